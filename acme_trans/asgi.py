@@ -3,6 +3,10 @@ ASGI config for acme_trans project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Serve it with an ASGI server to enable the live events channel, e.g.:
+
+    uvicorn acme_trans.asgi:application --workers 4
+
 For more information on this file, see
 https://docs.djangoproject.com/en/4.2/howto/deployment/asgi/
 """
@@ -13,4 +17,8 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'acme_trans.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+from flota.tiempo_real import CancelarAlDesconectar  # noqa: E402 (requiere apps cargadas)
+
+application = CancelarAlDesconectar(django_application)
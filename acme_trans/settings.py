@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/4.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -53,6 +54,7 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'flota.replica.ReplicaMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -85,9 +87,49 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # Conexiones persistentes, verificadas antes de reutilizarse
+        'CONN_MAX_AGE': 600,
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            'timeout': 5,
+        },
+        # Base de tests en archivo: la de memoria compartida responde "table is locked"
+        # en vez de esperar el lock, y los tests de concurrencia usan varios hilos
+        'TEST': {'NAME': BASE_DIR / 'test_db.sqlite3'},
     }
 }
 
+# Réplica de solo lectura opcional para reportes y estadísticas.
+# En local: ACME_REPLICA_SQLITE=replica.sqlite3 y `manage.py refrescar_replica --intervalo 10`
+if os.environ.get('ACME_REPLICA_SQLITE'):
+    DATABASES['replica'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / os.environ['ACME_REPLICA_SQLITE'],
+        'CONN_MAX_AGE': 600,
+        'CONN_HEALTH_CHECKS': True,
+        'TEST': {'MIRROR': 'default'},
+    }
+
+# Sharding opcional por centro (ver flota/shards.py).
+# En local: ACME_SHARDS="1,2,3" crea un SQLite por centro (centro_1.sqlite3, ...)
+# y `manage.py preparar_shards` migra los shards y mueve los datos existentes.
+FLOTA_SHARDS = {}
+for _centro_id in filter(None, os.environ.get('ACME_SHARDS', '').split(',')):
+    _alias = f'centro_{int(_centro_id)}'
+    DATABASES[_alias] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / f'{_alias}.sqlite3',
+        'CONN_MAX_AGE': 600,
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            'timeout': 5,
+        },
+        'TEST': {'NAME': BASE_DIR / f'test_{_alias}.sqlite3'},
+    }
+    FLOTA_SHARDS[int(_centro_id)] = _alias
+
+DATABASE_ROUTERS = ['flota.routers.RouterReplica', 'flota.routers.RouterShards']
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
@@ -129,3 +171,103 @@ STATIC_URL = 'static/'
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+
+# ==================== ACME TRANS ====================
+
+# Canal de eventos en tiempo real (SSE, servido vía ASGI: uvicorn acme_trans.asgi:application)
+FLOTA_SSE_INTERVALO = 2            # segundos entre consultas a la versión de datos (una por proceso)
+FLOTA_SSE_LATIDO = 25              # segundos entre comentarios keep-alive
+FLOTA_SSE_DURACION_MAXIMA = 300    # segundos antes de cerrar; el navegador reconecta con Last-Event-ID
+FLOTA_SSE_HISTORIAL = 100          # deltas recientes disponibles para reconexiones
+
+# PRAGMAs aplicados a cada conexión SQLite (ver flota/sqlite.py). El modo WAL
+# (lectores no bloquean al escritor) queda en el archivo: lo activa la migración 0003
+FLOTA_SQLITE_PRAGMAS = {
+    'synchronous': 'NORMAL',       # seguro con WAL; evita un fsync por commit
+    'cache_size': -20000,          # ~20 MB de caché de páginas por conexión
+    'mmap_size': 268435456,        # 256 MB de lectura mapeada en memoria
+    'busy_timeout': 5000,          # esperar el lock hasta 5 s antes de "database is locked"
+    'temp_store': 'MEMORY',
+}
+
+# Réplica de lectura (ver flota/replica.py)
+FLOTA_REPLICA_ALIAS = 'replica'
+FLOTA_REPLICA_PIN_SEGUNDOS = 30    # lecturas al primario tras escribir; debe cubrir el retraso de la réplica
+
+# Motor de reportes (ver flota/reportes/motor.py)
+FLOTA_REPORTES_CACHE_DIR = BASE_DIR / 'reportes_cache'
+FLOTA_REPORTES_CACHE_DIAS = 7               # archivos sin descargas en este plazo se eliminan
+FLOTA_REPORTES_LOTE = 2000                  # filas por lote de iterator()
+FLOTA_REPORTES_UMBRAL_TRABAJO = 20000       # desde estas filas se encola un trabajo en vez de generar en el request
+FLOTA_REPORTES_ARCHIVO_DIR = BASE_DIR / 'reportes_archivo'   # reportes de mantenimiento enviados (no se purgan)
+
+# Cola de trabajos en segundo plano (ver flota/trabajos.py; ejecutar "manage.py trabajador")
+FLOTA_TRABAJOS_PROCESOS = 2
+FLOTA_TRABAJOS_ESPERA = 2           # segundos entre consultas con la cola vacía
+FLOTA_TRABAJOS_ARRIENDO = 600       # segundos antes de que otro proceso retome un trabajo tomado
+FLOTA_TRABAJOS_BACKOFF_BASE = 10    # reintentos a los ~10 s, 20 s, 40 s...
+FLOTA_TRABAJOS_BACKOFF_MAXIMO = 3600
+
+# Exportaciones CSV/JSON (ver flota/exportaciones.py)
+FLOTA_EXPORTACION_MARGEN = 30       # segundos antes del cursor que ?since= vuelve a enviar (commits tardíos)
+
+# Email (en desarrollo se imprime en consola; ACME_EMAIL_BACKEND=django.core.mail.backends.filebased.EmailBackend
+# los guarda en EMAIL_FILE_PATH). En producción: smtp.EmailBackend con EMAIL_HOST/EMAIL_PORT/...
+EMAIL_BACKEND = os.environ.get('ACME_EMAIL_BACKEND', 'django.core.mail.backends.console.EmailBackend')
+EMAIL_FILE_PATH = BASE_DIR / 'correos'
+DEFAULT_FROM_EMAIL = 'ACME Trans <no-responder@acmetrans.cl>'
+
+# Notificaciones agrupadas en resúmenes (ver flota/notificaciones.py)
+FLOTA_NOTIFICACIONES_VENTANA = 900      # segundos: un resumen por destinatario cada 15 minutos como máximo
+FLOTA_NOTIFICACIONES = {
+    'mantenimiento_completado': [
+        'Jefe de Mantenimiento <jefe.mantenimiento@acmetrans.cl>',
+        'Gerente de Operaciones <gerente.operaciones@acmetrans.cl>',
+    ],
+    'prioridad_critica': [
+        'Jefe de Mantenimiento <jefe.mantenimiento@acmetrans.cl>',
+        'Gerente de Operaciones <gerente.operaciones@acmetrans.cl>',
+    ],
+    'alerta_km': [
+        'Jefe de Flota <jefe.flota@acmetrans.cl>',
+        'Jefe de Mantenimiento <jefe.mantenimiento@acmetrans.cl>',
+    ],
+}
+
+# Agenda de talleres: capacidad diaria por proveedor (ver flota/agenda.py)
+FLOTA_AGENDA_DIAS_HABILES = (0, 1, 2, 3, 4)     # lunes a viernes (date.weekday())
+FLOTA_AGENDA_HORIZONTE = 365                    # días hacia adelante en que se buscan cupos
+
+# Plan preventivo (ver flota/planificacion.py)
+FLOTA_PLAN_KM_DIARIOS = 250                     # uso promedio para estimar cuándo vence cada mantenimiento
+
+# Archivo de mantenimientos cerrados (ver flota/archivo.py)
+FLOTA_ARCHIVO_DIAS = 365                        # completados/cancelados con más antigüedad salen de la tabla vigente
+FLOTA_ARCHIVO_LOTE = 500                        # filas por transacción al archivar
+
+# Eliminación de vehículos en segundo plano (ver flota/eliminacion.py)
+FLOTA_ELIMINACION_LOTE = 500                    # mantenimientos borrados por transacción al purgar un vehículo
+
+# Registro de cambios para sistemas externos (ver flota/cambios.py)
+FLOTA_CAMBIOS_PAGINA_MAXIMA = 1000              # cambios por página en /api/cambios/
+FLOTA_CAMBIOS_COMPACTAR_DIAS = 7                # más antiguos que esto quedan en un cambio por objeto
+FLOTA_CAMBIOS_RETENCION_DIAS = 90               # más antiguos que esto se borran (cursores anteriores vencen)
+FLOTA_CAMBIOS_LOTE = 500                        # objetos/filas por transacción al compactar y purgar
+
+# Estado de la flota en memoria para KPIs y alertas (ver flota/estado_flota.py)
+FLOTA_ESTADO_MEMORIA = os.environ.get('ACME_ESTADO_MEMORIA') == '1'
+FLOTA_ESTADO_MEMORIA_REFRESCO = 5               # segundos que se usa un estado antes de aplicarle los cambios
+
+# Sincronización incremental de tablets y teléfonos (ver flota/sincronizacion.py)
+FLOTA_SINCRONIZACION_PAGINA = 500               # filas por página si el cliente no indica ?limite=
+FLOTA_SINCRONIZACION_PAGINA_MAXIMA = 2000
+FLOTA_SINCRONIZACION_MARGEN = 30                # segundos: los cambios más recientes esperan al próximo ciclo
+
+# Simulación Monte Carlo de la disponibilidad (ver flota/simulacion.py)
+FLOTA_SIMULACION_CORRIDAS = 1000                # trayectorias por simulación
+FLOTA_SIMULACION_CORRIDAS_MAXIMAS = 20000
+FLOTA_SIMULACION_PROCESOS = os.cpu_count() or 2  # procesos entre los que se reparten las corridas
+FLOTA_SIMULACION_DISPERSION_USO = 0.15          # desviación del uso diario entre corridas (fracción del promedio)
+FLOTA_SIMULACION_TASA_CORRECTIVA = 1 / 365      # fallas por vehículo y día si no hay historial suficiente
+FLOTA_SIMULACION_FACTOR_VENCIDOS = 2.0          # sin preventivos, los vencidos fallan esta cantidad de veces más
@@ -1,21 +1,44 @@
 # flota/admin.py
-from django.contrib import admin
+from django import forms
+from django.contrib import admin, messages
+from django.contrib.admin.helpers import ActionForm
+from django.utils.decorators import method_decorator
+from django.utils import timezone
 from django.utils.html import format_html
 from .models import (
-    CentroOperacional, Vehiculo, TipoMantenimiento, 
-    Proveedor, Mantenimiento
+    CentroOperacional, DemandaCentro, Vehiculo, TipoMantenimiento, 
+    Proveedor, Mantenimiento, Trabajo, EventoNotificacion, ResumenCostoMensual,
+    SnapshotDisponibilidad, TransicionEstado, MantenimientoArchivado, RegistroCambio,
 )
+from .eliminacion import solicitar_eliminacion
+from .replica import lectura_replica
+from .transiciones import TransicionInvalida, describir_resultado, transicionar_vehiculos
+
+
+class ListadoReplicaMixin:
+    """Los listados (changelist) se leen desde la réplica; los formularios de edición no"""
+    
+    @method_decorator(lectura_replica)
+    def changelist_view(self, request, extra_context=None):
+        return super().changelist_view(request, extra_context)
+
+
+class DemandaCentroInline(admin.TabularInline):
+    """Operativos requeridos por tipo de capacidad (ver flota/rebalanceo.py)"""
+    model = DemandaCentro
+    extra = 0
 
 
 @admin.register(CentroOperacional)
-class CentroOperacionalAdmin(admin.ModelAdmin):
-    list_display = ['nombre', 'ciudad', 'responsable', 'vehiculos_count', 'disponibilidad_display', 'activo']
+class CentroOperacionalAdmin(ListadoReplicaMixin, admin.ModelAdmin):
+    list_display = ['nombre', 'ciudad', 'responsable', 'capacidad_maxima', 'vehiculos_count', 'disponibilidad_display', 'activo']
     list_filter = ['activo', 'ciudad']
     search_fields = ['nombre', 'ciudad', 'responsable']
     ordering = ['nombre']
+    inlines = [DemandaCentroInline]
     
     def vehiculos_count(self, obj):
-        return obj.vehiculos.count()
+        return obj.vehiculos_count()
     vehiculos_count.short_description = 'Vehículos'
     
     def disponibilidad_display(self, obj):
@@ -33,15 +56,24 @@ class CentroOperacionalAdmin(admin.ModelAdmin):
     disponibilidad_display.short_description = 'Disponibilidad'
 
 
+class VehiculoActionForm(ActionForm):
+    """Centro de destino para la acción 'Mover a centro'"""
+    centro = forms.ModelChoiceField(
+        queryset=CentroOperacional.objects.filter(activo=True), required=False, label='Centro destino'
+    )
+
+
 @admin.register(Vehiculo)
-class VehiculoAdmin(admin.ModelAdmin):
+class VehiculoAdmin(ListadoReplicaMixin, admin.ModelAdmin):
     list_display = [
         'patente', 'marca_modelo', 'tipo_capacidad', 'centro_operacion', 
-        'kilometraje_actual', 'estado_display'
+        'kilometraje_actual', 'estado_display', 'activo'
     ]
-    list_filter = ['estado', 'tipo_capacidad', 'centro_operacion', 'marca']
+    list_filter = ['activo', 'estado', 'tipo_capacidad', 'centro_operacion', 'marca']
     search_fields = ['patente', 'marca', 'modelo', 'numero_chasis']
     ordering = ['patente']
+    action_form = VehiculoActionForm
+    actions = ['marcar_operativo', 'marcar_mantenimiento', 'marcar_fuera_servicio', 'mover_a_centro']
     
     fieldsets = (
         ('Información Básica', {
@@ -80,6 +112,49 @@ class VehiculoAdmin(admin.ModelAdmin):
             color, obj.get_estado_display()
         )
     estado_display.short_description = 'Estado'
+    
+    # Acciones en bloque: un UPDATE por lote con historial, cubo y versión (ver transiciones.py)
+    def _transicionar(self, request, queryset, **destino):
+        try:
+            resultado = transicionar_vehiculos(queryset.values_list('pk', flat=True), **destino)
+        except TransicionInvalida as error:
+            self.message_user(request, f'No se aplicó el cambio: {error}', messages.ERROR)
+            return
+        nivel = messages.WARNING if resultado['rechazados'] else messages.SUCCESS
+        self.message_user(request, describir_resultado(resultado), nivel)
+    
+    @admin.action(description='Marcar como Operativo')
+    def marcar_operativo(self, request, queryset):
+        self._transicionar(request, queryset, estado='operativo')
+    
+    @admin.action(description='Marcar como En Mantenimiento')
+    def marcar_mantenimiento(self, request, queryset):
+        self._transicionar(request, queryset, estado='mantenimiento')
+    
+    @admin.action(description='Marcar como Fuera de Servicio')
+    def marcar_fuera_servicio(self, request, queryset):
+        self._transicionar(request, queryset, estado='fuera_servicio')
+    
+    @admin.action(description='Mover al centro seleccionado')
+    def mover_a_centro(self, request, queryset):
+        centro = request.POST.get('centro')
+        if not centro:
+            self.message_user(request, 'Seleccione el centro destino.', messages.ERROR)
+            return
+        self._transicionar(request, queryset, centro_id=int(centro))
+    
+    # Eliminar marca inactivo y purga el historial en segundo plano (ver eliminacion.py)
+    def get_deleted_objects(self, objs, request):
+        # La confirmación no recorre las cascadas: con historiales largos eran miles de filas
+        objs = list(objs)
+        return [str(obj) for obj in objs], {Vehiculo._meta.verbose_name_plural: len(objs)}, set(), []
+    
+    def delete_model(self, request, obj):
+        solicitar_eliminacion(obj)
+    
+    def delete_queryset(self, request, queryset):
+        for vehiculo in queryset:
+            solicitar_eliminacion(vehiculo)
 
 
 @admin.register(TipoMantenimiento)
@@ -92,14 +167,14 @@ class TipoMantenimientoAdmin(admin.ModelAdmin):
 
 @admin.register(Proveedor)
 class ProveedorAdmin(admin.ModelAdmin):
-    list_display = ['nombre', 'rut', 'especialidad', 'telefono', 'email', 'activo']
+    list_display = ['nombre', 'rut', 'especialidad', 'capacidad_horas_diarias', 'telefono', 'email', 'activo']
     list_filter = ['activo', 'especialidad']
     search_fields = ['nombre', 'rut', 'email']
     ordering = ['nombre']
 
 
 @admin.register(Mantenimiento)
-class MantenimientoAdmin(admin.ModelAdmin):
+class MantenimientoAdmin(ListadoReplicaMixin, admin.ModelAdmin):
     list_display = [
         'vehiculo', 'tipo_mantenimiento', 'tipo', 'prioridad_display',
         'fecha_programada', 'estado_display', 'costo_estimado'
@@ -146,6 +221,104 @@ class MantenimientoAdmin(admin.ModelAdmin):
     estado_display.short_description = 'Estado'
 
 
+@admin.register(Trabajo)
+class TrabajoAdmin(admin.ModelAdmin):
+    list_display = ['id', 'tipo', 'estado', 'prioridad', 'intentos', 'disponible_desde', 'fecha_fin']
+    list_filter = ['estado', 'tipo']
+    search_fields = ['tipo', 'clave_idempotencia', 'error']
+    ordering = ['-fecha_creacion']
+    readonly_fields = ['intentos', 'trabajador', 'bloqueado_hasta', 'resultado', 'error', 'fecha_inicio', 'fecha_fin']
+    actions = ['reintentar']
+    
+    @admin.action(description='Reintentar trabajos seleccionados')
+    def reintentar(self, request, queryset):
+        actualizados = queryset.exclude(estado='en_proceso').update(
+            estado='pendiente', intentos=0, disponible_desde=timezone.now(), error=''
+        )
+        self.message_user(request, f'{actualizados} trabajo(s) reprogramados.')
+
+
+@admin.register(EventoNotificacion)
+class EventoNotificacionAdmin(admin.ModelAdmin):
+    list_display = ['tipo', 'destinatario', 'titulo', 'fecha_creacion', 'fecha_envio']
+    list_filter = ['tipo', 'destinatario']
+    search_fields = ['titulo', 'referencia']
+    ordering = ['-fecha_creacion']
+
+
+@admin.register(ResumenCostoMensual)
+class ResumenCostoMensualAdmin(admin.ModelAdmin):
+    """Solo lectura: el resumen se mantiene con signals y manage.py recalcular_costos"""
+    list_display = ['mes', 'vehiculo_id', 'centro_id', 'proveedor_id', 'cantidad', 'costo_estimado', 'costo_real']
+    list_filter = ['mes', 'centro_id']
+    ordering = ['-mes']
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(SnapshotDisponibilidad)
+class SnapshotDisponibilidadAdmin(admin.ModelAdmin):
+    """Solo lectura: lo escribe el trabajo diario tomar_snapshot_disponibilidad"""
+    list_display = ['fecha', 'centro_id', 'tipo_capacidad', 'estado', 'cantidad', 'tomado']
+    list_filter = ['fecha', 'centro_id', 'estado']
+    ordering = ['-fecha']
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(TransicionEstado)
+class TransicionEstadoAdmin(admin.ModelAdmin):
+    """Solo lectura: historial escrito por los signals de Vehiculo"""
+    list_display = ['fecha', 'vehiculo_id', 'centro_id', 'tipo_capacidad', 'estado_anterior', 'estado_nuevo']
+    list_filter = ['centro_id', 'estado_nuevo']
+    search_fields = ['=vehiculo_id']
+    date_hierarchy = 'fecha'
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(MantenimientoArchivado)
+class MantenimientoArchivadoAdmin(ListadoReplicaMixin, admin.ModelAdmin):
+    """Solo lectura: lo llena manage.py archivar_mantenimientos (y el trabajo nocturno)"""
+    list_display = ['id', 'vehiculo', 'tipo_mantenimiento', 'estado', 'fecha_programada', 'fecha_realizacion', 'costo_real', 'fecha_archivo']
+    list_filter = ['estado', 'tipo', 'fecha_archivo']
+    search_fields = ['=id', 'vehiculo__patente', 'tipo_mantenimiento__nombre']
+    ordering = ['-fecha_programada']
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(RegistroCambio)
+class RegistroCambioAdmin(ListadoReplicaMixin, admin.ModelAdmin):
+    """Solo lectura: lo escriben los signals y las operaciones en bloque (ver flota/cambios.py)"""
+    list_display = ['id', 'modelo', 'objeto_id', 'operacion', 'centro_id', 'fecha']
+    list_filter = ['modelo', 'operacion']
+    search_fields = ['=objeto_id']
+    ordering = ['-id']
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
 # Personalizar admin site
 admin.site.site_header = 'ACME Trans - Centro de Control Operativo'
 admin.site.site_title = 'ACME Trans'
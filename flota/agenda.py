@@ -0,0 +1,266 @@
+"""
+Agenda de talleres: capacidad diaria de cada proveedor.
+
+Cada ``Proveedor`` tiene ``capacidad_horas_diarias`` por día hábil
+(``FLOTA_AGENDA_DIAS_HABILES``). Un mantenimiento ocupa sus
+``tiempo_estimado_horas`` desde su fecha programada: llena las horas libres de
+ese día y, si no alcanzan, continúa en los días hábiles siguientes. Un trabajo
+cabe en una fecha si lo completa en el mínimo de días posible
+(``ceil(horas / capacidad)``).
+
+Las horas libres de cada taller están en un árbol de segmentos de máximos por
+día hábil: el primer día con al menos N horas libres se encuentra en
+O(log días), sin recorrer los días ya copados, así que agendar decenas de
+miles de trabajos toma poco tiempo aunque el taller esté lleno. La programación masiva toma los trabajos de un heap
+ordenado por prioridad (críticos primero) y fecha deseada.
+"""
+import bisect
+import datetime
+import heapq
+import math
+from django.conf import settings
+from django.db.models import Sum
+from django.utils import timezone
+from .models import Mantenimiento, Proveedor
+from .shards import reunir_shards
+
+
+RANGO_PRIORIDAD = {'critica': 0, 'alta': 1, 'media': 2, 'baja': 3}
+
+# Los mantenimientos que ocupan horas de taller
+ESTADOS_OCUPAN = ('programado', 'en_proceso')
+
+
+class AgendaInvalida(ValueError):
+    pass
+
+
+def dias_habiles(desde, dias):
+    """Fechas hábiles en [desde, desde + dias)"""
+    habiles = set(getattr(settings, 'FLOTA_AGENDA_DIAS_HABILES', (0, 1, 2, 3, 4)))
+    fechas = (desde + datetime.timedelta(days=n) for n in range(dias))
+    return [fecha for fecha in fechas if fecha.weekday() in habiles]
+
+
+class Taller:
+    """Horas libres por día hábil de un proveedor, en un árbol de segmentos de máximos"""
+
+    def __init__(self, proveedor_id, capacidad, dias):
+        self.proveedor_id = proveedor_id
+        self.capacidad = capacidad
+        self.dias = dias
+        self.tamano = 1
+        while self.tamano < dias:
+            self.tamano *= 2
+        # Hojas en [tamano, tamano + dias); cada nodo guarda el máximo de sus hijos
+        self.maximo = [0] * (2 * self.tamano)
+        self.maximo[self.tamano:self.tamano + dias] = [capacidad] * dias
+        for nodo in range(self.tamano - 1, 0, -1):
+            self.maximo[nodo] = max(self.maximo[2 * nodo], self.maximo[2 * nodo + 1])
+
+    @property
+    def libres(self):
+        return self.maximo[self.tamano:self.tamano + self.dias]
+
+    def _fijar(self, indice, horas):
+        nodo = self.tamano + indice
+        self.maximo[nodo] = horas
+        nodo //= 2
+        while nodo:
+            self.maximo[nodo] = max(self.maximo[2 * nodo], self.maximo[2 * nodo + 1])
+            nodo //= 2
+
+    def _primero(self, desde, minimo, nodo=1, izquierda=0, derecha=None):
+        """Primer día desde ``desde`` con al menos ``minimo`` horas libres, o None"""
+        derecha = self.tamano if derecha is None else derecha
+        if derecha <= desde or self.maximo[nodo] < minimo:
+            return None
+        if derecha - izquierda == 1:
+            return izquierda
+        medio = (izquierda + derecha) // 2
+        indice = self._primero(desde, minimo, 2 * nodo, izquierda, medio)
+        if indice is None:
+            indice = self._primero(desde, minimo, 2 * nodo + 1, medio, derecha)
+        return indice
+
+    def dias_necesarios(self, horas):
+        return max(1, math.ceil(horas / self.capacidad))
+
+    def cabe(self, indice, horas):
+        if not self.capacidad or indice >= self.dias or self.maximo[self.tamano + indice] == 0:
+            return False
+        fin = indice + self.dias_necesarios(horas)
+        return fin <= self.dias and sum(self.maximo[self.tamano + indice:self.tamano + fin]) >= horas
+
+    def primer_cupo(self, desde, horas):
+        """Índice del primer día desde ``desde`` donde cabe el trabajo, o None"""
+        if not self.capacidad:
+            return None
+        # El primer día debe aportar lo que los demás días (llenos a lo más) no alcanzan
+        minimo = max(1, horas - (self.dias_necesarios(horas) - 1) * self.capacidad)
+        indice = self._primero(desde, minimo)
+        while indice is not None and not self.cabe(indice, horas):
+            indice = self._primero(indice + 1, minimo)
+        return indice
+
+    def ocupar(self, indice, horas):
+        """Llena horas desde el día ``indice``; lo que exceda el horizonte se descarta"""
+        while horas > 0:
+            indice = self._primero(indice, 1)
+            if indice is None:
+                break
+            libres = self.maximo[self.tamano + indice]
+            tomadas = min(horas, libres)
+            self._fijar(indice, libres - tomadas)
+            horas -= tomadas
+
+
+class Agenda:
+    """
+    Ocupación de los talleres desde ``desde`` (hoy) durante ``horizonte`` días,
+    cargada con una consulta agrupada por proveedor y fecha en cada base.
+    ``excluir`` (ids) u ``omitir`` (un Q) dejan fuera de la ocupación
+    mantenimientos ya guardados, p. ej. al editarlos o reprogramarlos.
+    """
+
+    def __init__(self, desde=None, horizonte=None, proveedores=None, excluir=(), omitir=None):
+        self.desde = desde or timezone.localdate()
+        horizonte = horizonte or getattr(settings, 'FLOTA_AGENDA_HORIZONTE', 365)
+        self.hasta = self.desde + datetime.timedelta(days=horizonte)
+        self.dias = dias_habiles(self.desde, horizonte)
+
+        consulta = Proveedor.objects.filter(activo=True) if proveedores is None else Proveedor.objects.filter(pk__in=proveedores)
+        self.nombres = {}
+        self.talleres = {}
+        for pk, nombre, capacidad in consulta.order_by('id').values_list('id', 'nombre', 'capacidad_horas_diarias'):
+            self.nombres[pk] = nombre
+            self.talleres[pk] = Taller(pk, capacidad, len(self.dias))
+        self._cargar_ocupacion(set(excluir), omitir)
+
+    def _cargar_ocupacion(self, excluir, omitir):
+        ocupan = Mantenimiento.objects.filter(
+            estado__in=ESTADOS_OCUPAN, proveedor_id__in=list(self.talleres),
+            fecha_programada__gte=self.desde, fecha_programada__lt=self.hasta,
+        ).exclude(pk__in=excluir)
+        if omitir is not None:
+            ocupan = ocupan.exclude(omitir)
+
+        def parcial(alias):
+            return list(
+                ocupan.using(alias).order_by().values_list('proveedor_id', 'fecha_programada').annotate(
+                    total_horas=Sum('tiempo_estimado_horas')
+                )
+            )
+
+        filas = sorted(fila for parcial_filas in reunir_shards(parcial) for fila in parcial_filas)
+        for proveedor_id, fecha, horas in filas:
+            self.talleres[proveedor_id].ocupar(self.indice(fecha), horas or 0)
+
+    def indice(self, fecha):
+        """Índice del primer día hábil en o después de ``fecha``"""
+        return bisect.bisect_left(self.dias, fecha)
+
+    def es_habil(self, fecha):
+        indice = self.indice(fecha)
+        return indice < len(self.dias) and self.dias[indice] == fecha
+
+    def cabe(self, proveedor_id, fecha, horas):
+        taller = self.talleres.get(proveedor_id)
+        return taller is not None and self.es_habil(fecha) and taller.cabe(self.indice(fecha), horas)
+
+    def proponer(self, horas, proveedor_id=None, desde=None):
+        """(proveedor_id, fecha) más temprano con cupo, o None; sin proveedor se elige entre todos"""
+        desde = self.indice(max(desde or self.desde, self.desde))
+        if proveedor_id is None:
+            candidatos = self.talleres.values()
+        else:
+            candidatos = [self.talleres[proveedor_id]] if proveedor_id in self.talleres else []
+        mejor = None
+        for taller in candidatos:
+            indice = taller.primer_cupo(desde, horas)
+            if indice is not None and (mejor is None or indice < mejor[1]):
+                mejor = (taller.proveedor_id, indice)
+        return (mejor[0], self.dias[mejor[1]]) if mejor else None
+
+    def reservar(self, proveedor_id, fecha, horas):
+        self.talleres[proveedor_id].ocupar(self.indice(fecha), horas)
+
+    def programar(self, trabajos):
+        """
+        Asigna cupo a cada trabajo: dicts con 'horas', 'prioridad' y
+        opcionalmente 'fecha' (deseada, no antes) y 'proveedor_id'. Los críticos se
+        agendan primero, luego por fecha deseada. Retorna una lista de
+        (trabajo, proveedor_id, fecha), con fecha None si no hubo cupo en el
+        horizonte.
+        """
+        heap = [
+            (RANGO_PRIORIDAD.get(trabajo.get('prioridad'), len(RANGO_PRIORIDAD)), trabajo.get('fecha') or self.desde, orden, trabajo)
+            for orden, trabajo in enumerate(trabajos)
+        ]
+        heapq.heapify(heap)
+        resultado = []
+        while heap:
+            _, fecha, _, trabajo = heapq.heappop(heap)
+            propuesta = self.proponer(trabajo['horas'], trabajo.get('proveedor_id'), desde=fecha)
+            if propuesta is None:
+                resultado.append((trabajo, trabajo.get('proveedor_id'), None))
+                continue
+            self.reservar(propuesta[0], propuesta[1], trabajo['horas'])
+            resultado.append((trabajo, *propuesta))
+        return resultado
+
+    def calendario(self, desde=None, hasta=None):
+        """Columnar: días hábiles y, por proveedor, horas ocupadas y libres de cada día"""
+        inicio = self.indice(desde or self.desde)
+        fin = self.indice((hasta or self.hasta) + datetime.timedelta(days=1))
+        return {
+            'dias': [fecha.isoformat() for fecha in self.dias[inicio:fin]],
+            'proveedores': [
+                {
+                    'id': pk,
+                    'nombre': self.nombres[pk],
+                    'capacidad': taller.capacidad,
+                    'ocupadas': [taller.capacidad - libres for libres in taller.libres[inicio:fin]],
+                    'libres': taller.libres[inicio:fin],
+                }
+                for pk, taller in self.talleres.items()
+            ],
+        }
+
+
+def validar_cupo(proveedor_id, fecha, horas, excluir=()):
+    """None si el trabajo cabe; si no, un mensaje con la primera fecha disponible del taller"""
+    hoy = timezone.localdate()
+    horizonte = max(getattr(settings, 'FLOTA_AGENDA_HORIZONTE', 365), (fecha - hoy).days + 60)
+    agenda = Agenda(desde=hoy, horizonte=horizonte, proveedores=[proveedor_id], excluir=excluir)
+    if agenda.cabe(proveedor_id, fecha, horas):
+        return None
+    motivo = 'no es día hábil del taller' if not agenda.es_habil(fecha) else f'el taller no tiene {horas} horas libres ese día'
+    propuesta = agenda.proponer(horas, proveedor_id, desde=fecha)
+    if propuesta is None:
+        return f'{fecha:%d/%m/%Y} {motivo} y no hay cupo en el horizonte de la agenda.'
+    return f'{fecha:%d/%m/%Y} {motivo}. Primera fecha disponible: {propuesta[1]:%d/%m/%Y}.'
+
+
+def calendario_talleres(desde=None, hasta=None, proveedores=None):
+    """Horas ocupadas y libres por proveedor y día hábil entre dos fechas (por defecto, 4 semanas)"""
+    desde = desde or timezone.localdate()
+    hasta = hasta or desde + datetime.timedelta(days=27)
+    if hasta < desde or (hasta - desde).days > 366:
+        raise AgendaInvalida('el rango debe ser de 0 a 366 días')
+    agenda = Agenda(desde=desde, horizonte=(hasta - desde).days + 1, proveedores=proveedores)
+    return {'desde': desde.isoformat(), 'hasta': hasta.isoformat(), **agenda.calendario()}
+
+
+def opciones_cupo(horas, desde=None, proveedor_id=None, limite=5):
+    """Primera fecha con cupo de cada taller (o de uno), de la más temprana a la más tardía"""
+    if horas <= 0:
+        raise AgendaInvalida('horas debe ser positivo')
+    agenda = Agenda(proveedores=[proveedor_id] if proveedor_id else None)
+    opciones = []
+    for pk in agenda.talleres:
+        propuesta = agenda.proponer(horas, pk, desde=desde)
+        if propuesta is not None:
+            opciones.append({'proveedor_id': pk, 'proveedor': agenda.nombres[pk], 'fecha': propuesta[1].isoformat()})
+    opciones.sort(key=lambda opcion: opcion['fecha'])
+    return {'horas': horas, 'opciones': opciones[:limite]}
@@ -4,3 +4,10 @@ from django.apps import AppConfig
 class FlotaConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'flota'
+
+    def ready(self):
+        from django.db.backends.signals import connection_created
+        from . import signals, tareas  # noqa: F401
+        from .sqlite import configurar_conexion_sqlite
+        
+        connection_created.connect(configurar_conexion_sqlite, dispatch_uid='flota_sqlite_pragmas')
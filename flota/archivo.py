@@ -0,0 +1,122 @@
+"""
+Archivo de mantenimientos cerrados: tabla vigente pequeña, historial completo.
+
+Los trabajos abiertos (programados o en proceso) son una fracción mínima del
+historial, pero cada listado, filtro y conteo recorría la tabla completa.
+``archivar_mantenimientos`` mueve los completados y cancelados con más de
+``FLOTA_ARCHIVO_DIAS`` días (según su fecha de realización, o la programada)
+a ``MantenimientoArchivado``, en la misma base (o shard) que su vehículo:
+
+- por lotes, cada uno en su propia transacción corta, así corre con la
+  aplicación en uso sin retener el lock de escritura;
+- las filas se copian tal cual (mismo id y fechas) y se borran sin signals:
+  se mueven, no se eliminan, y el cubo y el resumen de costos no cambian.
+
+Las lecturas del historial usan ``MantenimientoHistorial``, una vista SQL
+(UNION ALL de ambas tablas, con la columna ``archivado``) que admite filtros,
+agregados y select_related como cualquier modelo, pero es de solo lectura.
+``Mantenimiento`` queda para el trabajo vigente y las escrituras.
+"""
+import datetime
+import time
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+from .disponibilidad import inicio_dia
+from .models import Mantenimiento, MantenimientoArchivado, MantenimientoHistorial
+from .shards import aliases_datos, copiar_filas
+from .sqlite import atomic_inmediato
+from .trabajos import PRIORIDAD_BAJA, encolar
+from .versiones import incrementar_version
+
+
+ESTADOS_ARCHIVABLES = ('completado', 'cancelado')
+
+
+def fecha_limite(dias=None):
+    """Se archivan los mantenimientos cerrados antes de esta fecha"""
+    dias = settings.FLOTA_ARCHIVO_DIAS if dias is None else dias
+    return timezone.localdate() - datetime.timedelta(days=dias)
+
+
+def archivables(alias, limite):
+    return Mantenimiento.objects.using(alias).filter(estado__in=ESTADOS_ARCHIVABLES).filter(
+        Q(fecha_realizacion__lt=limite) | Q(fecha_realizacion__isnull=True, fecha_programada__lt=limite)
+    )
+
+
+def _archivado(mantenimiento, ahora):
+    return MantenimientoArchivado(
+        fecha_archivo=ahora,
+        **{campo.attname: getattr(mantenimiento, campo.attname) for campo in Mantenimiento._meta.concrete_fields},
+    )
+
+
+def _archivar_lote(alias, limite, lote):
+    """Copia y borra un lote en una transacción; retorna cuántos movió"""
+    with atomic_inmediato(alias):
+        filas = list(archivables(alias, limite).order_by('pk')[:lote])
+        if filas:
+            ahora = timezone.now()
+            copiar_filas(MantenimientoArchivado, [_archivado(fila, ahora) for fila in filas], alias)
+            Mantenimiento.objects.using(alias).filter(pk__in=[fila.pk for fila in filas])._raw_delete(alias)
+    return len(filas)
+
+
+def archivar_mantenimientos(dias=None, lote=None, pausa=0, simular=False):
+    """
+    Mueve al archivo los mantenimientos cerrados hace más de ``dias``, de a
+    ``lote`` filas con ``pausa`` segundos entre lotes. Con ``simular`` solo
+    cuenta. Retorna {'limite', 'archivados', 'por_base': {alias: cantidad}}.
+    """
+    limite = fecha_limite(dias)
+    lote = lote or settings.FLOTA_ARCHIVO_LOTE
+    por_base = {}
+    for alias in aliases_datos():
+        if simular:
+            por_base[alias] = archivables(alias, limite).count()
+            continue
+        movidos = 0
+        while True:
+            cantidad = _archivar_lote(alias, limite, lote)
+            movidos += cantidad
+            if cantidad < lote:
+                break
+            if pausa:
+                time.sleep(pausa)
+        if movidos:
+            # Los listados de la tabla vigente cambian aunque el historial sea el mismo
+            incrementar_version(using=alias)
+        por_base[alias] = movidos
+    return {'limite': limite, 'archivados': sum(por_base.values()), 'por_base': por_base}
+
+
+def programar_archivo():
+    """Un archivado por noche, al comienzo del día siguiente (como el snapshot de disponibilidad)"""
+    manana = timezone.localdate() + datetime.timedelta(days=1)
+    retraso = (inicio_dia(manana) - timezone.now()).total_seconds()
+    return encolar(
+        'archivar_mantenimientos', prioridad=PRIORIDAD_BAJA,
+        clave=f'archivar_mantenimientos:{manana.isoformat()}', retraso=retraso,
+    )
+
+
+# ==================== LECTURA UNIFICADA ====================
+def incluir_archivo(parametros):
+    """Los listados muestran la tabla vigente salvo ?archivo=1 o un filtro por estado cerrado"""
+    return parametros.get('archivo') == '1' or parametros.get('estado') in ESTADOS_ARCHIVABLES
+
+
+def consultar_mantenimientos(parametros=None):
+    """Queryset de la tabla vigente o del historial completo, según ``incluir_archivo``"""
+    if parametros is not None and incluir_archivo(parametros):
+        return MantenimientoHistorial.objects.all()
+    return Mantenimiento.objects.all()
+
+
+def resumen_archivo():
+    """{alias: (vigentes, archivados)}"""
+    return {
+        alias: (Mantenimiento.objects.using(alias).count(), MantenimientoArchivado.objects.using(alias).count())
+        for alias in aliases_datos()
+    }
@@ -0,0 +1,41 @@
+"""
+Utilidades para vistas async.
+
+En Django 4.2 los métodos ``a*`` del ORM (``acount``, ``aaggregate``...) son
+envoltorios de ``sync_to_async(thread_sensitive=True)`` y comparten un único
+hilo, es decir, se ejecutan uno tras otro. ``en_paralelo`` usa el pool de hilos
+del executor (cada hilo con su propia conexión) para que las consultas
+independientes realmente corran al mismo tiempo mientras el event loop queda libre.
+
+Esos hilos no pasan por ``request_started``/``request_finished``, así que
+``en_paralelo`` hace la misma limpieza que Django hace en cada request
+(``close_old_connections``) antes y después de la llamada: las conexiones
+vencidas (``CONN_MAX_AGE``) o con error no se acumulan en el pool.
+"""
+import asyncio
+from asgiref.sync import sync_to_async
+from django.db import close_old_connections
+from django.shortcuts import render
+
+
+def _con_conexiones_limpias(funcion, *args, **kwargs):
+    close_old_connections()
+    try:
+        return funcion(*args, **kwargs)
+    finally:
+        close_old_connections()
+
+
+def en_paralelo(funcion, *args, **kwargs):
+    """Corrutina que ejecuta una función sync (consultas ORM) en el pool de hilos"""
+    return sync_to_async(_con_conexiones_limpias, thread_sensitive=False)(funcion, *args, **kwargs)
+
+
+async def reunir(*funciones):
+    """Ejecuta varias funciones sync independientes de forma concurrente"""
+    return await asyncio.gather(*(en_paralelo(funcion) for funcion in funciones))
+
+
+async def render_async(request, template_name, context=None):
+    """render() fuera del event loop: los templates pueden tocar el ORM (sesión, usuario)"""
+    return await sync_to_async(render)(request, template_name, context)
@@ -0,0 +1,323 @@
+"""
+Registro de cambios (CDC) para los sistemas externos: ERP, BI y la pasarela
+de telemetría.
+
+Sin este registro, la única forma de saber qué cambió era releer las tablas
+completas. ``RegistroCambio`` es un log de solo inserción con una fila por
+alta, modificación (solo los campos que cambiaron, con su valor nuevo) o baja
+de vehículos, mantenimientos, centros, proveedores y tipos de mantenimiento:
+
+- ``save()`` y ``delete()`` se capturan con signals (``signals.py``);
+- las operaciones en bloque (flujo, transiciones, plan preventivo, purga de
+  vehículos) registran sus filas con ``registrar_cambios``, igual que
+  mantienen el cubo y los costos;
+- las filas se insertan dentro de la transacción de los datos, así que un
+  rollback (de la transacción o de un savepoint) se las lleva. Con sharding,
+  los cambios de un shard se juntan por savepoint y se insertan en un
+  bulk_create al confirmarse la transacción del shard.
+
+Archivar un mantenimiento o moverlo de shard no cambia sus datos y no se
+registra.
+
+El id es el cursor. SQLite admite un solo escritor a la vez, así que ninguna
+fila se confirma con un id menor que otra ya visible. El consumidor pide
+``/api/cambios/?desde=<cursor>`` y aplica las altas y modificaciones como
+upserts y las bajas como borrados.
+
+Mantención nocturna (``mantener_registro``):
+
+- compactación: entre las filas con más de ``FLOTA_CAMBIOS_COMPACTAR_DIAS``
+  días se deja una por objeto, con el id de la última y los cambios
+  fusionados, de modo que cualquier cursor sigue llegando al estado final;
+- retención: se borran las filas con más de ``FLOTA_CAMBIOS_RETENCION_DIAS``
+  días. Un cursor anterior a lo borrado queda vencido (410) y el consumidor
+  debe partir de una exportación completa (``X-Cambios-Cursor``).
+"""
+import datetime
+import weakref
+from decimal import Decimal
+from itertools import groupby
+from operator import attrgetter
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.db.models import Count, Max
+from django.db.models.fields.files import FieldFile
+from django.utils import timezone
+from .disponibilidad import inicio_dia
+from .models import (
+    CentroOperacional, Mantenimiento, MantenimientoArchivado, Proveedor, RegistroCambio, TipoMantenimiento,
+    Vehiculo, VersionDatos,
+)
+from .sqlite import atomic_inmediato
+from .trabajos import PRIORIDAD_BAJA, encolar
+
+
+# Nombre público de cada modelo en el registro (los archivados son mantenimientos)
+MODELOS = {
+    Vehiculo: 'vehiculo',
+    Mantenimiento: 'mantenimiento',
+    MantenimientoArchivado: 'mantenimiento',
+    CentroOperacional: 'centro',
+    Proveedor: 'proveedor',
+    TipoMantenimiento: 'tipo_mantenimiento',
+}
+
+# Último id borrado por retención: los cursores anteriores están vencidos. La
+# fecha de la marca es el corte de la retención (para los cursores por fecha)
+CLAVE_PURGA = 'registro_cambios_purgado'
+
+
+class CursorVencido(ValueError):
+    pass
+
+
+def campos(modelo):
+    """Columnas registradas de un modelo (todas las concretas)"""
+    return [campo.attname for campo in modelo._meta.concrete_fields]
+
+
+def _valor(valor):
+    """Valores JSON compactos, iguales vengan de la instancia o de .values()"""
+    if isinstance(valor, FieldFile):
+        return valor.name or ''
+    if isinstance(valor, (datetime.date, datetime.datetime)):
+        return valor.isoformat()
+    if isinstance(valor, Decimal):
+        return int(valor) if valor == valor.to_integral_value() else float(valor)
+    return valor
+
+
+def fila(instancia):
+    return {campo: _valor(getattr(instancia, campo)) for campo in campos(type(instancia))}
+
+
+def diferencias(anterior, nuevo):
+    """Campos de ``nuevo`` con otro valor que en ``anterior``; vacío si solo cambió la fecha de modificación"""
+    cambiados = {campo: _valor(valor) for campo, valor in nuevo.items() if _valor(anterior.get(campo)) != _valor(valor)}
+    return cambiados if set(cambiados) - {'fecha_modificacion'} else {}
+
+
+def centro_de(instancia):
+    """Centro al que pertenece el objeto (para filtrar por centro); None en las tablas globales"""
+    if isinstance(instancia, Vehiculo):
+        return instancia.centro_operacion_id
+    if isinstance(instancia, CentroOperacional):
+        return instancia.pk
+    if isinstance(instancia, (Mantenimiento, MantenimientoArchivado)):
+        vehiculo = instancia._state.fields_cache.get('vehiculo')
+        if vehiculo is not None:
+            return vehiculo.centro_operacion_id
+        return Vehiculo.objects.using(instancia._state.db).filter(pk=instancia.vehiculo_id).values_list(
+            'centro_operacion_id', flat=True
+        ).first()
+    return None
+
+
+# ==================== ESCRITURA ====================
+class _Lote(list):
+    """Filas de un nivel (transacción o savepoint) de una base de datos; se insertan juntas al confirmarla"""
+
+    def volcar(self):
+        RegistroCambio.objects.using(DEFAULT_DB_ALIAS).bulk_create(self, batch_size=500)
+        self.clear()
+
+
+def _lote_de_savepoint(conexion):
+    """
+    Lote del savepoint actual de ``conexion`` (o de la transacción, fuera de
+    uno). La única referencia fuerte al lote es su callback de on_commit: si
+    el savepoint o la transacción se revierte, Django descarta el callback y
+    el lote desaparece del diccionario débil con sus filas.
+    """
+    lotes = getattr(conexion, '_registro_cambios', None)
+    if lotes is None:
+        lotes = conexion._registro_cambios = weakref.WeakValueDictionary()
+    # Los ids de savepoint no se repiten en la vida de la conexión
+    savepoint = next((sid for sid in reversed(conexion.savepoint_ids) if sid), None)
+    lote = lotes.get(savepoint)
+    if lote is None:
+        lote = lotes[savepoint] = _Lote()
+        transaction.on_commit(lote.volcar, using=conexion.alias)
+    return lote
+
+
+def registrar_cambios(cambios, using=None):
+    """
+    ``cambios`` son tuplas (modelo, objeto_id, operacion, datos, centro_id).
+    ``using`` es la base donde se escribieron los datos. Si es la misma del
+    registro, las filas se insertan en la transacción de los datos; si es
+    otra (un shard), al confirmar la transacción de esa base (o de inmediato,
+    fuera de una).
+    """
+    ahora = timezone.now()
+    filas = [
+        RegistroCambio(modelo=MODELOS[modelo], objeto_id=objeto_id, operacion=operacion, datos=datos,
+                       centro_id=centro_id, fecha=ahora)
+        for modelo, objeto_id, operacion, datos, centro_id in cambios
+    ]
+    if not filas:
+        return
+    conexion = connections[using or DEFAULT_DB_ALIAS]
+    if conexion.alias == DEFAULT_DB_ALIAS or not conexion.in_atomic_block:
+        RegistroCambio.objects.using(DEFAULT_DB_ALIAS).bulk_create(filas, batch_size=500)
+        return
+    _lote_de_savepoint(conexion).extend(filas)
+
+
+def registrar_guardado(instancia, anterior, using, centro_id=None):
+    """
+    Alta o modificación desde post_save; ``anterior`` es la fila previa (o None
+    si no existía) y ``centro_id`` el centro si quien llama ya lo conoce.
+    """
+    if anterior is None:
+        operacion, datos = 'alta', fila(instancia)
+    else:
+        operacion, datos = 'modificacion', diferencias(anterior, fila(instancia))
+        if not datos:
+            return
+    registrar_cambios([(type(instancia), instancia.pk, operacion, datos, centro_id or centro_de(instancia))], using)
+
+
+def registrar_baja(instancia, using, centro_id=None):
+    registrar_cambios([(type(instancia), instancia.pk, 'baja', {}, centro_id or centro_de(instancia))], using)
+
+
+# ==================== LECTURA ====================
+def cursor_purgado():
+    fila_purga = VersionDatos.objects.using(DEFAULT_DB_ALIAS).filter(clave=CLAVE_PURGA).values_list('numero', flat=True).first()
+    return fila_purga or 0
+
+
+def fecha_purgada():
+    """Corte de la última retención: se borraron los cambios anteriores; None si nunca se purgó"""
+    return VersionDatos.objects.using(DEFAULT_DB_ALIAS).filter(clave=CLAVE_PURGA).values_list(
+        'fecha_modificacion', flat=True
+    ).first()
+
+
+def cursor_actual():
+    """Id del último cambio registrado: el cursor desde donde seguir tras una exportación completa"""
+    return RegistroCambio.objects.aggregate(ultimo=Max('id'))['ultimo'] or cursor_purgado()
+
+
+def leer_cambios(desde=0, limite=None, modelos=None):
+    """
+    Página de cambios con id > ``desde``. Retorna {'cambios', 'cursor',
+    'hay_mas'}; levanta CursorVencido si la retención ya borró cambios
+    posteriores a ``desde``.
+    """
+    maximo = settings.FLOTA_CAMBIOS_PAGINA_MAXIMA
+    limite = min(max(int(limite or maximo), 1), maximo)
+    desde = int(desde or 0)
+    if desde < cursor_purgado():
+        raise CursorVencido(desde)
+
+    registros = RegistroCambio.objects.filter(id__gt=desde)
+    if modelos:
+        registros = registros.filter(modelo__in=modelos)
+    filas = list(registros.order_by('id').values(
+        'id', 'modelo', 'objeto_id', 'operacion', 'datos', 'centro_id', 'fecha'
+    )[:limite + 1])
+    hay_mas = len(filas) > limite
+    filas = filas[:limite]
+    for registro in filas:
+        registro['fecha'] = registro['fecha'].isoformat()
+    return {
+        'cambios': filas,
+        'cursor': str(filas[-1]['id'] if filas else desde),
+        'hay_mas': hay_mas,
+    }
+
+
+# ==================== MANTENCIÓN ====================
+def _fusionar(registros):
+    """Operación y datos equivalentes a aplicar los registros en orden"""
+    operacion, datos = registros[0].operacion, {}
+    for registro in registros:
+        if registro.operacion == 'baja':
+            operacion, datos = 'baja', {}
+        elif registro.operacion == 'alta':
+            operacion, datos = 'alta', dict(registro.datos)
+        else:
+            operacion = 'alta' if operacion == 'alta' else 'modificacion'
+            datos.update(registro.datos)
+    return operacion, datos
+
+
+def _compactar_lote(modelo, objeto_ids, limite):
+    registros = RegistroCambio.objects.filter(
+        modelo=modelo, objeto_id__in=objeto_ids, fecha__lt=limite
+    ).order_by('objeto_id', 'id')
+    conservados, borrados = [], []
+    for _, grupo in groupby(registros, key=attrgetter('objeto_id')):
+        grupo = list(grupo)
+        if len(grupo) < 2:
+            continue
+        ultimo = grupo[-1]
+        ultimo.operacion, ultimo.datos = _fusionar(grupo)
+        conservados.append(ultimo)
+        borrados.extend(registro.pk for registro in grupo[:-1])
+    RegistroCambio.objects.bulk_update(conservados, ['operacion', 'datos'], batch_size=500)
+    RegistroCambio.objects.filter(pk__in=borrados).delete()
+    return len(borrados)
+
+
+def compactar(limite, lote=None):
+    """Deja una fila por objeto entre las anteriores a ``limite``; retorna cuántas borró"""
+    lote = lote or settings.FLOTA_CAMBIOS_LOTE
+    repetidos = RegistroCambio.objects.filter(fecha__lt=limite).order_by().values('modelo', 'objeto_id').annotate(
+        total=Count('id')
+    ).filter(total__gt=1).values_list('modelo', 'objeto_id')
+    por_modelo = {}
+    for modelo, objeto_id in repetidos:
+        por_modelo.setdefault(modelo, []).append(objeto_id)
+
+    borrados = 0
+    for modelo, objeto_ids in por_modelo.items():
+        for inicio in range(0, len(objeto_ids), lote):
+            with atomic_inmediato(DEFAULT_DB_ALIAS):
+                borrados += _compactar_lote(modelo, objeto_ids[inicio:inicio + lote], limite)
+    return borrados
+
+
+def purgar(limite, lote=None):
+    """Borra, por lotes, los cambios anteriores a ``limite``; retorna cuántos"""
+    lote = lote or settings.FLOTA_CAMBIOS_LOTE
+    ultimo = RegistroCambio.objects.filter(fecha__lt=limite).aggregate(ultimo=Max('id'))['ultimo']
+    if ultimo is None:
+        return 0
+    # Primero la marca: un lector nunca ve filas faltantes sin que su cursor figure como vencido
+    VersionDatos.objects.using(DEFAULT_DB_ALIAS).update_or_create(
+        clave=CLAVE_PURGA, defaults={'numero': max(ultimo, cursor_purgado()), 'fecha_modificacion': max(
+            limite, fecha_purgada() or limite
+        )},
+    )
+    borrados = 0
+    while True:
+        with atomic_inmediato(DEFAULT_DB_ALIAS):
+            ids = list(RegistroCambio.objects.filter(id__lte=ultimo).order_by('id').values_list('id', flat=True)[:lote])
+            RegistroCambio.objects.filter(pk__in=ids).delete()
+        borrados += len(ids)
+        if len(ids) < lote:
+            return borrados
+
+
+def mantener_registro(compactar_dias=None, retencion_dias=None):
+    """Compactación y retención; retorna {'compactados', 'purgados'}"""
+    hoy = inicio_dia(timezone.localdate())
+    compactar_dias = settings.FLOTA_CAMBIOS_COMPACTAR_DIAS if compactar_dias is None else compactar_dias
+    retencion_dias = settings.FLOTA_CAMBIOS_RETENCION_DIAS if retencion_dias is None else retencion_dias
+    return {
+        'compactados': compactar(hoy - datetime.timedelta(days=compactar_dias)),
+        'purgados': purgar(hoy - datetime.timedelta(days=retencion_dias)),
+    }
+
+
+def programar_mantencion():
+    """Una mantención por noche, al comienzo del día siguiente (como el archivado)"""
+    manana = timezone.localdate() + datetime.timedelta(days=1)
+    retraso = (inicio_dia(manana) - timezone.now()).total_seconds()
+    return encolar(
+        'mantener_registro_cambios', prioridad=PRIORIDAD_BAJA,
+        clave=f'mantener_registro_cambios:{manana.isoformat()}', retraso=retraso,
+    )
@@ -0,0 +1,140 @@
+"""
+Soporte de GET condicional (ETag / Last-Modified).
+
+Las funciones de este módulo se usan con ``django.views.decorators.http.condition``
+y solo hacen consultas livianas sobre ``fecha_modificacion`` y la versión global
+de datos, de modo que un 304 se responde antes de cualquier trabajo de template.
+"""
+from functools import wraps
+from asgiref.sync import sync_to_async
+from django.contrib import messages
+from django.db.models import Max
+from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+from .models import Vehiculo, MantenimientoHistorial
+from .shards import alias_shard_de_pk
+from .versiones import version_actual
+
+
+def condition_async(etag_func=None, last_modified_func=None):
+    """Versión para vistas async de django.views.decorators.http.condition"""
+    
+    def _validadores_request(request, *args, **kwargs):
+        etag = etag_func(request, *args, **kwargs) if etag_func else None
+        last_modified = last_modified_func(request, *args, **kwargs) if last_modified_func else None
+        if last_modified is not None:
+            if not timezone.is_aware(last_modified):
+                last_modified = timezone.make_aware(last_modified, timezone.utc)
+            last_modified = int(last_modified.timestamp())
+        return (quote_etag(etag) if etag is not None else None), last_modified
+    
+    def decorator(func):
+        @wraps(func)
+        async def inner(request, *args, **kwargs):
+            etag, last_modified = await sync_to_async(_validadores_request)(request, *args, **kwargs)
+            response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+            if response is None:
+                response = await func(request, *args, **kwargs)
+            if request.method in ('GET', 'HEAD'):
+                if last_modified and not response.has_header('Last-Modified'):
+                    response.headers['Last-Modified'] = http_date(last_modified)
+                if etag:
+                    response.headers.setdefault('ETag', etag)
+            return response
+        return inner
+    
+    return decorator
+
+
+def _memo(request, clave, calcular):
+    """Calcula una sola vez por request (etag_func y last_modified_func comparten datos)"""
+    cache = request.__dict__.setdefault('_condicional', {})
+    if clave not in cache:
+        cache[clave] = calcular()
+    return cache[clave]
+
+
+def _hay_mensajes(request):
+    """Con mensajes pendientes la página debe renderizarse para mostrarlos"""
+    return len(messages.get_messages(request)) > 0
+
+
+def _validadores(request, clave, partes_func):
+    """Retorna (etag, last_modified) o (None, None) si no aplica"""
+    def calcular():
+        if _hay_mensajes(request):
+            return None, None
+        partes = partes_func()
+        if partes is None:
+            return None, None
+        etiqueta, fechas = partes
+        numero, fecha_version = version_actual()
+        fechas = [f for f in (*fechas, fecha_version) if f is not None]
+        usuario = request.user.pk or 0
+        etag = f'{etiqueta}-v{numero}-u{usuario}'
+        return etag, max(fechas) if fechas else None
+    return _memo(request, clave, calcular)
+
+
+# ==================== VEHÍCULOS ====================
+def _partes_vehiculo(pk):
+    fila = next(iter(Vehiculo.objects.using(alias_shard_de_pk(pk)).filter(pk=pk, activo=True).annotate(
+        ultimo_mantenimiento=Max('mantenimientos__fecha_modificacion')
+    ).values_list('fecha_modificacion', 'ultimo_mantenimiento')), None)
+    if fila is None:
+        return None
+    fecha_vehiculo, fecha_mantenimiento = fila
+    marca = int(max(f for f in fila if f is not None).timestamp())
+    return f'veh{pk}-{marca}', (fecha_vehiculo, fecha_mantenimiento)
+
+
+def vehiculo_detalle_etag(request, pk):
+    return _validadores(request, 'vehiculo', lambda: _partes_vehiculo(pk))[0]
+
+
+def vehiculo_detalle_last_modified(request, pk):
+    return _validadores(request, 'vehiculo', lambda: _partes_vehiculo(pk))[1]
+
+
+# ==================== MANTENIMIENTOS ====================
+def _partes_mantenimiento(pk, solo_completado=False):
+    # Detalle y reporte también muestran los archivados
+    fila = MantenimientoHistorial.objects.using(alias_shard_de_pk(pk)).filter(pk=pk).values_list(
+        'estado', 'fecha_modificacion', 'vehiculo__fecha_modificacion'
+    ).first()
+    if fila is None:
+        return None
+    estado, fecha_mantenimiento, fecha_vehiculo = fila
+    if solo_completado and estado != 'completado':
+        # La vista redirige con un mensaje; no se cachea
+        return None
+    marca = int(max(fecha_mantenimiento, fecha_vehiculo).timestamp())
+    return f'mant{pk}-{marca}', (fecha_mantenimiento, fecha_vehiculo)
+
+
+def mantenimiento_detalle_etag(request, pk):
+    return _validadores(request, 'mantenimiento', lambda: _partes_mantenimiento(pk))[0]
+
+
+def mantenimiento_detalle_last_modified(request, pk):
+    return _validadores(request, 'mantenimiento', lambda: _partes_mantenimiento(pk))[1]
+
+
+def mantenimiento_reporte_etag(request, pk):
+    return _validadores(request, 'reporte', lambda: _partes_mantenimiento(pk, solo_completado=True))[0]
+
+
+def mantenimiento_reporte_last_modified(request, pk):
+    return _validadores(request, 'reporte', lambda: _partes_mantenimiento(pk, solo_completado=True))[1]
+
+
+# ==================== API ====================
+def api_version_etag(request, *args, **kwargs):
+    """Las respuestas JSON agregadas solo dependen de la versión global"""
+    numero, _ = _memo(request, 'api', version_actual)
+    return f'api-v{numero}'
+
+
+def api_version_last_modified(request, *args, **kwargs):
+    return _memo(request, 'api', version_actual)[1]
@@ -0,0 +1,299 @@
+"""
+Análisis de costos de mantenimiento: estimado vs. real.
+
+Los totales, el porcentaje de sobrecosto y la distribución de la desviación
+se calculan con consultas agrupadas sobre ``ResumenCostoMensual``, un resumen
+precalculado por (mes, vehículo, proveedor, tipo de mantenimiento). Al completar (o
+editar/eliminar) un mantenimiento el resumen se actualiza sumando su aporte
+con un UPDATE condicional (``flota/signals.py``); las operaciones masivas
+recalculan sus celdas y ``manage.py recalcular_costos`` lo reconstruye
+completo.
+
+El mes de un mantenimiento es el de ``fecha_realizacion`` (o el de
+``fecha_programada`` si no se registró). Los recálculos leen el historial
+completo (``MantenimientoHistorial``): archivar no cambia el resumen.
+"""
+import datetime
+from decimal import Decimal
+from django.db import DEFAULT_DB_ALIAS, IntegrityError, transaction
+from django.db.models import Count, DateField, F, Q, Sum
+from django.db.models.functions import Coalesce, TruncMonth
+from django.utils import timezone
+from .models import MantenimientoHistorial, ResumenCostoMensual, Vehiculo, CentroOperacional, Proveedor, TipoMantenimiento
+from .shards import aliases_datos, reunir_shards
+
+
+# (campo del resumen, etiqueta, condición sobre el mantenimiento)
+TRAMOS = (
+    ('tramo_ahorro', 'Bajo lo estimado', Q(costo_real__lt=F('costo_estimado'))),
+    ('tramo_0_10', '0-10%', Q(costo_real__gte=F('costo_estimado'), costo_real__lte=F('costo_estimado') * Decimal('1.10'))),
+    ('tramo_10_25', '10-25%', Q(costo_real__gt=F('costo_estimado') * Decimal('1.10'),
+                                costo_real__lte=F('costo_estimado') * Decimal('1.25'))),
+    ('tramo_25_50', '25-50%', Q(costo_real__gt=F('costo_estimado') * Decimal('1.25'),
+                                costo_real__lte=F('costo_estimado') * Decimal('1.50'))),
+    ('tramo_mas_50', 'Más de 50%', Q(costo_real__gt=F('costo_estimado') * Decimal('1.50'))),
+)
+
+MEDIDAS = ('cantidad', 'costo_estimado', 'costo_real', 'con_sobrecosto') + tuple(campo for campo, _, _ in TRAMOS)
+
+# Clave única de una celda del resumen
+CAMPOS_CLAVE = ('mes', 'vehiculo_id', 'proveedor_id', 'tipo_mantenimiento_id')
+
+DIMENSIONES = {
+    'centro': 'centro_id',
+    'vehiculo': 'vehiculo_id',
+    'proveedor': 'proveedor_id',
+    'tipo_mantenimiento': 'tipo_mantenimiento_id',
+    'mes': 'mes',
+}
+
+
+class ParametroInvalido(ValueError):
+    pass
+
+
+def primer_dia_mes(fecha):
+    return fecha.replace(day=1)
+
+
+def fecha_costo(mantenimiento):
+    return mantenimiento.fecha_realizacion or mantenimiento.fecha_programada
+
+
+# ==================== RESUMEN MENSUAL ====================
+def _agregados():
+    # Prefijo total_: un alias igual al campo haría que las condiciones con F() apunten al agregado
+    agregados = {
+        'total_cantidad': Count('id'),
+        'total_costo_estimado': Coalesce(Sum('costo_estimado'), Decimal(0)),
+        'total_costo_real': Coalesce(Sum('costo_real'), Decimal(0)),
+        'total_con_sobrecosto': Count('id', filter=Q(costo_real__gt=F('costo_estimado'))),
+    }
+    agregados.update({f'total_{campo}': Count('id', filter=condicion) for campo, _, condicion in TRAMOS})
+    return agregados
+
+
+def filas_resumen(mantenimientos):
+    """Celdas del resumen (dicts) para los mantenimientos completados del queryset, en una consulta"""
+    return mantenimientos.filter(estado='completado').annotate(
+        mes_costo=TruncMonth(Coalesce('fecha_realizacion', 'fecha_programada'), output_field=DateField()),
+    ).order_by().values(
+        'mes_costo', 'vehiculo_id', 'vehiculo__centro_operacion_id', 'proveedor_id', 'tipo_mantenimiento_id',
+    ).annotate(**_agregados())
+
+
+def _celda(fila):
+    return ResumenCostoMensual(
+        mes=fila['mes_costo'],
+        vehiculo_id=fila['vehiculo_id'],
+        centro_id=fila['vehiculo__centro_operacion_id'],
+        proveedor_id=fila['proveedor_id'],
+        tipo_mantenimiento_id=fila['tipo_mantenimiento_id'],
+        **{medida: fila[f'total_{medida}'] for medida in MEDIDAS},
+    )
+
+
+def _reemplazar(filtro, celdas):
+    with transaction.atomic(using=DEFAULT_DB_ALIAS):
+        ResumenCostoMensual.objects.filter(**filtro).delete()
+        ResumenCostoMensual.objects.bulk_create(celdas, batch_size=1000)
+    return len(celdas)
+
+
+def recalcular_celdas(celdas, using=DEFAULT_DB_ALIAS):
+    """
+    Recalcula las celdas tocadas por escrituras sin signals: ``celdas`` son
+    pares (vehiculo_id, mes). Lee en una consulta el producto vehículos ×
+    meses, que incluye todas las celdas pedidas.
+    """
+    vehiculos = {vehiculo_id for vehiculo_id, _ in celdas}
+    meses = {primer_dia_mes(mes) for _, mes in celdas}
+    if not vehiculos:
+        return 0
+    filas = filas_resumen(MantenimientoHistorial.objects.using(using).filter(vehiculo_id__in=vehiculos)).filter(mes_costo__in=meses)
+    return _reemplazar({'vehiculo_id__in': vehiculos, 'mes__in': meses}, [_celda(fila) for fila in filas])
+
+
+def recalcular_vehiculo(vehiculo_id, using=DEFAULT_DB_ALIAS):
+    """Todas las filas de un vehículo; p. ej. al cambiar de centro (y de shard)"""
+    mantenimientos = MantenimientoHistorial.objects.using(using).filter(vehiculo_id=vehiculo_id)
+    return _reemplazar({'vehiculo_id': vehiculo_id}, [_celda(fila) for fila in filas_resumen(mantenimientos)])
+
+
+# ==================== ACTUALIZACIÓN INCREMENTAL ====================
+def _tramo(estimado, real):
+    """Campo del tramo de desviación, con la misma aritmética (punto flotante) que las condiciones SQL de TRAMOS"""
+    if real < estimado:
+        return 'tramo_ahorro'
+    for campo, factor in (('tramo_0_10', 1.10), ('tramo_10_25', 1.25), ('tramo_25_50', 1.50)):
+        if real <= float(estimado) * factor:
+            return campo
+    return 'tramo_mas_50'
+
+
+def aporte_mantenimiento(valores):
+    """(clave, medidas) con que un mantenimiento completado (dict de sus campos) contribuye al resumen"""
+    clave = (
+        primer_dia_mes(valores['fecha_realizacion'] or valores['fecha_programada']),
+        valores['vehiculo_id'], valores['proveedor_id'], valores['tipo_mantenimiento_id'],
+    )
+    estimado, real = valores['costo_estimado'], valores['costo_real']
+    medidas = dict.fromkeys(MEDIDAS, 0)
+    medidas.update(cantidad=1, costo_estimado=estimado or 0, costo_real=real or 0)
+    if estimado is not None and real is not None:
+        medidas['con_sobrecosto'] = int(real > estimado)
+        medidas[_tramo(estimado, real)] = 1
+    return clave, medidas
+
+
+def aplicar_delta(clave, delta, centro_id):
+    """
+    Suma ``delta`` (dict por MEDIDAS) a la celda con un UPDATE; si no existe
+    y el delta la crea, la inserta con ``centro_id``. La celda que queda sin
+    mantenimientos se borra.
+    """
+    filtro = dict(zip(CAMPOS_CLAVE, clave))
+    incrementos = {medida: F(medida) + valor for medida, valor in delta.items()}
+    if ResumenCostoMensual.objects.filter(**filtro).update(**incrementos):
+        if delta['cantidad'] < 0:
+            ResumenCostoMensual.objects.filter(**filtro, cantidad__lte=0).delete()
+        return
+    if delta['cantidad'] <= 0:
+        return
+    try:
+        with transaction.atomic(using=DEFAULT_DB_ALIAS):
+            ResumenCostoMensual.objects.create(**filtro, centro_id=centro_id, **delta)
+    except IntegrityError:
+        # Otro proceso creó la celda entremedio
+        ResumenCostoMensual.objects.filter(**filtro).update(**incrementos)
+
+
+def registrar_cambio_mantenimiento(anterior, nuevo, centro_id=None):
+    """
+    Aplica al resumen el cambio de un mantenimiento: ``anterior`` y ``nuevo``
+    son dicts de campos (None al crear o eliminar) y sólo aportan si están
+    completados. ``centro_id`` es el del vehículo de ``nuevo``, para una
+    celda que haya que crear. Editar un campo que no es del resumen no escribe.
+    """
+    deltas = {}
+    for valores, signo in ((anterior, -1), (nuevo, 1)):
+        if not valores or valores['estado'] != 'completado':
+            continue
+        clave, medidas = aporte_mantenimiento(valores)
+        suma = deltas.setdefault(clave, dict.fromkeys(MEDIDAS, 0))
+        for medida, valor in medidas.items():
+            suma[medida] += signo * valor
+    for clave, delta in deltas.items():
+        if any(delta.values()):
+            aplicar_delta(clave, delta, centro_id)
+
+
+def reconstruir_resumen():
+    """Reemplaza todo el resumen con el agrupado de todas las bases; retorna la cantidad de filas"""
+    celdas = []
+    for alias in aliases_datos():
+        celdas.extend(_celda(fila) for fila in filas_resumen(MantenimientoHistorial.objects.using(alias)))
+    return _reemplazar({}, celdas)
+
+
+# ==================== ANÁLISIS ====================
+def _pesos(valor):
+    return int(valor or 0)
+
+
+def _porcentaje(parte, total):
+    return round(parte * 100 / total, 1) if total else 0
+
+
+def _indicadores(fila):
+    """Totales, desviación y distribución de una fila agregada del resumen"""
+    estimado, real = _pesos(fila['total_costo_estimado']), _pesos(fila['total_costo_real'])
+    cantidad, con_sobrecosto = fila['total_cantidad'], fila['total_con_sobrecosto']
+    return {
+        'cantidad': cantidad,
+        'costo_estimado': estimado,
+        'costo_real': real,
+        'desviacion': real - estimado,
+        'desviacion_porcentaje': _porcentaje(real - estimado, estimado),
+        'con_sobrecosto': con_sobrecosto,
+        'sobrecosto_porcentaje': _porcentaje(con_sobrecosto, cantidad),
+        'distribucion': {campo: fila[f'total_{campo}'] for campo, _, _ in TRAMOS},
+    }
+
+
+def _nombres_vehiculos(ids):
+    def patentes(alias):
+        return list(Vehiculo.objects.using(alias).filter(pk__in=ids).values_list('id', 'patente'))
+    return {pk: patente for parcial in reunir_shards(patentes) for pk, patente in parcial}
+
+
+def _nombres(por, claves):
+    if por == 'mes':
+        return {mes: f'{mes:%Y-%m}' for mes in claves}
+    if por == 'vehiculo':
+        return _nombres_vehiculos(claves)
+    modelo = {'centro': CentroOperacional, 'proveedor': Proveedor, 'tipo_mantenimiento': TipoMantenimiento}[por]
+    return dict(modelo.objects.filter(pk__in=claves).values_list('id', 'nombre'))
+
+
+def analisis_costos(por='centro', desde=None, hasta=None, centro=None, limite=None):
+    """
+    Costos agrupados por ``por`` (ver DIMENSIONES) entre los meses ``desde`` y
+    ``hasta`` (inclusive), opcionalmente de un solo centro. Los grupos vienen
+    ordenados por costo real (o cronológicamente si ``por='mes'``).
+    """
+    if por not in DIMENSIONES:
+        raise ParametroInvalido(por)
+    campo = DIMENSIONES[por]
+
+    resumen = ResumenCostoMensual.objects.all()
+    if desde:
+        resumen = resumen.filter(mes__gte=primer_dia_mes(desde))
+    if hasta:
+        resumen = resumen.filter(mes__lte=primer_dia_mes(hasta))
+    if centro:
+        resumen = resumen.filter(centro_id=centro)
+
+    sumas = {f'total_{medida}': Sum(medida) for medida in MEDIDAS}
+    filas = resumen.order_by().values(campo).annotate(**sumas).order_by(campo if por == 'mes' else '-total_costo_real')
+    filas = list(filas[:limite] if limite else filas)
+    totales = resumen.aggregate(**sumas)
+    if totales['total_cantidad'] is None:
+        totales = dict.fromkeys(sumas, 0)
+
+    nombres = _nombres(por, [fila[campo] for fila in filas])
+    grupos = []
+    for fila in filas:
+        clave = fila[campo]
+        grupo = {'clave': clave.isoformat() if por == 'mes' else clave, 'nombre': nombres.get(clave, str(clave))}
+        grupo.update(_indicadores(fila))
+        grupos.append(grupo)
+
+    return {
+        'por': por,
+        'desde': desde.isoformat() if desde else None,
+        'hasta': hasta.isoformat() if hasta else None,
+        'tramos': [{'campo': campo, 'etiqueta': etiqueta} for campo, etiqueta, _ in TRAMOS],
+        'totales': _indicadores(totales),
+        'grupos': grupos,
+    }
+
+
+def leer_mes(texto):
+    """'2025-03' (o una fecha ISO) a date del primer día; None si viene vacío"""
+    if not texto:
+        return None
+    try:
+        return datetime.date.fromisoformat(texto if len(texto) > 7 else f'{texto}-01').replace(day=1)
+    except ValueError:
+        raise ParametroInvalido(texto)
+
+
+def panel_costos(meses=12):
+    """Datos del panel de costos de estadísticas: totales, por centro, por proveedor y serie mensual"""
+    desde = primer_dia_mes(timezone.localdate() - datetime.timedelta(days=31 * (meses - 1)))
+    return {
+        'por_centro': analisis_costos('centro', desde=desde),
+        'por_proveedor': analisis_costos('proveedor', desde=desde, limite=10),
+        'por_mes': analisis_costos('mes', desde=desde),
+    }
@@ -0,0 +1,383 @@
+"""
+Cubo OLAP de indicadores de flota y mantenimientos.
+
+``CeldaCubo`` materializa conteos, costos y horas por centro × tipo de
+capacidad × estado × tipo de mantenimiento × proveedor × tipo (preventivo /
+correctivo) × mes, para dos hechos:
+
+- ``mantenimiento``: un aporte por mantenimiento en el mes de su realización
+  (o de su programación si no se realizó). Se actualiza por deltas en cada
+  cambio (signals): se resta el aporte anterior y se suma el nuevo, sin
+  recorrer las tablas.
+- ``vehiculo``: stock de vehículos por centro, tipo de capacidad y estado,
+  tal como quedó en el último cambio del mes (también por deltas: -1 en la
+  celda que deja, +1 en la que entra). Es semi-aditivo: al agregar
+  varios meses se toma el último de cada período.
+
+``consultar_cubo`` responde cualquier agregación o corte con un GROUP BY
+sobre las celdas (cientos de filas, no la flota completa), y
+``verificar_cubo`` lo compara contra las tablas (``manage.py cubo``).
+"""
+from collections import defaultdict
+from decimal import Decimal
+from django.db import DEFAULT_DB_ALIAS, IntegrityError, transaction
+from django.db.models import Count, DateField, F, Q, Sum
+from django.db.models.functions import Coalesce, TruncMonth, TruncQuarter, TruncYear
+from django.utils import timezone
+from .models import CeldaCubo, CentroOperacional, MantenimientoHistorial, Proveedor, TipoMantenimiento, Vehiculo
+from .shards import alias_de_centro, aliases_datos
+
+
+CAMPOS_CLAVE = ('hecho', 'mes', 'centro_id', 'tipo_capacidad', 'estado', 'tipo_mantenimiento_id', 'proveedor_id', 'tipo')
+MEDIDAS = ('cantidad', 'costo_estimado', 'costo_real', 'horas')
+
+# Nombre en la API -> campo de CeldaCubo ('periodo' es el mes truncado según la granularidad)
+DIMENSIONES = {
+    'centro': 'centro_id',
+    'tipo_capacidad': 'tipo_capacidad',
+    'estado': 'estado',
+    'tipo_mantenimiento': 'tipo_mantenimiento_id',
+    'proveedor': 'proveedor_id',
+    'tipo': 'tipo',
+    'periodo': 'periodo',
+}
+
+GRANULARIDADES = {
+    'mes': None,
+    'trimestre': TruncQuarter,
+    'anio': TruncYear,
+}
+
+
+class ConsultaInvalida(ValueError):
+    pass
+
+
+def mes_actual():
+    return timezone.localdate().replace(day=1)
+
+
+def _sumar(destino, celdas):
+    for clave, medidas in celdas.items():
+        destino[clave] = tuple(a + b for a, b in zip(destino.get(clave, (0,) * len(MEDIDAS)), medidas))
+    return destino
+
+
+# ==================== HECHOS DESDE LAS TABLAS ====================
+def celdas_mantenimientos(mantenimientos):
+    """{clave: medidas} de los mantenimientos del queryset, agrupados en una consulta"""
+    filas = mantenimientos.annotate(
+        mes_cubo=TruncMonth(Coalesce('fecha_realizacion', 'fecha_programada'), output_field=DateField()),
+    ).order_by().values_list(
+        'mes_cubo', 'vehiculo__centro_operacion_id', 'vehiculo__tipo_capacidad', 'estado',
+        'tipo_mantenimiento_id', 'proveedor_id', 'tipo',
+    ).annotate(
+        total_cantidad=Count('id'),
+        total_costo_estimado=Coalesce(Sum('costo_estimado'), Decimal(0)),
+        total_costo_real=Coalesce(Sum('costo_real'), Decimal(0)),
+        total_horas=Coalesce(Sum('tiempo_estimado_horas'), 0),
+    )
+    return {
+        ('mantenimiento', *fila[:7]): tuple(int(valor) for valor in fila[7:])
+        for fila in filas
+    }
+
+
+def celdas_vehiculos(vehiculos, mes):
+    """{clave: medidas} del stock de vehículos activos del queryset en ``mes``"""
+    filas = vehiculos.filter(activo=True).order_by().values_list('centro_operacion_id', 'tipo_capacidad', 'estado').annotate(
+        total=Count('id')
+    )
+    return {
+        ('vehiculo', mes, centro_id, tipo_capacidad, estado, 0, 0, ''): (total, 0, 0, 0)
+        for centro_id, tipo_capacidad, estado, total in filas
+    }
+
+
+# ==================== ACTUALIZACIÓN INCREMENTAL ====================
+def aplicar_delta(clave, delta, crear=True):
+    """
+    Suma ``delta`` (una tupla por MEDIDAS) a la celda con un UPDATE y retorna
+    si la celda existía. Si no existe y el delta agrega hechos se crea (salvo
+    con ``crear=False``); la celda que queda sin hechos se borra.
+    """
+    filtro = dict(zip(CAMPOS_CLAVE, clave))
+    incrementos = {medida: F(medida) + valor for medida, valor in zip(MEDIDAS, delta)}
+    if CeldaCubo.objects.filter(**filtro).update(**incrementos):
+        if delta[0] < 0:
+            CeldaCubo.objects.filter(**filtro, cantidad__lte=0).delete()
+        return True
+    if crear and delta[0] > 0:
+        try:
+            with transaction.atomic(using=DEFAULT_DB_ALIAS):
+                CeldaCubo.objects.create(**filtro, **dict(zip(MEDIDAS, delta)))
+        except IntegrityError:
+            # Otro proceso creó la celda entremedio
+            CeldaCubo.objects.filter(**filtro).update(**incrementos)
+    return False
+
+
+def aplicar_deltas(deltas):
+    for clave, delta in deltas.items():
+        if any(delta):
+            aplicar_delta(clave, delta)
+
+
+def aporte_mantenimiento(valores, centro_id, tipo_capacidad):
+    """(clave, medidas) con que un mantenimiento (dict de sus campos) contribuye al cubo"""
+    fecha = valores['fecha_realizacion'] or valores['fecha_programada']
+    clave = (
+        'mantenimiento', fecha.replace(day=1), centro_id, tipo_capacidad, valores['estado'],
+        valores['tipo_mantenimiento_id'], valores['proveedor_id'], valores['tipo'],
+    )
+    medidas = (
+        1, int(valores['costo_estimado'] or 0), int(valores['costo_real'] or 0), int(valores['tiempo_estimado_horas'] or 0),
+    )
+    return clave, medidas
+
+
+def _dimensiones_vehiculo(vehiculo_id, using):
+    return Vehiculo.objects.using(using).filter(pk=vehiculo_id).values_list('centro_operacion_id', 'tipo_capacidad').first()
+
+
+def registrar_cambio_mantenimiento(anterior, nuevo, using=DEFAULT_DB_ALIAS, vehiculos=None):
+    """
+    Aplica al cubo el cambio de un mantenimiento: ``anterior`` y ``nuevo`` son
+    dicts de campos (None al crear o eliminar). Un cambio que no mueve ninguna
+    medida (p. ej. la prioridad) no escribe nada. ``vehiculos`` son las
+    dimensiones ya conocidas ({vehiculo_id: (centro_id, tipo_capacidad)}); las
+    que falten se consultan.
+    """
+    deltas = defaultdict(lambda: (0,) * len(MEDIDAS))
+    vehiculos = dict(vehiculos or {})
+    for valores, signo in ((anterior, -1), (nuevo, 1)):
+        if not valores:
+            continue
+        vehiculo_id = valores['vehiculo_id']
+        if vehiculos.get(vehiculo_id) is None:
+            vehiculos[vehiculo_id] = _dimensiones_vehiculo(vehiculo_id, using)
+        if vehiculos[vehiculo_id] is None:
+            continue
+        clave, medidas = aporte_mantenimiento(valores, *vehiculos[vehiculo_id])
+        deltas[clave] = tuple(actual + signo * valor for actual, valor in zip(deltas[clave], medidas))
+    aplicar_deltas(deltas)
+
+
+def registrar_cambios_mantenimientos(cambios):
+    """
+    Versión masiva de ``registrar_cambio_mantenimiento`` para escrituras sin
+    signals (bulk_create, update): ``cambios`` son tuplas (anterior, nuevo,
+    centro_id, tipo_capacidad) y los deltas se suman por celda antes de
+    escribir, una vez por celda y no por mantenimiento.
+    """
+    deltas = defaultdict(lambda: (0,) * len(MEDIDAS))
+    for anterior, nuevo, centro_id, tipo_capacidad in cambios:
+        for valores, signo in ((anterior, -1), (nuevo, 1)):
+            if valores:
+                clave, medidas = aporte_mantenimiento(valores, centro_id, tipo_capacidad)
+                deltas[clave] = tuple(actual + signo * valor for actual, valor in zip(deltas[clave], medidas))
+    aplicar_deltas(deltas)
+
+
+def mover_aportes_vehiculo(vehiculo_id, anterior, nuevo, using=DEFAULT_DB_ALIAS):
+    """Un vehículo cambió de centro o capacidad: sus mantenimientos pasan a las celdas nuevas"""
+    deltas = defaultdict(lambda: (0,) * len(MEDIDAS))
+    for clave, medidas in celdas_mantenimientos(MantenimientoHistorial.objects.using(using).filter(vehiculo_id=vehiculo_id)).items():
+        for dimensiones, signo in ((anterior, -1), (nuevo, 1)):
+            destino = (clave[0], clave[1], *dimensiones, *clave[4:])
+            deltas[destino] = tuple(actual + signo * valor for actual, valor in zip(deltas[destino], medidas))
+    aplicar_deltas(deltas)
+
+
+def mover_aportes_a_centro(mantenimientos, centro_id):
+    """
+    Versión masiva de ``mover_aportes_vehiculo`` para un cambio de centro: los
+    mantenimientos del queryset, agrupados con el centro actual de su vehículo
+    (antes de actualizarlo), pasan a las celdas de ``centro_id``.
+    """
+    deltas = defaultdict(lambda: (0,) * len(MEDIDAS))
+    for clave, medidas in celdas_mantenimientos(mantenimientos).items():
+        for destino, signo in ((clave, -1), ((*clave[:2], centro_id, *clave[3:]), 1)):
+            deltas[destino] = tuple(actual + signo * valor for actual, valor in zip(deltas[destino], medidas))
+    aplicar_deltas(deltas)
+
+
+def asegurar_stock_mes(mes=None):
+    """Primera escritura del mes: foto completa del stock, luego se mantiene por celda"""
+    mes = mes or mes_actual()
+    if CeldaCubo.objects.filter(hecho='vehiculo', mes=mes).exists():
+        return False
+    stock = {}
+    # Secuencial y en la conexión actual: se llama dentro de la transacción que guarda el vehículo
+    for alias in aliases_datos():
+        _sumar(stock, celdas_vehiculos(Vehiculo.objects.using(alias), mes))
+    CeldaCubo.objects.bulk_create(
+        [CeldaCubo(**dict(zip(CAMPOS_CLAVE, clave)), **dict(zip(MEDIDAS, medidas))) for clave, medidas in stock.items()],
+        ignore_conflicts=True,
+    )
+    return True
+
+
+def mover_stock(anterior, nuevo, mes=None):
+    """
+    Un vehículo sale de la celda de stock ``anterior`` y entra en ``nuevo``
+    ((centro_id, tipo_capacidad, estado) o None): un UPDATE por celda. Si el
+    mes aún no tiene stock se toma la foto completa, que ya incluye el cambio.
+    """
+    mes = mes or mes_actual()
+    for dimensiones, signo in ((anterior, -1), (nuevo, 1)):
+        if dimensiones is None:
+            continue
+        clave, delta = ('vehiculo', mes, *dimensiones, 0, 0, ''), (signo, 0, 0, 0)
+        if aplicar_delta(clave, delta, crear=False):
+            continue
+        if asegurar_stock_mes(mes):
+            return
+        aplicar_delta(clave, delta)
+
+
+def recalcular_stock(centro_id, tipo_capacidad, estado, mes=None):
+    """Recuenta una celda de stock del mes (vehículos activos del centro con esa capacidad y estado)"""
+    mes = mes or mes_actual()
+    total = Vehiculo.objects.using(alias_de_centro(centro_id)).filter(
+        activo=True, centro_operacion_id=centro_id, tipo_capacidad=tipo_capacidad, estado=estado
+    ).count()
+    filtro = {'hecho': 'vehiculo', 'mes': mes, 'centro_id': centro_id, 'tipo_capacidad': tipo_capacidad, 'estado': estado}
+    if total:
+        CeldaCubo.objects.update_or_create(**filtro, defaults={'cantidad': total})
+    else:
+        CeldaCubo.objects.filter(**filtro).delete()
+
+
+# ==================== CONSULTAS ====================
+def _etiqueta_periodo(fecha, granularidad):
+    if granularidad == 'trimestre':
+        return f'{fecha.year}-T{(fecha.month - 1) // 3 + 1}'
+    if granularidad == 'anio':
+        return str(fecha.year)
+    return f'{fecha:%Y-%m}'
+
+
+def _ultimos_meses(celdas, granularidad):
+    """Último mes con datos de cada período (para el stock, que no se suma entre meses)"""
+    ultimos = {}
+    for mes in celdas.order_by('mes').values_list('mes', flat=True).distinct():
+        ultimos[_etiqueta_periodo(mes, granularidad)] = mes
+    return list(ultimos.values())
+
+
+def _etiquetas(dimensiones, filas):
+    """Nombres de centros, proveedores y tipos de mantenimiento presentes en el resultado"""
+    modelos = {'centro': CentroOperacional, 'proveedor': Proveedor, 'tipo_mantenimiento': TipoMantenimiento}
+    etiquetas = {}
+    for dimension, modelo in modelos.items():
+        if dimension in dimensiones:
+            ids = {fila[dimension] for fila in filas}
+            etiquetas[dimension] = {
+                str(pk): nombre for pk, nombre in modelo.objects.filter(pk__in=ids).values_list('id', 'nombre')
+            }
+    return etiquetas
+
+
+def consultar_cubo(hecho='mantenimiento', por=(), filtros=None, granularidad='mes', desde=None, hasta=None):
+    """
+    Agrega el cubo por las dimensiones ``por`` (claves de DIMENSIONES),
+    filtrando con ``filtros`` ({dimensión: [valores]}) y por rango de meses.
+    Retorna las filas con las medidas sumadas; para el hecho ``vehiculo``
+    agrega la disponibilidad (% de operativos).
+    """
+    if hecho not in dict(CeldaCubo.HECHO_CHOICES):
+        raise ConsultaInvalida(f'hecho "{hecho}"')
+    if granularidad not in GRANULARIDADES:
+        raise ConsultaInvalida(f'granularidad "{granularidad}"')
+    desconocidas = [dimension for dimension in list(por) + list(filtros or {}) if dimension not in DIMENSIONES]
+    if desconocidas:
+        raise ConsultaInvalida(f'dimensión "{desconocidas[0]}"')
+
+    celdas = CeldaCubo.objects.filter(hecho=hecho)
+    if desde:
+        celdas = celdas.filter(mes__gte=desde.replace(day=1))
+    if hasta:
+        celdas = celdas.filter(mes__lte=hasta.replace(day=1))
+    for dimension, valores in (filtros or {}).items():
+        if dimension != 'periodo':
+            celdas = celdas.filter(**{f'{DIMENSIONES[dimension]}__in': valores})
+    if hecho == 'vehiculo':
+        meses = _ultimos_meses(celdas, granularidad)
+        celdas = celdas.filter(mes__in=meses if 'periodo' in por else meses[-1:])
+
+    truncar = GRANULARIDADES[granularidad]
+    celdas = celdas.annotate(periodo=truncar('mes', output_field=DateField()) if truncar else F('mes'))
+    campos = [DIMENSIONES[dimension] for dimension in por]
+
+    sumas = {f'total_{medida}': Sum(medida) for medida in MEDIDAS}
+    if hecho == 'vehiculo':
+        sumas['total_operativos'] = Sum('cantidad', filter=Q(estado='operativo'))
+    agrupadas = celdas.order_by().values(*campos).annotate(**sumas).order_by(*campos) if campos else [celdas.aggregate(**sumas)]
+    filas = []
+    for fila in agrupadas:
+        resultado = {dimension: fila[campo] for dimension, campo in zip(por, campos)}
+        if 'periodo' in resultado:
+            resultado['periodo'] = _etiqueta_periodo(resultado['periodo'], granularidad)
+        resultado.update({medida: int(fila[f'total_{medida}'] or 0) for medida in MEDIDAS})
+        if hecho == 'vehiculo':
+            operativos = fila['total_operativos'] or 0
+            resultado['disponibilidad'] = round(operativos * 100 / resultado['cantidad'], 1) if resultado['cantidad'] else 0
+        filas.append(resultado)
+
+    return {
+        'hecho': hecho,
+        'por': list(por),
+        'granularidad': granularidad,
+        'filas': filas,
+        'etiquetas': _etiquetas(por, filas),
+    }
+
+
+# ==================== CONSISTENCIA ====================
+def celdas_esperadas(mes=None):
+    """Cubo recalculado desde las tablas: todos los mantenimientos (también los archivados) y el stock del mes actual"""
+    mes = mes or mes_actual()
+    esperadas = {}
+    for alias in aliases_datos():
+        _sumar(esperadas, celdas_mantenimientos(MantenimientoHistorial.objects.using(alias)))
+        _sumar(esperadas, celdas_vehiculos(Vehiculo.objects.using(alias), mes))
+    return esperadas
+
+
+def _celdas_comparables(mes):
+    guardadas = CeldaCubo.objects.filter(Q(hecho='mantenimiento') | Q(hecho='vehiculo', mes=mes), cantidad__gt=0)
+    return {
+        tuple(fila[:len(CAMPOS_CLAVE)]): tuple(int(valor) for valor in fila[len(CAMPOS_CLAVE):])
+        for fila in guardadas.values_list(*CAMPOS_CLAVE, *MEDIDAS)
+    }
+
+
+def verificar_cubo(mes=None):
+    """Diferencias entre el cubo y las tablas: celdas faltantes, sobrantes y con medidas distintas"""
+    mes = mes or mes_actual()
+    esperadas = celdas_esperadas(mes)
+    guardadas = _celdas_comparables(mes)
+    return {
+        'celdas': len(esperadas),
+        'faltantes': sorted(set(esperadas) - set(guardadas), key=str),
+        'sobrantes': sorted(set(guardadas) - set(esperadas), key=str),
+        'distintas': sorted(
+            ((clave, guardadas[clave], esperadas[clave]) for clave in set(esperadas) & set(guardadas)
+             if guardadas[clave] != esperadas[clave]),
+            key=str,
+        ),
+    }
+
+
+def reconstruir_cubo(mes=None):
+    """Reemplaza los hechos de mantenimiento y el stock del mes; el stock de meses pasados se conserva"""
+    mes = mes or mes_actual()
+    esperadas = celdas_esperadas(mes)
+    with transaction.atomic(using=DEFAULT_DB_ALIAS):
+        CeldaCubo.objects.filter(Q(hecho='mantenimiento') | Q(hecho='vehiculo', mes=mes)).delete()
+        CeldaCubo.objects.bulk_create(
+            [CeldaCubo(**dict(zip(CAMPOS_CLAVE, clave)), **dict(zip(MEDIDAS, medidas))) for clave, medidas in esperadas.items()],
+            batch_size=1000,
+        )
+    return len(esperadas)
@@ -0,0 +1,18 @@
+from functools import wraps
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.views import redirect_to_login
+
+
+def login_required_async(view_func):
+    """Equivalente a login_required para vistas async (Django 4.2 no lo soporta)"""
+    
+    @wraps(view_func)
+    async def _wrapped_view(request, *args, **kwargs):
+        # request.user es perezoso y consulta la sesión: se resuelve fuera del event loop
+        autenticado = await sync_to_async(lambda: request.user.is_authenticated)()
+        if not autenticado:
+            return redirect_to_login(request.get_full_path(), settings.LOGIN_URL)
+        return await view_func(request, *args, **kwargs)
+    
+    return _wrapped_view
@@ -0,0 +1,189 @@
+"""
+Historial de disponibilidad de la flota.
+
+Dos tablas compactas en la base principal:
+
+- ``TransicionEstado``: cada cambio de estado de un vehículo con su instante
+  (signals de Vehiculo). Un alta, una baja o el paso a otro centro/capacidad
+  se registran con el estado vacío del lado que no existe.
+- ``SnapshotDisponibilidad``: conteo diario por centro × tipo de capacidad ×
+  estado. Se copia del stock del mes del cubo (``flota/cubo.py``), que ya se
+  mantiene por celda: tomar el snapshot lee cientos de filas, no la flota.
+
+Las horas disponibles de un período son exactas: se parte de los conteos del
+último snapshot anterior al período y se aplican en orden las transiciones
+posteriores, acumulando vehículos × horas entre cada cambio.
+"""
+import bisect
+import datetime
+from collections import defaultdict
+from django.db import transaction
+from django.utils import timezone
+from .models import CeldaCubo, SnapshotDisponibilidad, TransicionEstado
+from . import cubo
+from .trabajos import PRIORIDAD_BAJA, encolar, encolar_una_vez
+
+
+ESTADO_DISPONIBLE = 'operativo'
+
+
+def inicio_dia(fecha):
+    return timezone.make_aware(datetime.datetime.combine(fecha, datetime.time.min))
+
+
+# ==================== REGISTRO ====================
+def _lados(anterior, nuevo):
+    """Filas (centro_id, tipo_capacidad, estado_anterior, estado_nuevo) de un cambio"""
+    if anterior and nuevo and anterior[:2] == nuevo[:2]:
+        return [(anterior[0], anterior[1], anterior[2], nuevo[2])]
+    # Cambio de centro o de capacidad: sale de una combinación y entra en otra
+    lados = []
+    if anterior:
+        lados.append((anterior[0], anterior[1], anterior[2], ''))
+    if nuevo:
+        lados.append((nuevo[0], nuevo[1], '', nuevo[2]))
+    return lados
+
+
+def registrar_transicion(vehiculo_id, anterior, nuevo, fecha=None):
+    """
+    ``anterior`` y ``nuevo`` son (centro_id, tipo_capacidad, estado), o None en
+    un alta o una baja. Retorna las transiciones creadas.
+    """
+    return registrar_transiciones([(vehiculo_id, anterior, nuevo)], fecha)
+
+
+def registrar_transiciones(cambios, fecha=None):
+    """Versión masiva: ``cambios`` son tuplas (vehiculo_id, anterior, nuevo), en un solo bulk_create"""
+    fecha = fecha or timezone.now()
+    filas = [
+        TransicionEstado(
+            vehiculo_id=vehiculo_id, centro_id=centro_id, tipo_capacidad=tipo_capacidad,
+            estado_anterior=estado_anterior, estado_nuevo=estado_nuevo, fecha=fecha,
+        )
+        for vehiculo_id, anterior, nuevo in cambios
+        if anterior != nuevo
+        for centro_id, tipo_capacidad, estado_anterior, estado_nuevo in _lados(anterior, nuevo)
+    ]
+    if not filas:
+        return []
+    transiciones = TransicionEstado.objects.bulk_create(filas, batch_size=1000)
+    # Cada transición asegura el snapshot de mañana; la cola se consulta una vez por día y proceso
+    encolar_una_vez('tomar_snapshot_disponibilidad', **_siguiente_snapshot())
+    return transiciones
+
+
+def _siguiente_snapshot():
+    manana = timezone.localdate() + datetime.timedelta(days=1)
+    return {
+        'prioridad': PRIORIDAD_BAJA,
+        'clave': f'snapshot_disponibilidad:{manana.isoformat()}',
+        'retraso': (inicio_dia(manana) - timezone.now()).total_seconds(),
+    }
+
+
+def programar_snapshot():
+    """Un trabajo por día, al comienzo del día siguiente"""
+    return encolar('tomar_snapshot_disponibilidad', **_siguiente_snapshot())
+
+
+def tomar_snapshot():
+    """Copia el stock actual del cubo como snapshot de hoy (reemplaza uno anterior del mismo día)"""
+    cubo.asegurar_stock_mes()
+    tomado = timezone.now()
+    fecha = timezone.localdate(tomado)
+    filas = [
+        SnapshotDisponibilidad(
+            fecha=fecha, tomado=tomado, centro_id=centro_id, tipo_capacidad=tipo_capacidad,
+            estado=estado, cantidad=cantidad,
+        )
+        for centro_id, tipo_capacidad, estado, cantidad in CeldaCubo.objects.filter(
+            hecho='vehiculo', mes=cubo.mes_actual(), cantidad__gt=0,
+        ).values_list('centro_id', 'tipo_capacidad', 'estado', 'cantidad')
+    ]
+    with transaction.atomic():
+        SnapshotDisponibilidad.objects.filter(fecha=fecha).delete()
+        SnapshotDisponibilidad.objects.bulk_create(filas)
+    return {'fecha': fecha.isoformat(), 'filas': len(filas)}
+
+
+# ==================== CONSULTAS ====================
+def _snapshot_base(instante, filtro):
+    """Conteos del último snapshot tomado hasta ``instante`` (o del primero, si no hay anteriores)"""
+    snapshots = SnapshotDisponibilidad.objects.filter(**filtro).order_by()
+    base = snapshots.filter(tomado__lte=instante).order_by('-tomado').values('fecha', 'tomado').first()
+    if base is None:
+        base = snapshots.order_by('tomado').values('fecha', 'tomado').first()
+    if base is None:
+        return None, {}
+    conteos = defaultdict(lambda: [0, 0])  # centro -> [disponibles, total]
+    for centro_id, estado, cantidad in snapshots.filter(fecha=base['fecha']).values_list(
+        'centro_id', 'estado', 'cantidad'
+    ):
+        conteos[centro_id][1] += cantidad
+        if estado == ESTADO_DISPONIBLE:
+            conteos[centro_id][0] += cantidad
+    return base['tomado'], conteos
+
+
+def horas_por_periodo(bordes, centro=None, tipo_capacidad=None):
+    """
+    Horas-vehículo disponibles y totales por centro en cada intervalo
+    [bordes[i], bordes[i + 1]) (fechas). Retorna una lista de
+    {centro_id: {'disponibles': h, 'totales': h}} y, por intervalo, las horas
+    cubiertas por el historial (0 antes del primer snapshot o en el futuro).
+    """
+    limites = [inicio_dia(fecha) for fecha in bordes]
+    fin = min(limites[-1], timezone.now())
+    intervalos = len(limites) - 1
+    horas = [defaultdict(lambda: {'disponibles': 0.0, 'totales': 0.0}) for _ in range(intervalos)]
+    cubiertas = [0.0] * intervalos
+
+    filtro = {}
+    if centro is not None:
+        filtro['centro_id'] = centro
+    if tipo_capacidad:
+        filtro['tipo_capacidad'] = tipo_capacidad
+    tomado, conteos = _snapshot_base(limites[0], filtro)
+    if tomado is None or tomado >= fin:
+        return horas, cubiertas
+
+    def acumular(desde, hasta):
+        while desde < hasta:
+            indice = bisect.bisect_right(limites, desde) - 1
+            corte = min(hasta, limites[indice + 1])
+            if indice >= 0:
+                duracion = (corte - desde).total_seconds() / 3600
+                cubiertas[indice] += duracion
+                for centro_id, (disponibles, total) in conteos.items():
+                    horas[indice][centro_id]['disponibles'] += disponibles * duracion
+                    horas[indice][centro_id]['totales'] += total * duracion
+            desde = corte
+
+    cursor = tomado
+    transiciones = TransicionEstado.objects.filter(fecha__gt=tomado, fecha__lt=fin, **filtro).order_by('fecha', 'id')
+    for centro_id, anterior, nuevo, fecha in transiciones.values_list(
+        'centro_id', 'estado_anterior', 'estado_nuevo', 'fecha'
+    ).iterator(chunk_size=2000):
+        acumular(cursor, fecha)
+        cursor = fecha
+        conteo = conteos[centro_id]
+        if anterior:
+            conteo[1] -= 1
+            conteo[0] -= anterior == ESTADO_DISPONIBLE
+        if nuevo:
+            conteo[1] += 1
+            conteo[0] += nuevo == ESTADO_DISPONIBLE
+    acumular(cursor, fin)
+    return horas, cubiertas
+
+
+def conteos_diarios(desde, hasta, centro=None):
+    """{fecha: {estado: vehículos}} de los snapshots entre dos fechas (inclusive)"""
+    snapshots = SnapshotDisponibilidad.objects.filter(fecha__gte=desde, fecha__lte=hasta)
+    if centro is not None:
+        snapshots = snapshots.filter(centro_id=centro)
+    dias = defaultdict(lambda: defaultdict(int))
+    for fecha, estado, cantidad in snapshots.order_by().values_list('fecha', 'estado', 'cantidad'):
+        dias[fecha][estado] += cantidad
+    return dias
@@ -0,0 +1,115 @@
+"""
+Eliminación de vehículos en segundo plano.
+
+``vehiculo.delete()`` borraba en el request, con CASCADE, todos los
+mantenimientos del vehículo: con años de historial eso cargaba miles de filas
+en memoria, disparaba un signal por fila y retenía el lock de escritura de
+SQLite hasta terminar. Ahora la eliminación tiene dos pasos:
+
+1. ``solicitar_eliminacion`` marca el vehículo inactivo (``activo=False``) en
+   una escritura corta; los signals lo sacan del stock del cubo y registran la
+   baja en el historial de estados. Las lecturas (listados, KPIs, alertas,
+   formularios, transiciones) filtran ``activo=True`` usando el índice
+   ``vehiculo_activo_idx``.
+2. La tarea ``purgar_vehiculo`` borra sus mantenimientos vigentes y archivados
+   por lotes, cada uno en su propia transacción, descontando cada lote del
+   cubo y del resumen de costos y anotando las bajas en el registro de
+   cambios, e informa el avance en el resultado del trabajo. Sin
+   dependientes, borra la fila del vehículo.
+
+La purga es idempotente: si el trabajador muere a mitad, el reintento sigue
+desde lo que quedó.
+"""
+import time
+from django.conf import settings
+from .cambios import registrar_cambios
+from .flujo import CAMPOS_CUBO
+from .models import Mantenimiento, MantenimientoArchivado, Vehiculo
+from .shards import aliases_datos
+from .sqlite import atomic_inmediato
+from .trabajos import PRIORIDAD_BAJA, encolar, informar_progreso
+from .versiones import incrementar_version
+from . import costos, cubo
+
+
+def solicitar_eliminacion(vehiculo):
+    """Da de baja el vehículo de inmediato y encola la purga de su historial; retorna el trabajo"""
+    if vehiculo.activo:
+        vehiculo.activo = False
+        vehiculo.save(update_fields=['activo', 'fecha_modificacion'])
+    # La fecha de creación distingue a un vehículo nuevo que reutilice el id
+    return encolar(
+        'purgar_vehiculo', {'vehiculo_id': vehiculo.pk}, prioridad=PRIORIDAD_BAJA,
+        clave=f'purgar_vehiculo:{vehiculo.pk}:{vehiculo.fecha_creacion.timestamp():.0f}',
+    )
+
+
+def pendientes_de_purga():
+    """{alias: [ids]} de los vehículos marcados para eliminar"""
+    return {
+        alias: list(Vehiculo.objects.using(alias).filter(activo=False).values_list('id', flat=True))
+        for alias in aliases_datos()
+    }
+
+
+def _borrar_lote(alias, modelo, vehiculo, lote):
+    """Borra hasta ``lote`` mantenimientos del vehículo y descuenta su aporte; retorna cuántos"""
+    filas = list(modelo.objects.using(alias).filter(vehiculo_id=vehiculo['id']).order_by('pk').values(
+        'id', *CAMPOS_CUBO
+    )[:lote])
+    if not filas:
+        return 0
+    modelo.objects.using(alias).filter(pk__in=[fila['id'] for fila in filas])._raw_delete(alias)
+    cubo.registrar_cambios_mantenimientos(
+        (fila, None, vehiculo['centro_operacion_id'], vehiculo['tipo_capacidad']) for fila in filas
+    )
+    costos.recalcular_celdas([
+        (vehiculo['id'], fila['fecha_realizacion'] or fila['fecha_programada'])
+        for fila in filas if fila['estado'] == 'completado'
+    ], using=alias)
+    registrar_cambios(((modelo, fila['id'], 'baja', {}, vehiculo['centro_operacion_id']) for fila in filas), using=alias)
+    return len(filas)
+
+
+def purgar_vehiculo(vehiculo_id, lote=None, pausa=0):
+    """
+    Borra por lotes los mantenimientos de un vehículo inactivo y luego el
+    vehículo. Retorna {'vehiculo_id', 'mantenimientos', 'borrados', 'eliminado'}
+    (o 'omitido' con el motivo si no existe o se reactivó).
+    """
+    lote = lote or settings.FLOTA_ELIMINACION_LOTE
+    for alias in aliases_datos():
+        vehiculo = Vehiculo.objects.using(alias).filter(pk=vehiculo_id).values(
+            'id', 'activo', 'centro_operacion_id', 'tipo_capacidad'
+        ).first()
+        if vehiculo is not None:
+            break
+    else:
+        return {'vehiculo_id': vehiculo_id, 'omitido': 'no existe'}
+    if vehiculo['activo']:
+        return {'vehiculo_id': vehiculo_id, 'omitido': 'el vehículo está activo'}
+
+    progreso = {
+        'vehiculo_id': vehiculo_id,
+        'mantenimientos': sum(
+            modelo.objects.using(alias).filter(vehiculo_id=vehiculo_id).count()
+            for modelo in (Mantenimiento, MantenimientoArchivado)
+        ),
+        'borrados': 0,
+        'eliminado': False,
+    }
+    while not progreso['eliminado']:
+        with atomic_inmediato(alias):
+            cantidad = (_borrar_lote(alias, Mantenimiento, vehiculo, lote)
+                        or _borrar_lote(alias, MantenimientoArchivado, vehiculo, lote))
+            if not cantidad:
+                # Sin dependientes: la fila del vehículo, sin signals (la baja ya se registró al marcarlo)
+                Vehiculo.objects.using(alias).filter(pk=vehiculo_id, activo=False)._raw_delete(alias)
+                registrar_cambios([(Vehiculo, vehiculo_id, 'baja', {}, vehiculo['centro_operacion_id'])], using=alias)
+                progreso['eliminado'] = True
+        incrementar_version(using=alias)
+        progreso['borrados'] += cantidad
+        informar_progreso(progreso)
+        if pausa and not progreso['eliminado']:
+            time.sleep(pausa)
+    return progreso
@@ -0,0 +1,273 @@
+"""
+Estado de la flota en memoria, por columnas, para los cálculos que recorren
+todos los vehículos (KPIs por centro, estado y tipo, niveles de alerta por
+kilometraje).
+
+``EstadoFlota`` guarda los vehículos activos en arreglos compactos
+(``array``: ids, centros, códigos de estado y de tipo, kilometraje y año), en
+lugar de una instancia de modelo por vehículo: con 100.000 vehículos ocupa un
+par de MB. Los conteos por centro, estado y tipo se mantienen con cada cambio
+y las alertas se calculan recorriendo columnas de enteros, sin armar objetos.
+
+Se carga una vez por proceso (``consultar_estado()``) y se mantiene al día
+con el registro de cambios (``cambios.py``): a lo más cada
+``FLOTA_ESTADO_MEMORIA_REFRESCO`` segundos se leen los cambios de vehículos
+posteriores a su cursor (un rango del índice primario) y se aplican como
+upserts y bajas. Si la retención ya borró cambios que no alcanzó a leer, se
+recarga completo.
+
+El estado publicado no se modifica: un hilo refresca una copia fuera del lock
+y la publica; el lock solo protege leer o reemplazar la referencia, así que
+las consultas nunca esperan una lectura de la base.
+
+Se activa con ``FLOTA_ESTADO_MEMORIA`` (``indicadores.py`` lo usa en los KPIs,
+las estadísticas y las alertas).
+"""
+import threading
+import time
+from array import array
+from collections import Counter
+from django.conf import settings
+from .cambios import cursor_actual, cursor_purgado
+from .models import RegistroCambio, Vehiculo
+from .shards import aliases_consulta
+
+
+ESTADOS = tuple(codigo for codigo, _ in Vehiculo.ESTADO_CHOICES)
+TIPOS = tuple(codigo for codigo, _ in Vehiculo.TIPO_CAPACIDAD_CHOICES)
+CODIGOS_ESTADO = {estado: codigo for codigo, estado in enumerate(ESTADOS)}
+CODIGOS_TIPO = {tipo: codigo for codigo, tipo in enumerate(TIPOS)}
+OPERATIVO = CODIGOS_ESTADO['operativo']
+
+# Columnas del registro de cambios que se guardan en memoria
+CAMPOS = ('id', 'centro_operacion_id', 'estado', 'tipo_capacidad', 'kilometraje_actual', 'año')
+
+LOTE_CAMBIOS = 5000
+
+
+class EstadoFlota:
+    """Vehículos activos en columnas; la fila de cada id está en ``posiciones``"""
+
+    def __init__(self, cursor=0):
+        self.cursor = cursor
+        self.refrescado = time.monotonic()
+        self.ids = array('q')
+        self.centros = array('q')
+        self.estados = array('b')
+        self.tipos = array('b')
+        self.kilometrajes = array('q')
+        self.años = array('h')
+        self.posiciones = {}
+        # Vehículos por (centro, estado, tipo), mantenido en cada cambio: los KPIs no recorren las columnas
+        self.conteos = Counter()
+
+    @classmethod
+    def desde_filas(cls, filas, cursor=0):
+        """Filas (id, centro_id, estado, tipo_capacidad, kilometraje, año)"""
+        estado = cls(cursor)
+        for fila in filas:
+            estado._agregar(*fila)
+        return estado
+
+    @classmethod
+    def cargar(cls):
+        """Lee los vehículos activos de todas las bases"""
+        # El cursor se toma antes de leer: lo confirmado después se aplica como cambio
+        cursor = cursor_actual()
+        filas = (
+            fila
+            for alias in aliases_consulta()
+            for fila in Vehiculo.objects.using(alias).filter(activo=True).order_by().values_list(*CAMPOS).iterator(
+                chunk_size=LOTE_CAMBIOS
+            )
+        )
+        return cls.desde_filas(filas, cursor)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def copia(self):
+        """Copia independiente, para refrescar sin tocar el estado que otros leen"""
+        copia = EstadoFlota(self.cursor)
+        for nombre in ('ids', 'centros', 'estados', 'tipos', 'kilometrajes', 'años'):
+            setattr(copia, nombre, array(getattr(self, nombre).typecode, getattr(self, nombre)))
+        copia.posiciones = dict(self.posiciones)
+        copia.conteos = Counter(self.conteos)
+        return copia
+
+    def vencido(self):
+        return time.monotonic() - self.refrescado >= settings.FLOTA_ESTADO_MEMORIA_REFRESCO
+
+    # ==================== CAMBIOS ====================
+    def _agregar(self, vehiculo_id, centro_id, estado, tipo, kilometraje, año):
+        self.posiciones[vehiculo_id] = len(self.ids)
+        self.ids.append(vehiculo_id)
+        self.centros.append(centro_id)
+        self.estados.append(CODIGOS_ESTADO[estado])
+        self.tipos.append(CODIGOS_TIPO[tipo])
+        self.kilometrajes.append(kilometraje)
+        self.años.append(año)
+        self.conteos[self._grupo(len(self.ids) - 1)] += 1
+
+    def _grupo(self, posicion):
+        return self.centros[posicion], self.estados[posicion], self.tipos[posicion]
+
+    def _quitar(self, vehiculo_id):
+        """Borra la fila moviendo la última a su lugar (el orden no importa)"""
+        posicion = self.posiciones.pop(vehiculo_id, None)
+        if posicion is None:
+            return
+        self.conteos[self._grupo(posicion)] -= 1
+        ultima = len(self.ids) - 1
+        for columna in (self.ids, self.centros, self.estados, self.tipos, self.kilometrajes, self.años):
+            columna[posicion] = columna[ultima]
+            del columna[ultima]
+        if posicion != ultima:
+            self.posiciones[self.ids[posicion]] = posicion
+
+    def _actualizar(self, vehiculo_id, datos):
+        posicion = self.posiciones[vehiculo_id]
+        self.conteos[self._grupo(posicion)] -= 1
+        if 'centro_operacion_id' in datos:
+            self.centros[posicion] = datos['centro_operacion_id']
+        if 'estado' in datos:
+            self.estados[posicion] = CODIGOS_ESTADO[datos['estado']]
+        if 'tipo_capacidad' in datos:
+            self.tipos[posicion] = CODIGOS_TIPO[datos['tipo_capacidad']]
+        if 'kilometraje_actual' in datos:
+            self.kilometrajes[posicion] = datos['kilometraje_actual']
+        if 'año' in datos:
+            self.años[posicion] = datos['año']
+        self.conteos[self._grupo(posicion)] += 1
+
+    def aplicar(self, vehiculo_id, operacion, datos):
+        """
+        Aplica un cambio del registro. Retorna False si es la modificación de un
+        vehículo que no está en memoria: hay que leer su fila.
+        """
+        if operacion == 'baja' or datos.get('activo') is False:
+            self._quitar(vehiculo_id)
+        elif operacion == 'alta':
+            self._quitar(vehiculo_id)
+            self._agregar(vehiculo_id, *(datos[campo] for campo in CAMPOS[1:]))
+        elif vehiculo_id in self.posiciones:
+            self._actualizar(vehiculo_id, datos)
+        elif 'activo' in datos:
+            # Reactivado: la modificación no trae la fila completa
+            return False
+        return True
+
+    def refrescar(self):
+        """Aplica los cambios de vehículos posteriores al cursor; retorna cuántos"""
+        aplicados = 0
+        while True:
+            cambios = list(RegistroCambio.objects.filter(id__gt=self.cursor, modelo='vehiculo').order_by('id').values_list(
+                'id', 'objeto_id', 'operacion', 'datos'
+            )[:LOTE_CAMBIOS])
+            faltantes = [objeto_id for _, objeto_id, operacion, datos in cambios if not self.aplicar(objeto_id, operacion, datos)]
+            if faltantes:
+                for alias in aliases_consulta():
+                    for fila in Vehiculo.objects.using(alias).filter(pk__in=faltantes, activo=True).values_list(*CAMPOS):
+                        self._quitar(fila[0])
+                        self._agregar(*fila)
+            if cambios:
+                self.cursor = cambios[-1][0]
+            aplicados += len(cambios)
+            if len(cambios) < LOTE_CAMBIOS:
+                self.refrescado = time.monotonic()
+                return aplicados
+
+    # ==================== CONSULTAS ====================
+    def conteos_por_centro(self):
+        """Filas (centro_id, estado, tipo_capacidad, total), como indicadores.conteos_por_centro()"""
+        return [
+            (centro_id, ESTADOS[estado], TIPOS[tipo], total)
+            for (centro_id, estado, tipo), total in self.conteos.items() if total
+        ]
+
+    def km_hasta_mantenimiento(self, intervalo):
+        """Kilómetros que faltan para el próximo múltiplo de ``intervalo``, por fila"""
+        return [intervalo - km % intervalo for km in self.kilometrajes]
+
+    def niveles_alerta(self, intervalo, km_alerta, km_urgente):
+        """Nivel por fila: 0 sin alerta, 1 próximo, 2 urgente (solo operativos; igual que nivel_alerta_km)"""
+        return [
+            0 if estado != OPERATIVO or faltan > km_alerta else 2 if faltan <= km_urgente else 1
+            for estado, faltan in zip(self.estados, self.km_hasta_mantenimiento(intervalo))
+        ]
+
+    def ids_en_alerta(self, intervalo, km_alerta):
+        minimo = intervalo - km_alerta
+        return [
+            vehiculo_id
+            for vehiculo_id, estado, km in zip(self.ids, self.estados, self.kilometrajes)
+            if estado == OPERATIVO and km % intervalo >= minimo
+        ]
+
+    def km_restantes_en_alerta(self, intervalo, km_alerta):
+        """{id: km que faltan} de los operativos en alerta"""
+        return {
+            vehiculo_id: intervalo - km % intervalo
+            for vehiculo_id, estado, km in zip(self.ids, self.estados, self.kilometrajes)
+            if estado == OPERATIVO and intervalo - km % intervalo <= km_alerta
+        }
+
+
+# ==================== ESTADO DEL PROCESO ====================
+_estado = None
+# Protege solo la referencia a _estado; _refresco deja un solo hilo leyendo la base
+_lock = threading.Lock()
+_refresco = threading.Lock()
+
+
+def _publicado():
+    with _lock:
+        return _estado
+
+
+def _refrescar(estado):
+    """
+    Arma y publica un estado al día. Si otro hilo ya está refrescando se
+    sigue con ``estado`` (la primera carga sí se espera).
+    """
+    global _estado
+    if not _refresco.acquire(blocking=estado is None):
+        return estado
+    try:
+        actual = _publicado()
+        if actual is not None and not actual.vencido():
+            # Otro hilo lo refrescó mientras se esperaba
+            return actual
+        if actual is None or actual.cursor < cursor_purgado():
+            nuevo = EstadoFlota.cargar()
+        elif not RegistroCambio.objects.filter(id__gt=actual.cursor, modelo='vehiculo').exists():
+            # Sin cambios: basta con renovar la marca de tiempo
+            actual.refrescado = time.monotonic()
+            return actual
+        else:
+            nuevo = actual.copia()
+        nuevo.refrescar()
+        with _lock:
+            _estado = nuevo
+        return nuevo
+    finally:
+        _refresco.release()
+
+
+def consultar_estado(funcion):
+    """
+    funcion(estado) con el estado del proceso, cargado la primera vez y
+    refrescado cuando tiene más de FLOTA_ESTADO_MEMORIA_REFRESCO segundos.
+    ``funcion`` corre sin lock sobre un estado que ya no cambia.
+    """
+    estado = _publicado()
+    if estado is None or estado.vencido():
+        estado = _refrescar(estado)
+    return funcion(estado)
+
+
+def descartar_estado():
+    """Fuerza la recarga completa en el próximo uso"""
+    global _estado
+    with _refresco, _lock:
+        _estado = None
@@ -0,0 +1,268 @@
+"""
+Exportación completa de vehículos y mantenimientos en CSV o JSON.
+
+Las filas se leen con ``values_list(...).iterator(chunk_size=...)`` y se
+escriben a medida que llegan (StreamingHttpResponse), comprimidas con gzip al
+vuelo cuando el cliente lo acepta: exportar un millón de mantenimientos no
+carga un millón de objetos en memoria. Los mantenimientos se leen del
+historial completo (vigentes y archivados, ver ``archivo.py``).
+
+Exportación incremental: cada respuesta trae un cursor (cabecera
+``X-Export-Cursor`` y campo ``cursor`` del JSON) con el instante del corte;
+pasando ``?since=<cursor>`` la siguiente exportación trae sólo las filas con
+``fecha_modificacion`` posterior, menos ``FLOTA_EXPORTACION_MARGEN`` segundos:
+``fecha_modificacion`` se asigna antes del commit, y una fila confirmada tarde
+con una fecha anterior al corte llega en la siguiente exportación (el
+consumidor recibe repetidas las filas del margen y las reemplaza por id). Las
+exportaciones incrementales se leen del primario; una completa puede salir de
+la réplica y entonces el corte es la última modificación que la réplica ya
+tiene, no el reloj del servidor web. La cabecera ``X-Cambios-Cursor`` trae además
+el cursor del registro de cambios (``cambios.py``) tomado antes de leer: desde
+ahí se sigue con ``/api/cambios/``, que también informa las bajas.
+"""
+import csv
+import datetime
+import io
+import json
+import zlib
+from decimal import Decimal
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models import Max
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from .cambios import cursor_actual
+from .filtros import filtrar_vehiculos, filtrar_mantenimientos
+from .models import Vehiculo, MantenimientoHistorial
+from .replica import alias_replica, leer_desde_replica
+from .shards import aliases_consulta
+
+
+TAMANO_BLOQUE = 64 * 1024
+
+
+class CursorInvalido(ValueError):
+    pass
+
+
+class Exportacion:
+    """Columnas (nombre, campo) de un modelo y cómo filtrarlo"""
+
+    def __init__(self, nombre, modelo, columnas, filtrar):
+        self.nombre = nombre
+        self.modelo = modelo
+        self.columnas = columnas
+        self.filtrar = filtrar
+
+    @property
+    def nombres(self):
+        return [nombre for nombre, _ in self.columnas]
+
+    @property
+    def campos(self):
+        return [campo for _, campo in self.columnas]
+
+    def transformar(self, filas):
+        return filas
+
+
+class ExportacionMantenimientos(Exportacion):
+    def transformar(self, filas):
+        # auth_user no está en los shards: los usuarios (pocos) se resuelven en memoria
+        usuarios = dict(User.objects.values_list('id', 'username'))
+        indice = self.campos.index('usuario_programacion_id')
+        for fila in filas:
+            fila = list(fila)
+            fila[indice] = usuarios.get(fila[indice], fila[indice])
+            yield fila
+
+
+EXPORTACIONES = {
+    'vehiculos': Exportacion('vehiculos', Vehiculo, (
+        ('id', 'id'),
+        ('patente', 'patente'),
+        ('marca', 'marca'),
+        ('modelo', 'modelo'),
+        ('año', 'año'),
+        ('tipo_capacidad', 'tipo_capacidad'),
+        ('estado', 'estado'),
+        ('kilometraje_actual', 'kilometraje_actual'),
+        ('centro_id', 'centro_operacion_id'),
+        ('centro', 'centro_operacion__nombre'),
+        ('centro_ciudad', 'centro_operacion__ciudad'),
+        ('numero_chasis', 'numero_chasis'),
+        ('numero_motor', 'numero_motor'),
+        ('valor_adquisicion', 'valor_adquisicion'),
+        ('fecha_adquisicion', 'fecha_adquisicion'),
+        ('activo', 'activo'),
+        ('fecha_creacion', 'fecha_creacion'),
+        ('fecha_modificacion', 'fecha_modificacion'),
+    ), filtrar_vehiculos),
+    'mantenimientos': ExportacionMantenimientos('mantenimientos', MantenimientoHistorial, (
+        ('id', 'id'),
+        ('vehiculo_id', 'vehiculo_id'),
+        ('patente', 'vehiculo__patente'),
+        ('centro', 'vehiculo__centro_operacion__nombre'),
+        ('tipo_mantenimiento', 'tipo_mantenimiento__nombre'),
+        ('proveedor', 'proveedor__nombre'),
+        ('proveedor_rut', 'proveedor__rut'),
+        ('usuario', 'usuario_programacion_id'),
+        ('tipo', 'tipo'),
+        ('estado', 'estado'),
+        ('prioridad', 'prioridad'),
+        ('fecha_programada', 'fecha_programada'),
+        ('fecha_realizacion', 'fecha_realizacion'),
+        ('kilometraje_programado', 'kilometraje_programado'),
+        ('costo_estimado', 'costo_estimado'),
+        ('costo_real', 'costo_real'),
+        ('tiempo_estimado_horas', 'tiempo_estimado_horas'),
+        ('descripcion', 'descripcion'),
+        ('fecha_creacion', 'fecha_creacion'),
+        ('fecha_modificacion', 'fecha_modificacion'),
+    ), filtrar_mantenimientos),
+}
+
+
+def leer_cursor(texto):
+    """Fecha del parámetro since= (ISO 8601); None si no viene"""
+    if not texto:
+        return None
+    try:
+        fecha = parse_datetime(texto.replace(' ', '+'))  # '+' llega como espacio si no se codificó
+    except ValueError:
+        fecha = None
+    if fecha is None:
+        raise CursorInvalido(texto)
+    return timezone.make_aware(fecha) if timezone.is_naive(fecha) else fecha
+
+
+def _leer(exportacion, queryset, aliases):
+    lote = getattr(settings, 'FLOTA_EXPORTACION_LOTE', 2000)
+    for alias in aliases:
+        yield from exportacion.transformar(
+            queryset.using(alias).values_list(*exportacion.campos).iterator(chunk_size=lote)
+        )
+
+
+def bases_exportacion(desde):
+    """
+    Bases de las que se leen las filas. Se eligen antes de responder: las filas
+    se leen al enviar la respuesta, cuando la vista (y lectura_replica) ya
+    retornó. Una exportación incremental nunca lee de la réplica.
+    """
+    aliases = aliases_consulta()
+    if aliases != [None]:
+        return aliases
+    if desde is None and leer_desde_replica():
+        return [alias_replica()]
+    return [DEFAULT_DB_ALIAS]
+
+
+def corte_exportacion(exportacion, aliases):
+    """Instante hasta el que llega la exportación: ahora, o la última modificación que ya está en la réplica"""
+    ahora = timezone.now()
+    if aliases != [alias_replica()]:
+        return ahora
+    ultima = exportacion.modelo.objects.using(aliases[0]).aggregate(ultima=Max('fecha_modificacion'))['ultima']
+    return min(ultima, ahora) if ultima else ahora
+
+
+def filas_exportacion(exportacion, parametros, desde, hasta, aliases):
+    """Filas filtradas con desde - margen < fecha_modificacion <= hasta, leídas por lotes en cada base"""
+    queryset = exportacion.filtrar(exportacion.modelo.objects.all(), parametros)
+    queryset = queryset.filter(fecha_modificacion__lte=hasta).order_by('fecha_modificacion', 'id')
+    if desde is not None:
+        margen = datetime.timedelta(seconds=getattr(settings, 'FLOTA_EXPORTACION_MARGEN', 30))
+        queryset = queryset.filter(fecha_modificacion__gt=desde - margen)
+    return _leer(exportacion, queryset, aliases)
+
+
+# ==================== FORMATOS ====================
+def _valor(valor):
+    if isinstance(valor, (datetime.date, datetime.datetime)):
+        return valor.isoformat()
+    if isinstance(valor, Decimal):
+        return int(valor) if valor == valor.to_integral_value() else float(valor)
+    return valor
+
+
+def escribir_csv(exportacion, filas, cursor):
+    buffer = io.StringIO()
+    escritor = csv.writer(buffer)
+    escritor.writerow(exportacion.nombres)
+    for fila in filas:
+        escritor.writerow([_valor(valor) for valor in fila])
+        if buffer.tell() >= TAMANO_BLOQUE:
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue().encode('utf-8')
+
+
+def escribir_json(exportacion, filas, cursor):
+    """{"cursor": ..., "datos": [{...}, ...]} escrito de a bloques"""
+    nombres = exportacion.nombres
+    partes = [f'{{"modelo": "{exportacion.nombre}", "cursor": {json.dumps(cursor)}, "datos": [']
+    tamano, primero = 0, True
+    for fila in filas:
+        objeto = json.dumps(dict(zip(nombres, map(_valor, fila))), ensure_ascii=False)
+        partes.append(objeto if primero else ',' + objeto)
+        primero = False
+        tamano += len(objeto)
+        if tamano >= TAMANO_BLOQUE:
+            yield ''.join(partes).encode('utf-8')
+            partes, tamano = [], 0
+    partes.append(']}')
+    yield ''.join(partes).encode('utf-8')
+
+
+FORMATOS = {
+    'csv': (escribir_csv, 'text/csv; charset=utf-8'),
+    'json': (escribir_json, 'application/json'),
+}
+
+
+def comprimir_gzip(fragmentos):
+    compresor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits 31: formato gzip
+    for fragmento in fragmentos:
+        comprimido = compresor.compress(fragmento)
+        if comprimido:
+            yield comprimido
+    yield compresor.flush()
+
+
+def respuesta_exportacion(request, nombre):
+    """StreamingHttpResponse con la exportación; lanza CursorInvalido si since= no es una fecha"""
+    exportacion = EXPORTACIONES[nombre]
+    formato = request.GET.get('formato', 'csv')
+    if formato not in FORMATOS:
+        formato = 'csv'
+    escritor, content_type = FORMATOS[formato]
+
+    desde = leer_cursor(request.GET.get('since'))
+    cursor_cambios = cursor_actual()
+    aliases = bases_exportacion(desde)
+    hasta = corte_exportacion(exportacion, aliases)
+    cursor = hasta.isoformat()
+
+    contenido = escritor(exportacion, filas_exportacion(exportacion, request.GET, desde, hasta, aliases), cursor)
+    nombre_archivo = f'{nombre}_{hasta:%Y%m%d_%H%M%S}.{formato}'
+
+    if request.GET.get('gzip') == '1':
+        # Descarga explícita de un .gz
+        response = StreamingHttpResponse(comprimir_gzip(contenido), content_type='application/gzip')
+        nombre_archivo += '.gz'
+    elif 'gzip' in request.headers.get('Accept-Encoding', ''):
+        # Compresión de transporte: el cliente la deshace al recibir
+        response = StreamingHttpResponse(comprimir_gzip(contenido), content_type=content_type)
+        response['Content-Encoding'] = 'gzip'
+    else:
+        response = StreamingHttpResponse(contenido, content_type=content_type)
+
+    response['Vary'] = 'Accept-Encoding'
+    response['Content-Disposition'] = f'attachment; filename="{nombre_archivo}"'
+    response['X-Export-Cursor'] = cursor
+    response['X-Cambios-Cursor'] = str(cursor_cambios)
+    return response
@@ -0,0 +1,31 @@
+"""Filtros de los listados, compartidos por las vistas y las exportaciones"""
+
+
+def filtrar_vehiculos(vehiculos, parametros):
+    """Aplica los filtros ?centro=, ?tipo= y ?estado= de gestion_vehiculos_view"""
+    centro_filter = parametros.get('centro', '')
+    tipo_filter = parametros.get('tipo', '')
+    estado_filter = parametros.get('estado', '')
+    
+    if centro_filter:
+        vehiculos = vehiculos.filter(centro_operacion__nombre=centro_filter)
+    if tipo_filter:
+        vehiculos = vehiculos.filter(tipo_capacidad=tipo_filter)
+    if estado_filter:
+        vehiculos = vehiculos.filter(estado=estado_filter)
+    return vehiculos
+
+
+def filtrar_mantenimientos(mantenimientos, parametros):
+    """Aplica los filtros ?estado=, ?tipo= y ?prioridad= de mantenimientos_view"""
+    estado_filter = parametros.get('estado', '')
+    tipo_filter = parametros.get('tipo', '')
+    prioridad_filter = parametros.get('prioridad', '')
+    
+    if estado_filter:
+        mantenimientos = mantenimientos.filter(estado=estado_filter)
+    if tipo_filter:
+        mantenimientos = mantenimientos.filter(tipo=tipo_filter)
+    if prioridad_filter:
+        mantenimientos = mantenimientos.filter(prioridad=prioridad_filter)
+    return mantenimientos
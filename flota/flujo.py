@@ -0,0 +1,216 @@
+"""
+Operaciones en bloque del flujo de mantenimientos: iniciar, completar y cancelar.
+
+Al cierre del turno el taller cierra decenas de trabajos de una vez.
+``aplicar_operacion`` recibe filas {id, fecha_realizacion, costo_real} y, por
+cada base, dentro de una sola transacción:
+
+- valida por conjuntos: una consulta lee el estado de todos los
+  mantenimientos del lote; los que no admiten la operación se rechazan con
+  su motivo;
+- escribe con un solo UPDATE por lote; al completar, la fecha y el costo de
+  cada fila van en un CASE;
+- actualiza el estado de los vehículos (``transiciones.transicionar_vehiculos``):
+  iniciar los deja en mantenimiento; completar o cancelar un trabajo en
+  proceso los devuelve a operativo si no les queda otro en proceso.
+
+Sin signals, el cubo, el resumen de costos, las notificaciones, el registro
+de cambios y la versión de datos se mantienen aquí, y un solo trabajo de la cola archiva los PDF.
+Los números de reporte se derivan del id (``Mantenimiento.numero_reporte``):
+se asignan todos juntos al completar, sin contador ni consultas extra.
+"""
+from collections import defaultdict
+from django.db.models import Case, F, Value, When
+from django.utils import timezone
+from .cambios import diferencias, registrar_cambios
+from .models import Mantenimiento
+from .shards import aliases_datos
+from .sqlite import atomic_inmediato
+from .trabajos import PRIORIDAD_ALTA, PRIORIDAD_BAJA, encolar
+from .transiciones import transicionar_vehiculos
+from .versiones import incrementar_version, version_actual
+from . import costos, cubo, notificaciones
+
+
+OPERACIONES = {
+    'iniciar': {'desde': ('programado',), 'estado': 'en_proceso', 'vehiculo': 'mantenimiento'},
+    'completar': {'desde': ('programado', 'en_proceso'), 'estado': 'completado', 'vehiculo': 'operativo'},
+    'cancelar': {'desde': ('programado', 'en_proceso'), 'estado': 'cancelado', 'vehiculo': 'operativo'},
+}
+
+MOTIVOS_RECHAZO = {
+    'no_encontrado': 'No existe',
+    'estado_no_permitido': 'Su estado actual no admite la operación',
+}
+
+# Campos que usa el cubo (mismos que CAMPOS_ANTERIORES de signals) más los del vehículo
+CAMPOS_CUBO = (
+    'fecha_realizacion', 'fecha_programada', 'estado', 'tipo_mantenimiento_id', 'proveedor_id', 'tipo',
+    'costo_estimado', 'costo_real', 'tiempo_estimado_horas',
+)
+CAMPOS_LECTURA = ('id', 'vehiculo_id', *CAMPOS_CUBO, 'vehiculo__centro_operacion_id', 'vehiculo__tipo_capacidad',
+                  'vehiculo__patente', 'tipo_mantenimiento__nombre')
+
+TAMANO_LOTE = 500
+
+
+class OperacionInvalida(ValueError):
+    pass
+
+
+def numero_reporte(mantenimiento_id):
+    """Misma regla que Mantenimiento.numero_reporte()"""
+    return f"MT-2025-{mantenimiento_id:04d}"
+
+
+def _nuevos_valores(operacion, anterior, fila, hoy):
+    nuevo = {**anterior, 'estado': OPERACIONES[operacion]['estado']}
+    if operacion == 'completar':
+        nuevo['fecha_realizacion'] = fila.get('fecha_realizacion') or hoy
+        if fila.get('costo_real') is not None:
+            nuevo['costo_real'] = fila['costo_real']
+    return nuevo
+
+
+def _escribir(alias, operacion, cambios, ahora):
+    """
+    Un solo UPDATE por lote: al completar, la fecha y el costo de cada fila
+    van en un CASE por id.
+    """
+    config = OPERACIONES[operacion]
+    ids = [nuevo['id'] for _, nuevo in cambios]
+    valores = {'estado': config['estado']}
+    if operacion == 'completar':
+        for campo in ('fecha_realizacion', 'costo_real'):
+            campo_modelo = Mantenimiento._meta.get_field(campo)
+            valores[campo] = Case(
+                *(When(pk=nuevo['id'], then=Value(nuevo[campo], output_field=campo_modelo)) for _, nuevo in cambios),
+                default=F(campo), output_field=campo_modelo,
+            )
+    Mantenimiento.objects.using(alias).filter(pk__in=ids, estado__in=config['desde']).update(
+        **valores, fecha_modificacion=ahora,
+    )
+
+
+def _procesar_lote(alias, operacion, lote, resultado, hoy, ahora):
+    """
+    Valida y escribe un lote de filas {id: fila} en ``alias``. Retorna los ids
+    encontrados en la base y los cambios (anterior, nuevo) aplicados.
+    """
+    config = OPERACIONES[operacion]
+    encontrados, cambios = set(), []
+    for anterior in Mantenimiento.objects.using(alias).filter(pk__in=list(lote)).order_by().values(*CAMPOS_LECTURA):
+        encontrados.add(anterior['id'])
+        if anterior['estado'] not in config['desde']:
+            resultado['rechazados']['estado_no_permitido'].append(anterior['id'])
+        else:
+            cambios.append((anterior, _nuevos_valores(operacion, anterior, lote[anterior['id']], hoy)))
+    if cambios:
+        _escribir(alias, operacion, cambios, ahora)
+    return encontrados, cambios
+
+
+def _mantener_derivados(alias, operacion, cambios, ahora):
+    """Lo que en la edición individual hacen los signals: cubo, costos, registro de cambios y notificaciones"""
+    cubo.registrar_cambios_mantenimientos(
+        (anterior, nuevo, anterior['vehiculo__centro_operacion_id'], anterior['vehiculo__tipo_capacidad'])
+        for anterior, nuevo in cambios
+    )
+    registrar_cambios((
+        (Mantenimiento, nuevo['id'], 'modificacion', diferencias(anterior, {**nuevo, 'fecha_modificacion': ahora}),
+         anterior['vehiculo__centro_operacion_id'])
+        for anterior, nuevo in cambios
+    ), using=alias)
+    if operacion != 'completar':
+        return
+    costos.recalcular_celdas(
+        [(nuevo['vehiculo_id'], nuevo['fecha_realizacion']) for _, nuevo in cambios], using=alias,
+    )
+    eventos = []
+    for _, nuevo in cambios:
+        numero = numero_reporte(nuevo['id'])
+        eventos.append({
+            'titulo': f"{numero} {nuevo['vehiculo__patente']} - {nuevo['tipo_mantenimiento__nombre']}",
+            'detalle': f"Realizado el {nuevo['fecha_realizacion']}; costo real ${nuevo['costo_real'] or 0:,.0f}",
+            'referencia': f"mantenimiento:{nuevo['id']}",
+            'archivo': f'mantenimientos/{numero}.pdf',
+        })
+    notificaciones.registrar_eventos('mantenimiento_completado', eventos)
+
+
+def aplicar_operacion(operacion, filas):
+    """
+    Aplica ``operacion`` (iniciar, completar o cancelar) a las filas
+    {'id', 'fecha_realizacion', 'costo_real'}; los datos de realización solo
+    se usan al completar (por defecto hoy y el costo ya registrado). Retorna
+    {'procesados', 'numeros_reporte', 'rechazados': {motivo: [ids]}, 'vehiculos'}.
+    """
+    if operacion not in OPERACIONES:
+        raise OperacionInvalida(f'operación desconocida: {operacion}')
+    pendientes = {int(fila['id']): fila for fila in filas}
+    if not pendientes:
+        raise OperacionInvalida('no se seleccionó ningún mantenimiento')
+    hoy, ahora = timezone.localdate(), timezone.now()
+    config = OPERACIONES[operacion]
+    resultado = {'procesados': 0, 'numeros_reporte': [], 'rechazados': defaultdict(list)}
+    vehiculos = {'actualizados': 0, 'sin_cambio': 0, 'rechazados': defaultdict(list)}
+    completados = []
+
+    for alias in aliases_datos():
+        if not pendientes:
+            break
+        encontrados, cambios_base = set(), []
+        # Mantenimientos y vehículos viven en la misma base: una transacción para ambos
+        with atomic_inmediato(alias):
+            ids = sorted(pendientes)
+            for inicio in range(0, len(ids), TAMANO_LOTE):
+                lote = {pk: pendientes[pk] for pk in ids[inicio:inicio + TAMANO_LOTE]}
+                leidos, cambios = _procesar_lote(alias, operacion, lote, resultado, hoy, ahora)
+                encontrados |= leidos
+                _mantener_derivados(alias, operacion, cambios, ahora)
+                cambios_base.extend(cambios)
+
+            # Iniciar lleva al taller cualquier vehículo; completar o cancelar solo libera los que estaban en proceso
+            afectados = {
+                anterior['vehiculo_id'] for anterior, _ in cambios_base
+                if operacion == 'iniciar' or anterior['estado'] == 'en_proceso'
+            }
+            if afectados:
+                parcial = transicionar_vehiculos(afectados, estado=config['vehiculo'], using=alias)
+                vehiculos['actualizados'] += parcial['actualizados']
+                vehiculos['sin_cambio'] += parcial['sin_cambio']
+                for motivo, pks in parcial['rechazados'].items():
+                    vehiculos['rechazados'][motivo].extend(pks)
+        if cambios_base:
+            incrementar_version(using=alias)
+        resultado['procesados'] += len(cambios_base)
+        if operacion == 'completar':
+            completados.extend(nuevo['id'] for _, nuevo in cambios_base)
+        pendientes = {pk: fila for pk, fila in pendientes.items() if pk not in encontrados}
+
+    resultado['rechazados']['no_encontrado'].extend(sorted(pendientes))
+    if completados:
+        completados.sort()
+        resultado['numeros_reporte'] = [numero_reporte(pk) for pk in completados]
+        encolar(
+            'archivar_reportes_mantenimiento', {'mantenimiento_ids': completados}, prioridad=PRIORIDAD_ALTA,
+            clave=f'reportes_mantenimiento:{completados[0]}:{completados[-1]}:{len(completados)}',
+        )
+        version = version_actual()[0]
+        encolar(
+            'reconstruir_cache_reportes', {'version': version},
+            prioridad=PRIORIDAD_BAJA, clave=f'reconstruir_cache_reportes:{version}',
+        )
+    resultado['rechazados'] = {motivo: pks for motivo, pks in resultado['rechazados'].items() if pks}
+    vehiculos['rechazados'] = {motivo: pks for motivo, pks in vehiculos['rechazados'].items() if pks}
+    resultado['vehiculos'] = vehiculos
+    return resultado
+
+
+def describir_resultado(operacion, resultado):
+    """Mensaje corto para la vista de tablets"""
+    partes = [f"{resultado['procesados']} mantenimiento(s) con '{operacion}' aplicado"]
+    partes.extend(f'{len(ids)} rechazados: {MOTIVOS_RECHAZO[motivo].lower()}' for motivo, ids in resultado['rechazados'].items())
+    if resultado['vehiculos']['actualizados']:
+        partes.append(f"{resultado['vehiculos']['actualizados']} vehículo(s) cambiaron de estado")
+    return '; '.join(partes)
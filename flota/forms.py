@@ -1,9 +1,48 @@
 # flota/forms.py
 from django import forms
 from django.core.exceptions import ValidationError
+from django.forms.models import ModelChoiceIterator
 from django.utils import timezone
 import re
+from .agenda import validar_cupo
 from .models import Vehiculo, CentroOperacional, Mantenimiento
+from .shards import sharding_activo, buscar_por_pk, contar_en_shards, existe_en_shards, listar_shards
+
+
+class VehiculosEnShards(ModelChoiceIterator):
+    """Opciones de vehículos de todos los shards; se consultan recién al recorrerlas"""
+    
+    def __iter__(self):
+        if not sharding_activo():
+            yield from super().__iter__()
+            return
+        if self.field.empty_label is not None:
+            yield ('', self.field.empty_label)
+        for vehiculo in listar_shards(lambda alias: self.queryset.using(alias), clave=lambda v: v.patente):
+            yield self.choice(vehiculo)
+    
+    def __len__(self):
+        if not sharding_activo():
+            return super().__len__()
+        return contar_en_shards(self.queryset) + (1 if self.field.empty_label is not None else 0)
+    
+    def __bool__(self):
+        if not sharding_activo():
+            return super().__bool__()
+        return self.field.empty_label is not None or existe_en_shards(self.queryset)
+
+
+class VehiculoChoiceField(forms.ModelChoiceField):
+    """ModelChoiceField que lista y busca vehículos en todos los shards"""
+    iterator = VehiculosEnShards
+    
+    def to_python(self, value):
+        if value in self.empty_values:
+            return None
+        vehiculo = buscar_por_pk(self.queryset, value)
+        if vehiculo is None:
+            raise ValidationError(self.error_messages['invalid_choice'], code='invalid_choice')
+        return vehiculo
 
 
 class VehiculoForm(forms.ModelForm):
@@ -97,7 +136,10 @@ class VehiculoForm(forms.ModelForm):
         if self.instance.pk:
             queryset = queryset.exclude(pk=self.instance.pk)
         
-        if queryset.exists():
+        if existe_en_shards(queryset):
+            # Un vehículo en eliminación conserva su patente hasta que termina la purga
+            if not existe_en_shards(queryset.filter(activo=True)):
+                raise ValidationError('La patente es de un vehículo que se está eliminando. Intente en unos minutos.')
             raise ValidationError('Ya existe un vehículo con esta patente.')
         
         return patente
@@ -169,6 +211,10 @@ class MantenimientoForm(forms.ModelForm):
             'observaciones_programacion'
         ]
         
+        field_classes = {
+            'vehiculo': VehiculoChoiceField,
+        }
+        
         widgets = {
             'vehiculo': forms.Select(attrs={'class': 'form-select form-select-lg'}),
             'tipo_mantenimiento': forms.Select(attrs={'class': 'form-select form-select-lg'}),
@@ -222,6 +268,8 @@ class MantenimientoForm(forms.ModelForm):
     
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
+        # Los vehículos marcados para eliminar no reciben trabajos nuevos
+        self.fields['vehiculo'].queryset = self.fields['vehiculo'].queryset.filter(activo=True)
         # Si hay un vehículo en instance Y tiene pk (es edición)
         if self.instance.pk and self.instance.vehiculo:
             self.fields['kilometraje_programado'].initial = self.instance.vehiculo.kilometraje_actual
@@ -246,6 +294,20 @@ class MantenimientoForm(forms.ModelForm):
             )
         
         return kilometraje
+    
+    def clean(self):
+        """Cupo del taller en la fecha elegida; los críticos se aceptan aunque el taller esté copado"""
+        cleaned_data = super().clean()
+        proveedor = cleaned_data.get('proveedor')
+        fecha = cleaned_data.get('fecha_programada')
+        horas = cleaned_data.get('tiempo_estimado_horas')
+        
+        if proveedor and fecha and horas and cleaned_data.get('prioridad') != 'critica':
+            error = validar_cupo(proveedor.pk, fecha, horas, excluir=[self.instance.pk] if self.instance.pk else ())
+            if error:
+                self.add_error('fecha_programada', f'{proveedor.nombre}: {error}')
+        
+        return cleaned_data
 
 
 class CompletarMantenimientoForm(forms.ModelForm):
@@ -274,4 +336,71 @@ class CompletarMantenimientoForm(forms.ModelForm):
             'estado': 'Estado del Mantenimiento *',
             'fecha_realizacion': 'Fecha de Realización',
             'costo_real': 'Costo Real (CLP)',
-        }
\ No newline at end of file
+        }
+
+class FilaOperacionForm(forms.Form):
+    """Una fila de una operación en bloque: el mantenimiento y, al completar, sus datos de realización"""
+    
+    id = forms.IntegerField(min_value=1)
+    fecha_realizacion = forms.DateField(required=False)
+    costo_real = forms.DecimalField(required=False, min_value=0, max_digits=10, decimal_places=0)
+    
+    def clean_fecha_realizacion(self):
+        fecha = self.cleaned_data['fecha_realizacion']
+        
+        if fecha and fecha > timezone.now().date():
+            raise ValidationError('La fecha de realización no puede ser futura.')
+        
+        return fecha
+
+
+class OperacionMantenimientosForm(forms.Form):
+    """
+    Iniciar, completar o cancelar varios mantenimientos (tablets del taller).
+    Recibe {'operacion', 'mantenimientos': [{'id', 'fecha_realizacion', 'costo_real'}]},
+    tal como llega en el JSON de la API o armado con ``datos_tablet``.
+    """
+    
+    operacion = forms.ChoiceField(choices=[
+        ('iniciar', 'Iniciar'),
+        ('completar', 'Completar'),
+        ('cancelar', 'Cancelar'),
+    ])
+    
+    @staticmethod
+    def datos_tablet(post):
+        """Form HTML: ids marcados en ``seleccion`` y, por fila, ``fecha_realizacion_<id>`` y ``costo_real_<id>``"""
+        return {
+            'operacion': post.get('operacion'),
+            'mantenimientos': [
+                {
+                    'id': pk,
+                    'fecha_realizacion': post.get(f'fecha_realizacion_{pk}') or None,
+                    'costo_real': post.get(f'costo_real_{pk}') or None,
+                }
+                for pk in post.getlist('seleccion')
+            ],
+        }
+    
+    def clean(self):
+        """Cada fila se valida con FilaOperacionForm; los errores se informan por mantenimiento"""
+        cleaned_data = super().clean()
+        filas = self.data.get('mantenimientos')
+        
+        if not isinstance(filas, list) or not filas:
+            raise ValidationError('Seleccione al menos un mantenimiento.')
+        
+        validas, errores = [], []
+        for numero, fila in enumerate(filas, start=1):
+            form = FilaOperacionForm(fila if isinstance(fila, dict) else {'id': fila})
+            if form.is_valid():
+                validas.append(form.cleaned_data)
+            else:
+                detalle = '; '.join(f'{campo}: {" ".join(mensajes)}' for campo, mensajes in form.errors.items())
+                errores.append(f"Mantenimiento {form.data.get('id', f'fila {numero}')}: {detalle}")
+        
+        if errores:
+            raise ValidationError(errores)
+        
+        cleaned_data['mantenimientos'] = validas
+        return cleaned_data
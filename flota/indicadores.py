@@ -0,0 +1,158 @@
+"""
+Indicadores (KPIs) de la flota calculados con consultas agrupadas.
+
+Reemplazan los ``count()`` por centro y por estado de las vistas: una sola
+consulta GROUP BY entrega todos los conteos, sin importar cuántos centros haya.
+Con ``FLOTA_ESTADO_MEMORIA`` los conteos y las alertas salen del estado de la
+flota en memoria (``estado_flota.py``), sin consultar las tablas; la vista de
+alertas lee solo las filas de los vehículos en alerta.
+"""
+import asyncio
+from django.conf import settings
+from django.db.models import Count
+from django.db.models.functions import Mod
+from .asincrono import en_paralelo
+from .estado_flota import consultar_estado
+from .models import Vehiculo, CentroOperacional
+from .shards import reunir_shards, reunir_shards_async
+
+
+# Misma regla que Vehiculo.km_hasta_mantenimiento() <= 2000:
+# faltan 10000 - (km % 10000) km, luego km % 10000 >= 8000
+KM_ALERTA = 2000
+KM_URGENTE = 500
+INTERVALO_MANTENIMIENTO_KM = 10000
+
+
+def _disponibilidad(operativos, total):
+    return round((operativos / total) * 100, 1) if total > 0 else 0
+
+
+def vehiculos_alerta_km(vehiculos=None):
+    """Vehículos operativos a menos de KM_ALERTA de su mantenimiento (filtrado en SQL)"""
+    if vehiculos is None:
+        vehiculos = Vehiculo.objects.all()
+    return vehiculos.filter(activo=True, estado='operativo').annotate(
+        resto_km=Mod('kilometraje_actual', INTERVALO_MANTENIMIENTO_KM)
+    ).filter(resto_km__gte=INTERVALO_MANTENIMIENTO_KM - KM_ALERTA)
+
+
+def nivel_alerta_km(kilometraje, estado):
+    """Nivel de alerta de un vehículo: 0 sin alerta, 1 próximo (<= KM_ALERTA), 2 urgente (<= KM_URGENTE)"""
+    if estado != 'operativo':
+        return 0
+    km_hasta = INTERVALO_MANTENIMIENTO_KM - (kilometraje % INTERVALO_MANTENIMIENTO_KM)
+    if km_hasta <= KM_URGENTE:
+        return 2
+    return 1 if km_hasta <= KM_ALERTA else 0
+
+
+def vehiculos_proximos_km(alias, ids=None):
+    """
+    Vehículos en alerta de un shard, con su centro. ``ids`` son los del estado
+    en memoria (km_restantes_alerta); sin ellos se filtra en SQL.
+    """
+    vehiculos = Vehiculo.objects.using(alias).select_related('centro_operacion')
+    if ids is None:
+        return list(vehiculos_alerta_km(vehiculos))
+    # El estado puede tener unos segundos: se descarta lo que ya no está en alerta
+    return [
+        vehiculo for vehiculo in vehiculos.filter(pk__in=ids, activo=True)
+        if nivel_alerta_km(vehiculo.kilometraje_actual, vehiculo.estado)
+    ]
+
+
+def contar_alertas_km(vehiculos=None):
+    """Cantidad de vehículos operativos a menos de KM_ALERTA de su mantenimiento"""
+    return vehiculos_alerta_km(vehiculos).count()
+
+
+def conteos_por_centro(vehiculos=None):
+    """Filas (centro_id, estado, tipo_capacidad, total) de los vehículos activos, en una sola consulta"""
+    if vehiculos is None:
+        vehiculos = Vehiculo.objects.all()
+    return list(
+        vehiculos.filter(activo=True).order_by().values_list('centro_operacion_id', 'estado', 'tipo_capacidad')
+        .annotate(total=Count('id'))
+    )
+
+
+def combinar_kpis(filas, centros, alertas):
+    """Arma el diccionario de KPIs a partir de las filas agrupadas"""
+    por_centro = {
+        centro_id: {'nombre': nombre, 'operativos': 0, 'mantenimiento': 0, 'fuera_servicio': 0, 'total': 0}
+        for centro_id, nombre in centros
+    }
+    kpis = {'total': 0, 'operativos': 0, 'mantenimiento': 0, 'fuera_servicio': 0, 'gc': 0, 'mc': 0}
+    
+    for centro_id, estado, tipo_capacidad, total in filas:
+        kpis['total'] += total
+        kpis[estado if estado != 'operativo' else 'operativos'] += total
+        kpis['gc' if tipo_capacidad == 'GC' else 'mc'] += total
+        
+        centro = por_centro.get(centro_id)
+        if centro is not None:
+            centro['total'] += total
+            centro[estado if estado != 'operativo' else 'operativos'] += total
+    
+    centros_data = []
+    for centro in por_centro.values():
+        centro['disponibilidad'] = _disponibilidad(centro['operativos'], centro['total'])
+        centros_data.append(centro)
+    
+    kpis['disponibilidad'] = _disponibilidad(kpis['operativos'], kpis['total'])
+    kpis['centros'] = centros_data
+    kpis['alertas'] = alertas
+    return kpis
+
+
+def lista_centros():
+    return list(CentroOperacional.objects.values_list('id', 'nombre'))
+
+
+def _conteos_y_alertas(alias):
+    """Consultas de un shard: conteos agrupados y alertas"""
+    vehiculos = Vehiculo.objects.using(alias)
+    return conteos_por_centro(vehiculos), contar_alertas_km(vehiculos)
+
+
+def _conteos_en_memoria(estado):
+    """Conteos y alertas del estado en memoria, como un parcial de _conteos_y_alertas"""
+    return estado.conteos_por_centro(), len(estado.ids_en_alerta(INTERVALO_MANTENIMIENTO_KM, KM_ALERTA))
+
+
+def _parciales():
+    if settings.FLOTA_ESTADO_MEMORIA:
+        return [consultar_estado(_conteos_en_memoria)]
+    return reunir_shards(_conteos_y_alertas)
+
+
+def _combinar_shards(parciales, centros):
+    filas = [fila for conteos, _ in parciales for fila in conteos]
+    return combinar_kpis(filas, centros, sum(alertas for _, alertas in parciales))
+
+
+def contar_alertas_flota():
+    """contar_alertas_km() sumado sobre todos los shards"""
+    if settings.FLOTA_ESTADO_MEMORIA:
+        return consultar_estado(lambda estado: len(estado.ids_en_alerta(INTERVALO_MANTENIMIENTO_KM, KM_ALERTA)))
+    return sum(reunir_shards(lambda alias: contar_alertas_km(Vehiculo.objects.using(alias))))
+
+
+def km_restantes_alerta():
+    """{id: km que faltan} de los vehículos en alerta, desde el estado en memoria"""
+    return consultar_estado(lambda estado: estado.km_restantes_en_alerta(INTERVALO_MANTENIMIENTO_KM, KM_ALERTA))
+
+
+def kpis_flota():
+    """KPIs generales, por tipo y por centro (3 consultas por shard)"""
+    return _combinar_shards(_parciales(), lista_centros())
+
+
+async def kpis_flota_async():
+    """Igual que kpis_flota(), con las consultas independientes y los shards en paralelo"""
+    centros, parciales = await asyncio.gather(
+        en_paralelo(lista_centros),
+        en_paralelo(_parciales) if settings.FLOTA_ESTADO_MEMORIA else reunir_shards_async(_conteos_y_alertas),
+    )
+    return _combinar_shards(parciales, centros)
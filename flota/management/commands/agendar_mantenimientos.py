@@ -0,0 +1,61 @@
+import datetime
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+from django.utils import timezone
+from flota.agenda import Agenda
+from flota.models import Mantenimiento
+from flota.shards import aliases_consulta
+
+
+class Command(BaseCommand):
+    help = (
+        'Reprograma los mantenimientos preventivos pendientes según la capacidad diaria de cada taller: '
+        'los críticos primero y ninguno antes de su fecha actual. Sin --aplicar solo informa los cambios.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--aplicar', action='store_true', help='Guardar las nuevas fechas')
+        parser.add_argument('--incluir-correctivos', action='store_true',
+                            help='Reprogramar también los correctivos pendientes')
+
+    def handle(self, *args, **options):
+        inicio = time.perf_counter()
+        hoy = timezone.localdate()
+        hasta = hoy + datetime.timedelta(days=settings.FLOTA_AGENDA_HORIZONTE)
+        alcance = Q(estado='programado', fecha_programada__gte=hoy, fecha_programada__lt=hasta)
+        if not options['incluir_correctivos']:
+            alcance &= Q(tipo='preventivo')
+        agenda = Agenda(desde=hoy, omitir=alcance)
+
+        trabajos = []
+        for alias in aliases_consulta():
+            for pk, proveedor_id, fecha, horas, prioridad in Mantenimiento.objects.using(alias).filter(alcance).values_list(
+                'id', 'proveedor_id', 'fecha_programada', 'tiempo_estimado_horas', 'prioridad'
+            ).iterator(chunk_size=2000):
+                trabajos.append({
+                    'id': pk, 'alias': alias, 'proveedor_id': proveedor_id,
+                    'fecha': fecha, 'horas': horas, 'prioridad': prioridad,
+                })
+
+        resultado = agenda.programar(trabajos)
+        movidos = [(trabajo, fecha) for trabajo, _, fecha in resultado if fecha and fecha != trabajo['fecha']]
+        sin_cupo = sum(1 for _, _, fecha in resultado if fecha is None)
+        segundos = time.perf_counter() - inicio
+
+        self.stdout.write(f'📅 {len(trabajos)} mantenimientos agendados en {segundos:.2f} s')
+        self.stdout.write(f'  ↪ {len(movidos)} cambian de fecha; {sin_cupo} sin cupo en el horizonte (se mantienen)')
+        for trabajo, fecha in movidos[:20]:
+            self.stdout.write(f"    #{trabajo['id']}: {trabajo['fecha']:%d/%m/%Y} → {fecha:%d/%m/%Y}")
+
+        if not options['aplicar']:
+            self.stdout.write(self.style.WARNING('Simulación: use --aplicar para guardar las nuevas fechas'))
+            return
+
+        # Uno a uno con save(): los signals mantienen el cubo, las series y la versión de datos
+        for trabajo, fecha in movidos:
+            mantenimiento = Mantenimiento.objects.using(trabajo['alias']).get(pk=trabajo['id'])
+            mantenimiento.fecha_programada = fecha
+            mantenimiento.save(update_fields=['fecha_programada', 'fecha_modificacion'])
+        self.stdout.write(self.style.SUCCESS(f'✅ {len(movidos)} mantenimientos reprogramados'))
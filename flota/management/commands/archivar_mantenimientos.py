@@ -0,0 +1,41 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from flota.archivo import archivar_mantenimientos, programar_archivo, resumen_archivo
+
+
+class Command(BaseCommand):
+    help = (
+        'Mueve los mantenimientos completados y cancelados más antiguos que --dias a la tabla de archivo, '
+        'por lotes y sin detener la aplicación. Con --programar deja además el archivado nocturno en la cola '
+        'de trabajos (luego el trabajador lo repite cada día).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dias', type=int, default=settings.FLOTA_ARCHIVO_DIAS,
+                            help=f'Antigüedad mínima en días (por defecto {settings.FLOTA_ARCHIVO_DIAS})')
+        parser.add_argument('--lote', type=int, default=settings.FLOTA_ARCHIVO_LOTE, help='Filas por transacción')
+        parser.add_argument('--pausa', type=float, default=0, help='Segundos de espera entre lotes')
+        parser.add_argument('--simular', action='store_true', help='Solo contar lo que se archivaría')
+        parser.add_argument('--programar', action='store_true', help='Programar el archivado nocturno')
+
+    def handle(self, *args, **options):
+        if options['dias'] < 0 or options['lote'] < 1:
+            raise CommandError('--dias no puede ser negativo y --lote debe ser al menos 1')
+
+        resultado = archivar_mantenimientos(
+            dias=options['dias'], lote=options['lote'], pausa=options['pausa'], simular=options['simular'],
+        )
+        accion = 'Se archivarían' if options['simular'] else 'Archivados'
+        self.stdout.write(self.style.SUCCESS(
+            f"\n🗄️  {accion} {resultado['archivados']:,} mantenimientos cerrados antes del {resultado['limite']}\n"
+        ))
+
+        for alias, (vigentes, archivados) in resumen_archivo().items():
+            self.stdout.write(
+                f"  {alias}: {resultado['por_base'][alias]:,} en esta ejecución; "
+                f"{vigentes:,} vigentes, {archivados:,} en archivo"
+            )
+
+        if options['programar']:
+            trabajo = programar_archivo()
+            self.stdout.write(f'\n⏰ Próximo archivado desde {trabajo.disponible_desde:%Y-%m-%d %H:%M}')
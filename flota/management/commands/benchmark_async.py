@@ -0,0 +1,106 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.test import Client, AsyncClient
+from django.urls import reverse
+
+
+URLS_POR_DEFECTO = [
+    'flota:dashboard',
+    'flota:estadisticas',
+    'flota:alertas',
+    'flota:api_alertas_count',
+    'flota:api_kpis',
+]
+
+
+class Command(BaseCommand):
+    help = 'Compara el throughput de las vistas de lectura servidas vía WSGI (sync) y ASGI (async)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=8,
+                            help='Hilos WSGI, y tamaño del pool de hilos del event loop ASGI')
+        parser.add_argument('--clientes', type=int, default=32,
+                            help='Clientes concurrentes (ASGI); WSGI atiende como máximo --workers a la vez')
+        parser.add_argument('--requests', type=int, default=400, help='Requests por modo')
+        parser.add_argument('--latencia-ms', type=float, default=0,
+                            help='Latencia simulada por consulta SQL (emula una BD en red)')
+        parser.add_argument('--usuario', default=None, help='Usuario para la sesión (por defecto el primer superusuario)')
+
+    def handle(self, *args, **options):
+        usuario = self.obtener_usuario(options['usuario'])
+        urls = [reverse(nombre) for nombre in URLS_POR_DEFECTO]
+        self.instalar_latencia(options['latencia_ms'])
+        
+        # Una sola sesión compartida por todos los clientes
+        cliente = Client()
+        cliente.force_login(usuario)
+        self.cookies = cliente.cookies
+        
+        self.stdout.write(self.style.SUCCESS(
+            f'\n⏱️  Benchmark WSGI vs ASGI — {options["workers"]} workers, '
+            f'{options["requests"]} requests, latencia SQL {options["latencia_ms"]} ms\n'
+        ))
+        
+        wsgi = self.medir_wsgi(urls, options['workers'], options['requests'])
+        asgi = asyncio.run(self.medir_asgi(urls, options['workers'], options['clientes'], options['requests']))
+        
+        self.stdout.write(f'  • WSGI (sync, {options["workers"]} hilos):  {wsgi:8.1f} req/s')
+        self.stdout.write(f'  • ASGI (async, {options["clientes"]} clientes): {asgi:8.1f} req/s')
+        self.stdout.write(self.style.SUCCESS(f'  • Relación ASGI/WSGI: {asgi / wsgi:.2f}x\n'))
+
+    def obtener_usuario(self, username):
+        usuarios = User.objects.all()
+        usuario = usuarios.filter(username=username).first() if username else usuarios.filter(is_superuser=True).first()
+        if usuario is None:
+            raise CommandError('No hay usuario para autenticar. Ejecute poblar_acme_trans o use --usuario.')
+        return usuario
+
+    def instalar_latencia(self, latencia_ms):
+        if not latencia_ms:
+            return
+        
+        def demorar(execute, sql, params, many, context):
+            time.sleep(latencia_ms / 1000)
+            return execute(sql, params, many, context)
+        
+        def agregar_demora(sender, connection, **kwargs):
+            connection.execute_wrappers.append(demorar)
+        
+        connection_created.connect(agregar_demora, weak=False)
+        for conexion in connections.all():
+            conexion.execute_wrappers.append(demorar)
+
+    def verificar(self, response, url):
+        if response.status_code != 200:
+            raise CommandError(f'{url} respondió {response.status_code}')
+
+    def medir_wsgi(self, urls, workers, total):
+        def trabajar(indices):
+            cliente = Client()
+            cliente.cookies = self.cookies
+            for i in indices:
+                self.verificar(cliente.get(urls[i % len(urls)]), urls[i % len(urls)])
+        
+        inicio = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            list(pool.map(trabajar, [range(w, total, workers) for w in range(workers)]))
+        return total / (time.perf_counter() - inicio)
+
+    async def medir_asgi(self, urls, workers, clientes, total):
+        loop = asyncio.get_running_loop()
+        loop.set_default_executor(ThreadPoolExecutor(max_workers=workers))
+        
+        async def trabajar(indices):
+            cliente = AsyncClient()
+            cliente.cookies = self.cookies
+            for i in indices:
+                self.verificar(await cliente.get(urls[i % len(urls)]), urls[i % len(urls)])
+        
+        inicio = time.perf_counter()
+        await asyncio.gather(*(trabajar(range(c, total, clientes)) for c in range(clientes)))
+        return total / (time.perf_counter() - inicio)
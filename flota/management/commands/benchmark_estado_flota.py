@@ -0,0 +1,121 @@
+import random
+import time
+import tracemalloc
+from collections import Counter
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS, transaction
+from flota.estado_flota import CAMPOS, EstadoFlota, ESTADOS, TIPOS
+from flota.indicadores import (
+    INTERVALO_MANTENIMIENTO_KM, KM_ALERTA, conteos_por_centro, contar_alertas_km, nivel_alerta_km,
+)
+from flota.models import CentroOperacional, Vehiculo
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmark de KPIs y alertas: consultas agrupadas (indicadores.conteos_por_centro) e instancias de '
+        'Vehiculo vs el estado de la flota en columnas. Los vehículos sintéticos se insertan en una '
+        'transacción que se revierte al terminar'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--vehiculos', type=int, default=100000, help='Vehículos sintéticos')
+        parser.add_argument('--centros', type=int, default=30, help='Centros entre los que se reparten')
+        parser.add_argument('--repeticiones', type=int, default=5, help='Mediciones de latencia (se informa la mediana)')
+
+    def handle(self, *args, **options):
+        self.stdout.write(self.style.SUCCESS(
+            f'\n⏱️  Benchmark estado de la flota — {options["vehiculos"]:,} vehículos, {options["centros"]} centros\n'
+        ))
+        try:
+            with transaction.atomic(using=DEFAULT_DB_ALIAS):
+                self.poblar(options['vehiculos'], options['centros'])
+                self.medir(options['repeticiones'])
+                raise Rollback
+        except Rollback:
+            pass
+
+    def poblar(self, cantidad, centros):
+        """Centros y vehículos sintéticos (solo los nuevos entran en las mediciones)"""
+        random.seed(1)
+        Vehiculo.objects.using(DEFAULT_DB_ALIAS).update(activo=False)
+        centros = CentroOperacional.objects.using(DEFAULT_DB_ALIAS).bulk_create([
+            CentroOperacional(nombre=f'Benchmark {i}', direccion='-', ciudad='-', telefono='-', responsable='-')
+            for i in range(centros)
+        ])
+        Vehiculo.objects.using(DEFAULT_DB_ALIAS).bulk_create((
+            Vehiculo(
+                patente=f'BM{i:06d}', marca='Volvo', modelo='FH', año=random.randint(2005, 2024),
+                tipo_capacidad=random.choice(TIPOS), estado=random.choice(ESTADOS),
+                kilometraje_actual=random.randint(0, 400000), centro_operacion_id=random.choice(centros).pk,
+            )
+            for i in range(cantidad)
+        ), batch_size=5000)
+
+    def medir(self, repeticiones):
+        vehiculos = Vehiculo.objects.using(DEFAULT_DB_ALIAS)
+        instancias, memoria_instancias = self.medir_memoria(lambda: list(vehiculos.filter(activo=True)))
+        estado, memoria_columnas = self.medir_memoria(lambda: EstadoFlota.desde_filas(
+            vehiculos.filter(activo=True).order_by().values_list(*CAMPOS).iterator(chunk_size=5000)
+        ))
+        carga = self.medir_latencia(lambda: EstadoFlota.desde_filas(
+            vehiculos.filter(activo=True).order_by().values_list(*CAMPOS).iterator(chunk_size=5000)
+        ), 1)
+        resultados = {
+            'Consultas agrupadas (indicadores.conteos_por_centro)': lambda: self.kpis_consultas(vehiculos),
+            'Instancias de modelo': lambda: self.kpis_instancias(instancias),
+            'Estado en columnas': lambda: self.kpis_columnas(estado),
+        }
+        latencias = {nombre: self.medir_latencia(funcion, repeticiones) for nombre, funcion in resultados.items()}
+        if len({repr(funcion()) for funcion in resultados.values()}) != 1:
+            self.stdout.write(self.style.ERROR('  ✗ Los resultados no coinciden'))
+        cambio = self.medir_latencia(
+            lambda: estado.aplicar(random.choice(estado.ids), 'modificacion', {'kilometraje_actual': 1000}), repeticiones,
+        )
+
+        memorias = {'Instancias de modelo': memoria_instancias, 'Estado en columnas': memoria_columnas}
+        for nombre, latencia in latencias.items():
+            self.stdout.write(self.style.SUCCESS(f'📊 {nombre}:'))
+            if nombre in memorias:
+                self.stdout.write(f'  • Memoria: {memorias[nombre] / 2 ** 20:10.1f} MB')
+            self.stdout.write(f'  • KPIs + alertas: {latencia * 1000:8.1f} ms\n')
+        self.stdout.write(f'  • Carga inicial del estado: {carga * 1000:8.1f} ms')
+        self.stdout.write(f'  • Aplicar un cambio: {cambio * 1e6:6.1f} µs\n')
+        consultas, columnas = latencias['Consultas agrupadas (indicadores.conteos_por_centro)'], latencias['Estado en columnas']
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ {consultas / max(columnas, 1e-9):.1f}x más rápido que las consultas agrupadas, '
+            f'{memoria_instancias / max(memoria_columnas, 1):.0f}x menos memoria que las instancias'
+        ))
+
+    def kpis_consultas(self, vehiculos):
+        return sorted(conteos_por_centro(vehiculos)), contar_alertas_km(vehiculos)
+
+    def kpis_instancias(self, instancias):
+        conteos = Counter((v.centro_operacion_id, v.estado, v.tipo_capacidad) for v in instancias)
+        alertas = sum(1 for v in instancias if nivel_alerta_km(v.kilometraje_actual, v.estado))
+        return sorted((*clave, total) for clave, total in conteos.items()), alertas
+
+    def kpis_columnas(self, estado):
+        return sorted(estado.conteos_por_centro()), len(estado.ids_en_alerta(INTERVALO_MANTENIMIENTO_KM, KM_ALERTA))
+
+    def medir_memoria(self, funcion):
+        tracemalloc.start()
+        try:
+            resultado = funcion()
+            memoria, _ = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        return resultado, memoria
+
+    def medir_latencia(self, funcion, repeticiones):
+        tiempos = []
+        for _ in range(max(repeticiones, 1)):
+            inicio = time.perf_counter()
+            funcion()
+            tiempos.append(time.perf_counter() - inicio)
+        tiempos.sort()
+        return tiempos[len(tiempos) // 2]
@@ -0,0 +1,125 @@
+import os
+import random
+import sqlite3
+import tempfile
+import threading
+import time
+from django.core.management.base import BaseCommand
+from flota.sqlite import pragmas_configurados
+
+
+PERFILES = {
+    # Configuración por defecto de Django 4.2: journal DELETE, BEGIN diferido
+    'por_defecto': {
+        'pragmas': {'journal_mode': 'DELETE', 'synchronous': 'FULL'},
+        'begin': 'BEGIN',
+    },
+    'produccion': {
+        'pragmas': None,  # FLOTA_SQLITE_PRAGMAS
+        'begin': 'BEGIN IMMEDIATE',
+    },
+}
+
+
+class Command(BaseCommand):
+    help = 'Benchmark de lecturas/escrituras concurrentes en SQLite: perfil por defecto vs perfil de producción'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--vehiculos', type=int, default=10000, help='Filas en la tabla de prueba')
+        parser.add_argument('--escritores', type=int, default=4, help='Hilos que actualizan kilometraje')
+        parser.add_argument('--lectores', type=int, default=8, help='Hilos que consultan agregados y detalles')
+        parser.add_argument('--segundos', type=float, default=5, help='Duración de cada perfil')
+
+    def handle(self, *args, **options):
+        self.stdout.write(self.style.SUCCESS(
+            f'\n⏱️  Benchmark SQLite — {options["escritores"]} escritores, {options["lectores"]} lectores, '
+            f'{options["segundos"]} s por perfil\n'
+        ))
+        
+        for nombre, perfil in PERFILES.items():
+            with tempfile.TemporaryDirectory() as directorio:
+                ruta = os.path.join(directorio, 'benchmark.sqlite3')
+                resultado = self.medir(ruta, perfil, options)
+            
+            self.stdout.write(self.style.SUCCESS(f'📊 Perfil {nombre}:'))
+            self.stdout.write(f'  • Escrituras: {resultado["escrituras"] / options["segundos"]:10.1f} tx/s')
+            self.stdout.write(f'  • Lecturas:   {resultado["lecturas"] / options["segundos"]:10.1f} consultas/s')
+            self.stdout.write(f'  • Errores "database is locked": {resultado["bloqueos"]:,}')
+            self.stdout.write(f'  • Latencia p95 escritura: {resultado["p95_escritura"]:.1f} ms\n')
+
+    def conectar(self, ruta, perfil):
+        conexion = sqlite3.connect(ruta, timeout=5, isolation_level=None, check_same_thread=False)
+        pragmas = perfil['pragmas'] if perfil['pragmas'] is not None else pragmas_configurados()
+        for nombre, valor in pragmas.items():
+            conexion.execute(f'PRAGMA {nombre} = {valor}')
+        return conexion
+
+    def preparar(self, ruta, perfil, total):
+        conexion = self.conectar(ruta, perfil)
+        conexion.execute(
+            'CREATE TABLE vehiculo (id INTEGER PRIMARY KEY, patente TEXT, estado TEXT, '
+            'centro INTEGER, kilometraje INTEGER, fecha_modificacion REAL)'
+        )
+        estados = ['operativo', 'mantenimiento', 'fuera_servicio']
+        conexion.execute('BEGIN')
+        conexion.executemany(
+            'INSERT INTO vehiculo VALUES (?, ?, ?, ?, ?, ?)',
+            ((i, f'BM-{i:06d}', estados[i % 3], i % 3, random.randint(0, 300000), time.time()) for i in range(1, total + 1))
+        )
+        conexion.execute('COMMIT')
+        conexion.close()
+
+    def medir(self, ruta, perfil, options):
+        self.preparar(ruta, perfil, options['vehiculos'])
+        fin = time.monotonic() + options['segundos']
+        contadores = {'escrituras': 0, 'lecturas': 0, 'bloqueos': 0}
+        latencias = []
+        lock = threading.Lock()
+        
+        def escritor():
+            conexion = self.conectar(ruta, perfil)
+            while time.monotonic() < fin:
+                inicio = time.perf_counter()
+                pk = random.randint(1, options['vehiculos'])
+                try:
+                    # Igual que ActualizarKilometrajeForm: leer, validar y luego escribir
+                    conexion.execute(perfil['begin'])
+                    km = conexion.execute('SELECT kilometraje FROM vehiculo WHERE id = ?', (pk,)).fetchone()[0]
+                    conexion.execute(
+                        'UPDATE vehiculo SET kilometraje = ?, fecha_modificacion = ? WHERE id = ?',
+                        (km + random.randint(1, 500), time.time(), pk)
+                    )
+                    conexion.execute('COMMIT')
+                    with lock:
+                        contadores['escrituras'] += 1
+                        latencias.append((time.perf_counter() - inicio) * 1000)
+                except sqlite3.OperationalError:
+                    if conexion.in_transaction:
+                        conexion.execute('ROLLBACK')
+                    with lock:
+                        contadores['bloqueos'] += 1
+            conexion.close()
+        
+        def lector():
+            conexion = self.conectar(ruta, perfil)
+            while time.monotonic() < fin:
+                try:
+                    conexion.execute('SELECT centro, estado, COUNT(*) FROM vehiculo GROUP BY centro, estado').fetchall()
+                    conexion.execute('SELECT * FROM vehiculo WHERE id = ?', (random.randint(1, options['vehiculos']),)).fetchone()
+                    with lock:
+                        contadores['lecturas'] += 2
+                except sqlite3.OperationalError:
+                    with lock:
+                        contadores['bloqueos'] += 1
+            conexion.close()
+        
+        hilos = [threading.Thread(target=escritor) for _ in range(options['escritores'])]
+        hilos += [threading.Thread(target=lector) for _ in range(options['lectores'])]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+        
+        latencias.sort()
+        contadores['p95_escritura'] = latencias[int(len(latencias) * 0.95)] if latencias else 0
+        return contadores
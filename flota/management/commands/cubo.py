@@ -0,0 +1,47 @@
+import time
+from django.core.management.base import BaseCommand, CommandError
+from flota.cubo import reconstruir_cubo, verificar_cubo
+
+
+class Command(BaseCommand):
+    help = (
+        'Verifica el cubo de indicadores contra las tablas de vehículos y mantenimientos. '
+        'Ejemplo: "manage.py cubo --reparar" (verifica y reconstruye si hay diferencias)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reparar', action='store_true', help='Reconstruir el cubo si hay diferencias')
+        parser.add_argument('--reconstruir', action='store_true', help='Reconstruir el cubo sin verificar')
+        parser.add_argument('--mostrar', type=int, default=10, help='Diferencias a listar por categoría')
+
+    def _reconstruir(self):
+        inicio = time.perf_counter()
+        celdas = reconstruir_cubo()
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ Cubo reconstruido: {celdas} celdas en {time.perf_counter() - inicio:.2f} s'
+        ))
+
+    def handle(self, *args, **options):
+        if options['reconstruir']:
+            self._reconstruir()
+            return
+
+        inicio = time.perf_counter()
+        resultado = verificar_cubo()
+        segundos = time.perf_counter() - inicio
+        diferencias = sum(len(resultado[categoria]) for categoria in ('faltantes', 'sobrantes', 'distintas'))
+        if not diferencias:
+            self.stdout.write(self.style.SUCCESS(
+                f'✅ Cubo consistente: {resultado["celdas"]} celdas verificadas en {segundos:.2f} s'
+            ))
+            return
+
+        for categoria in ('faltantes', 'sobrantes', 'distintas'):
+            if resultado[categoria]:
+                self.stdout.write(self.style.WARNING(f'⚠️  {len(resultado[categoria])} celda(s) {categoria}'))
+                for diferencia in resultado[categoria][:options['mostrar']]:
+                    self.stdout.write(f'    {diferencia}')
+
+        if not options['reparar']:
+            raise CommandError(f'El cubo tiene {diferencias} diferencia(s); ejecute con --reparar')
+        self._reconstruir()
@@ -0,0 +1,61 @@
+import time
+from django.core.management.base import BaseCommand
+from django.db import connections, DEFAULT_DB_ALIAS
+
+
+class Command(BaseCommand):
+    help = (
+        'Mantenimiento periódico de la base SQLite: PRAGMA optimize, ANALYZE, '
+        'checkpoint del WAL y VACUUM cuando hay fragmentación. '
+        'Programar con cron, por ejemplo: '
+        '"*/30 * * * * manage.py mantener_bd" y "0 3 * * 0 manage.py mantener_bd --analyze --vacuum"'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS, help='Alias de la base de datos')
+        parser.add_argument('--analyze', action='store_true', help='ANALYZE completo (actualiza estadísticas del planificador)')
+        parser.add_argument('--vacuum', action='store_true', help='VACUUM si la fragmentación supera --umbral')
+        parser.add_argument('--umbral', type=float, default=10.0,
+                            help='Porcentaje de páginas libres a partir del cual se ejecuta VACUUM (por defecto 10)')
+        parser.add_argument('--forzar-vacuum', action='store_true', help='VACUUM sin importar la fragmentación')
+        parser.add_argument('--wal', action='store_true',
+                            help='Pasa la base a journal_mode=WAL (queda en el archivo; lo hace también la migración 0003)')
+
+    def handle(self, *args, **options):
+        conexion = connections[options['database']]
+        if conexion.vendor != 'sqlite':
+            self.stdout.write(self.style.WARNING(f'⚠️  {options["database"]} no es SQLite; nada que hacer.'))
+            return
+        
+        self.stdout.write(self.style.SUCCESS(f'\n🧹 Mantenimiento de {conexion.settings_dict["NAME"]}\n'))
+        
+        with conexion.cursor() as cursor:
+            if options['wal']:
+                self.ejecutar(cursor, 'PRAGMA journal_mode = WAL')
+            
+            if options['analyze']:
+                self.ejecutar(cursor, 'ANALYZE')
+            
+            # Recalcula solo las estadísticas que el planificador considera desactualizadas
+            self.ejecutar(cursor, 'PRAGMA optimize')
+            
+            if options['vacuum'] or options['forzar_vacuum']:
+                paginas = cursor.execute('PRAGMA page_count').fetchone()[0]
+                libres = cursor.execute('PRAGMA freelist_count').fetchone()[0]
+                fragmentacion = (libres / paginas) * 100 if paginas else 0
+                self.stdout.write(f'  • Páginas libres: {libres:,} de {paginas:,} ({fragmentacion:.1f}%)')
+                
+                if options['forzar_vacuum'] or fragmentacion >= options['umbral']:
+                    self.ejecutar(cursor, 'VACUUM')
+                else:
+                    self.stdout.write(f'  ⏭️  VACUUM omitido (umbral {options["umbral"]}%)')
+            
+            # Trunca el archivo -wal para que no crezca indefinidamente
+            self.ejecutar(cursor, 'PRAGMA wal_checkpoint(TRUNCATE)')
+        
+        self.stdout.write(self.style.SUCCESS('\n✅ Mantenimiento completado\n'))
+
+    def ejecutar(self, cursor, sql):
+        inicio = time.perf_counter()
+        cursor.execute(sql)
+        self.stdout.write(f'  ✅ {sql} ({(time.perf_counter() - inicio) * 1000:.0f} ms)')
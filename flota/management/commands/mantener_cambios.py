@@ -0,0 +1,32 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from flota.cambios import cursor_actual, cursor_purgado, mantener_registro, programar_mantencion
+
+
+class Command(BaseCommand):
+    help = (
+        'Compacta el registro de cambios (un cambio por objeto entre los más antiguos que --compactar-dias) '
+        'y borra los más antiguos que --retencion-dias. Con --programar deja además la mantención nocturna '
+        'en la cola de trabajos (luego el trabajador la repite cada día).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--compactar-dias', type=int, default=settings.FLOTA_CAMBIOS_COMPACTAR_DIAS,
+                            help=f'Antigüedad para compactar (por defecto {settings.FLOTA_CAMBIOS_COMPACTAR_DIAS})')
+        parser.add_argument('--retencion-dias', type=int, default=settings.FLOTA_CAMBIOS_RETENCION_DIAS,
+                            help=f'Antigüedad para borrar (por defecto {settings.FLOTA_CAMBIOS_RETENCION_DIAS})')
+        parser.add_argument('--programar', action='store_true', help='Programar la mantención nocturna')
+
+    def handle(self, *args, **options):
+        if options['compactar_dias'] < 0 or options['retencion_dias'] < options['compactar_dias']:
+            raise CommandError('--compactar-dias no puede ser negativo ni mayor que --retencion-dias')
+
+        resultado = mantener_registro(options['compactar_dias'], options['retencion_dias'])
+        self.stdout.write(self.style.SUCCESS(
+            f"\n📜 Registro de cambios: {resultado['compactados']:,} compactados, {resultado['purgados']:,} borrados\n"
+        ))
+        self.stdout.write(f'  Cursores válidos: desde {cursor_purgado()} hasta {cursor_actual()}')
+
+        if options['programar']:
+            trabajo = programar_mantencion()
+            self.stdout.write(f'\n⏰ Próxima mantención desde {trabajo.disponible_desde:%Y-%m-%d %H:%M}')
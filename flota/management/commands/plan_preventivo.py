@@ -0,0 +1,50 @@
+import time
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from flota.planificacion import PlanInvalido, calcular_plan, crear_trabajos, resumen_plan
+
+
+class Command(BaseCommand):
+    help = (
+        'Programa los mantenimientos preventivos que vencen en el horizonte para toda la flota, con cupo en la '
+        'agenda de talleres. Omite los pares vehículo/tipo con un trabajo abierto: se puede repetir sin duplicar.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--horizonte', type=int, default=30, help='Días hacia adelante (por defecto 30)')
+        parser.add_argument('--proveedor', type=int, help='Asignar todo a este proveedor')
+        parser.add_argument('--centro', type=int, help='Solo los vehículos de este centro')
+        parser.add_argument('--ignorar-capacidad', action='store_true',
+                            help='Programar en la fecha de vencimiento sin consultar la agenda (requiere --proveedor)')
+        parser.add_argument('--usuario', help='Usuario que queda como programador (por defecto el primer superusuario)')
+        parser.add_argument('--simular', action='store_true', help='Solo mostrar el plan, sin crear mantenimientos')
+
+    def handle(self, *args, **options):
+        usuarios = User.objects.filter(username=options['usuario']) if options['usuario'] else User.objects.filter(is_superuser=True)
+        usuario = usuarios.order_by('id').first()
+        if usuario is None:
+            raise CommandError('No se encontró el usuario programador')
+
+        inicio = time.perf_counter()
+        try:
+            plan = calcular_plan(
+                options['horizonte'], options['proveedor'], not options['ignorar_capacidad'], options['centro'],
+            )
+        except PlanInvalido as error:
+            raise CommandError(str(error))
+        resumen = resumen_plan(plan)
+        self.stdout.write(f"📋 Plan a {options['horizonte']} días calculado en {time.perf_counter() - inicio:.2f} s")
+        self.stdout.write(f"  ↪ {resumen['trabajos']} mantenimientos ({resumen['horas']} horas de taller)")
+        for nombre, cantidad in resumen['por_tipo']:
+            self.stdout.write(f'    {nombre}: {cantidad}')
+        self.stdout.write(f"  ↪ {resumen['con_trabajo_abierto']} pares con un trabajo abierto (omitidos)")
+        if resumen['sin_cupo']:
+            self.stdout.write(self.style.WARNING(f"  ↪ {resumen['sin_cupo']} sin cupo en la agenda (quedan para la próxima ejecución)"))
+
+        if options['simular']:
+            self.stdout.write(self.style.WARNING('Simulación: no se creó ningún mantenimiento'))
+            return
+
+        inicio = time.perf_counter()
+        creados = crear_trabajos(plan['trabajos'], usuario)
+        self.stdout.write(self.style.SUCCESS(f'✅ {creados} mantenimientos programados en {time.perf_counter() - inicio:.2f} s'))
@@ -0,0 +1,55 @@
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, transaction, DEFAULT_DB_ALIAS
+from flota.models import CentroOperacional, DemandaCentro, TipoMantenimiento, Proveedor, Vehiculo
+from flota import shards
+
+
+class Command(BaseCommand):
+    help = 'Migra los shards por centro, copia las tablas de referencia y mueve vehículos y mantenimientos desde default'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=1000, help='Filas por lote al mover datos')
+        parser.add_argument('--sin-mover', action='store_true', help='Solo preparar esquema y espejos')
+
+    def handle(self, *args, **options):
+        if not shards.sharding_activo():
+            raise CommandError('No hay shards configurados. Defina ACME_SHARDS, por ejemplo "1,2,3".')
+        
+        self.stdout.write(self.style.SUCCESS('\n🧩 Preparando shards por centro...\n'))
+        
+        for alias in shards.aliases_shards():
+            self.stdout.write(f'📦 {alias}')
+            call_command('migrate', 'flota', database=alias, verbosity=0)
+            # El schema editor reactiva foreign_keys: los usuarios no existen en el shard
+            connections[alias].disable_constraint_checking()
+            self.stdout.write('  ✅ Esquema listo')
+        
+        # replicar_referencia escribe en todos los shards: recién con todos migrados
+        self.copiar_referencias()
+        self.stdout.write('📋 Tablas de referencia copiadas')
+        
+        if not options['sin_mover']:
+            for centro_id, alias in sorted(shards.mapa_shards().items()):
+                self.mover_centro(centro_id, alias, options['lote'])
+        
+        self.stdout.write(self.style.SUCCESS('\n✅ Shards preparados\n'))
+
+    def copiar_referencias(self):
+        for modelo in (CentroOperacional, DemandaCentro, TipoMantenimiento, Proveedor):
+            for instancia in modelo.objects.using(DEFAULT_DB_ALIAS).iterator():
+                shards.replicar_referencia(instancia)
+
+    def mover_centro(self, centro_id, alias, lote):
+        vehiculos = Vehiculo.objects.using(DEFAULT_DB_ALIAS).filter(centro_operacion_id=centro_id).order_by('pk')
+        movidos = 0
+        while True:
+            ids = list(vehiculos.values_list('pk', flat=True)[:lote])
+            if not ids:
+                break
+            # Copia raw y borrado sin signals: los vehículos cambian de base, no se dan de baja
+            with transaction.atomic(using=alias), transaction.atomic(using=DEFAULT_DB_ALIAS):
+                shards.mover_vehiculos(ids, DEFAULT_DB_ALIAS, alias)
+            movidos += len(ids)
+        
+        self.stdout.write(f'  🚛 Centro {centro_id} → {alias}: {movidos:,} vehículos movidos')
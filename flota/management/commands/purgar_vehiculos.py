@@ -0,0 +1,37 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from flota.eliminacion import pendientes_de_purga, purgar_vehiculo
+
+
+class Command(BaseCommand):
+    help = (
+        'Borra por lotes el historial de los vehículos marcados para eliminar (inactivos) y luego los vehículos. '
+        'Normalmente lo hace el trabajador (tarea purgar_vehiculo); este comando sirve sin trabajador en marcha '
+        'o para terminar purgas que quedaron a medias.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=settings.FLOTA_ELIMINACION_LOTE, help='Filas por transacción')
+        parser.add_argument('--pausa', type=float, default=0, help='Segundos de espera entre lotes')
+        parser.add_argument('--simular', action='store_true', help='Solo listar los vehículos pendientes')
+
+    def handle(self, *args, **options):
+        if options['lote'] < 1:
+            raise CommandError('--lote debe ser al menos 1')
+
+        pendientes = pendientes_de_purga()
+        total = sum(len(ids) for ids in pendientes.values())
+        self.stdout.write(f'\n🗑️  {total} vehículo(s) marcados para eliminar\n')
+        if options['simular']:
+            for alias, ids in pendientes.items():
+                self.stdout.write(f'  {alias}: {ids}')
+            return
+
+        for ids in pendientes.values():
+            for vehiculo_id in ids:
+                resultado = purgar_vehiculo(vehiculo_id, lote=options['lote'], pausa=options['pausa'])
+                self.stdout.write(
+                    f"  Vehículo {vehiculo_id}: {resultado.get('borrados', 0):,} mantenimientos borrados"
+                    + ('' if resultado.get('eliminado') else f" ({resultado.get('omitido', 'incompleto')})")
+                )
+        self.stdout.write(self.style.SUCCESS('\n✅ Purga terminada'))
@@ -0,0 +1,34 @@
+import time
+from django.core.management.base import BaseCommand
+from flota.rebalanceo import aplicar_rebalanceo, proponer_rebalanceo
+
+
+class Command(BaseCommand):
+    help = (
+        'Propone el mínimo de traslados de vehículos operativos entre centros para cubrir la demanda por tipo de '
+        'capacidad (DemandaCentro) sin exceder la capacidad máxima de cada centro.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--aplicar', action='store_true', help='Trasladar los vehículos propuestos')
+
+    def handle(self, *args, **options):
+        inicio = time.perf_counter()
+        propuesta = proponer_rebalanceo()
+        resumen = propuesta['resumen']
+        self.stdout.write(f"🔀 Propuesta calculada en {time.perf_counter() - inicio:.2f} s")
+        self.stdout.write(f"  ↪ {resumen['traslados']} traslados")
+        self.stdout.write(f"  ↪ Operativos faltantes: {resumen['faltantes']} → {resumen['faltantes_despues']}")
+        self.stdout.write(f"  ↪ Vehículos sobre la capacidad: {resumen['exceso']} → {resumen['exceso_despues']}")
+        for transferencia in propuesta['transferencias']:
+            self.stdout.write(
+                f"    {transferencia['origen_nombre']} → {transferencia['destino_nombre']}: "
+                f"{transferencia['cantidad']} {transferencia['tipo_capacidad']}"
+            )
+
+        if not options['aplicar']:
+            return
+        resultado = aplicar_rebalanceo(propuesta)
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ {resultado['trasladados']} vehículos trasladados ({resultado['rechazados']} omitidos)"
+        ))
@@ -0,0 +1,16 @@
+import time
+from django.core.management.base import BaseCommand
+from flota.costos import reconstruir_resumen
+
+
+class Command(BaseCommand):
+    help = (
+        'Reconstruye el resumen mensual de costos (ResumenCostoMensual) desde los mantenimientos completados. '
+        'Necesario una vez tras migrar y después de cargas masivas que no disparan signals.'
+    )
+
+    def handle(self, *args, **options):
+        inicio = time.perf_counter()
+        filas = reconstruir_resumen()
+        segundos = time.perf_counter() - inicio
+        self.stdout.write(self.style.SUCCESS(f'✅ Resumen de costos reconstruido: {filas} filas en {segundos:.2f} s'))
@@ -0,0 +1,24 @@
+import time
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS
+from flota.replica import refrescar_replica, alias_replica
+
+
+class Command(BaseCommand):
+    help = 'Copia la base SQLite primaria sobre la réplica local de solo lectura (API de backup de SQLite)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--origen', default=DEFAULT_DB_ALIAS, help='Alias de la base primaria')
+        parser.add_argument('--intervalo', type=float, default=0,
+                            help='Repetir cada N segundos (0 = una sola vez)')
+
+    def handle(self, *args, **options):
+        if alias_replica() is None:
+            raise CommandError('No hay réplica configurada. Defina ACME_REPLICA_SQLITE con la ruta del archivo.')
+        
+        while True:
+            segundos = refrescar_replica(origen=options['origen'])
+            self.stdout.write(self.style.SUCCESS(f'✅ Réplica "{alias_replica()}" actualizada en {segundos * 1000:.0f} ms'))
+            if not options['intervalo']:
+                break
+            time.sleep(options['intervalo'])
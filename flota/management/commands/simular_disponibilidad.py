@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand, CommandError
+from flota.simulacion import SimulacionInvalida, simular
+
+
+class Command(BaseCommand):
+    help = (
+        'Simulación Monte Carlo de la disponibilidad de la flota: percentiles p5/p50/p95 por centro para los '
+        'próximos días, con preventivos, correctivos aleatorios y la capacidad de los talleres.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dias', type=int, default=90, help='Horizonte en días (por defecto 90)')
+        parser.add_argument('--corridas', type=int, help='Trayectorias simuladas (por defecto FLOTA_SIMULACION_CORRIDAS)')
+        parser.add_argument('--centro', type=int, action='append', help='Informar solo este centro (repetible)')
+        parser.add_argument('--procesos', type=int, help='Procesos del pool (1 = sin pool)')
+        parser.add_argument('--semilla', type=int, help='Semilla para repetir una simulación')
+        parser.add_argument('--sin-preventivo', action='store_true',
+                            help='Escenario sin programa preventivo (los vencidos fallan más)')
+        parser.add_argument('--cada', type=int, default=7, help='Mostrar un día de cada N (por defecto 7)')
+
+    def handle(self, *args, **options):
+        try:
+            resultado = simular(
+                options['dias'], options['corridas'], options['centro'], not options['sin_preventivo'],
+                options['semilla'], options['procesos'],
+            )
+        except SimulacionInvalida as error:
+            raise CommandError(str(error))
+
+        escenario = 'sin preventivo' if options['sin_preventivo'] else 'con preventivo'
+        self.stdout.write(self.style.SUCCESS(
+            f"\n🎲 {resultado['corridas']:,} corridas a {options['dias']} días ({escenario}, semilla {resultado['semilla']}) "
+            f"en {resultado['segundos']:.2f} s\n"
+        ))
+        dias = range(0, len(resultado['fechas']), max(options['cada'], 1))
+        self.stdout.write('  Disponibilidad % (p5 / p50 / p95)')
+        self.stdout.write(f"  {'':24}" + ''.join(f"{resultado['fechas'][dia][5:]:>20}" for dia in dias))
+        for nombre, fila in [(centro['nombre'], centro) for centro in resultado['centros']] + [('Flota', resultado['flota'])]:
+            self.stdout.write(f"  {nombre[:22]:24}" + ''.join(
+                f"{fila['p5'][dia]:>7.1f}{fila['p50'][dia]:>6.1f}{fila['p95'][dia]:>7.1f}" for dia in dias
+            ))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+from flota.disponibilidad import programar_snapshot, tomar_snapshot
+
+
+class Command(BaseCommand):
+    help = (
+        'Toma el snapshot de disponibilidad de hoy (conteos por centro, capacidad y estado) y deja programado '
+        'el del día siguiente en la cola de trabajos. Basta ejecutarlo una vez: luego el trabajador lo repite cada día.'
+    )
+
+    def handle(self, *args, **options):
+        resultado = tomar_snapshot()
+        trabajo = programar_snapshot()
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ Snapshot del {resultado['fecha']}: {resultado['filas']} filas; "
+            f"el próximo se ejecuta desde {trabajo.disponible_desde:%Y-%m-%d %H:%M}"
+        ))
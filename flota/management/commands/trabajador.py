@@ -0,0 +1,74 @@
+import multiprocessing
+import signal
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+from flota.trabajos import nombre_trabajador, procesar_pendientes
+
+
+_detener = multiprocessing.Event()
+
+
+def _detener_al_recibir(*_):
+    _detener.set()
+
+
+def _bucle(espera, una_vez, hijo=False):
+    """Ciclo de un proceso trabajador: vaciar la cola, dormir, repetir"""
+    if hijo:
+        signal.signal(signal.SIGINT, signal.SIG_IGN)  # el proceso principal coordina la detención
+    trabajador = nombre_trabajador()
+    while not _detener.is_set():
+        procesados = procesar_pendientes(trabajador)
+        if una_vez and not procesados:
+            break
+        if not procesados:
+            _detener.wait(espera)
+    connections.close_all()
+
+
+class Command(BaseCommand):
+    help = (
+        'Ejecuta los trabajos en segundo plano (reportes, emails, caché). '
+        'Ejemplo: "manage.py trabajador --procesos 4"'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--procesos', type=int, default=getattr(settings, 'FLOTA_TRABAJOS_PROCESOS', 2),
+                            help='Cantidad de procesos trabajadores')
+        parser.add_argument('--espera', type=float, default=getattr(settings, 'FLOTA_TRABAJOS_ESPERA', 2),
+                            help='Segundos entre consultas cuando la cola está vacía')
+        parser.add_argument('--una-vez', action='store_true',
+                            help='Vaciar la cola y terminar (útil para cron o pruebas)')
+
+    def handle(self, *args, **options):
+        procesos = max(options['procesos'], 1)
+        self.stdout.write(self.style.SUCCESS(f'\n⚙️  Trabajador iniciado con {procesos} proceso(s)\n'))
+
+        # SIGINT/SIGTERM: terminar el trabajo en curso y salir
+        signal.signal(signal.SIGINT, _detener_al_recibir)
+        signal.signal(signal.SIGTERM, _detener_al_recibir)
+
+        if procesos == 1:
+            _bucle(options['espera'], options['una_vez'])
+            return
+
+        # fork: los hijos heredan Django ya inicializado; sin conexiones abiertas que compartir
+        connections.close_all()
+        contexto = multiprocessing.get_context('fork')
+        hijos = [
+            contexto.Process(target=_bucle, args=(options['espera'], options['una_vez'], True), daemon=True)
+            for _ in range(procesos)
+        ]
+        for hijo in hijos:
+            hijo.start()
+
+        while any(hijo.is_alive() for hijo in hijos) and not _detener.is_set():
+            time.sleep(0.5)
+
+        # Cada hijo termina el trabajo en curso antes de salir
+        _detener.set()
+        for hijo in hijos:
+            hijo.join()
+        self.stdout.write(self.style.SUCCESS('\n✅ Trabajador detenido\n'))
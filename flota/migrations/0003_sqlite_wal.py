@@ -0,0 +1,26 @@
+from django.db import migrations
+
+
+def activar_wal(apps, schema_editor):
+    # journal_mode queda guardado en el archivo: basta aplicarlo una vez por base
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute('PRAGMA journal_mode = WAL')
+
+
+def desactivar_wal(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute('PRAGMA journal_mode = DELETE')
+
+
+class Migration(migrations.Migration):
+    # El modo de journal no se puede cambiar dentro de una transacción
+    atomic = False
+
+    dependencies = [
+        ('flota', '0002_versiondatos'),
+    ]
+
+    operations = [
+        # El hint deja que un router la aplique también en las demás bases con vehículos
+        migrations.RunPython(activar_wal, desactivar_wal, hints={'model_name': 'vehiculo'}),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 4.2.7 on 2026-10-19 13:09
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('flota', '0003_sqlite_wal'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Trabajo',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(max_length=50, verbose_name='Tipo')),
+                ('parametros', models.JSONField(blank=True, default=dict, verbose_name='Parámetros')),
+                ('estado', models.CharField(choices=[('pendiente', 'Pendiente'), ('en_proceso', 'En Proceso'), ('completado', 'Completado'), ('fallido', 'Fallido')], default='pendiente', max_length=20, verbose_name='Estado')),
+                ('prioridad', models.SmallIntegerField(default=5, verbose_name='Prioridad')),
+                ('clave_idempotencia', models.CharField(blank=True, max_length=150, null=True, unique=True, verbose_name='Clave de Idempotencia')),
+                ('intentos', models.IntegerField(default=0, verbose_name='Intentos')),
+                ('max_intentos', models.IntegerField(default=5, verbose_name='Máximo de Intentos')),
+                ('disponible_desde', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Disponible Desde')),
+                ('trabajador', models.CharField(blank=True, max_length=100, verbose_name='Trabajador')),
+                ('bloqueado_hasta', models.DateTimeField(blank=True, null=True, verbose_name='Bloqueado Hasta')),
+                ('resultado', models.JSONField(blank=True, null=True, verbose_name='Resultado')),
+                ('error', models.TextField(blank=True, verbose_name='Último Error')),
+                ('fecha_creacion', models.DateTimeField(auto_now_add=True)),
+                ('fecha_inicio', models.DateTimeField(blank=True, null=True)),
+                ('fecha_fin', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name': 'Trabajo',
+                'verbose_name_plural': 'Trabajos',
+                'ordering': ['-fecha_creacion'],
+                'indexes': [models.Index(fields=['estado', 'prioridad', 'disponible_desde'], name='trabajo_cola_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 4.2.7 on 2026-10-19 13:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('flota', '0004_trabajo'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EventoNotificacion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(choices=[('mantenimiento_completado', 'Mantenimiento Completado'), ('prioridad_critica', 'Mantenimiento de Prioridad Crítica'), ('alerta_km', 'Cambio de Nivel de Alerta')], max_length=30, verbose_name='Tipo')),
+                ('destinatario', models.CharField(max_length=200, verbose_name='Destinatario')),
+                ('titulo', models.CharField(max_length=200, verbose_name='Título')),
+                ('detalle', models.TextField(blank=True, verbose_name='Detalle')),
+                ('referencia', models.CharField(blank=True, max_length=50, verbose_name='Referencia')),
+                ('archivo', models.CharField(blank=True, max_length=200, verbose_name='Archivo Adjunto')),
+                ('fecha_creacion', models.DateTimeField(auto_now_add=True)),
+                ('fecha_envio', models.DateTimeField(blank=True, null=True, verbose_name='Fecha de Envío')),
+            ],
+            options={
+                'verbose_name': 'Evento de Notificación',
+                'verbose_name_plural': 'Eventos de Notificación',
+                'ordering': ['-fecha_creacion'],
+                'indexes': [models.Index(fields=['fecha_envio', 'destinatario'], name='evento_pendiente_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 4.2.7 on 2026-10-19 13:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('flota', '0005_eventonotificacion'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResumenCostoMensual',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('mes', models.DateField(verbose_name='Mes')),
+                ('vehiculo_id', models.BigIntegerField(verbose_name='Vehículo')),
+                ('centro_id', models.BigIntegerField(verbose_name='Centro Operacional')),
+                ('proveedor_id', models.BigIntegerField(verbose_name='Proveedor')),
+                ('tipo_mantenimiento_id', models.BigIntegerField(verbose_name='Tipo de Mantenimiento')),
+                ('cantidad', models.IntegerField(default=0, verbose_name='Mantenimientos')),
+                ('costo_estimado', models.DecimalField(decimal_places=0, default=0, max_digits=14, verbose_name='Costo Estimado')),
+                ('costo_real', models.DecimalField(decimal_places=0, default=0, max_digits=14, verbose_name='Costo Real')),
+                ('con_sobrecosto', models.IntegerField(default=0, verbose_name='Con Sobrecosto')),
+                ('tramo_ahorro', models.IntegerField(default=0, verbose_name='Bajo lo Estimado')),
+                ('tramo_0_10', models.IntegerField(default=0, verbose_name='0-10%')),
+                ('tramo_10_25', models.IntegerField(default=0, verbose_name='10-25%')),
+                ('tramo_25_50', models.IntegerField(default=0, verbose_name='25-50%')),
+                ('tramo_mas_50', models.IntegerField(default=0, verbose_name='Más de 50%')),
+                ('fecha_actualizacion', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Resumen de Costos Mensual',
+                'verbose_name_plural': 'Resúmenes de Costos Mensuales',
+                'ordering': ['-mes'],
+                'indexes': [models.Index(fields=['mes', 'centro_id'], name='resumen_costo_mes_centro_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='resumencostomensual',
+            constraint=models.UniqueConstraint(fields=('mes', 'vehiculo_id', 'proveedor_id', 'tipo_mantenimiento_id'), name='resumen_costo_celda_unica'),
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 4.2.7 on 2026-10-19 13:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('flota', '0006_resumencostomensual'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CeldaCubo',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hecho', models.CharField(choices=[('mantenimiento', 'Mantenimiento'), ('vehiculo', 'Vehículo')], max_length=20, verbose_name='Hecho')),
+                ('mes', models.DateField(verbose_name='Mes')),
+                ('centro_id', models.BigIntegerField(verbose_name='Centro Operacional')),
+                ('tipo_capacidad', models.CharField(max_length=2, verbose_name='Tipo de Capacidad')),
+                ('estado', models.CharField(max_length=20, verbose_name='Estado')),
+                ('tipo_mantenimiento_id', models.BigIntegerField(default=0, verbose_name='Tipo de Mantenimiento')),
+                ('proveedor_id', models.BigIntegerField(default=0, verbose_name='Proveedor')),
+                ('tipo', models.CharField(blank=True, default='', max_length=20, verbose_name='Preventivo/Correctivo')),
+                ('cantidad', models.IntegerField(default=0, verbose_name='Cantidad')),
+                ('costo_estimado', models.DecimalField(decimal_places=0, default=0, max_digits=14, verbose_name='Costo Estimado')),
+                ('costo_real', models.DecimalField(decimal_places=0, default=0, max_digits=14, verbose_name='Costo Real')),
+                ('horas', models.IntegerField(default=0, verbose_name='Horas Estimadas')),
+            ],
+            options={
+                'verbose_name': 'Celda del Cubo',
+                'verbose_name_plural': 'Celdas del Cubo',
+                'indexes': [models.Index(fields=['hecho', 'centro_id', 'mes'], name='celda_cubo_centro_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='celdacubo',
+            constraint=models.UniqueConstraint(fields=('hecho', 'mes', 'centro_id', 'tipo_capacidad', 'estado', 'tipo_mantenimiento_id', 'proveedor_id', 'tipo'), name='celda_cubo_unica'),
+        ),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 4.2.7 on 2026-10-19 13:32
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('flota', '0007_celdacubo'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TransicionEstado',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('vehiculo_id', models.BigIntegerField(verbose_name='Vehículo')),
+                ('centro_id', models.BigIntegerField(verbose_name='Centro Operacional')),
+                ('tipo_capacidad', models.CharField(max_length=2, verbose_name='Tipo de Capacidad')),
+                ('estado_anterior', models.CharField(blank=True, default='', max_length=20, verbose_name='Estado Anterior')),
+                ('estado_nuevo', models.CharField(blank=True, default='', max_length=20, verbose_name='Estado Nuevo')),
+                ('fecha', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Fecha')),
+            ],
+            options={
+                'verbose_name': 'Transición de Estado',
+                'verbose_name_plural': 'Transiciones de Estado',
+                'ordering': ['-fecha'],
+                'indexes': [models.Index(fields=['fecha'], name='transicion_fecha_idx'), models.Index(fields=['vehiculo_id', 'fecha'], name='transicion_vehiculo_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='SnapshotDisponibilidad',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField(verbose_name='Fecha')),
+                ('tomado', models.DateTimeField(verbose_name='Tomado')),
+                ('centro_id', models.BigIntegerField(verbose_name='Centro Operacional')),
+                ('tipo_capacidad', models.CharField(max_length=2, verbose_name='Tipo de Capacidad')),
+                ('estado', models.CharField(max_length=20, verbose_name='Estado')),
+                ('cantidad', models.IntegerField(default=0, verbose_name='Vehículos')),
+            ],
+            options={
+                'verbose_name': 'Snapshot de Disponibilidad',
+                'verbose_name_plural': 'Snapshots de Disponibilidad',
+                'ordering': ['-fecha'],
+                'indexes': [models.Index(fields=['centro_id', 'fecha'], name='snapshot_centro_fecha_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='snapshotdisponibilidad',
+            constraint=models.UniqueConstraint(fields=('fecha', 'centro_id', 'tipo_capacidad', 'estado'), name='snapshot_disponibilidad_unico'),
+        ),
+    ]
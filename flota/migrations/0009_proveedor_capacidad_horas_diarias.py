@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-19 13:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('flota', '0008_snapshotdisponibilidad_transicionestado'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='proveedor',
+            name='capacidad_horas_diarias',
+            field=models.PositiveIntegerField(default=8, help_text='Horas de taller disponibles por día hábil para programar mantenimientos', verbose_name='Capacidad Diaria (horas)'),
+        ),
+    ]
@@ -0,0 +1,93 @@
+# Generated by Django 4.2.7 on 2026-10-19 13:58
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+COLUMNAS = (
+    'id, vehiculo_id, tipo_mantenimiento_id, proveedor_id, tipo, estado, prioridad, fecha_programada, '
+    'fecha_realizacion, kilometraje_programado, costo_estimado, costo_real, tiempo_estimado_horas, '
+    'descripcion, observaciones_programacion, usuario_programacion_id, fecha_creacion, fecha_modificacion'
+)
+
+CREAR_VISTA = f"""
+CREATE VIEW flota_mantenimientohistorial AS
+SELECT {COLUMNAS}, 0 AS archivado FROM flota_mantenimiento
+UNION ALL
+SELECT {COLUMNAS}, 1 AS archivado FROM flota_mantenimientoarchivado
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('flota', '0009_proveedor_capacidad_horas_diarias'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MantenimientoHistorial',
+            fields=[
+                ('tipo', models.CharField(choices=[('preventivo', 'Preventivo'), ('correctivo', 'Correctivo')], max_length=20, verbose_name='Tipo')),
+                ('estado', models.CharField(choices=[('programado', 'Programado'), ('en_proceso', 'En Proceso'), ('completado', 'Completado'), ('cancelado', 'Cancelado')], max_length=20, verbose_name='Estado')),
+                ('prioridad', models.CharField(choices=[('baja', 'Baja'), ('media', 'Media'), ('alta', 'Alta'), ('critica', 'Crítica')], max_length=20, verbose_name='Prioridad')),
+                ('fecha_programada', models.DateField(verbose_name='Fecha Programada')),
+                ('fecha_realizacion', models.DateField(blank=True, null=True, verbose_name='Fecha de Realización')),
+                ('kilometraje_programado', models.IntegerField(verbose_name='Kilometraje Programado')),
+                ('costo_estimado', models.DecimalField(decimal_places=0, max_digits=10, verbose_name='Costo Estimado')),
+                ('costo_real', models.DecimalField(blank=True, decimal_places=0, max_digits=10, null=True, verbose_name='Costo Real')),
+                ('tiempo_estimado_horas', models.IntegerField(verbose_name='Tiempo Estimado (horas)')),
+                ('descripcion', models.TextField(verbose_name='Descripción del Trabajo')),
+                ('observaciones_programacion', models.TextField(blank=True, verbose_name='Observaciones')),
+                ('fecha_creacion', models.DateTimeField()),
+                ('fecha_modificacion', models.DateTimeField()),
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('archivado', models.BooleanField(verbose_name='Archivado')),
+            ],
+            options={
+                'verbose_name': 'Mantenimiento (historial)',
+                'verbose_name_plural': 'Mantenimientos (historial)',
+                'db_table': 'flota_mantenimientohistorial',
+                'ordering': ['-fecha_programada'],
+                'abstract': False,
+                'managed': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='MantenimientoArchivado',
+            fields=[
+                ('tipo', models.CharField(choices=[('preventivo', 'Preventivo'), ('correctivo', 'Correctivo')], max_length=20, verbose_name='Tipo')),
+                ('estado', models.CharField(choices=[('programado', 'Programado'), ('en_proceso', 'En Proceso'), ('completado', 'Completado'), ('cancelado', 'Cancelado')], max_length=20, verbose_name='Estado')),
+                ('prioridad', models.CharField(choices=[('baja', 'Baja'), ('media', 'Media'), ('alta', 'Alta'), ('critica', 'Crítica')], max_length=20, verbose_name='Prioridad')),
+                ('fecha_programada', models.DateField(verbose_name='Fecha Programada')),
+                ('fecha_realizacion', models.DateField(blank=True, null=True, verbose_name='Fecha de Realización')),
+                ('kilometraje_programado', models.IntegerField(verbose_name='Kilometraje Programado')),
+                ('costo_estimado', models.DecimalField(decimal_places=0, max_digits=10, verbose_name='Costo Estimado')),
+                ('costo_real', models.DecimalField(blank=True, decimal_places=0, max_digits=10, null=True, verbose_name='Costo Real')),
+                ('tiempo_estimado_horas', models.IntegerField(verbose_name='Tiempo Estimado (horas)')),
+                ('descripcion', models.TextField(verbose_name='Descripción del Trabajo')),
+                ('observaciones_programacion', models.TextField(blank=True, verbose_name='Observaciones')),
+                ('fecha_creacion', models.DateTimeField()),
+                ('fecha_modificacion', models.DateTimeField()),
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('fecha_archivo', models.DateTimeField(verbose_name='Fecha de Archivo')),
+                ('proveedor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='flota.proveedor', verbose_name='Proveedor')),
+                ('tipo_mantenimiento', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='flota.tipomantenimiento', verbose_name='Tipo de Mantenimiento')),
+                ('usuario_programacion', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='Usuario que Programó')),
+                ('vehiculo', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='mantenimientos_archivados', to='flota.vehiculo', verbose_name='Vehículo')),
+            ],
+            options={
+                'verbose_name': 'Mantenimiento Archivado',
+                'verbose_name_plural': 'Mantenimientos Archivados',
+                'ordering': ['-fecha_programada'],
+                'abstract': False,
+            },
+        ),
+        migrations.RunSQL(
+            CREAR_VISTA,
+            'DROP VIEW IF EXISTS flota_mantenimientohistorial',
+            hints={'model_name': 'mantenimientohistorial'},
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.7 on 2026-10-19 14:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('flota', '0010_mantenimientoarchivado_mantenimientohistorial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='vehiculo',
+            index=models.Index(fields=['activo', 'centro_operacion', 'estado', 'tipo_capacidad'], name='vehiculo_activo_idx'),
+        ),
+    ]
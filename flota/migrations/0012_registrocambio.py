@@ -0,0 +1,32 @@
+# Generated by Django 4.2.7 on 2026-10-19 14:14
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('flota', '0011_vehiculo_activo_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RegistroCambio',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('modelo', models.CharField(max_length=30, verbose_name='Modelo')),
+                ('objeto_id', models.BigIntegerField(verbose_name='Objeto')),
+                ('operacion', models.CharField(choices=[('alta', 'Alta'), ('modificacion', 'Modificación'), ('baja', 'Baja')], max_length=15, verbose_name='Operación')),
+                ('datos', models.JSONField(blank=True, default=dict, verbose_name='Datos')),
+                ('centro_id', models.BigIntegerField(blank=True, null=True, verbose_name='Centro Operacional')),
+                ('fecha', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Fecha')),
+            ],
+            options={
+                'verbose_name': 'Registro de Cambio',
+                'verbose_name_plural': 'Registro de Cambios',
+                'ordering': ['id'],
+                'indexes': [models.Index(fields=['fecha'], name='registro_cambio_fecha_idx'), models.Index(fields=['modelo', 'objeto_id'], name='registro_cambio_objeto_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 4.2.7 on 2026-10-19 14:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('flota', '0012_registrocambio'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='mantenimiento',
+            index=models.Index(fields=['fecha_modificacion'], name='mantenimiento_modif_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='vehiculo',
+            index=models.Index(fields=['centro_operacion', 'fecha_modificacion'], name='vehiculo_sync_idx'),
+        ),
+    ]
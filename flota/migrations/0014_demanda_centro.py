@@ -0,0 +1,31 @@
+# Generated by Django 4.2.7 on 2026-10-19 14:41
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('flota', '0013_sincronizacion_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DemandaCentro',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo_capacidad', models.CharField(choices=[('GC', 'Gran Capacidad'), ('MC', 'Mediana Capacidad')], max_length=2, verbose_name='Tipo de Capacidad')),
+                ('operativos', models.PositiveIntegerField(verbose_name='Operativos Requeridos')),
+                ('centro', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='demandas', to='flota.centrooperacional', verbose_name='Centro Operacional')),
+            ],
+            options={
+                'verbose_name': 'Demanda del Centro',
+                'verbose_name_plural': 'Demandas de los Centros',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='demandacentro',
+            constraint=models.UniqueConstraint(fields=('centro', 'tipo_capacidad'), name='demanda_centro_unica'),
+        ),
+    ]
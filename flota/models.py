@@ -4,6 +4,7 @@ from django.contrib.auth.models import User
 from django.urls import reverse
 from django.utils import timezone
 from datetime import timedelta
+from .shards import ShardQuerySet
 
 
 class CentroOperacional(models.Model):
@@ -25,13 +26,13 @@ class CentroOperacional(models.Model):
         return self.nombre
     
     def vehiculos_count(self):
-        return self.vehiculos.count()
+        return self.vehiculos.filter(activo=True).count()
     
     def vehiculos_operativos(self):
-        return self.vehiculos.filter(estado='operativo').count()
+        return self.vehiculos.filter(activo=True, estado='operativo').count()
     
     def disponibilidad_porcentaje(self):
-        total = self.vehiculos.count()
+        total = self.vehiculos_count()
         operativos = self.vehiculos_operativos()
         return round((operativos / total) * 100, 1) if total > 0 else 0
 
@@ -101,14 +102,23 @@ class Vehiculo(models.Model):
     observaciones = models.TextField(blank=True, verbose_name="Observaciones")
     
     # Metadatos
+    # Inactivo: marcado para eliminar, su historial se purga en segundo plano (flota.eliminacion)
     activo = models.BooleanField(default=True)
     fecha_creacion = models.DateTimeField(auto_now_add=True)
     fecha_modificacion = models.DateTimeField(auto_now=True)
     
+    objects = ShardQuerySet.as_manager()
+    
     class Meta:
         verbose_name = "Vehículo"
         verbose_name_plural = "Vehículos"
         ordering = ['patente']
+        indexes = [
+            # Conteos por centro, estado y capacidad de la flota activa sin leer la tabla
+            models.Index(fields=['activo', 'centro_operacion', 'estado', 'tipo_capacidad'], name='vehiculo_activo_idx'),
+            # Sincronización por centro: rango de fecha de modificación (ver flota/sincronizacion.py)
+            models.Index(fields=['centro_operacion', 'fecha_modificacion'], name='vehiculo_sync_idx'),
+        ]
     
     def __str__(self):
         return f"{self.patente} - {self.marca} {self.modelo}"
@@ -129,6 +139,27 @@ class Vehiculo(models.Model):
         return self.km_hasta_mantenimiento() <= 500
 
 
+class DemandaCentro(models.Model):
+    """Vehículos operativos que necesita un centro por tipo de capacidad (objetivo del rebalanceo)"""
+    centro = models.ForeignKey(
+        CentroOperacional, on_delete=models.CASCADE, related_name='demandas', verbose_name="Centro Operacional"
+    )
+    tipo_capacidad = models.CharField(
+        max_length=2, choices=Vehiculo.TIPO_CAPACIDAD_CHOICES, verbose_name="Tipo de Capacidad"
+    )
+    operativos = models.PositiveIntegerField(verbose_name="Operativos Requeridos")
+    
+    class Meta:
+        verbose_name = "Demanda del Centro"
+        verbose_name_plural = "Demandas de los Centros"
+        constraints = [
+            models.UniqueConstraint(fields=['centro', 'tipo_capacidad'], name='demanda_centro_unica'),
+        ]
+    
+    def __str__(self):
+        return f"{self.centro.nombre} {self.tipo_capacidad}: {self.operativos}"
+
+
 class TipoMantenimiento(models.Model):
     nombre = models.CharField(max_length=100, verbose_name="Nombre")
     descripcion = models.TextField(verbose_name="Descripción")
@@ -161,6 +192,11 @@ class Proveedor(models.Model):
     email = models.EmailField(verbose_name="Email")
     contacto_principal = models.CharField(max_length=100, verbose_name="Contacto Principal")
     especialidad = models.CharField(max_length=100, verbose_name="Especialidad")
+    capacidad_horas_diarias = models.PositiveIntegerField(
+        default=8,
+        help_text="Horas de taller disponibles por día hábil para programar mantenimientos",
+        verbose_name="Capacidad Diaria (horas)"
+    )
     activo = models.BooleanField(default=True)
     fecha_creacion = models.DateTimeField(auto_now_add=True)
     
@@ -259,6 +295,8 @@ class Mantenimiento(models.Model):
     fecha_creacion = models.DateTimeField(auto_now_add=True)
     fecha_modificacion = models.DateTimeField(auto_now=True)
     
+    objects = ShardQuerySet.as_manager()
+    
     def numero_reporte(self):
         """Genera número único de reporte"""
         if self.estado == 'completado':
@@ -269,6 +307,346 @@ class Mantenimiento(models.Model):
         verbose_name = "Mantenimiento"
         verbose_name_plural = "Mantenimientos"
         ordering = ['-fecha_programada']
+        indexes = [
+            models.Index(fields=['fecha_modificacion'], name='mantenimiento_modif_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.vehiculo.patente} - {self.tipo_mantenimiento.nombre}"
+
+class VersionDatos(models.Model):
+    """Contador de versión de los datos, incrementado en cada cambio."""
+    clave = models.CharField(max_length=50, unique=True, verbose_name="Clave")
+    numero = models.BigIntegerField(default=0, verbose_name="Número de Versión")
+    fecha_modificacion = models.DateTimeField(default=timezone.now)
+    
+    class Meta:
+        verbose_name = "Versión de Datos"
+        verbose_name_plural = "Versiones de Datos"
+    
+    def __str__(self):
+        return f"{self.clave} v{self.numero}"
+
+
+class Trabajo(models.Model):
+    """Trabajo en segundo plano (cola local en la base de datos, ver flota/trabajos.py)"""
+    ESTADO_CHOICES = [
+        ('pendiente', 'Pendiente'),
+        ('en_proceso', 'En Proceso'),
+        ('completado', 'Completado'),
+        ('fallido', 'Fallido'),
+    ]
+    
+    tipo = models.CharField(max_length=50, verbose_name="Tipo")
+    parametros = models.JSONField(default=dict, blank=True, verbose_name="Parámetros")
+    estado = models.CharField(max_length=20, choices=ESTADO_CHOICES, default='pendiente', verbose_name="Estado")
+    prioridad = models.SmallIntegerField(default=5, verbose_name="Prioridad")  # menor = antes
+    clave_idempotencia = models.CharField(
+        max_length=150, unique=True, null=True, blank=True, verbose_name="Clave de Idempotencia"
+    )
+    intentos = models.IntegerField(default=0, verbose_name="Intentos")
+    max_intentos = models.IntegerField(default=5, verbose_name="Máximo de Intentos")
+    disponible_desde = models.DateTimeField(default=timezone.now, verbose_name="Disponible Desde")
+    trabajador = models.CharField(max_length=100, blank=True, verbose_name="Trabajador")
+    bloqueado_hasta = models.DateTimeField(null=True, blank=True, verbose_name="Bloqueado Hasta")
+    resultado = models.JSONField(null=True, blank=True, verbose_name="Resultado")
+    error = models.TextField(blank=True, verbose_name="Último Error")
+    fecha_creacion = models.DateTimeField(auto_now_add=True)
+    fecha_inicio = models.DateTimeField(null=True, blank=True)
+    fecha_fin = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        verbose_name = "Trabajo"
+        verbose_name_plural = "Trabajos"
+        ordering = ['-fecha_creacion']
+        indexes = [
+            models.Index(fields=['estado', 'prioridad', 'disponible_desde'], name='trabajo_cola_idx'),
+        ]
+    
+    def __str__(self):
+        return f"#{self.pk} {self.tipo} ({self.estado})"
+
+
+class EventoNotificacion(models.Model):
+    """Evento pendiente de notificar; se agrupan por destinatario en resúmenes (flota/notificaciones.py)"""
+    TIPO_CHOICES = [
+        ('mantenimiento_completado', 'Mantenimiento Completado'),
+        ('prioridad_critica', 'Mantenimiento de Prioridad Crítica'),
+        ('alerta_km', 'Cambio de Nivel de Alerta'),
+    ]
+    
+    tipo = models.CharField(max_length=30, choices=TIPO_CHOICES, verbose_name="Tipo")
+    destinatario = models.CharField(max_length=200, verbose_name="Destinatario")
+    titulo = models.CharField(max_length=200, verbose_name="Título")
+    detalle = models.TextField(blank=True, verbose_name="Detalle")
+    referencia = models.CharField(max_length=50, blank=True, verbose_name="Referencia")
+    archivo = models.CharField(max_length=200, blank=True, verbose_name="Archivo Adjunto")
+    fecha_creacion = models.DateTimeField(auto_now_add=True)
+    fecha_envio = models.DateTimeField(null=True, blank=True, verbose_name="Fecha de Envío")
+    
+    class Meta:
+        verbose_name = "Evento de Notificación"
+        verbose_name_plural = "Eventos de Notificación"
+        ordering = ['-fecha_creacion']
+        indexes = [
+            models.Index(fields=['fecha_envio', 'destinatario'], name='evento_pendiente_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.get_tipo_display()} → {self.destinatario}"
+
+
+class ResumenCostoMensual(models.Model):
+    """
+    Costos de mantenimientos completados agregados por mes, vehículo, proveedor
+    y tipo (ver flota/costos.py). Los ids no son ForeignKey: con sharding los
+    vehículos viven en otra base de datos.
+    """
+    mes = models.DateField(verbose_name="Mes")  # primer día del mes
+    vehiculo_id = models.BigIntegerField(verbose_name="Vehículo")
+    centro_id = models.BigIntegerField(verbose_name="Centro Operacional")
+    proveedor_id = models.BigIntegerField(verbose_name="Proveedor")
+    tipo_mantenimiento_id = models.BigIntegerField(verbose_name="Tipo de Mantenimiento")
+    cantidad = models.IntegerField(default=0, verbose_name="Mantenimientos")
+    costo_estimado = models.DecimalField(max_digits=14, decimal_places=0, default=0, verbose_name="Costo Estimado")
+    costo_real = models.DecimalField(max_digits=14, decimal_places=0, default=0, verbose_name="Costo Real")
+    con_sobrecosto = models.IntegerField(default=0, verbose_name="Con Sobrecosto")
+    # Distribución de la desviación (real - estimado) / estimado
+    tramo_ahorro = models.IntegerField(default=0, verbose_name="Bajo lo Estimado")
+    tramo_0_10 = models.IntegerField(default=0, verbose_name="0-10%")
+    tramo_10_25 = models.IntegerField(default=0, verbose_name="10-25%")
+    tramo_25_50 = models.IntegerField(default=0, verbose_name="25-50%")
+    tramo_mas_50 = models.IntegerField(default=0, verbose_name="Más de 50%")
+    fecha_actualizacion = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        verbose_name = "Resumen de Costos Mensual"
+        verbose_name_plural = "Resúmenes de Costos Mensuales"
+        ordering = ['-mes']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['mes', 'vehiculo_id', 'proveedor_id', 'tipo_mantenimiento_id'], name='resumen_costo_celda_unica'
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['mes', 'centro_id'], name='resumen_costo_mes_centro_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.mes:%Y-%m} vehículo {self.vehiculo_id}: ${self.costo_real}"
+
+
+class CeldaCubo(models.Model):
+    """
+    Celda del cubo de indicadores (ver flota/cubo.py): conteos y sumas por
+    centro × tipo de capacidad × estado × tipo de mantenimiento × proveedor ×
+    tipo × mes. Los hechos de vehículos usan 0/'' en las dimensiones de
+    mantenimiento.
+    """
+    HECHO_CHOICES = [
+        ('mantenimiento', 'Mantenimiento'),
+        ('vehiculo', 'Vehículo'),
+    ]
+    
+    hecho = models.CharField(max_length=20, choices=HECHO_CHOICES, verbose_name="Hecho")
+    mes = models.DateField(verbose_name="Mes")
+    centro_id = models.BigIntegerField(verbose_name="Centro Operacional")
+    tipo_capacidad = models.CharField(max_length=2, verbose_name="Tipo de Capacidad")
+    estado = models.CharField(max_length=20, verbose_name="Estado")
+    tipo_mantenimiento_id = models.BigIntegerField(default=0, verbose_name="Tipo de Mantenimiento")
+    proveedor_id = models.BigIntegerField(default=0, verbose_name="Proveedor")
+    tipo = models.CharField(max_length=20, blank=True, default='', verbose_name="Preventivo/Correctivo")
+    cantidad = models.IntegerField(default=0, verbose_name="Cantidad")
+    costo_estimado = models.DecimalField(max_digits=14, decimal_places=0, default=0, verbose_name="Costo Estimado")
+    costo_real = models.DecimalField(max_digits=14, decimal_places=0, default=0, verbose_name="Costo Real")
+    horas = models.IntegerField(default=0, verbose_name="Horas Estimadas")
+    
+    class Meta:
+        verbose_name = "Celda del Cubo"
+        verbose_name_plural = "Celdas del Cubo"
+        constraints = [
+            models.UniqueConstraint(
+                fields=['hecho', 'mes', 'centro_id', 'tipo_capacidad', 'estado', 'tipo_mantenimiento_id', 'proveedor_id', 'tipo'],
+                name='celda_cubo_unica',
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['hecho', 'centro_id', 'mes'], name='celda_cubo_centro_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.hecho} {self.mes:%Y-%m} centro {self.centro_id}: {self.cantidad}"
+
+
+class SnapshotDisponibilidad(models.Model):
+    """
+    Conteo diario de vehículos por centro, tipo de capacidad y estado (ver
+    flota/disponibilidad.py). Se copia del stock del cubo, no de la tabla de
+    vehículos.
+    """
+    fecha = models.DateField(verbose_name="Fecha")
+    tomado = models.DateTimeField(verbose_name="Tomado")  # instante exacto de los conteos
+    centro_id = models.BigIntegerField(verbose_name="Centro Operacional")
+    tipo_capacidad = models.CharField(max_length=2, verbose_name="Tipo de Capacidad")
+    estado = models.CharField(max_length=20, verbose_name="Estado")
+    cantidad = models.IntegerField(default=0, verbose_name="Vehículos")
+    
+    class Meta:
+        verbose_name = "Snapshot de Disponibilidad"
+        verbose_name_plural = "Snapshots de Disponibilidad"
+        ordering = ['-fecha']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['fecha', 'centro_id', 'tipo_capacidad', 'estado'], name='snapshot_disponibilidad_unico'
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['centro_id', 'fecha'], name='snapshot_centro_fecha_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.fecha} centro {self.centro_id} {self.tipo_capacidad} {self.estado}: {self.cantidad}"
+
+
+class TransicionEstado(models.Model):
+    """
+    Cambio de estado de un vehículo. El alta y la baja (o el paso a otro centro
+    o capacidad) se registran con el estado vacío del lado que no existe.
+    """
+    vehiculo_id = models.BigIntegerField(verbose_name="Vehículo")
+    centro_id = models.BigIntegerField(verbose_name="Centro Operacional")
+    tipo_capacidad = models.CharField(max_length=2, verbose_name="Tipo de Capacidad")
+    estado_anterior = models.CharField(max_length=20, blank=True, default='', verbose_name="Estado Anterior")
+    estado_nuevo = models.CharField(max_length=20, blank=True, default='', verbose_name="Estado Nuevo")
+    fecha = models.DateTimeField(default=timezone.now, verbose_name="Fecha")
+    
+    class Meta:
+        verbose_name = "Transición de Estado"
+        verbose_name_plural = "Transiciones de Estado"
+        ordering = ['-fecha']
+        indexes = [
+            models.Index(fields=['fecha'], name='transicion_fecha_idx'),
+            models.Index(fields=['vehiculo_id', 'fecha'], name='transicion_vehiculo_idx'),
+        ]
+    
+    def __str__(self):
+        return f"vehículo {self.vehiculo_id}: {self.estado_anterior or '-'} → {self.estado_nuevo or '-'} ({self.fecha:%Y-%m-%d %H:%M})"
+
+
+class DatosMantenimiento(models.Model):
+    """Campos propios de un mantenimiento, comunes al archivo y al historial (ver flota/archivo.py)"""
+    tipo = models.CharField(max_length=20, choices=Mantenimiento.TIPO_CHOICES, verbose_name="Tipo")
+    estado = models.CharField(max_length=20, choices=Mantenimiento.ESTADO_CHOICES, verbose_name="Estado")
+    prioridad = models.CharField(max_length=20, choices=Mantenimiento.PRIORIDAD_CHOICES, verbose_name="Prioridad")
+    fecha_programada = models.DateField(verbose_name="Fecha Programada")
+    fecha_realizacion = models.DateField(null=True, blank=True, verbose_name="Fecha de Realización")
+    kilometraje_programado = models.IntegerField(verbose_name="Kilometraje Programado")
+    costo_estimado = models.DecimalField(max_digits=10, decimal_places=0, verbose_name="Costo Estimado")
+    costo_real = models.DecimalField(max_digits=10, decimal_places=0, null=True, blank=True, verbose_name="Costo Real")
+    tiempo_estimado_horas = models.IntegerField(verbose_name="Tiempo Estimado (horas)")
+    descripcion = models.TextField(verbose_name="Descripción del Trabajo")
+    observaciones_programacion = models.TextField(blank=True, verbose_name="Observaciones")
+    # Se conservan las fechas originales del mantenimiento
+    fecha_creacion = models.DateTimeField()
+    fecha_modificacion = models.DateTimeField()
+    
+    class Meta:
+        abstract = True
+        ordering = ['-fecha_programada']
+    
+    def numero_reporte(self):
+        """Mismo número que tenía como Mantenimiento"""
+        if self.estado == 'completado':
+            return f"MT-2025-{self.pk:04d}"
+        return None
+    
+    def __str__(self):
+        return f"{self.vehiculo.patente} - {self.tipo_mantenimiento.nombre}"
+
+
+class MantenimientoArchivado(DatosMantenimiento):
+    """
+    Mantenimiento completado o cancelado movido fuera de la tabla de trabajo
+    vigente. Conserva el id original y vive en la misma base que su vehículo.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    vehiculo = models.ForeignKey(
+        Vehiculo,
+        on_delete=models.CASCADE,
+        related_name='mantenimientos_archivados',
+        verbose_name="Vehículo"
+    )
+    tipo_mantenimiento = models.ForeignKey(
+        TipoMantenimiento, on_delete=models.CASCADE, related_name='+', verbose_name="Tipo de Mantenimiento"
+    )
+    proveedor = models.ForeignKey(Proveedor, on_delete=models.CASCADE, related_name='+', verbose_name="Proveedor")
+    usuario_programacion = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name='+', verbose_name="Usuario que Programó"
+    )
+    fecha_archivo = models.DateTimeField(verbose_name="Fecha de Archivo")
+    
+    class Meta(DatosMantenimiento.Meta):
+        verbose_name = "Mantenimiento Archivado"
+        verbose_name_plural = "Mantenimientos Archivados"
+
+
+class MantenimientoHistorial(DatosMantenimiento):
+    """
+    Vista SQL de solo lectura: mantenimientos vigentes y archivados (UNION ALL).
+    Se consulta como cualquier modelo (filtros, agregados, select_related).
+    """
+    id = models.BigIntegerField(primary_key=True)
+    vehiculo = models.ForeignKey(
+        Vehiculo, on_delete=models.DO_NOTHING, db_constraint=False, related_name='+', verbose_name="Vehículo"
+    )
+    tipo_mantenimiento = models.ForeignKey(
+        TipoMantenimiento, on_delete=models.DO_NOTHING, db_constraint=False, related_name='+',
+        verbose_name="Tipo de Mantenimiento"
+    )
+    proveedor = models.ForeignKey(
+        Proveedor, on_delete=models.DO_NOTHING, db_constraint=False, related_name='+', verbose_name="Proveedor"
+    )
+    usuario_programacion = models.ForeignKey(
+        User, on_delete=models.DO_NOTHING, db_constraint=False, related_name='+', verbose_name="Usuario que Programó"
+    )
+    archivado = models.BooleanField(verbose_name="Archivado")
+    
+    class Meta(DatosMantenimiento.Meta):
+        managed = False
+        db_table = 'flota_mantenimientohistorial'
+        verbose_name = "Mantenimiento (historial)"
+        verbose_name_plural = "Mantenimientos (historial)"
+
+
+class RegistroCambio(models.Model):
+    """
+    Registro de cambios (solo inserción) de vehículos, mantenimientos y tablas
+    de referencia, para que los sistemas externos sincronicen por cursor (ver
+    flota/cambios.py). Los ids no son ForeignKey: el registro vive en la base
+    principal y, con sharding, los vehículos en otra.
+    """
+    OPERACION_CHOICES = [
+        ('alta', 'Alta'),
+        ('modificacion', 'Modificación'),
+        ('baja', 'Baja'),
+    ]
+    
+    modelo = models.CharField(max_length=30, verbose_name="Modelo")
+    objeto_id = models.BigIntegerField(verbose_name="Objeto")
+    operacion = models.CharField(max_length=15, choices=OPERACION_CHOICES, verbose_name="Operación")
+    # Alta: la fila completa; modificación: solo los campos que cambiaron (valor nuevo); baja: vacío
+    datos = models.JSONField(default=dict, blank=True, verbose_name="Datos")
+    centro_id = models.BigIntegerField(null=True, blank=True, verbose_name="Centro Operacional")
+    fecha = models.DateTimeField(default=timezone.now, verbose_name="Fecha")
+    
+    class Meta:
+        verbose_name = "Registro de Cambio"
+        verbose_name_plural = "Registro de Cambios"
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['fecha'], name='registro_cambio_fecha_idx'),
+            models.Index(fields=['modelo', 'objeto_id'], name='registro_cambio_objeto_idx'),
+        ]
     
     def __str__(self):
-        return f"{self.vehiculo.patente} - {self.tipo_mantenimiento.nombre}"
\ No newline at end of file
+        return f"#{self.pk} {self.get_operacion_display()} {self.modelo} {self.objeto_id}"
@@ -0,0 +1,131 @@
+"""
+Notificaciones por email agrupadas en resúmenes.
+
+Los eventos (mantenimiento completado, prioridad crítica, cambio de nivel de
+alerta) no se envían uno a uno: se guardan como ``EventoNotificacion`` por
+destinatario y un trabajo de la cola, uno por ventana de tiempo, arma un solo
+resumen por destinatario y los envía todos por una misma conexión SMTP.
+Cerrar treinta mantenimientos al final del turno produce un correo por
+destinatario, no sesenta.
+"""
+import itertools
+import logging
+from pathlib import Path
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.utils import timezone
+from .models import EventoNotificacion
+from .trabajos import encolar_una_vez, PRIORIDAD_NORMAL
+
+
+logger = logging.getLogger(__name__)
+
+
+def ventana_segundos():
+    return getattr(settings, 'FLOTA_NOTIFICACIONES_VENTANA', 900)
+
+
+def destinatarios(tipo):
+    return getattr(settings, 'FLOTA_NOTIFICACIONES', {}).get(tipo, [])
+
+
+def programar_resumen():
+    """Un solo trabajo por ventana: se ejecuta al cierre de la ventana en curso"""
+    ventana = ventana_segundos()
+    ahora = timezone.now().timestamp()
+    indice = int(ahora // ventana)
+    return encolar_una_vez(
+        'enviar_resumenes', prioridad=PRIORIDAD_NORMAL,
+        clave=f'enviar_resumenes:{ventana}:{indice}', retraso=(indice + 1) * ventana - ahora,
+    )
+
+
+def registrar_evento(tipo, titulo, detalle='', referencia='', archivo=''):
+    """Guarda el evento para cada destinatario configurado y asegura el envío del resumen"""
+    return registrar_eventos(tipo, [
+        {'titulo': titulo, 'detalle': detalle, 'referencia': referencia, 'archivo': archivo},
+    ])
+
+
+def registrar_eventos(tipo, eventos):
+    """Versión masiva para las operaciones en bloque: ``eventos`` son dicts (titulo, detalle, referencia, archivo)"""
+    filas = [
+        EventoNotificacion(
+            tipo=tipo, destinatario=destinatario, titulo=evento['titulo'], detalle=evento.get('detalle', ''),
+            referencia=evento.get('referencia', ''), archivo=evento.get('archivo', ''),
+        )
+        for evento in eventos
+        for destinatario in destinatarios(tipo)
+    ]
+    if not filas:
+        return []
+    EventoNotificacion.objects.bulk_create(filas, batch_size=1000)
+    programar_resumen()
+    return filas
+
+
+def _coalescer(eventos):
+    """Un evento por (tipo, referencia): el más reciente, p. ej. varios cambios de alerta del mismo vehículo"""
+    ultimos = {}
+    for evento in eventos:
+        ultimos[(evento.tipo, evento.referencia or evento.pk)] = evento
+    return sorted(ultimos.values(), key=lambda evento: (evento.tipo, evento.fecha_creacion))
+
+
+def armar_resumen(destinatario, eventos):
+    """EmailMessage con los eventos agrupados por tipo (y los reportes PDF adjuntos)"""
+    eventos = _coalescer(eventos)
+    nombres = dict(EventoNotificacion.TIPO_CHOICES)
+    lineas = [f'Resumen de eventos de la flota ({len(eventos)}):', '']
+
+    for tipo, grupo in itertools.groupby(eventos, key=lambda evento: evento.tipo):
+        grupo = list(grupo)
+        lineas.append(f'{nombres.get(tipo, tipo)} ({len(grupo)})')
+        lineas.append('-' * 40)
+        for evento in grupo:
+            lineas.append(f'• {evento.fecha_creacion:%d/%m %H:%M}  {evento.titulo}')
+            if evento.detalle:
+                lineas.append(f'    {evento.detalle}')
+        lineas.append('')
+
+    correo = EmailMessage(
+        f'[ACME Trans] Resumen: {len(eventos)} evento(s) de flota', '\n'.join(lineas), to=[destinatario],
+    )
+    archivo_dir = Path(settings.FLOTA_REPORTES_ARCHIVO_DIR)
+    for evento in eventos:
+        if evento.archivo and (archivo_dir / evento.archivo).exists():
+            correo.attach_file(str(archivo_dir / evento.archivo), 'application/pdf')
+    return correo
+
+
+def enviar_resumenes():
+    """Envía un resumen por destinatario con los eventos pendientes, por una sola conexión SMTP"""
+    maximo = getattr(settings, 'FLOTA_NOTIFICACIONES_MAXIMO', 5000)
+    pendientes = list(EventoNotificacion.objects.filter(
+        fecha_envio__isnull=True
+    ).order_by('destinatario', 'fecha_creacion', 'id')[:maximo])
+
+    conexion = get_connection()
+    conexion.open()
+    enviados = eventos_enviados = 0
+    try:
+        for destinatario, eventos in itertools.groupby(pendientes, key=lambda evento: evento.destinatario):
+            eventos = list(eventos)
+            conexion.send_messages([armar_resumen(destinatario, eventos)])
+            # Se marca por destinatario: si la conexión falla a mitad, el reintento no duplica
+            EventoNotificacion.objects.filter(pk__in=[evento.pk for evento in eventos]).update(
+                fecha_envio=timezone.now()
+            )
+            enviados += 1
+            eventos_enviados += len(eventos)
+    finally:
+        conexion.close()
+
+    if len(pendientes) == maximo:
+        # Quedan más: otra pasada ya mismo. La clave sale del lote enviado, así dos
+        # pasadas que leyeron el mismo lote encolan una sola continuación
+        ultimo = max(evento.pk for evento in pendientes)
+        encolar_una_vez('enviar_resumenes', prioridad=PRIORIDAD_NORMAL, clave=f'enviar_resumenes:continuacion:{ultimo}')
+
+    logger.info('Resúmenes enviados: %s (%s eventos)', enviados, eventos_enviados)
+    return {'resumenes': enviados, 'eventos': eventos_enviados}
@@ -0,0 +1,256 @@
+"""
+Plan de mantenimientos preventivos para toda la flota.
+
+Para cada vehículo activo (no fuera de servicio) y cada tipo de mantenimiento
+preventivo activo, el próximo servicio es el kilometraje del último
+completado más la frecuencia del tipo (o el próximo múltiplo de la frecuencia
+si nunca se hizo). Con el uso diario promedio (``FLOTA_PLAN_KM_DIARIOS``) se
+estima la fecha en que vence; los que vencen dentro del horizonte se
+programan con los valores del tipo y un cupo de la agenda de talleres
+(``flota/agenda.py``).
+
+Todo se resuelve por conjuntos: una consulta por base para los vehículos,
+otra para los pares (vehículo, tipo) con un trabajo abierto y otra para el
+último kilometraje completado, y las altas van en ``bulk_create`` por lotes.
+Los pares con un mantenimiento programado o en proceso se omiten, por lo que
+repetir el plan no duplica nada; como el plan se calcula fuera de la
+transacción de escritura, los pares se vuelven a verificar dentro de ella
+antes de insertar (dos planes simultáneos no duplican trabajos).
+"""
+import datetime
+import math
+from collections import Counter, defaultdict
+from django.conf import settings
+from django.db.models import Max
+from django.utils import timezone
+from .agenda import Agenda
+from .cambios import fila, registrar_cambios
+from .models import Mantenimiento, MantenimientoHistorial, TipoMantenimiento, Vehiculo
+from .shards import aliases_consulta, reservar_ids, sharding_activo
+from .sqlite import atomic_inmediato
+from .versiones import incrementar_version
+from . import cubo
+
+
+ESTADOS_ABIERTOS = ('programado', 'en_proceso')
+TAMANO_LOTE = 1000
+
+
+class PlanInvalido(ValueError):
+    pass
+
+
+def km_diarios():
+    return getattr(settings, 'FLOTA_PLAN_KM_DIARIOS', 250)
+
+
+def tipos_preventivos():
+    """{id: tipo} de los tipos preventivos activos con frecuencia por kilometraje"""
+    return {
+        tipo.pk: tipo
+        for tipo in TipoMantenimiento.objects.filter(es_preventivo=True, activo=True, frecuencia_km__gt=0)
+    }
+
+
+def proximos_servicios(alias, tipos, centro=None):
+    """
+    Próximo servicio de cada vehículo activo (no fuera de servicio) y tipo
+    preventivo: tuplas (vehiculo_id, estado, km, centro_id, tipo_capacidad,
+    tipo, proximo_km), con proximo_km None si el par ya tiene un trabajo abierto.
+    """
+    vehiculos = Vehiculo.objects.using(alias).filter(activo=True).exclude(estado='fuera_servicio')
+    if centro:
+        vehiculos = vehiculos.filter(centro_operacion_id=centro)
+    mantenimientos = Mantenimiento.objects.using(alias).filter(tipo_mantenimiento_id__in=list(tipos))
+    abiertos = set(
+        mantenimientos.filter(estado__in=ESTADOS_ABIERTOS).order_by().values_list('vehiculo_id', 'tipo_mantenimiento_id').distinct()
+    )
+    # El último realizado puede estar archivado: se busca en el historial completo
+    realizados = {
+        (vehiculo_id, tipo_id): km
+        for vehiculo_id, tipo_id, km in MantenimientoHistorial.objects.using(alias).filter(
+            tipo_mantenimiento_id__in=list(tipos), estado='completado',
+        ).order_by().values_list(
+            'vehiculo_id', 'tipo_mantenimiento_id'
+        ).annotate(ultimo_km=Max('kilometraje_programado'))
+    }
+
+    for vehiculo_id, estado, km, centro_id, tipo_capacidad in vehiculos.order_by().values_list(
+        'id', 'estado', 'kilometraje_actual', 'centro_operacion_id', 'tipo_capacidad'
+    ).iterator(chunk_size=5000):
+        for tipo in tipos.values():
+            if (vehiculo_id, tipo.pk) in abiertos:
+                yield vehiculo_id, estado, km, centro_id, tipo_capacidad, tipo, None
+                continue
+            ultimo = realizados.get((vehiculo_id, tipo.pk))
+            proximo_km = ultimo + tipo.frecuencia_km if ultimo is not None else (km // tipo.frecuencia_km + 1) * tipo.frecuencia_km
+            yield vehiculo_id, estado, km, centro_id, tipo_capacidad, tipo, proximo_km
+
+
+def _vencimientos(alias, tipos, hoy, horizonte, centro):
+    """Trabajos (dicts) que vencen en el horizonte y cuántos pares ya tienen un trabajo abierto"""
+    trabajos, con_abierto = [], 0
+    uso = km_diarios()
+    for vehiculo_id, _, km, centro_id, tipo_capacidad, tipo, proximo_km in proximos_servicios(alias, tipos, centro):
+        if proximo_km is None:
+            con_abierto += 1
+            continue
+        dias = max(0, math.ceil((proximo_km - km) / uso))
+        if dias > horizonte:
+            continue
+        trabajos.append({
+            'alias': alias,
+            'vehiculo_id': vehiculo_id,
+            'centro_id': centro_id,
+            'tipo_capacidad': tipo_capacidad,
+            'tipo_mantenimiento': tipo,
+            'kilometraje': max(proximo_km, km),
+            'fecha': hoy + datetime.timedelta(days=dias),
+            'prioridad': 'alta' if proximo_km <= km else 'media',
+            'horas': tipo.tiempo_estimado_horas,
+        })
+    return trabajos, con_abierto
+
+
+def calcular_plan(horizonte=30, proveedor_id=None, respetar_capacidad=True, centro=None):
+    """
+    Trabajos a programar en los próximos ``horizonte`` días, con fecha y
+    proveedor asignados. Sin respetar la capacidad se programan en su fecha de
+    vencimiento con ``proveedor_id``.
+    """
+    if horizonte < 0:
+        raise PlanInvalido('el horizonte no puede ser negativo')
+    if not respetar_capacidad and not proveedor_id:
+        raise PlanInvalido('sin agenda hay que indicar el proveedor')
+    hoy = timezone.localdate()
+    tipos = tipos_preventivos()
+
+    trabajos, con_abierto = [], 0
+    for alias in aliases_consulta():
+        parcial, abiertos = _vencimientos(alias, tipos, hoy, horizonte, centro)
+        trabajos.extend(parcial)
+        con_abierto += abiertos
+
+    sin_cupo = []
+    if respetar_capacidad:
+        agenda = Agenda(desde=hoy, proveedores=[proveedor_id] if proveedor_id else None)
+        programados = []
+        for trabajo, proveedor, fecha in agenda.programar(
+            {**trabajo, 'proveedor_id': proveedor_id} for trabajo in trabajos
+        ):
+            if fecha is None:
+                sin_cupo.append(trabajo)
+            else:
+                programados.append({**trabajo, 'proveedor_id': proveedor, 'fecha': fecha})
+        trabajos = programados
+    else:
+        trabajos = [{**trabajo, 'proveedor_id': proveedor_id} for trabajo in trabajos]
+
+    return {'trabajos': trabajos, 'sin_cupo': sin_cupo, 'con_trabajo_abierto': con_abierto}
+
+
+def _mantenimiento(trabajo, usuario):
+    tipo = trabajo['tipo_mantenimiento']
+    return Mantenimiento(
+        vehiculo_id=trabajo['vehiculo_id'],
+        tipo_mantenimiento_id=tipo.pk,
+        proveedor_id=trabajo['proveedor_id'],
+        tipo='preventivo',
+        estado='programado',
+        prioridad=trabajo['prioridad'],
+        fecha_programada=trabajo['fecha'],
+        kilometraje_programado=trabajo['kilometraje'],
+        costo_estimado=tipo.costo_estimado,
+        tiempo_estimado_horas=tipo.tiempo_estimado_horas,
+        descripcion=f"{tipo.nombre} a los {trabajo['kilometraje']:,} km (plan preventivo)",
+        usuario_programacion_id=usuario.pk,
+    )
+
+
+def _valores_cubo(mantenimiento):
+    return {
+        'fecha_realizacion': None,
+        'fecha_programada': mantenimiento.fecha_programada,
+        'estado': mantenimiento.estado,
+        'tipo_mantenimiento_id': mantenimiento.tipo_mantenimiento_id,
+        'proveedor_id': mantenimiento.proveedor_id,
+        'tipo': mantenimiento.tipo,
+        'costo_estimado': mantenimiento.costo_estimado,
+        'costo_real': None,
+        'tiempo_estimado_horas': mantenimiento.tiempo_estimado_horas,
+    }
+
+
+def _pares_abiertos(alias, lote):
+    """Pares (vehiculo_id, tipo_id) del lote que ya tienen un trabajo abierto"""
+    return set(
+        Mantenimiento.objects.using(alias).filter(
+            estado__in=ESTADOS_ABIERTOS,
+            vehiculo_id__in={trabajo['vehiculo_id'] for trabajo in lote},
+            tipo_mantenimiento_id__in={trabajo['tipo_mantenimiento'].pk for trabajo in lote},
+        ).order_by().values_list('vehiculo_id', 'tipo_mantenimiento_id').distinct()
+    )
+
+
+def crear_trabajos(trabajos, usuario):
+    """
+    Inserta los trabajos con bulk_create por lotes en la base de cada vehículo.
+    Los pares que entretanto recibieron un trabajo abierto (otro plan, una
+    edición) se omiten: se leen dentro de la misma transacción IMMEDIATE que
+    inserta. Sin signals: el cubo, el registro de cambios y la versión de
+    datos se actualizan aquí, una vez.
+    """
+    por_alias = defaultdict(list)
+    for trabajo in trabajos:
+        por_alias[trabajo['alias']].append(trabajo)
+
+    creados = 0
+    for alias, lista in por_alias.items():
+        with atomic_inmediato(alias):
+            for inicio in range(0, len(lista), TAMANO_LOTE):
+                lote = lista[inicio:inicio + TAMANO_LOTE]
+                abiertos = _pares_abiertos(alias, lote)
+                lote = [
+                    trabajo for trabajo in lote
+                    if (trabajo['vehiculo_id'], trabajo['tipo_mantenimiento'].pk) not in abiertos
+                ]
+                if not lote:
+                    continue
+                nuevos = [_mantenimiento(trabajo, usuario) for trabajo in lote]
+                if sharding_activo():
+                    # bulk_create no pasa por asignar_id_en_rango: el lote reserva sus ids de una vez
+                    primero = reservar_ids(Mantenimiento, alias, len(nuevos))
+                    for desplazamiento, mantenimiento in enumerate(nuevos):
+                        mantenimiento.pk = primero + desplazamiento
+                Mantenimiento.objects.using(alias).bulk_create(nuevos)
+                cubo.registrar_cambios_mantenimientos(
+                    (None, _valores_cubo(mantenimiento), trabajo['centro_id'], trabajo['tipo_capacidad'])
+                    for mantenimiento, trabajo in zip(nuevos, lote)
+                )
+                registrar_cambios((
+                    (Mantenimiento, mantenimiento.pk, 'alta', fila(mantenimiento), trabajo['centro_id'])
+                    for mantenimiento, trabajo in zip(nuevos, lote)
+                ), using=alias)
+                creados += len(nuevos)
+    if creados:
+        incrementar_version()
+    return creados
+
+
+def resumen_plan(plan):
+    """Conteos por tipo de mantenimiento y por fecha para mostrar el plan"""
+    return {
+        'trabajos': len(plan['trabajos']),
+        'sin_cupo': len(plan['sin_cupo']),
+        'con_trabajo_abierto': plan['con_trabajo_abierto'],
+        'por_tipo': Counter(trabajo['tipo_mantenimiento'].nombre for trabajo in plan['trabajos']).most_common(),
+        'horas': sum(trabajo['horas'] for trabajo in plan['trabajos']),
+    }
+
+
+def generar_plan(usuario, horizonte=30, proveedor_id=None, respetar_capacidad=True, centro=None):
+    """Calcula y programa el plan; retorna el resumen con la cantidad creada"""
+    plan = calcular_plan(horizonte, proveedor_id, respetar_capacidad, centro)
+    resumen = resumen_plan(plan)
+    resumen['creados'] = crear_trabajos(plan['trabajos'], usuario)
+    return resumen
@@ -0,0 +1,389 @@
+"""
+Rebalanceo de la flota entre centros.
+
+Propone el mínimo de traslados de vehículos operativos entre centros para que
+cada uno cubra su demanda por tipo de capacidad (``DemandaCentro``) sin pasar
+su ``capacidad_maxima``. Los vehículos en mantenimiento o fuera de servicio no
+se mueven, pero ocupan lugar en su centro; los centros inactivos tienen
+capacidad 0 y no reciben vehículos.
+
+Se resuelve como un flujo de costo mínimo sobre los conteos por centro, tipo y
+estado, no sobre vehículos:
+
+- Los operativos de cada (centro, tipo) se quedan (costo 0) o pasan por un
+  nodo del tipo (costo 1: un traslado) hacia otro centro.
+- En su destino, los operativos que cubren la demanda del tipo tienen un
+  premio; cada centro descarga en el sumidero hasta su lugar libre sin costo
+  y el resto con una penalización por exceso de capacidad.
+
+Las penalizaciones son estrictas: primero se evita el exceso de capacidad (es
+un límite físico), luego se cubre la demanda y, entre las soluciones que lo
+logran, se elige la de menos traslados. Con un nodo por tipo la red tiene
+O(centros × tipos) aristas, en lugar de una por par de centros, y se resuelve
+con el método primal-dual (Dijkstra con potenciales y un flujo bloqueante por
+los caminos mínimos); los vehículos concretos se eligen al final, prefiriendo
+los que no tienen un mantenimiento abierto.
+
+La propuesta lleva una ``huella`` de sus traslados (vehículos y destinos):
+quien la aplica envía la huella que revisó y, si al recalcularla la flota ya
+cambió, no se traslada nada.
+"""
+import hashlib
+import heapq
+import json
+from collections import Counter, defaultdict, deque
+from django.conf import settings
+from .estado_flota import consultar_estado
+from .indicadores import conteos_por_centro
+from .models import CentroOperacional, DemandaCentro, Mantenimiento, Vehiculo
+from .shards import reunir_shards
+from .transiciones import transicionar_vehiculos
+
+
+TIPOS = tuple(codigo for codigo, _ in Vehiculo.TIPO_CAPACIDAD_CHOICES)
+ESTADOS_ABIERTOS = ('programado', 'en_proceso')
+INFINITO = float('inf')
+
+
+# ==================== FLUJO DE COSTO MÍNIMO ====================
+class RedFlujo:
+    """Red de flujo con aristas en listas paralelas; la inversa de la arista ``e`` es ``e ^ 1``"""
+
+    def __init__(self, nodos):
+        self.salientes = [[] for _ in range(nodos)]
+        self.destinos, self.capacidades, self.costos = [], [], []
+
+    def agregar(self, origen, destino, capacidad, costo):
+        """Agrega la arista y su inversa; retorna el índice de la arista"""
+        arista = len(self.destinos)
+        for desde, hasta, cupo, valor in ((origen, destino, capacidad, costo), (destino, origen, 0, -costo)):
+            self.salientes[desde].append(len(self.destinos))
+            self.destinos.append(hasta)
+            self.capacidades.append(cupo)
+            self.costos.append(valor)
+        return arista
+
+    def flujo(self, arista):
+        return self.capacidades[arista ^ 1]
+
+    def _distancias(self, fuente, potencial):
+        """Dijkstra con costos reducidos (no negativos gracias a los potenciales)"""
+        distancias = [INFINITO] * len(self.salientes)
+        distancias[fuente] = 0
+        cola = [(0, fuente)]
+        while cola:
+            distancia, nodo = heapq.heappop(cola)
+            if distancia > distancias[nodo]:
+                continue
+            for arista in self.salientes[nodo]:
+                if not self.capacidades[arista]:
+                    continue
+                siguiente = self.destinos[arista]
+                nueva = distancia + self.costos[arista] + potencial[nodo] - potencial[siguiente]
+                if nueva < distancias[siguiente]:
+                    distancias[siguiente] = nueva
+                    heapq.heappush(cola, (nueva, siguiente))
+        return distancias
+
+    def _potenciales(self, fuente):
+        """Distancias iniciales (Bellman-Ford con cola): la red admite costos negativos pero no ciclos"""
+        distancias = [INFINITO] * len(self.salientes)
+        distancias[fuente] = 0
+        pendientes, en_cola = deque([fuente]), {fuente}
+        while pendientes:
+            nodo = pendientes.popleft()
+            en_cola.discard(nodo)
+            for arista in self.salientes[nodo]:
+                siguiente = self.destinos[arista]
+                if self.capacidades[arista] and distancias[nodo] + self.costos[arista] < distancias[siguiente]:
+                    distancias[siguiente] = distancias[nodo] + self.costos[arista]
+                    if siguiente not in en_cola:
+                        en_cola.add(siguiente)
+                        pendientes.append(siguiente)
+        return [0 if distancia == INFINITO else distancia for distancia in distancias]
+
+    def _bloquear(self, fuente, sumidero, potencial):
+        """Flujo bloqueante (Dinic) sobre las aristas de costo reducido 0; retorna cuánto se aumentó"""
+        admisibles = [
+            [
+                arista for arista in salientes
+                if self.costos[arista] + potencial[nodo] - potencial[self.destinos[arista]] == 0
+            ]
+            for nodo, salientes in enumerate(self.salientes)
+        ]
+        total = 0
+        while True:
+            niveles = [-1] * len(self.salientes)
+            niveles[fuente] = 0
+            pendientes = deque([fuente])
+            while pendientes:
+                nodo = pendientes.popleft()
+                for arista in admisibles[nodo]:
+                    siguiente = self.destinos[arista]
+                    if self.capacidades[arista] and niveles[siguiente] < 0:
+                        niveles[siguiente] = niveles[nodo] + 1
+                        pendientes.append(siguiente)
+            if niveles[sumidero] < 0:
+                return total
+            proxima = [0] * len(self.salientes)
+
+            def empujar(nodo, limite):
+                if nodo == sumidero:
+                    return limite
+                while proxima[nodo] < len(admisibles[nodo]):
+                    arista = admisibles[nodo][proxima[nodo]]
+                    siguiente = self.destinos[arista]
+                    if self.capacidades[arista] and niveles[siguiente] == niveles[nodo] + 1:
+                        empujado = empujar(siguiente, min(limite, self.capacidades[arista]))
+                        if empujado:
+                            self.capacidades[arista] -= empujado
+                            self.capacidades[arista ^ 1] += empujado
+                            return empujado
+                    proxima[nodo] += 1
+                return 0
+
+            while True:
+                empujado = empujar(fuente, INFINITO)
+                if not empujado:
+                    break
+                total += empujado
+
+    def resolver(self, fuente, sumidero):
+        """
+        Flujo máximo de costo mínimo (primal-dual): tras cada Dijkstra se
+        aumenta todo el flujo posible por los caminos mínimos a la vez. Los
+        costos toman pocos valores, así que bastan unas pocas fases.
+        """
+        potencial = self._potenciales(fuente)
+        flujo_total = 0
+        while True:
+            distancias = self._distancias(fuente, potencial)
+            if distancias[sumidero] == INFINITO:
+                return flujo_total
+            for nodo, distancia in enumerate(distancias):
+                if distancia < INFINITO:
+                    potencial[nodo] += distancia
+            flujo_total += self._bloquear(fuente, sumidero, potencial)
+
+
+# ==================== OPTIMIZACIÓN ====================
+def optimizar(centros, conteos, demandas):
+    """
+    Traslados [(origen, destino, tipo_capacidad, cantidad)] a partir de
+    ``centros`` {id: (capacidad_maxima, activo)}, ``conteos`` filas
+    (centro_id, estado, tipo_capacidad, total) y ``demandas``
+    {(centro_id, tipo_capacidad): operativos}.
+    """
+    operativos, vehiculos = Counter(), Counter()
+    for centro_id, estado, tipo, total in conteos:
+        vehiculos[centro_id] += total
+        if estado == 'operativo':
+            operativos[(centro_id, tipo)] += total
+    operativos = +operativos
+    activos = {centro_id for centro_id, (_, activo) in centros.items() if activo}
+    demandas = {clave: cantidad for clave, cantidad in demandas.items() if clave[0] in activos and cantidad > 0}
+    if not operativos:
+        return []
+
+    # Lugar libre de cada centro descontando lo que no se mueve (en mantenimiento y fuera de servicio)
+    movibles = sum(operativos.values())
+    fijos = Counter(vehiculos)
+    for (centro_id, _), cantidad in operativos.items():
+        fijos[centro_id] -= cantidad
+    libres = {
+        centro_id: max(capacidad - fijos[centro_id], 0) if centro_id in activos else 0
+        for centro_id, (capacidad, _) in centros.items()
+    }
+    libres.update({centro_id: 0 for centro_id in vehiculos if centro_id not in centros})
+    # Prioridades estrictas: ningún número de traslados vale un faltante y ningún faltante vale un exceso
+    penalizacion_faltante = movibles + 1
+    penalizacion_exceso = penalizacion_faltante * (sum(demandas.values()) + 1)
+
+    # Nodos: fuente, sumidero, uno por tipo, uno por centro, y por (centro, tipo) los operativos de
+    # origen y los que terminan allí
+    fuente, sumidero = 0, 1
+    nodo_tipo = {tipo: 2 + n for n, tipo in enumerate(TIPOS)}
+    nodo_centro = {centro_id: 2 + len(TIPOS) + n for n, centro_id in enumerate(libres)}
+    destinos = [(centro_id, tipo) for centro_id in libres for tipo in TIPOS if centro_id in activos or (centro_id, tipo) in operativos]
+    nodo_destino = {clave: 2 + len(TIPOS) + len(libres) + n for n, clave in enumerate(destinos)}
+    nodo_origen = {clave: 2 + len(TIPOS) + len(libres) + len(destinos) + n for n, clave in enumerate(operativos)}
+    red = RedFlujo(2 + len(TIPOS) + len(libres) + len(destinos) + len(operativos))
+
+    salidas = {}
+    for (centro_id, tipo), cantidad in operativos.items():
+        nodo = nodo_origen[(centro_id, tipo)]
+        red.agregar(fuente, nodo, cantidad, 0)
+        red.agregar(nodo, nodo_destino[(centro_id, tipo)], cantidad, 0)
+        salidas[(centro_id, tipo)] = red.agregar(nodo, nodo_tipo[tipo], cantidad, 1)
+    llegadas = {}
+    for (centro_id, tipo), nodo in nodo_destino.items():
+        if centro_id in activos:
+            llegadas[(centro_id, tipo)] = red.agregar(nodo_tipo[tipo], nodo, movibles, 0)
+        if demandas.get((centro_id, tipo)):
+            red.agregar(nodo, nodo_centro[centro_id], demandas[(centro_id, tipo)], -penalizacion_faltante)
+        red.agregar(nodo, nodo_centro[centro_id], movibles, 0)
+    for centro_id, libre in libres.items():
+        if libre:
+            red.agregar(nodo_centro[centro_id], sumidero, libre, 0)
+        red.agregar(nodo_centro[centro_id], sumidero, movibles, penalizacion_exceso)
+    red.resolver(fuente, sumidero)
+
+    # Salidas y llegadas netas por tipo; cualquier emparejamiento tiene el mismo costo
+    traslados = []
+    for tipo in TIPOS:
+        netos = Counter()
+        for (centro_id, t), arista in salidas.items():
+            if t == tipo:
+                netos[centro_id] += red.flujo(arista)
+        for (centro_id, t), arista in llegadas.items():
+            if t == tipo:
+                netos[centro_id] -= red.flujo(arista)
+        origenes = [[centro_id, neto] for centro_id, neto in sorted(netos.items()) if neto > 0]
+        destinos = [[centro_id, -neto] for centro_id, neto in sorted(netos.items()) if neto < 0]
+        while origenes and destinos:
+            cantidad = min(origenes[0][1], destinos[0][1])
+            traslados.append((origenes[0][0], destinos[0][0], tipo, cantidad))
+            for lista in (origenes, destinos):
+                lista[0][1] -= cantidad
+                if not lista[0][1]:
+                    lista.pop(0)
+    return traslados
+
+
+# ==================== PROPUESTA ====================
+def _conteos():
+    if settings.FLOTA_ESTADO_MEMORIA:
+        return consultar_estado(lambda estado: estado.conteos_por_centro())
+    return [fila for parcial in reunir_shards(lambda alias: conteos_por_centro(Vehiculo.objects.using(alias))) for fila in parcial]
+
+
+def _elegir_vehiculos(traslados):
+    """{(origen, tipo): [(id, patente)]} operativos para trasladar, primero los sin mantenimiento abierto"""
+    origenes = sorted({origen for origen, _, _, _ in traslados})
+
+    def candidatos(alias):
+        abiertos = set(Mantenimiento.objects.using(alias).filter(
+            estado__in=ESTADOS_ABIERTOS, vehiculo__activo=True, vehiculo__estado='operativo',
+            vehiculo__centro_operacion_id__in=origenes,
+        ).order_by().values_list('vehiculo_id', flat=True))
+        return [
+            (vehiculo_id in abiertos, vehiculo_id, patente, centro_id, tipo)
+            for vehiculo_id, patente, centro_id, tipo in Vehiculo.objects.using(alias).filter(
+                activo=True, estado='operativo', centro_operacion_id__in=origenes,
+            ).order_by().values_list('id', 'patente', 'centro_operacion_id', 'tipo_capacidad')
+        ]
+
+    grupos = defaultdict(list)
+    for parcial in reunir_shards(candidatos):
+        for abierto, vehiculo_id, patente, centro_id, tipo in parcial:
+            grupos[(centro_id, tipo)].append((abierto, vehiculo_id, patente))
+    return {clave: [(vehiculo_id, patente) for _, vehiculo_id, patente in sorted(lista)] for clave, lista in grupos.items()}
+
+
+def proponer_rebalanceo():
+    """
+    Traslados propuestos (con los vehículos elegidos) y el estado de cada
+    centro antes y después de aplicarlos.
+    """
+    centros = {
+        centro_id: {'id': centro_id, 'nombre': nombre, 'capacidad': capacidad, 'activo': activo}
+        for centro_id, nombre, capacidad, activo in CentroOperacional.objects.order_by('nombre').values_list(
+            'id', 'nombre', 'capacidad_maxima', 'activo'
+        )
+    }
+    demandas = {(centro_id, tipo): cantidad for centro_id, tipo, cantidad in DemandaCentro.objects.values_list(
+        'centro_id', 'tipo_capacidad', 'operativos'
+    )}
+    conteos = _conteos()
+    traslados = optimizar(
+        {centro_id: (centro['capacidad'], centro['activo']) for centro_id, centro in centros.items()}, conteos, demandas,
+    )
+
+    disponibles = _elegir_vehiculos(traslados) if traslados else {}
+    transferencias = []
+    for origen, destino, tipo, cantidad in traslados:
+        elegidos = disponibles.get((origen, tipo), [])[:cantidad]
+        disponibles[(origen, tipo)] = disponibles.get((origen, tipo), [])[cantidad:]
+        if not elegidos:
+            continue
+        transferencias.append({
+            'origen': origen,
+            'origen_nombre': centros[origen]['nombre'],
+            'destino': destino,
+            'destino_nombre': centros[destino]['nombre'],
+            'tipo_capacidad': tipo,
+            'cantidad': len(elegidos),
+            'vehiculos': [{'id': vehiculo_id, 'patente': patente} for vehiculo_id, patente in elegidos],
+        })
+
+    # Estado de cada centro antes y después
+    vehiculos, operativos = Counter(), Counter()
+    for centro_id, estado, tipo, total in conteos:
+        vehiculos[centro_id] += total
+        if estado == 'operativo':
+            operativos[(centro_id, tipo)] += total
+    despues_vehiculos, despues_operativos = Counter(vehiculos), Counter(operativos)
+    for transferencia in transferencias:
+        for centro_id, signo in ((transferencia['origen'], -1), (transferencia['destino'], 1)):
+            despues_vehiculos[centro_id] += signo * transferencia['cantidad']
+            despues_operativos[(centro_id, transferencia['tipo_capacidad'])] += signo * transferencia['cantidad']
+
+    def faltan(operativos_centro, centro_id, tipo):
+        return max(demandas.get((centro_id, tipo), 0) - operativos_centro[(centro_id, tipo)], 0) if centros[centro_id]['activo'] else 0
+
+    def exceso(vehiculos_centro, centro_id):
+        capacidad = centros[centro_id]['capacidad'] if centros[centro_id]['activo'] else 0
+        return max(vehiculos_centro[centro_id] - capacidad, 0)
+
+    filas = [
+        {
+            **centro,
+            'vehiculos': vehiculos[centro_id],
+            'vehiculos_despues': despues_vehiculos[centro_id],
+            'exceso': exceso(vehiculos, centro_id),
+            'exceso_despues': exceso(despues_vehiculos, centro_id),
+            'tipos': {
+                tipo: {
+                    'demanda': demandas.get((centro_id, tipo), 0),
+                    'operativos': operativos[(centro_id, tipo)],
+                    'operativos_despues': despues_operativos[(centro_id, tipo)],
+                    'faltan': faltan(operativos, centro_id, tipo),
+                    'faltan_despues': faltan(despues_operativos, centro_id, tipo),
+                }
+                for tipo in TIPOS
+            },
+        }
+        for centro_id, centro in centros.items()
+    ]
+    return {
+        'transferencias': transferencias,
+        'huella': huella_traslados(transferencias),
+        'centros': filas,
+        'resumen': {
+            'traslados': sum(transferencia['cantidad'] for transferencia in transferencias),
+            'faltantes': sum(tipo['faltan'] for fila in filas for tipo in fila['tipos'].values()),
+            'faltantes_despues': sum(tipo['faltan_despues'] for fila in filas for tipo in fila['tipos'].values()),
+            'exceso': sum(fila['exceso'] for fila in filas),
+            'exceso_despues': sum(fila['exceso_despues'] for fila in filas),
+        },
+    }
+
+
+def huella_traslados(transferencias):
+    """Resumen de los vehículos a trasladar y sus destinos, para comparar la propuesta revisada con la vigente"""
+    traslados = sorted(
+        (vehiculo['id'], transferencia['destino']) for transferencia in transferencias for vehiculo in transferencia['vehiculos']
+    )
+    return hashlib.sha1(json.dumps(traslados).encode()).hexdigest()
+
+
+def aplicar_rebalanceo(propuesta):
+    """Traslada los vehículos de la propuesta; retorna {'trasladados', 'rechazados'}"""
+    trasladados, rechazados = 0, 0
+    for transferencia in propuesta['transferencias']:
+        resultado = transicionar_vehiculos(
+            [vehiculo['id'] for vehiculo in transferencia['vehiculos']], centro_id=transferencia['destino'],
+        )
+        trasladados += resultado['actualizados']
+        rechazados += sum(len(ids) for ids in resultado['rechazados'].values())
+    return {'trasladados': trasladados, 'rechazados': rechazados}
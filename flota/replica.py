@@ -0,0 +1,102 @@
+"""
+Lecturas desde una réplica para las vistas analíticas.
+
+- ``lectura_replica``: decorador para vistas de solo lectura (estadísticas,
+  reportes, exportaciones). Mientras corre la vista, las lecturas de modelos de
+  ``flota`` se envían al alias de réplica (ver ``routers.RouterReplica``).
+- ``ReplicaMiddleware``: si la sesión escribió hace poco, sus lecturas se fijan
+  al primario durante ``FLOTA_REPLICA_PIN_SEGUNDOS`` para no mostrar datos
+  desactualizados (read-after-write).
+- ``refrescar_replica``: copia el SQLite primario a la réplica con la API de
+  backup, para probar la configuración sin un servidor externo.
+
+Sin alias de réplica configurado todo se lee del primario.
+"""
+import contextvars
+import sqlite3
+import time
+from functools import wraps
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.db import connections, DEFAULT_DB_ALIAS
+from django.utils.deprecation import MiddlewareMixin
+
+
+CLAVE_SESION_PIN = 'flota_primario_hasta'
+
+_usar_replica = contextvars.ContextVar('flota_usar_replica', default=False)
+_fijado_primario = contextvars.ContextVar('flota_fijado_primario', default=False)
+_hubo_escritura = contextvars.ContextVar('flota_hubo_escritura', default=False)
+
+
+def alias_replica():
+    """Alias de la réplica si está configurado, o None"""
+    alias = getattr(settings, 'FLOTA_REPLICA_ALIAS', 'replica')
+    return alias if alias in settings.DATABASES else None
+
+
+def leer_desde_replica():
+    return _usar_replica.get() and not _fijado_primario.get() and alias_replica() is not None
+
+
+def registrar_escritura():
+    _hubo_escritura.set(True)
+
+
+def lectura_replica(view_func):
+    """Decorador: las lecturas de la vista (sync o async) van a la réplica"""
+    if iscoroutinefunction(view_func):
+        @wraps(view_func)
+        async def _wrapped_view(request, *args, **kwargs):
+            token = _usar_replica.set(request.method in ('GET', 'HEAD'))
+            try:
+                return await view_func(request, *args, **kwargs)
+            finally:
+                _usar_replica.reset(token)
+    else:
+        @wraps(view_func)
+        def _wrapped_view(request, *args, **kwargs):
+            token = _usar_replica.set(request.method in ('GET', 'HEAD'))
+            try:
+                return view_func(request, *args, **kwargs)
+            finally:
+                _usar_replica.reset(token)
+    return _wrapped_view
+
+
+class ReplicaMiddleware(MiddlewareMixin):
+    """Fija al primario las sesiones que escribieron recientemente"""
+    
+    def process_request(self, request):
+        _hubo_escritura.set(False)
+        _fijado_primario.set(False)
+        if alias_replica() is None or not hasattr(request, 'session'):
+            return
+        hasta = request.session.get(CLAVE_SESION_PIN)
+        _fijado_primario.set(bool(hasta) and hasta > time.time())
+    
+    def process_response(self, request, response):
+        if _hubo_escritura.get() and alias_replica() is not None and hasattr(request, 'session'):
+            segundos = getattr(settings, 'FLOTA_REPLICA_PIN_SEGUNDOS', 30)
+            request.session[CLAVE_SESION_PIN] = time.time() + segundos
+        _hubo_escritura.set(False)
+        _fijado_primario.set(False)
+        return response
+
+
+def refrescar_replica(origen=DEFAULT_DB_ALIAS, destino=None, paginas_por_paso=-1):
+    """Copia la base SQLite de origen sobre la réplica con la API de backup"""
+    destino = destino or alias_replica()
+    if destino is None:
+        raise ValueError('No hay alias de réplica configurado en DATABASES.')
+    
+    ruta_origen = connections[origen].settings_dict['NAME']
+    ruta_destino = connections[destino].settings_dict['NAME']
+    # Las conexiones persistentes a la réplica se reabren después de la copia
+    connections[destino].close()
+    
+    inicio = time.perf_counter()
+    with sqlite3.connect(ruta_origen) as fuente, sqlite3.connect(ruta_destino) as copia:
+        copia.execute('PRAGMA busy_timeout = 5000')
+        fuente.backup(copia, pages=paginas_por_paso)
+    return time.perf_counter() - inicio
@@ -0,0 +1,7 @@
+"""
+Generación de reportes: planes de consulta (planes.py), escritores en
+streaming (escritores.py) y motor con caché y generación en segundo plano (motor.py).
+"""
+from .escritores import FORMATOS
+from .motor import respuesta_reporte, encolar_reporte, purgar_cache
+from .planes import PLANES, obtener_plan
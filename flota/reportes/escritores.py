@@ -0,0 +1,277 @@
+"""
+Escritores de reportes en streaming: CSV, XLSX y PDF.
+
+Cada escritor recibe el título, las columnas y un iterable de filas, y entrega
+bloques de bytes a medida que avanza. Sólo usan la biblioteca estándar: el XLSX
+es un ZIP escrito hacia adelante (sin seek) y el PDF se arma página a página
+llevando la tabla de offsets (xref) en memoria, no las páginas.
+"""
+import csv
+import datetime
+import io
+import re
+import zipfile
+from decimal import Decimal
+from xml.sax.saxutils import escape
+
+
+TAMANO_BLOQUE = 64 * 1024
+
+
+def _texto(valor):
+    if valor is None:
+        return ''
+    if isinstance(valor, (datetime.date, datetime.datetime)):
+        return valor.strftime('%d/%m/%Y')
+    return str(valor)
+
+
+# ==================== CSV ====================
+def escribir_csv(titulo, columnas, filas):
+    """CSV con BOM UTF-8 y separador ';' (abre directo en Excel con configuración regional es)"""
+    buffer = io.StringIO()
+    escritor = csv.writer(buffer, delimiter=';')
+    buffer.write('\ufeff')
+    escritor.writerow(columnas)
+
+    for fila in filas:
+        escritor.writerow([_texto(valor) for valor in fila])
+        if buffer.tell() >= TAMANO_BLOQUE:
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate()
+
+    yield buffer.getvalue().encode('utf-8')
+
+
+# ==================== XLSX ====================
+class _SalidaZip(io.RawIOBase):
+    """Archivo de sólo escritura que acumula lo escrito hasta que se vacía"""
+
+    def __init__(self):
+        self.partes = []
+
+    def writable(self):
+        return True
+
+    def write(self, datos):
+        self.partes.append(bytes(datos))
+        return len(datos)
+
+    def vaciar(self):
+        datos = b''.join(self.partes)
+        self.partes.clear()
+        return datos
+
+
+_XML = '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+_NS_MAIN = 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'
+_NS_REL = 'http://schemas.openxmlformats.org/package/2006/relationships'
+_NS_DOC_REL = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships'
+
+_PARTES_FIJAS = {
+    '[Content_Types].xml': (
+        _XML + '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        '<Override PartName="/xl/styles.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>'
+        '</Types>'
+    ),
+    '_rels/.rels': (
+        _XML + f'<Relationships xmlns="{_NS_REL}">'
+        f'<Relationship Id="rId1" Type="{_NS_DOC_REL}/officeDocument" Target="xl/workbook.xml"/>'
+        '</Relationships>'
+    ),
+    'xl/_rels/workbook.xml.rels': (
+        _XML + f'<Relationships xmlns="{_NS_REL}">'
+        f'<Relationship Id="rId1" Type="{_NS_DOC_REL}/worksheet" Target="worksheets/sheet1.xml"/>'
+        f'<Relationship Id="rId2" Type="{_NS_DOC_REL}/styles" Target="styles.xml"/>'
+        '</Relationships>'
+    ),
+    # Estilo 1: encabezado en negrita
+    'xl/styles.xml': (
+        _XML + f'<styleSheet xmlns="{_NS_MAIN}">'
+        '<fonts count="2"><font><sz val="11"/><name val="Calibri"/></font>'
+        '<font><b/><sz val="11"/><name val="Calibri"/></font></fonts>'
+        '<fills count="1"><fill><patternFill patternType="none"/></fill></fills>'
+        '<borders count="1"><border/></borders>'
+        '<cellStyleXfs count="1"><xf/></cellStyleXfs>'
+        '<cellXfs count="2"><xf/><xf fontId="1" applyFont="1"/></cellXfs>'
+        '</styleSheet>'
+    ),
+}
+
+# Caracteres de control no permitidos en XML 1.0
+_CONTROL_XML = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+
+def _celda_xlsx(valor, estilo=''):
+    if isinstance(valor, bool) or valor is None:
+        valor = 'Sí' if valor is True else ''
+    elif isinstance(valor, (int, float, Decimal)):
+        return f'<c{estilo}><v>{valor}</v></c>'
+    texto = escape(_CONTROL_XML.sub('', _texto(valor)))
+    return f'<c t="inlineStr"{estilo}><is><t xml:space="preserve">{texto}</t></is></c>'
+
+
+def _hoja_nombre(titulo):
+    # Máximo 31 caracteres y sin []:*?/\
+    return escape(re.sub(r'[\[\]:*?/\\]', '', titulo)[:31] or 'Reporte')
+
+
+def escribir_xlsx(titulo, columnas, filas):
+    """Libro XLSX de una hoja con cadenas en línea (sin tabla de cadenas compartidas)"""
+    salida = _SalidaZip()
+    with zipfile.ZipFile(salida, 'w', compression=zipfile.ZIP_DEFLATED) as libro:
+        for nombre, contenido in _PARTES_FIJAS.items():
+            libro.writestr(nombre, contenido)
+        libro.writestr('xl/workbook.xml', (
+            _XML + f'<workbook xmlns="{_NS_MAIN}" xmlns:r="{_NS_DOC_REL}">'
+            f'<sheets><sheet name="{_hoja_nombre(titulo)}" sheetId="1" r:id="rId1"/></sheets></workbook>'
+        ))
+        yield salida.vaciar()
+
+        with libro.open('xl/worksheets/sheet1.xml', 'w', force_zip64=True) as hoja:
+            encabezado = ''.join(_celda_xlsx(columna, ' s="1"') for columna in columnas)
+            hoja.write((
+                _XML + f'<worksheet xmlns="{_NS_MAIN}"><sheetData><row>{encabezado}</row>'
+            ).encode('utf-8'))
+
+            partes, tamano = [], 0
+            for fila in filas:
+                xml_fila = '<row>' + ''.join(_celda_xlsx(valor) for valor in fila) + '</row>'
+                partes.append(xml_fila)
+                tamano += len(xml_fila)
+                if tamano >= TAMANO_BLOQUE:
+                    hoja.write(''.join(partes).encode('utf-8'))
+                    partes, tamano = [], 0
+                    datos = salida.vaciar()
+                    if datos:
+                        yield datos
+
+            hoja.write((''.join(partes) + '</sheetData></worksheet>').encode('utf-8'))
+    yield salida.vaciar()
+
+
+# ==================== PDF ====================
+# A4 horizontal, Helvetica (fuente base, no se incrusta) con codificación WinAnsi
+_ANCHO, _ALTO = 842, 595
+_MARGEN = 30
+_TAMANO_FUENTE = 7
+_ALTO_LINEA = 11
+_LINEAS_POR_PAGINA = (_ALTO - 2 * _MARGEN - 40) // _ALTO_LINEA
+
+
+def _texto_pdf(valor, max_caracteres):
+    texto = _texto(valor)
+    if len(texto) > max_caracteres:
+        texto = texto[:max(max_caracteres - 1, 1)] + '…'
+    texto = texto.encode('cp1252', errors='replace')
+    return texto.replace(b'\\', b'\\\\').replace(b'(', b'\\(').replace(b')', b'\\)')
+
+
+class _DocumentoPdf:
+    """Lleva los offsets de cada objeto mientras el documento se escribe en orden"""
+
+    def __init__(self):
+        self.posicion = 0
+        self.offsets = {}
+
+    def objeto(self, numero, cuerpo):
+        self.offsets[numero] = self.posicion
+        datos = b'%d 0 obj\n' % numero + cuerpo + b'\nendobj\n'
+        self.posicion += len(datos)
+        return datos
+
+    def crudo(self, datos):
+        self.posicion += len(datos)
+        return datos
+
+
+def _contenido_pagina(titulo, columnas, filas_pagina, numero_pagina, ancho_columna, max_caracteres):
+    lineas = [b'BT /F1 11 Tf %d %d Td (%s) Tj ET' % (
+        _MARGEN, _ALTO - _MARGEN - 10, _texto_pdf(titulo, 120)
+    )]
+    lineas.append(b'BT /F1 7 Tf %d %d Td (P\xe1gina %d) Tj ET' % (
+        _ANCHO - _MARGEN - 40, _ALTO - _MARGEN - 10, numero_pagina
+    ))
+
+    y = _ALTO - _MARGEN - 35
+    lineas.append(b'0.85 g %d %d %d %d re f 0 g' % (
+        _MARGEN - 2, y - 3, _ANCHO - 2 * _MARGEN + 4, _ALTO_LINEA
+    ))
+    for fila in [columnas] + filas_pagina:
+        x = _MARGEN
+        for valor in fila:
+            lineas.append(b'BT /F1 %d Tf %d %d Td (%s) Tj ET' % (
+                _TAMANO_FUENTE, x, y, _texto_pdf(valor, max_caracteres)
+            ))
+            x += ancho_columna
+        y -= _ALTO_LINEA
+    return b'\n'.join(lineas)
+
+
+def escribir_pdf(titulo, columnas, filas):
+    """PDF tabular paginado; sólo la página en curso vive en memoria"""
+    documento = _DocumentoPdf()
+    ancho_columna = (_ANCHO - 2 * _MARGEN) // max(len(columnas), 1)
+    # Helvetica 7pt: ~0.5 em por carácter en promedio
+    max_caracteres = max(int(ancho_columna / (_TAMANO_FUENTE * 0.5)) - 1, 3)
+
+    # 1 = catálogo, 2 = árbol de páginas (se escribe al final), 3 = fuente
+    yield documento.crudo(b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n')
+    yield documento.objeto(1, b'<< /Type /Catalog /Pages 2 0 R >>')
+    yield documento.objeto(3, (
+        b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>'
+    ))
+
+    paginas = []
+    siguiente = 4
+
+    def pagina(filas_pagina):
+        nonlocal siguiente
+        contenido = _contenido_pagina(
+            titulo, columnas, filas_pagina, len(paginas) + 1, ancho_columna, max_caracteres
+        )
+        numero_contenido, numero_pagina = siguiente, siguiente + 1
+        siguiente += 2
+        paginas.append(numero_pagina)
+        return documento.objeto(
+            numero_contenido, b'<< /Length %d >>\nstream\n' % len(contenido) + contenido + b'\nendstream'
+        ) + documento.objeto(numero_pagina, (
+            b'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 %d %d] '
+            b'/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>'
+        ) % (_ANCHO, _ALTO, numero_contenido))
+
+    filas_pagina = []
+    for fila in filas:
+        filas_pagina.append(fila)
+        if len(filas_pagina) == _LINEAS_POR_PAGINA:
+            yield pagina(filas_pagina)
+            filas_pagina = []
+    if filas_pagina or not paginas:
+        yield pagina(filas_pagina)
+
+    kids = b' '.join(b'%d 0 R' % numero for numero in paginas)
+    yield documento.objeto(2, b'<< /Type /Pages /Kids [%s] /Count %d >>' % (kids, len(paginas)))
+
+    inicio_xref = documento.posicion
+    total = siguiente
+    xref = [b'xref\n0 %d\n' % total, b'0000000000 65535 f \n']
+    for numero in range(1, total):
+        xref.append(b'%010d 00000 n \n' % documento.offsets[numero])
+    xref.append(b'trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n' % (total, inicio_xref))
+    yield documento.crudo(b''.join(xref))
+
+
+# ==================== REGISTRO ====================
+FORMATOS = {
+    'csv': (escribir_csv, 'text/csv; charset=utf-8'),
+    'xlsx': (escribir_xlsx, 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'),
+    'pdf': (escribir_pdf, 'application/pdf'),
+}
@@ -0,0 +1,171 @@
+"""
+Motor de reportes: caché por contenido, trabajos en segundo plano y respuestas en streaming.
+
+La clave de un reporte es sha256(tipo, formato, versión de datos, fecha); la
+fecha entra porque los vencimientos dependen del día. Mientras los datos no cambien (ver flota/versiones.py) la misma clave apunta al mismo archivo
+y la descarga es sólo servir un archivo del disco. Los archivos se guardan por
+hash de su contenido (``blobs/ab/abcd....xlsx``) y las claves son referencias a
+ellos, así dos versiones que producen el mismo contenido comparten el archivo.
+
+Los reportes chicos se generan en el mismo request y se envían en streaming
+mientras se copian a la caché. Los grandes (más de FLOTA_REPORTES_UMBRAL_TRABAJO
+filas) no se generan en el request: se encola el trabajo ``renderizar_reporte``
+y se responde 202; el trabajador lo deja en la caché y la siguiente descarga
+lo sirve desde disco. Un If-None-Match con la clave vigente responde 304.
+"""
+import hashlib
+import os
+import tempfile
+import time
+from pathlib import Path
+from django.conf import settings
+from django.http import FileResponse, Http404, JsonResponse, StreamingHttpResponse
+from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from ..trabajos import encolar, estado_trabajo, PRIORIDAD_NORMAL
+from ..versiones import version_actual
+from .escritores import FORMATOS
+from .planes import obtener_plan
+
+
+# Incrementar al cambiar columnas o formato de salida: invalida toda la caché
+VERSION_MOTOR = 1
+
+
+def directorio_cache():
+    return Path(getattr(settings, 'FLOTA_REPORTES_CACHE_DIR', settings.BASE_DIR / 'reportes_cache'))
+
+
+def clave_reporte(tipo, formato, version, fecha):
+    return hashlib.sha256(f'{VERSION_MOTOR}:{tipo}:{formato}:{version}:{fecha}'.encode()).hexdigest()
+
+
+def _ruta_referencia(clave):
+    return directorio_cache() / 'claves' / clave
+
+
+def _ruta_blob(hash_contenido, formato):
+    return directorio_cache() / 'blobs' / hash_contenido[:2] / f'{hash_contenido}.{formato}'
+
+
+def buscar_en_cache(clave, formato):
+    """Ruta del archivo ya generado para la clave, o None"""
+    try:
+        hash_contenido = _ruta_referencia(clave).read_text().strip()
+    except FileNotFoundError:
+        return None
+    ruta = _ruta_blob(hash_contenido, formato)
+    return ruta if ruta.exists() else None
+
+
+def _escribir_atomico(ruta, datos):
+    ruta.parent.mkdir(parents=True, exist_ok=True)
+    descriptor, temporal = tempfile.mkstemp(dir=ruta.parent, prefix='.tmp-')
+    with os.fdopen(descriptor, 'w') as archivo:
+        archivo.write(datos)
+    os.replace(temporal, ruta)
+
+
+def guardar_en_cache(fragmentos, clave, formato):
+    """
+    Reenvía los fragmentos y los copia a la caché. El archivo sólo se publica
+    si el reporte terminó completo (un cliente que corta la descarga no deja
+    archivos a medias).
+    """
+    temporales = directorio_cache() / 'tmp'
+    temporales.mkdir(parents=True, exist_ok=True)
+    descriptor, temporal = tempfile.mkstemp(dir=temporales, suffix=f'.{formato}')
+    hash_contenido = hashlib.sha256()
+    completo = False
+    try:
+        with os.fdopen(descriptor, 'wb') as archivo:
+            for fragmento in fragmentos:
+                archivo.write(fragmento)
+                hash_contenido.update(fragmento)
+                yield fragmento
+        completo = True
+    finally:
+        if completo:
+            destino = _ruta_blob(hash_contenido.hexdigest(), formato)
+            destino.parent.mkdir(parents=True, exist_ok=True)
+            os.replace(temporal, destino)
+            _escribir_atomico(_ruta_referencia(clave), hash_contenido.hexdigest())
+            purgar_cache()
+        else:
+            os.unlink(temporal)
+
+
+def purgar_cache(dias=None):
+    """Elimina archivos de la caché sin uso hace más de FLOTA_REPORTES_CACHE_DIAS días"""
+    if dias is None:
+        dias = getattr(settings, 'FLOTA_REPORTES_CACHE_DIAS', 7)
+    limite = time.time() - dias * 86400
+    eliminados = 0
+    for ruta in directorio_cache().rglob('*'):
+        try:
+            if ruta.is_file() and ruta.stat().st_mtime < limite:
+                ruta.unlink()
+                eliminados += 1
+        except FileNotFoundError:
+            pass
+    return eliminados
+
+
+# ==================== GENERACIÓN EN SEGUNDO PLANO ====================
+def generar_en_archivo(tipo, formato, clave):
+    """Genera el reporte completo en la caché y retorna su ruta (se ejecuta en el trabajador)"""
+    ruta = buscar_en_cache(clave, formato)
+    if ruta is None:
+        plan = obtener_plan(tipo)
+        escritor, _ = FORMATOS[formato]
+        for _ in guardar_en_cache(escritor(plan.titulo, plan.columnas, plan.filas()), clave, formato):
+            pass
+        ruta = buscar_en_cache(clave, formato)
+    return str(ruta)
+
+
+def encolar_reporte(tipo, formato):
+    """Encola la generación del reporte; mismo reporte y misma versión de datos: un solo trabajo"""
+    version = version_actual()[0]
+    return encolar(
+        'renderizar_reporte', {'tipo': tipo, 'formato': formato}, prioridad=PRIORIDAD_NORMAL,
+        clave=f'renderizar_reporte:{tipo}:{formato}:v{version}:{timezone.localdate()}',
+    )
+
+
+# ==================== RESPUESTA ====================
+def nombre_archivo(tipo, formato):
+    return f'reporte_{tipo}_{timezone.localdate():%Y%m%d}.{formato}'
+
+
+def respuesta_reporte(request, tipo, formato):
+    """304 si el cliente ya tiene la versión, FileResponse desde la caché, streaming o 202 con el trabajo encolado"""
+    plan = obtener_plan(tipo)
+    if plan is None or formato not in FORMATOS:
+        raise Http404('Reporte no encontrado')
+
+    escritor, content_type = FORMATOS[formato]
+    clave = clave_reporte(tipo, formato, version_actual()[0], timezone.localdate())
+    etag = f'"{clave[:32]}"'
+    no_modificado = get_conditional_response(request, etag=etag)
+    if no_modificado is not None:
+        return no_modificado
+
+    ruta = buscar_en_cache(clave, formato)
+    if ruta is None and plan.estimar_filas() >= getattr(settings, 'FLOTA_REPORTES_UMBRAL_TRABAJO', 20000):
+        return JsonResponse(estado_trabajo(encolar_reporte(tipo, formato)), status=202)
+
+    if ruta is not None:
+        # Renueva las fechas para que purgar_cache conserve los reportes en uso
+        os.utime(ruta)
+        os.utime(_ruta_referencia(clave))
+        response = FileResponse(open(ruta, 'rb'), content_type=content_type)
+    else:
+        response = StreamingHttpResponse(
+            guardar_en_cache(escritor(plan.titulo, plan.columnas, plan.filas()), clave, formato),
+            content_type=content_type,
+        )
+
+    response['Content-Disposition'] = f'attachment; filename="{nombre_archivo(tipo, formato)}"'
+    response['ETag'] = etag
+    return response
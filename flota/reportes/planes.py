@@ -0,0 +1,234 @@
+"""
+Planes de consulta de los reportes.
+
+Cada plan declara sus columnas y produce filas (tuplas) directamente desde la
+base de datos con ``values_list(...).iterator(chunk_size=...)``: nunca se
+cargan todos los objetos en memoria, sin importar el tamaño de la flota.
+"""
+from collections import defaultdict
+from decimal import Decimal
+from django.conf import settings
+from django.db.models import Count, Sum, Q
+from django.utils import timezone
+from ..indicadores import (
+    vehiculos_alerta_km, kpis_flota, lista_centros, KM_ALERTA, INTERVALO_MANTENIMIENTO_KM,
+)
+from ..models import Vehiculo, Mantenimiento, MantenimientoHistorial
+from ..shards import aliases_consulta
+
+
+def tamano_lote():
+    return getattr(settings, 'FLOTA_REPORTES_LOTE', 2000)
+
+
+def _recorrer(queryset, *campos):
+    """Filas de values_list en cada base de datos, leídas por lotes"""
+    for alias in aliases_consulta():
+        yield from queryset.using(alias).values_list(*campos).iterator(chunk_size=tamano_lote())
+
+
+def _contar(queryset):
+    return sum(queryset.using(alias).count() for alias in aliases_consulta())
+
+
+class PlanReporte:
+    """Plan base: titulo, columnas y generador de filas"""
+    titulo = ''
+    columnas = ()
+
+    def filas(self):
+        raise NotImplementedError
+
+    def estimar_filas(self):
+        """Cantidad aproximada de filas (decide si se encola en vez de generar en el request)"""
+        return 0
+
+
+# ==================== VEHÍCULOS ====================
+class PlanVehiculos(PlanReporte):
+    titulo = 'Reporte de Flota Vehicular'
+    columnas = (
+        'Patente', 'Marca', 'Modelo', 'Año', 'Capacidad', 'Estado', 'Centro',
+        'Kilometraje', 'Km hasta mantenimiento', 'Alerta',
+    )
+
+    def queryset(self):
+        return Vehiculo.objects.filter(activo=True).order_by('patente')
+
+    def filas(self):
+        estados = dict(Vehiculo.ESTADO_CHOICES)
+        for patente, marca, modelo, año, capacidad, estado, centro, km in _recorrer(
+            self.queryset(), 'patente', 'marca', 'modelo', 'año', 'tipo_capacidad',
+            'estado', 'centro_operacion__nombre', 'kilometraje_actual',
+        ):
+            km_hasta = INTERVALO_MANTENIMIENTO_KM - (km % INTERVALO_MANTENIMIENTO_KM)
+            alerta = 'Sí' if estado == 'operativo' and km_hasta <= KM_ALERTA else ''
+            yield (patente, marca, modelo, año, capacidad, estados.get(estado, estado), centro, km, km_hasta, alerta)
+
+    def estimar_filas(self):
+        return _contar(self.queryset())
+
+
+# ==================== MANTENIMIENTOS ====================
+class PlanMantenimientos(PlanReporte):
+    titulo = 'Reporte de Mantenimientos'
+    columnas = (
+        'Vehículo', 'Tipo de Mantenimiento', 'Tipo', 'Estado', 'Prioridad', 'Proveedor',
+        'Fecha Programada', 'Fecha Realización', 'Costo Estimado', 'Costo Real',
+    )
+
+    def queryset(self):
+        return MantenimientoHistorial.objects.order_by('-fecha_programada', 'id')
+
+    def filas(self):
+        estados = dict(Mantenimiento.ESTADO_CHOICES)
+        prioridades = dict(Mantenimiento.PRIORIDAD_CHOICES)
+        for fila in _recorrer(
+            self.queryset(), 'vehiculo__patente', 'tipo_mantenimiento__nombre', 'tipo', 'estado',
+            'prioridad', 'proveedor__nombre', 'fecha_programada', 'fecha_realizacion',
+            'costo_estimado', 'costo_real',
+        ):
+            patente, tipo_mant, tipo, estado, prioridad, proveedor, programada, realizada, estimado, real = fila
+            yield (
+                patente, tipo_mant, tipo.capitalize(), estados.get(estado, estado),
+                prioridades.get(prioridad, prioridad), proveedor, programada, realizada, estimado, real,
+            )
+
+    def estimar_filas(self):
+        return _contar(self.queryset())
+
+
+# ==================== COSTOS ====================
+class PlanCostos(PlanReporte):
+    titulo = 'Análisis de Costos Operacionales'
+    columnas = (
+        'Vehículo', 'Centro', 'Mantenimientos Completados', 'Costo Estimado',
+        'Costo Real', 'Desviación', 'Desviación %',
+    )
+
+    def queryset(self):
+        # Una fila por vehículo, agregada en SQL
+        return MantenimientoHistorial.objects.filter(estado='completado').order_by(
+            'vehiculo__patente'
+        ).values('vehiculo__patente', 'vehiculo__centro_operacion__nombre').annotate(
+            cantidad=Count('id'), estimado=Sum('costo_estimado'), real=Sum('costo_real'),
+        )
+
+    def filas(self):
+        totales = defaultdict(lambda: [0, Decimal(0), Decimal(0)])
+        for patente, centro, cantidad, estimado, real in _recorrer(
+            self.queryset(), 'vehiculo__patente', 'vehiculo__centro_operacion__nombre',
+            'cantidad', 'estimado', 'real',
+        ):
+            estimado, real = estimado or Decimal(0), real or Decimal(0)
+            total_centro = totales[centro]
+            total_centro[0] += cantidad
+            total_centro[1] += estimado
+            total_centro[2] += real
+            yield (patente, centro, cantidad, estimado, real, real - estimado, _porcentaje(real - estimado, estimado))
+
+        # Subtotales por centro (un acumulador por centro, no por vehículo)
+        for centro in sorted(totales, key=lambda c: c or ''):
+            cantidad, estimado, real = totales[centro]
+            yield (
+                'TOTAL CENTRO', centro, cantidad, estimado, real,
+                real - estimado, _porcentaje(real - estimado, estimado),
+            )
+
+    def estimar_filas(self):
+        return _contar(self.queryset())
+
+
+# ==================== RENDIMIENTO ====================
+class PlanRendimiento(PlanReporte):
+    titulo = 'Indicadores de Rendimiento (KPIs)'
+    columnas = (
+        'Centro', 'Vehículos', 'Operativos', 'En Mantenimiento', 'Fuera de Servicio',
+        'Disponibilidad %', 'Mantenimientos Completados', 'Mantenimientos Vencidos', 'Cumplimiento %',
+    )
+
+    def filas(self):
+        hoy = timezone.now().date()
+        cumplimiento = defaultdict(lambda: [0, 0])
+        consulta = MantenimientoHistorial.objects.order_by().values('vehiculo__centro_operacion_id').annotate(
+            completados=Count('id', filter=Q(estado='completado')),
+            vencidos=Count('id', filter=Q(estado__in=['programado', 'en_proceso'], fecha_programada__lt=hoy)),
+        )
+        for centro_id, completados, vencidos in _recorrer(
+            consulta, 'vehiculo__centro_operacion_id', 'completados', 'vencidos'
+        ):
+            cumplimiento[centro_id][0] += completados
+            cumplimiento[centro_id][1] += vencidos
+
+        kpis = kpis_flota()
+        for (centro_id, _), centro in zip(lista_centros(), kpis['centros']):
+            completados, vencidos = cumplimiento[centro_id]
+            yield (
+                centro['nombre'], centro['total'], centro['operativos'], centro['mantenimiento'],
+                centro['fuera_servicio'], centro['disponibilidad'], completados, vencidos,
+                _porcentaje(completados, completados + vencidos),
+            )
+
+        completados = sum(c for c, _ in cumplimiento.values())
+        vencidos = sum(v for _, v in cumplimiento.values())
+        yield (
+            'TOTAL FLOTA', kpis['total'], kpis['operativos'], kpis['mantenimiento'],
+            kpis['fuera_servicio'], kpis['disponibilidad'], completados, vencidos,
+            _porcentaje(completados, completados + vencidos),
+        )
+
+
+# ==================== ALERTAS ====================
+class PlanAlertas(PlanReporte):
+    titulo = 'Reporte de Alertas y Acciones Requeridas'
+    columnas = ('Tipo de Alerta', 'Vehículo', 'Centro', 'Detalle', 'Fecha / Kilometraje', 'Acción Requerida')
+
+    def filas(self):
+        for patente, centro, km in _recorrer(
+            vehiculos_alerta_km().order_by('patente'),
+            'patente', 'centro_operacion__nombre', 'kilometraje_actual',
+        ):
+            km_hasta = INTERVALO_MANTENIMIENTO_KM - (km % INTERVALO_MANTENIMIENTO_KM)
+            yield ('Kilometraje', patente, centro, f'Faltan {km_hasta} km', km, 'Programar mantenimiento preventivo')
+
+        vencidos = Mantenimiento.objects.filter(
+            vehiculo__activo=True, estado='programado', fecha_programada__lt=timezone.now().date()
+        ).order_by('fecha_programada', 'id')
+        for patente, centro, tipo, fecha in _recorrer(
+            vencidos, 'vehiculo__patente', 'vehiculo__centro_operacion__nombre',
+            'tipo_mantenimiento__nombre', 'fecha_programada',
+        ):
+            yield ('Mantenimiento vencido', patente, centro, tipo, fecha, 'Reprogramar o ejecutar')
+
+        en_proceso = Mantenimiento.objects.filter(
+            vehiculo__activo=True, estado='en_proceso'
+        ).order_by('fecha_programada', 'id')
+        for patente, centro, tipo, fecha in _recorrer(
+            en_proceso, 'vehiculo__patente', 'vehiculo__centro_operacion__nombre',
+            'tipo_mantenimiento__nombre', 'fecha_programada',
+        ):
+            yield ('En proceso', patente, centro, tipo, fecha, 'Registrar cierre al completar')
+
+    def estimar_filas(self):
+        return _contar(vehiculos_alerta_km()) + _contar(Mantenimiento.objects.filter(vehiculo__activo=True).filter(
+            Q(estado='en_proceso') | Q(estado='programado', fecha_programada__lt=timezone.now().date())
+        ))
+
+
+def _porcentaje(parte, total):
+    return round(float(parte) / float(total) * 100, 1) if total else 0
+
+
+PLANES = {
+    'vehiculos': PlanVehiculos,
+    'mantenimientos': PlanMantenimientos,
+    'costos': PlanCostos,
+    'rendimiento': PlanRendimiento,
+    'alertas': PlanAlertas,
+}
+
+
+def obtener_plan(tipo):
+    """Instancia del plan de reporte, o None si el tipo no existe"""
+    plan = PLANES.get(tipo)
+    return plan() if plan else None
@@ -0,0 +1,102 @@
+from django.db import DEFAULT_DB_ALIAS
+from .replica import leer_desde_replica, alias_replica, registrar_escritura
+from . import shards
+
+
+class RouterShards:
+    """
+    Ubica Vehiculo y Mantenimiento en el shard de su centro (ver ``shards.py``).
+    
+    Solo decide cuando hay una instancia de referencia (guardar, relaciones);
+    las consultas sin contexto deben usar ``.using()`` o los helpers de ``shards``.
+    """
+    
+    def _alias_instancia(self, model, instance):
+        nombre = model._meta.model_name
+        if nombre == 'vehiculo':
+            return shards.alias_de_centro(instance.centro_operacion_id)
+        if nombre == 'mantenimiento':
+            vehiculo = instance._state.fields_cache.get('vehiculo')
+            if vehiculo is not None and vehiculo._state.db:
+                return vehiculo._state.db
+            if instance._state.db and not instance._state.adding:
+                # Fila existente: sigue en su base (el vehículo pudo cambiar de shard tras crearse)
+                return instance._state.db
+            if instance.vehiculo_id is not None:
+                return shards.alias_probable_de_pk(instance.vehiculo_id)
+        return None
+    
+    def db_for_read(self, model, **hints):
+        if not shards.sharding_activo():
+            return None
+        instance = hints.get('instance')
+        if model._meta.app_label == 'flota' and model._meta.model_name in shards.MODELOS_FRAGMENTADOS:
+            if instance is not None and instance._state.db:
+                return instance._state.db
+            return None
+        if instance is not None and shards.es_shard(instance._state.db):
+            # Las tablas de referencia tienen espejo en el shard; el resto (usuarios) no
+            if model._meta.app_label == 'flota' and model._meta.model_name in shards.MODELOS_ESPEJO:
+                return instance._state.db
+            return DEFAULT_DB_ALIAS
+        return None
+    
+    def db_for_write(self, model, **hints):
+        if not shards.sharding_activo():
+            return None
+        instance = hints.get('instance')
+        if model._meta.app_label == 'flota' and model._meta.model_name in shards.MODELOS_FRAGMENTADOS:
+            if instance is not None and isinstance(instance, model):
+                return self._alias_instancia(model, instance)
+            return None
+        # Las copias maestras de referencia se escriben siempre en default
+        return DEFAULT_DB_ALIAS
+    
+    def allow_relation(self, obj1, obj2, **hints):
+        if shards.sharding_activo():
+            return True
+        return None
+    
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if not shards.es_shard(db):
+            return None
+        return app_label == 'flota' and model_name in (shards.MODELOS_FRAGMENTADOS | shards.MODELOS_ESPEJO)
+
+
+class RouterReplica:
+    """
+    Envía a la réplica las lecturas de modelos de flota hechas dentro de vistas
+    marcadas con ``lectura_replica``. Sesiones, usuarios y escrituras quedan
+    siempre en el primario.
+    
+    Va antes que RouterShards: nunca decide escrituras, solo las registra.
+    """
+    
+    app_label = 'flota'
+    
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label != self.app_label or not leer_desde_replica():
+            return None
+        # Con sharding, vehículos y mantenimientos no están en la réplica de default
+        if shards.sharding_activo() and model._meta.model_name in shards.MODELOS_FRAGMENTADOS:
+            return None
+        return alias_replica()
+    
+    def db_for_write(self, model, **hints):
+        if model._meta.app_label == self.app_label:
+            registrar_escritura()
+        return None
+    
+    def allow_relation(self, obj1, obj2, **hints):
+        # La réplica es una copia del primario: los objetos son intercambiables
+        replica = alias_replica()
+        bases = {None, 'default', replica}
+        if obj1._state.db in bases and obj2._state.db in bases:
+            return True
+        return None
+    
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # El esquema de la réplica llega con la copia (refrescar_replica)
+        if db == alias_replica():
+            return False
+        return None
@@ -0,0 +1,263 @@
+"""
+Series de tiempo para los gráficos de estadísticas.
+
+Cada serie se agrupa en períodos (día, semana o mes) con truncado de fechas en
+SQL, o se lee de los resúmenes ya agregados (``ResumenCostoMensual`` para los
+costos mensuales). La disponibilidad son horas-vehículo exactas desde el
+historial de snapshots y transiciones (``flota/disponibilidad.py``).
+
+Los valores se guardan en caché por período (clave con la versión de datos):
+un rango nuevo sólo calcula los períodos que faltan, en una consulta. La
+respuesta es columnar: una lista de períodos y, por columna, un arreglo de
+valores alineado con ella.
+"""
+import bisect
+import datetime
+from collections import defaultdict
+from decimal import Decimal
+from django.core.cache import cache
+from django.db.models import Count, DateField, F, Q, Sum
+from django.db.models.functions import Coalesce, TruncDay, TruncMonth, TruncWeek
+from django.utils import timezone
+from .disponibilidad import conteos_diarios, horas_por_periodo
+from .models import CeldaCubo, CentroOperacional, MantenimientoHistorial, ResumenCostoMensual
+from .shards import reunir_shards
+from .versiones import version_actual
+
+
+GRANULARIDADES = {
+    'dia': TruncDay,
+    'semana': TruncWeek,
+    'mes': TruncMonth,
+}
+
+MAXIMO_PERIODOS = 1000
+DURACION_CACHE = 60 * 60
+
+
+class SerieInvalida(ValueError):
+    pass
+
+
+# ==================== PERÍODOS ====================
+def inicio_periodo(fecha, granularidad):
+    if granularidad == 'semana':
+        return fecha - datetime.timedelta(days=fecha.weekday())
+    if granularidad == 'mes':
+        return fecha.replace(day=1)
+    return fecha
+
+
+def siguiente_periodo(fecha, granularidad):
+    if granularidad == 'mes':
+        return (fecha + datetime.timedelta(days=32)).replace(day=1)
+    return fecha + datetime.timedelta(days=7 if granularidad == 'semana' else 1)
+
+
+def periodos(granularidad, desde, hasta):
+    """Inicios de los períodos que cubren [desde, hasta]"""
+    if granularidad not in GRANULARIDADES:
+        raise SerieInvalida(f'granularidad "{granularidad}"')
+    if desde > hasta:
+        raise SerieInvalida('desde es posterior a hasta')
+    resultado = []
+    actual = inicio_periodo(desde, granularidad)
+    while actual <= hasta:
+        resultado.append(actual)
+        if len(resultado) > MAXIMO_PERIODOS:
+            raise SerieInvalida(f'más de {MAXIMO_PERIODOS} períodos; use una granularidad mayor')
+        actual = siguiente_periodo(actual, granularidad)
+    return resultado
+
+
+# ==================== CÁLCULO POR SERIE ====================
+def _porcentaje(parte, total):
+    return round(parte * 100 / total, 1) if total else 0
+
+
+def _truncar(granularidad, campo):
+    return GRANULARIDADES[granularidad](campo, output_field=DateField())
+
+
+def calcular_mantenimientos(granularidad, desde, hasta):
+    """{período: {columna: cantidad}} por estado, tipo y prioridad según la fecha programada"""
+    def parcial(alias):
+        return list(
+            MantenimientoHistorial.objects.using(alias).filter(fecha_programada__gte=desde, fecha_programada__lt=hasta)
+            .annotate(periodo=_truncar(granularidad, 'fecha_programada'))
+            .order_by().values_list('periodo', 'estado', 'tipo', 'prioridad').annotate(total=Count('id'))
+        )
+
+    valores = defaultdict(lambda: defaultdict(int))
+    for filas in reunir_shards(parcial):
+        for periodo, estado, tipo, prioridad, total in filas:
+            columnas = valores[periodo]
+            columnas['total'] += total
+            columnas[f'estado:{estado}'] += total
+            columnas[f'tipo:{tipo}'] += total
+            columnas[f'prioridad:{prioridad}'] += total
+    return valores
+
+
+def calcular_costos(granularidad, desde, hasta):
+    """{período: {columna: valor}} de los mantenimientos completados, estimado vs. real"""
+    if granularidad == 'mes':
+        # Ya agregado por mes en el resumen de costos
+        filas = [list(
+            ResumenCostoMensual.objects.filter(mes__gte=desde, mes__lt=hasta).order_by().values_list('mes').annotate(
+                total_cantidad=Sum('cantidad'), total_estimado=Sum('costo_estimado'),
+                total_real=Sum('costo_real'), total_con_sobrecosto=Sum('con_sobrecosto'),
+            )
+        )]
+    else:
+        def parcial(alias):
+            fecha = Coalesce('fecha_realizacion', 'fecha_programada')
+            return list(
+                MantenimientoHistorial.objects.using(alias).filter(estado='completado').annotate(fecha_costo=fecha)
+                .filter(fecha_costo__gte=desde, fecha_costo__lt=hasta)
+                .annotate(periodo=_truncar(granularidad, 'fecha_costo'))
+                .order_by().values_list('periodo').annotate(
+                    total_cantidad=Count('id'),
+                    total_estimado=Coalesce(Sum('costo_estimado'), Decimal(0)),
+                    total_real=Coalesce(Sum('costo_real'), Decimal(0)),
+                    total_con_sobrecosto=Count('id', filter=Q(costo_real__gt=F('costo_estimado'))),
+                )
+            )
+        filas = reunir_shards(parcial)
+
+    valores = defaultdict(lambda: defaultdict(int))
+    for parcial_filas in filas:
+        for periodo, cantidad, estimado, real, con_sobrecosto in parcial_filas:
+            columnas = valores[periodo]
+            columnas['cantidad'] += cantidad
+            columnas['estimado'] += int(estimado or 0)
+            columnas['real'] += int(real or 0)
+            columnas['con_sobrecosto'] += con_sobrecosto
+    return valores
+
+
+def _disponibilidad_stock_mensual(lista_periodos):
+    """Períodos anteriores al historial: último stock mensual del cubo registrado hasta cada período"""
+    filas = CeldaCubo.objects.filter(hecho='vehiculo', mes__lte=lista_periodos[-1]).order_by().values_list(
+        'mes', 'centro_id'
+    ).annotate(total=Sum('cantidad'), operativos=Sum('cantidad', filter=Q(estado='operativo')))
+    stock = defaultdict(dict)
+    for mes, centro_id, total, operativos in filas:
+        stock[mes][centro_id] = (operativos or 0, total)
+    meses = sorted(stock)
+
+    valores = {}
+    for periodo in lista_periodos:
+        indice = bisect.bisect_right(meses, periodo) - 1
+        if indice < 0:
+            continue
+        por_centro = stock[meses[indice]]
+        columnas = {
+            f'centro:{centro_id}': _porcentaje(operativos, total) for centro_id, (operativos, total) in por_centro.items()
+        }
+        operativos = sum(operativos for operativos, _ in por_centro.values())
+        vehiculos = sum(total for _, total in por_centro.values())
+        columnas.update({'flota': _porcentaje(operativos, vehiculos), 'operativos': operativos, 'vehiculos': vehiculos})
+        valores[periodo] = columnas
+    return valores
+
+
+def calcular_disponibilidad(granularidad, desde, hasta):
+    """
+    {período: {columna: valor}}: % de horas-vehículo operativas por centro y de
+    la flota, y promedio de vehículos operativos y totales, exactos desde el
+    historial de snapshots y transiciones. Los períodos previos al historial
+    usan el stock mensual del cubo.
+    """
+    lista_periodos = periodos(granularidad, desde, hasta - datetime.timedelta(days=1))
+    horas, cubiertas = horas_por_periodo(lista_periodos + [hasta])
+    pendientes = [
+        periodo for periodo, cubierto in zip(lista_periodos, cubiertas)
+        if not cubierto and periodo <= timezone.localdate()
+    ]
+    valores = _disponibilidad_stock_mensual(pendientes) if pendientes else {}
+
+    for periodo, por_centro, cubierto in zip(lista_periodos, horas, cubiertas):
+        if not cubierto:
+            continue
+        columnas = {
+            f'centro:{centro_id}': _porcentaje(centro['disponibles'], centro['totales'])
+            for centro_id, centro in por_centro.items() if centro['totales']
+        }
+        disponibles = sum(centro['disponibles'] for centro in por_centro.values())
+        totales = sum(centro['totales'] for centro in por_centro.values())
+        columnas.update({
+            'flota': _porcentaje(disponibles, totales),
+            'operativos': round(disponibles / cubierto, 1),
+            'vehiculos': round(totales / cubierto, 1),
+            'horas_operativas': round(disponibles, 1),
+            'horas_totales': round(totales, 1),
+        })
+        valores[periodo] = columnas
+    return valores
+
+
+def calcular_estados(granularidad, desde, hasta):
+    """{período: {estado:X: vehículos}} según el último snapshot diario de cada período"""
+    valores = {}
+    dias = conteos_diarios(desde, hasta - datetime.timedelta(days=1))
+    for dia in sorted(dias):
+        valores[inicio_periodo(dia, granularidad)] = {f'estado:{estado}': cantidad for estado, cantidad in dias[dia].items()}
+    return valores
+
+
+# nombre -> (cálculo, valor de un período sin datos)
+SERIES = {
+    'mantenimientos': (calcular_mantenimientos, 0),
+    'costos': (calcular_costos, 0),
+    'disponibilidad': (calcular_disponibilidad, None),
+    'estados': (calcular_estados, None),
+}
+
+
+# ==================== CACHÉ Y FORMATO ====================
+def _clave_cache(nombre, granularidad, periodo, version):
+    return f'flota:serie:{nombre}:{granularidad}:{periodo.isoformat()}:v{version}'
+
+
+def valores_por_periodo(nombre, granularidad, lista_periodos):
+    """Valores de cada período, desde la caché o calculando de una vez el tramo que falta"""
+    version = version_actual()[0]
+    claves = {periodo: _clave_cache(nombre, granularidad, periodo, version) for periodo in lista_periodos}
+    encontrados = cache.get_many(claves.values())
+    faltantes = [periodo for periodo in lista_periodos if claves[periodo] not in encontrados]
+    if faltantes:
+        calculados = SERIES[nombre][0](granularidad, faltantes[0], siguiente_periodo(faltantes[-1], granularidad))
+        nuevos = {claves[periodo]: dict(calculados.get(periodo, {})) for periodo in faltantes}
+        cache.set_many(nuevos, DURACION_CACHE)
+        encontrados.update(nuevos)
+    return [encontrados[claves[periodo]] for periodo in lista_periodos]
+
+
+def _etiquetas(columnas):
+    ids = [int(columna.split(':', 1)[1]) for columna in columnas if columna.startswith('centro:')]
+    if not ids:
+        return {}
+    return {
+        f'centro:{pk}': nombre for pk, nombre in CentroOperacional.objects.filter(pk__in=ids).values_list('id', 'nombre')
+    }
+
+
+def serie(nombre, granularidad='semana', desde=None, hasta=None):
+    """Serie columnar: {'periodos': [...], 'columnas': {nombre: [valor por período]}}"""
+    if nombre not in SERIES:
+        raise SerieInvalida(f'serie "{nombre}"')
+    hasta = hasta or timezone.localdate()
+    desde = desde or hasta - datetime.timedelta(days=365)
+    lista_periodos = periodos(granularidad, desde, hasta)
+
+    valores = valores_por_periodo(nombre, granularidad, lista_periodos)
+    nombres = sorted({columna for columnas in valores for columna in columnas})
+    vacio = SERIES[nombre][1]
+    return {
+        'serie': nombre,
+        'granularidad': granularidad,
+        'periodos': [periodo.isoformat() for periodo in lista_periodos],
+        'columnas': {columna: [columnas.get(columna, vacio) for columnas in valores] for columna in nombres},
+        'etiquetas': _etiquetas(nombres),
+    }
@@ -0,0 +1,313 @@
+"""
+Sharding opcional de Vehiculo y Mantenimiento por centro operacional.
+
+Con ``FLOTA_SHARDS = {centro_id: alias}`` las filas de ``Vehiculo`` y
+``Mantenimiento`` de cada centro viven en su propia base de datos, de modo que
+las escrituras de un centro no toman el lock de escritura de los demás. Los
+centros sin shard siguen en ``default``.
+
+- Las tablas de referencia (centros y su demanda, tipos de mantenimiento, proveedores) son
+  globales: la copia maestra está en ``default`` y cada shard mantiene un espejo
+  de solo lectura (``replicar_referencia``) para que los ``select_related``
+  funcionen dentro del shard.
+- Los mantenimientos archivados (``archivo.py``) acompañan a su vehículo
+  igual que los vigentes.
+- Usuarios, sesiones y el resto de las tablas quedan solo en ``default``; por
+  eso los shards se abren con ``foreign_keys = OFF`` (ver ``sqlite.py``).
+- Cada shard reserva un rango de ids (``offset_ids``), así los pk son únicos en
+  toda la flota y el shard de un pk se adivina sin consultar. Los ids nuevos
+  se asignan dentro del rango con un contador atómico por base
+  (``reservar_ids``), no con AUTOINCREMENT.
+- Las vistas que cruzan centros usan ``reunir_shards`` / ``reunir_shards_async``
+  para ejecutar la misma consulta en todos los shards en paralelo.
+
+Sin ``FLOTA_SHARDS`` todas las funciones operan sobre ``default`` sin costo extra.
+"""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from django.apps import apps
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, IntegrityError, connections, models, transaction
+from django.http import Http404
+from .asincrono import en_paralelo
+
+
+MODELOS_FRAGMENTADOS = {'vehiculo', 'mantenimiento', 'mantenimientoarchivado', 'mantenimientohistorial'}
+MODELOS_ESPEJO = {'centrooperacional', 'demandacentro', 'tipomantenimiento', 'proveedor', 'versiondatos'}
+
+TAMANO_RANGO_IDS = 10 ** 12
+
+
+def mapa_shards():
+    return getattr(settings, 'FLOTA_SHARDS', {})
+
+
+def sharding_activo():
+    return bool(mapa_shards())
+
+
+def aliases_shards():
+    """Aliases de shard (sin incluir default), en orden estable"""
+    return sorted(set(mapa_shards().values()))
+
+
+def aliases_datos():
+    """Todas las bases que pueden contener vehículos y mantenimientos"""
+    return [DEFAULT_DB_ALIAS] + aliases_shards()
+
+
+def es_shard(alias):
+    return alias in aliases_shards()
+
+
+def alias_de_centro(centro_id):
+    return mapa_shards().get(centro_id, DEFAULT_DB_ALIAS)
+
+
+def offset_ids(alias):
+    """Primer id del rango reservado para el alias (default usa el rango 0)"""
+    if alias == DEFAULT_DB_ALIAS:
+        return 0
+    return (aliases_shards().index(alias) + 1) * TAMANO_RANGO_IDS
+
+
+def _modelo_de_ids(modelo):
+    # Los ids de los mantenimientos archivados siguen tomados: se busca en la vista con ambas tablas
+    if modelo._meta.model_name == 'mantenimiento':
+        return apps.get_model('flota', 'MantenimientoHistorial')
+    return modelo
+
+
+def _ultimo_id_en_rango(modelo, alias):
+    """Id más alto ya usado en el rango del alias, buscando en todas las bases"""
+    inicio = offset_ids(alias)
+    modelo = _modelo_de_ids(modelo)
+    return max(
+        (
+            modelo.objects.using(base).filter(pk__gt=inicio, pk__lt=inicio + TAMANO_RANGO_IDS)
+            .aggregate(ultimo=models.Max('pk'))['ultimo'] or inicio
+            for base in aliases_datos()
+        ),
+        default=inicio,
+    )
+
+
+def reservar_ids(modelo, alias, cantidad=1):
+    """
+    Reserva ``cantidad`` ids consecutivos del rango del alias y retorna el primero.
+    
+    No se usa el AUTOINCREMENT de SQLite: al mover un vehículo entran al shard
+    filas con ids de otro rango, y SQLite siempre continúa desde el id más alto
+    de la tabla. El último id entregado se guarda en una fila de VersionDatos de
+    la propia base y se incrementa con un único ``UPDATE ... RETURNING``, que
+    SQLite serializa: dos escritores concurrentes nunca reciben el mismo id.
+    La primera vez la fila se siembra con el máximo del rango en todas las
+    bases, porque las filas movidas conservan su id.
+    """
+    from .models import VersionDatos
+    
+    clave = f'ids:{modelo._meta.db_table}'
+    conexion = connections[alias]
+    tabla = conexion.ops.quote_name(VersionDatos._meta.db_table)
+    while True:
+        with conexion.cursor() as cursor:
+            cursor.execute(
+                f'UPDATE {tabla} SET numero = numero + %s WHERE clave = %s RETURNING numero',
+                [cantidad, clave],
+            )
+            fila = cursor.fetchone()
+        if fila is not None:
+            return fila[0] - cantidad + 1
+        # El máximo se lee fuera de la transacción: en WAL, una transacción que leyó
+        # y luego escribe falla con "database is locked" si otro escribió entremedio
+        ultimo = _ultimo_id_en_rango(modelo, alias)
+        try:
+            with transaction.atomic(using=alias):
+                VersionDatos.objects.using(alias).create(clave=clave, numero=ultimo)
+        except IntegrityError:
+            # Otro proceso sembró el contador entremedio
+            pass
+
+
+def siguiente_id(modelo, alias):
+    """Siguiente id libre del rango reservado para el alias (ver ``reservar_ids``)"""
+    return reservar_ids(modelo, alias)
+
+
+def alias_probable_de_pk(pk):
+    """Shard donde se creó el registro, según su rango de ids"""
+    indice = int(pk) // TAMANO_RANGO_IDS
+    shards = aliases_shards()
+    return shards[indice - 1] if 0 < indice <= len(shards) else DEFAULT_DB_ALIAS
+
+
+def alias_shard_de_pk(pk):
+    """Como alias_probable_de_pk(), pero None (routers) cuando no hay sharding"""
+    return alias_probable_de_pk(pk) if sharding_activo() else None
+
+
+def _aliases_por_probabilidad(pk):
+    probable = alias_probable_de_pk(pk)
+    return [probable] + [alias for alias in aliases_datos() if alias != probable]
+
+
+def buscar_por_pk(queryset, pk):
+    """Objeto por pk buscando en los shards (primero en el de su rango), o None"""
+    if hasattr(queryset, '_default_manager'):
+        queryset = queryset._default_manager.all()
+    if not sharding_activo():
+        return queryset.filter(pk=pk).first()
+    try:
+        pk = int(pk)
+    except (TypeError, ValueError):
+        return None
+    for alias in _aliases_por_probabilidad(pk):
+        objeto = queryset.using(alias).filter(pk=pk).first()
+        if objeto is not None:
+            return objeto
+    return None
+
+
+def obtener_o_404(queryset, pk):
+    """get_object_or_404 por pk a través de los shards (acepta modelo o queryset)"""
+    if hasattr(queryset, '_default_manager'):
+        queryset = queryset._default_manager.all()
+    if not sharding_activo():
+        try:
+            return queryset.get(pk=pk)
+        except queryset.model.DoesNotExist:
+            raise Http404(f'No {queryset.model._meta.object_name} matches the given query.')
+    objeto = buscar_por_pk(queryset, pk)
+    if objeto is None:
+        raise Http404(f'No {queryset.model._meta.object_name} matches the given query.')
+    return objeto
+
+
+def existe_en_shards(queryset):
+    return any(reunir_shards(lambda alias: queryset.using(alias).exists()))
+
+
+def contar_en_shards(queryset):
+    return sum(reunir_shards(lambda alias: queryset.using(alias).count()))
+
+
+def aliases_consulta():
+    # Sin sharding se pasa None: el queryset queda en manos de los routers (réplica)
+    return aliases_datos() if sharding_activo() else [None]
+
+
+def reunir_shards(funcion):
+    """Ejecuta funcion(alias) en cada base de datos, en paralelo; resultados en orden de aliases_datos()"""
+    aliases = aliases_consulta()
+    if len(aliases) == 1:
+        return [funcion(aliases[0])]
+    
+    def ejecutar(alias):
+        try:
+            return funcion(alias)
+        finally:
+            # Hilos del pool: no dejar conexiones abiertas entre llamadas
+            connections.close_all()
+    
+    with ThreadPoolExecutor(max_workers=len(aliases)) as pool:
+        return list(pool.map(ejecutar, aliases))
+
+
+async def reunir_shards_async(funcion):
+    """Versión async de reunir_shards"""
+    return await asyncio.gather(*(en_paralelo(partial(funcion, alias)) for alias in aliases_consulta()))
+
+
+def listar_shards(funcion, clave=None, reverse=False):
+    """Concatena las listas de funcion(alias) y, si se indica, las ordena"""
+    resultado = [objeto for parcial in reunir_shards(lambda alias: list(funcion(alias))) for objeto in parcial]
+    if clave is not None and sharding_activo():
+        resultado.sort(key=clave, reverse=reverse)
+    return resultado
+
+
+class ShardQuerySet(models.QuerySet):
+    """QuerySet cuyo create() deja que el router elija el shard según la instancia"""
+    
+    def create(self, **kwargs):
+        if self._db is not None or not sharding_activo():
+            return super().create(**kwargs)
+        # QuerySet.create() guarda con using=self.db, que sin instancia siempre es default
+        objeto = self.model(**kwargs)
+        objeto.save(force_insert=True)
+        return objeto
+
+
+# ==================== ESPEJOS DE REFERENCIA ====================
+def _valores(instancia):
+    return {
+        campo.attname: getattr(instancia, campo.attname)
+        for campo in instancia._meta.concrete_fields
+        if not campo.primary_key
+    }
+
+
+def replicar_referencia(instancia):
+    """Copia (upsert) una fila de una tabla de referencia en todos los shards"""
+    modelo = type(instancia)
+    for alias in aliases_shards():
+        actualizadas = modelo.objects.using(alias).filter(pk=instancia.pk).update(**_valores(instancia))
+        if not actualizadas:
+            modelo.objects.using(alias).bulk_create([modelo(pk=instancia.pk, **_valores(instancia))])
+
+
+def eliminar_referencia(instancia):
+    modelo = type(instancia)
+    for alias in aliases_shards():
+        modelo.objects.using(alias).filter(pk=instancia.pk).delete()
+
+
+# ==================== MOVIMIENTO ENTRE SHARDS ====================
+TAMANO_LOTE = 1000
+
+
+def mover_vehiculo(vehiculo_id, origen, destino):
+    """Mueve el historial de mantenimientos de un vehículo (ya guardado en destino) y borra el original"""
+    from .models import Mantenimiento, MantenimientoArchivado, Vehiculo
+    
+    mantenimientos = Mantenimiento.objects.using(origen).filter(vehiculo_id=vehiculo_id)
+    archivados = MantenimientoArchivado.objects.using(origen).filter(vehiculo_id=vehiculo_id)
+    for modelo, filas in ((Mantenimiento, mantenimientos), (MantenimientoArchivado, archivados)):
+        for inicio in range(0, filas.count(), TAMANO_LOTE):
+            copiar_filas(modelo, list(filas.order_by('pk')[inicio:inicio + TAMANO_LOTE]), destino)
+    # Sin signals: las filas se mueven, no se eliminan (resúmenes, cubo, historial de estados y
+    # registro de cambios no deben contarlas como bajas)
+    mantenimientos._raw_delete(origen)
+    archivados._raw_delete(origen)
+    Vehiculo.objects.using(origen).filter(pk=vehiculo_id)._raw_delete(origen)
+
+
+def copiar_filas(modelo, filas, destino):
+    """INSERT de las filas tal cual (raw): conserva el id y las fechas auto_now/auto_now_add"""
+    campos = modelo._meta.concrete_fields
+    lote = max(connections[destino].ops.bulk_batch_size(campos, filas), 1)
+    for inicio in range(0, len(filas), lote):
+        modelo._base_manager.using(destino)._insert(filas[inicio:inicio + lote], fields=campos, using=destino, raw=True)
+
+
+def mover_vehiculos(vehiculo_ids, origen, destino, **valores):
+    """
+    Versión masiva de ``mover_vehiculo`` para las transiciones en bloque: copia
+    los vehículos (con ``valores`` aplicados) y su historial al destino y borra
+    los originales, sin signals. Llamar dentro de una transacción en cada base.
+    """
+    from .models import Mantenimiento, MantenimientoArchivado, Vehiculo
+    
+    for inicio in range(0, len(vehiculo_ids), TAMANO_LOTE):
+        lote = vehiculo_ids[inicio:inicio + TAMANO_LOTE]
+        vehiculos = list(Vehiculo.objects.using(origen).filter(pk__in=lote))
+        for vehiculo in vehiculos:
+            for campo, valor in valores.items():
+                setattr(vehiculo, campo, valor)
+        copiar_filas(Vehiculo, vehiculos, destino)
+        for modelo in (Mantenimiento, MantenimientoArchivado):
+            mantenimientos = modelo.objects.using(origen).filter(vehiculo_id__in=lote)
+            copiar_filas(modelo, list(mantenimientos), destino)
+            mantenimientos._raw_delete(origen)
+        Vehiculo.objects.using(origen).filter(pk__in=lote)._raw_delete(origen)
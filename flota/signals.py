@@ -0,0 +1,325 @@
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.models.signals import pre_delete, pre_save, post_save, post_delete, post_migrate
+from .models import Vehiculo, CentroOperacional, DemandaCentro, Mantenimiento, MantenimientoArchivado, TipoMantenimiento, Proveedor
+from .indicadores import nivel_alerta_km
+from .versiones import incrementar_version
+from . import cambios, costos, cubo, disponibilidad, notificaciones, shards
+
+
+MODELOS_VERSIONADOS = (Vehiculo, CentroOperacional, Mantenimiento, MantenimientoArchivado, TipoMantenimiento, Proveedor)
+MODELOS_REFERENCIA = (CentroOperacional, DemandaCentro, TipoMantenimiento, Proveedor)
+
+
+def actualizar_version_datos(sender, using=DEFAULT_DB_ALIAS, **kwargs):
+    """Cualquier cambio en los modelos de flota invalida ETags y cachés"""
+    incrementar_version(using=using)
+
+
+for modelo in MODELOS_VERSIONADOS:
+    post_save.connect(actualizar_version_datos, sender=modelo, dispatch_uid=f'version_save_{modelo.__name__}')
+    post_delete.connect(actualizar_version_datos, sender=modelo, dispatch_uid=f'version_delete_{modelo.__name__}')
+
+
+# ==================== SHARDING ====================
+def replicar_referencia_guardada(sender, instance, using, raw=False, **kwargs):
+    """Mantiene el espejo de las tablas de referencia en cada shard"""
+    if shards.sharding_activo() and using == DEFAULT_DB_ALIAS and not raw:
+        shards.replicar_referencia(instance)
+
+
+def replicar_referencia_eliminada(sender, instance, using, **kwargs):
+    if shards.sharding_activo() and using == DEFAULT_DB_ALIAS:
+        shards.eliminar_referencia(instance)
+
+
+for modelo in MODELOS_REFERENCIA:
+    post_save.connect(replicar_referencia_guardada, sender=modelo, dispatch_uid=f'espejo_save_{modelo.__name__}')
+    post_delete.connect(replicar_referencia_eliminada, sender=modelo, dispatch_uid=f'espejo_delete_{modelo.__name__}')
+
+
+def desactivar_claves_foraneas_en_shard(sender, using=DEFAULT_DB_ALIAS, **kwargs):
+    """El schema editor reactiva foreign_keys al migrar; en un shard deben seguir apagadas"""
+    if shards.es_shard(using):
+        connections[using].disable_constraint_checking()
+
+
+post_migrate.connect(desactivar_claves_foraneas_en_shard, dispatch_uid='shard_post_migrate')
+
+
+def asignar_id_en_rango(sender, instance, using, raw=False, **kwargs):
+    """Los registros nuevos toman su id del rango reservado de la base donde se guardan"""
+    if shards.sharding_activo() and instance.pk is None and not raw:
+        instance.pk = shards.siguiente_id(sender, using)
+
+
+for modelo in (Vehiculo, Mantenimiento):
+    pre_save.connect(asignar_id_en_rango, sender=modelo, dispatch_uid=f'shard_id_{modelo.__name__}')
+
+
+def detectar_cambio_de_shard(sender, instance, using, **kwargs):
+    """Un vehículo que cambia a un centro de otro shard se guarda en el nuevo shard"""
+    anterior = instance._state.db
+    if shards.sharding_activo() and instance.pk and anterior and anterior != using:
+        instance._shard_anterior = anterior
+
+
+def mover_historial_de_shard(sender, instance, using, **kwargs):
+    """Tras guardar en el nuevo shard, mueve sus mantenimientos y borra la fila antigua"""
+    anterior = instance.__dict__.pop('_shard_anterior', None)
+    if anterior is None:
+        return
+    shards.mover_vehiculo(instance.pk, anterior, using)
+
+
+pre_save.connect(detectar_cambio_de_shard, sender=Vehiculo, dispatch_uid='shard_pre_save_vehiculo')
+post_save.connect(mover_historial_de_shard, sender=Vehiculo, dispatch_uid='shard_post_save_vehiculo')
+
+
+# ==================== NOTIFICACIONES ====================
+# Valores previos al guardar que usan las notificaciones, el resumen de costos y el cubo
+CAMPOS_ANTERIORES = {
+    Mantenimiento: (
+        'estado', 'prioridad', 'vehiculo_id', 'fecha_realizacion', 'fecha_programada', 'tipo_mantenimiento_id',
+        'proveedor_id', 'tipo', 'costo_estimado', 'costo_real', 'tiempo_estimado_horas',
+    ),
+    Vehiculo: ('kilometraje_actual', 'estado', 'centro_operacion_id', 'tipo_capacidad', 'activo'),
+}
+CAMPOS_ANTERIORES[MantenimientoArchivado] = CAMPOS_ANTERIORES[Mantenimiento]
+
+# Centro y capacidad del vehículo de un mantenimiento (dimensiones del cubo y del resumen de costos)
+CAMPOS_VEHICULO = ('vehiculo__centro_operacion_id', 'vehiculo__tipo_capacidad')
+
+
+def recordar_estado_anterior(sender, instance, using, raw=False, **kwargs):
+    """
+    Guarda en la instancia la fila previa completa (para el registro de cambios),
+    los valores que deciden notificaciones y recálculos y, en un mantenimiento,
+    el centro y la capacidad de su vehículo. Es la única lectura previa al
+    guardado: los handlers de post_save trabajan sobre esta foto.
+    """
+    instance._vehiculo_actual = None
+    if raw or instance._state.adding:
+        instance._fila_anterior = instance._valores_anteriores = instance._vehiculo_anterior = None
+        return
+    # La base de origen (en un cambio de shard la fila todavía está en la anterior)
+    origen = instance._state.db or using
+    extras = CAMPOS_VEHICULO if sender is Mantenimiento else ()
+    fila = sender.objects.using(origen).filter(pk=instance.pk).values(*cambios.campos(sender), *extras).first()
+    instance._vehiculo_anterior = fila and extras and tuple(fila.pop(campo) for campo in extras)
+    instance._fila_anterior = fila
+    instance._valores_anteriores = fila and {campo: fila[campo] for campo in CAMPOS_ANTERIORES.get(sender, ())}
+
+
+def olvidar_vehiculo(sender, instance, **kwargs):
+    instance._vehiculo_actual = None
+
+
+def dimensiones_vehiculo(instance, using):
+    """
+    (centro_id, tipo_capacidad) del vehículo del mantenimiento, o None si no
+    existe. Sale de la foto previa o del vehículo ya cargado; si hay que
+    consultarlo, se hace una vez por guardado y lo comparten los handlers.
+    """
+    dimensiones = getattr(instance, '_vehiculo_actual', None)
+    if dimensiones is not None:
+        return dimensiones
+    anterior = getattr(instance, '_valores_anteriores', None)
+    vehiculo = instance._state.fields_cache.get('vehiculo')
+    if anterior and anterior['vehiculo_id'] == instance.vehiculo_id and instance._vehiculo_anterior:
+        dimensiones = instance._vehiculo_anterior
+    elif vehiculo is not None and vehiculo.pk == instance.vehiculo_id:
+        dimensiones = (vehiculo.centro_operacion_id, vehiculo.tipo_capacidad)
+    else:
+        dimensiones = Vehiculo.objects.using(using).filter(pk=instance.vehiculo_id).values_list(
+            'centro_operacion_id', 'tipo_capacidad'
+        ).first()
+    instance._vehiculo_actual = dimensiones
+    return dimensiones
+
+
+def _valores_actuales(instance):
+    return {campo: getattr(instance, campo) for campo in CAMPOS_ANTERIORES[type(instance)]}
+
+
+def notificar_mantenimiento(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    anterior = getattr(instance, '_valores_anteriores', None) or {}
+    
+    # El vehículo y el tipo se cargan sólo si hay evento que registrar
+    if instance.estado == 'completado' and anterior.get('estado') != 'completado':
+        numero = f"MT-2025-{instance.pk:04d}"
+        notificaciones.registrar_evento(
+            'mantenimiento_completado',
+            f'{numero} {instance.vehiculo.patente} - {instance.tipo_mantenimiento.nombre}',
+            detalle=f'Realizado el {instance.fecha_realizacion or "-"}; costo real ${instance.costo_real or 0:,.0f}',
+            referencia=f'mantenimiento:{instance.pk}',
+            archivo=f'mantenimientos/{numero}.pdf',
+        )
+    elif instance.prioridad == 'critica' and anterior.get('prioridad') != 'critica' and instance.estado != 'cancelado':
+        notificaciones.registrar_evento(
+            'prioridad_critica',
+            f'{instance.vehiculo.patente} - {instance.tipo_mantenimiento.nombre} (programado {instance.fecha_programada})',
+            detalle=instance.descripcion[:200],
+            referencia=f'mantenimiento:{instance.pk}',
+        )
+
+
+def notificar_alerta_vehiculo(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    anterior = getattr(instance, '_valores_anteriores', None)
+    nivel = nivel_alerta_km(instance.kilometraje_actual, instance.estado)
+    nivel_anterior = nivel_alerta_km(anterior['kilometraje_actual'], anterior['estado']) if anterior else 0
+    
+    # Sólo cuando el nivel sube: próximo (1) o urgente (2)
+    if nivel > nivel_anterior:
+        km_hasta = instance.km_hasta_mantenimiento()
+        notificaciones.registrar_evento(
+            'alerta_km',
+            f'{instance.patente}: {"URGENTE" if nivel == 2 else "próximo mantenimiento"} (faltan {km_hasta:,} km)',
+            detalle=f'Kilometraje actual {instance.kilometraje_actual:,} km',
+            referencia=f'vehiculo:{instance.pk}',
+        )
+
+
+for modelo in (Mantenimiento, Vehiculo, *MODELOS_REFERENCIA):
+    pre_save.connect(recordar_estado_anterior, sender=modelo, dispatch_uid=f'notificacion_pre_save_{modelo.__name__.lower()}')
+for modelo in (Mantenimiento, MantenimientoArchivado):
+    pre_delete.connect(olvidar_vehiculo, sender=modelo, dispatch_uid=f'vehiculo_pre_delete_{modelo.__name__.lower()}')
+post_save.connect(notificar_mantenimiento, sender=Mantenimiento, dispatch_uid='notificacion_mantenimiento')
+post_save.connect(notificar_alerta_vehiculo, sender=Vehiculo, dispatch_uid='notificacion_vehiculo')
+
+
+# ==================== RESUMEN DE COSTOS ====================
+def actualizar_resumen_costos(sender, instance, using, raw=False, **kwargs):
+    """Resta del resumen el aporte anterior del mantenimiento y suma el nuevo (sólo cuentan los completados)"""
+    if raw:
+        return
+    anterior = getattr(instance, '_valores_anteriores', None)
+    if instance.estado != 'completado' and not (anterior and anterior['estado'] == 'completado'):
+        return
+    costos.registrar_cambio_mantenimiento(
+        anterior, _valores_actuales(instance), (dimensiones_vehiculo(instance, using) or (None,))[0]
+    )
+
+
+def eliminar_de_resumen_costos(sender, instance, using, **kwargs):
+    if instance.estado == 'completado':
+        costos.registrar_cambio_mantenimiento(_valores_actuales(instance), None)
+
+
+def actualizar_centro_en_costos(sender, instance, created, using, raw=False, **kwargs):
+    """El análisis por centro usa el centro actual; con sharding el historial ya se movió de base"""
+    anterior = getattr(instance, '_valores_anteriores', None)
+    if not raw and anterior and anterior['centro_operacion_id'] != instance.centro_operacion_id:
+        costos.recalcular_vehiculo(instance.pk, using=using)
+
+
+post_save.connect(actualizar_resumen_costos, sender=Mantenimiento, dispatch_uid='costos_save_mantenimiento')
+post_delete.connect(eliminar_de_resumen_costos, sender=Mantenimiento, dispatch_uid='costos_delete_mantenimiento')
+# Los archivados solo se eliminan en cascada (vehículo, tipo, proveedor o usuario borrados)
+post_delete.connect(eliminar_de_resumen_costos, sender=MantenimientoArchivado, dispatch_uid='costos_delete_archivado')
+post_save.connect(actualizar_centro_en_costos, sender=Vehiculo, dispatch_uid='costos_save_vehiculo')
+
+
+# ==================== CUBO ====================
+def actualizar_cubo_mantenimiento(sender, instance, created, using, raw=False, **kwargs):
+    """Resta el aporte anterior del mantenimiento y suma el nuevo"""
+    if raw:
+        return
+    anterior = getattr(instance, '_valores_anteriores', None)
+    vehiculos = {instance.vehiculo_id: dimensiones_vehiculo(instance, using)}
+    if anterior and anterior['vehiculo_id'] != instance.vehiculo_id:
+        vehiculos[anterior['vehiculo_id']] = instance._vehiculo_anterior
+    cubo.registrar_cambio_mantenimiento(anterior, _valores_actuales(instance), using=using, vehiculos=vehiculos)
+
+
+def quitar_del_cubo_mantenimiento(sender, instance, using, **kwargs):
+    cubo.registrar_cambio_mantenimiento(
+        _valores_actuales(instance), None, using=using,
+        vehiculos={instance.vehiculo_id: dimensiones_vehiculo(instance, using)},
+    )
+
+
+def _dimensiones_stock(valores):
+    """Celda de stock del vehículo; None si no existe o está marcado para eliminar (inactivo)"""
+    if not valores or not valores['activo']:
+        return None
+    return valores['centro_operacion_id'], valores['tipo_capacidad'], valores['estado']
+
+
+def actualizar_cubo_vehiculo(sender, instance, created, using, raw=False, **kwargs):
+    """Stock del mes y, si cambió de centro o capacidad, los aportes de sus mantenimientos"""
+    if raw:
+        return
+    viejo = _dimensiones_stock(getattr(instance, '_valores_anteriores', None))
+    nuevo = _dimensiones_stock(_valores_actuales(instance))
+    if viejo == nuevo:
+        return
+    if viejo and nuevo and viejo[:2] != nuevo[:2]:
+        cubo.mover_aportes_vehiculo(instance.pk, viejo[:2], nuevo[:2], using=using)
+    cubo.mover_stock(viejo, nuevo)
+
+
+def quitar_del_cubo_vehiculo(sender, instance, using, **kwargs):
+    cubo.mover_stock(_dimensiones_stock(_valores_actuales(instance)), None)
+
+
+post_save.connect(actualizar_cubo_mantenimiento, sender=Mantenimiento, dispatch_uid='cubo_save_mantenimiento')
+post_delete.connect(quitar_del_cubo_mantenimiento, sender=Mantenimiento, dispatch_uid='cubo_delete_mantenimiento')
+post_delete.connect(quitar_del_cubo_mantenimiento, sender=MantenimientoArchivado, dispatch_uid='cubo_delete_archivado')
+post_save.connect(actualizar_cubo_vehiculo, sender=Vehiculo, dispatch_uid='cubo_save_vehiculo')
+post_delete.connect(quitar_del_cubo_vehiculo, sender=Vehiculo, dispatch_uid='cubo_delete_vehiculo')
+
+
+# ==================== DISPONIBILIDAD ====================
+def registrar_transicion_vehiculo(sender, instance, created, raw=False, **kwargs):
+    """Historial de estados: cada cambio de estado, centro o capacidad con su instante"""
+    if raw:
+        return
+    disponibilidad.registrar_transicion(
+        instance.pk,
+        _dimensiones_stock(getattr(instance, '_valores_anteriores', None)),
+        _dimensiones_stock(_valores_actuales(instance)),
+    )
+
+
+def registrar_baja_vehiculo(sender, instance, **kwargs):
+    disponibilidad.registrar_transicion(instance.pk, _dimensiones_stock(_valores_actuales(instance)), None)
+
+
+post_save.connect(registrar_transicion_vehiculo, sender=Vehiculo, dispatch_uid='disponibilidad_save_vehiculo')
+post_delete.connect(registrar_baja_vehiculo, sender=Vehiculo, dispatch_uid='disponibilidad_delete_vehiculo')
+
+
+# ==================== REGISTRO DE CAMBIOS ====================
+def _registrar_en(sender, using):
+    """Las tablas de referencia se registran en la base principal, no en sus espejos de los shards"""
+    return sender not in MODELOS_REFERENCIA or using == DEFAULT_DB_ALIAS
+
+
+def _centro_conocido(instance, using):
+    """El centro de un mantenimiento sale de las dimensiones que ya usaron el cubo y los costos"""
+    if isinstance(instance, (Mantenimiento, MantenimientoArchivado)):
+        return (dimensiones_vehiculo(instance, using) or (None,))[0]
+    return None
+
+
+def registrar_cambio_guardado(sender, instance, using, raw=False, **kwargs):
+    # Alta o modificación según exista la fila previa (un cambio de shard inserta en la nueva base)
+    if not raw and _registrar_en(sender, using):
+        cambios.registrar_guardado(
+            instance, getattr(instance, '_fila_anterior', None), using, _centro_conocido(instance, using)
+        )
+
+
+def registrar_cambio_eliminado(sender, instance, using, **kwargs):
+    if _registrar_en(sender, using):
+        cambios.registrar_baja(instance, using, _centro_conocido(instance, using))
+
+
+for modelo in cambios.MODELOS:
+    if modelo is not MantenimientoArchivado:
+        post_save.connect(registrar_cambio_guardado, sender=modelo, dispatch_uid=f'cambios_save_{modelo.__name__}')
+    post_delete.connect(registrar_cambio_eliminado, sender=modelo, dispatch_uid=f'cambios_delete_{modelo.__name__}')
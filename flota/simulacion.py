@@ -0,0 +1,417 @@
+"""
+Simulación Monte Carlo de la disponibilidad de la flota.
+
+Proyecta, día a día y por centro, cuántos vehículos quedarán detenidos en los
+próximos ``horizonte`` días y entrega los percentiles (p5, p50, p95) de la
+disponibilidad sobre miles de corridas. Cada corrida combina:
+
+- los preventivos que vencen según el kilometraje (``planificacion.py``),
+  con un uso diario que varía entre corridas (``FLOTA_SIMULACION_DISPERSION_USO``);
+- los mantenimientos ya programados y los vehículos que hoy están en taller;
+- fallas correctivas aleatorias (Poisson), con la tasa histórica de cada centro
+  del último año;
+- la capacidad diaria de los talleres (``Proveedor.capacidad_horas_diarias``
+  en días hábiles), atendida por orden de llegada: cuando no alcanza, los
+  correctivos esperan detenidos.
+
+El escenario se lee de la base una sola vez (``preparar_escenario``) y queda en
+estructuras simples; las corridas no consultan la base. Los trabajos iguales
+(mismo centro, día y horas) se atienden en grupo y los vencimientos se cuentan
+con búsqueda binaria sobre distancias ordenadas, por lo que el costo de una
+corrida depende de centros × días y no de la cantidad de vehículos. Las
+corridas se reparten en un pool de procesos, cada lote con su propia semilla:
+con la misma semilla el resultado se repite.
+
+Con ``con_preventivo=False`` se simula el escenario sin programa preventivo:
+los servicios no se hacen y los vehículos vencidos fallan
+``FLOTA_SIMULACION_FACTOR_VENCIDOS`` veces más.
+"""
+import bisect
+import datetime
+import math
+import multiprocessing
+import random
+import threading
+import time
+from array import array
+from collections import Counter, defaultdict
+from concurrent.futures import ProcessPoolExecutor
+import django
+from django.conf import settings
+from django.db.models import Avg, Count, Sum
+from django.utils import timezone
+from .agenda import dias_habiles
+from .models import CentroOperacional, Mantenimiento, MantenimientoHistorial, Proveedor, TipoMantenimiento, Vehiculo
+from .planificacion import km_diarios, proximos_servicios, tipos_preventivos
+from .shards import aliases_consulta, reunir_shards
+
+
+PERCENTILES = (5, 50, 95)
+HORIZONTE_MAXIMO = 730
+HORAS_POR_DEFECTO = 8
+DIAS_HISTORIAL = 365
+MINIMO_CORRECTIVOS = 10         # con menos fallas en el año, el centro usa la tasa de toda la flota
+MUESTRA_HORAS = 5000
+MEDIA_POISSON_NORMAL = 30       # desde esta media, Poisson se aproxima con una normal
+
+
+class SimulacionInvalida(ValueError):
+    pass
+
+
+def leer_parametros(datos):
+    """Parámetros de ``simular`` desde un QueryDict (?horizonte=&corridas=&centro=&preventivo=0&semilla=)"""
+    try:
+        parametros = {
+            'horizonte': int(datos.get('horizonte') or 90),
+            'corridas': int(datos.get('corridas') or settings.FLOTA_SIMULACION_CORRIDAS),
+            'centros': sorted({int(centro) for centro in datos.getlist('centro') if centro}),
+            'con_preventivo': datos.get('preventivo', '1') not in ('0', 'false', 'no'),
+            'semilla': int(datos['semilla']) if datos.get('semilla') else None,
+        }
+    except ValueError:
+        raise SimulacionInvalida('los parámetros numéricos deben ser enteros')
+    if not 1 <= parametros['horizonte'] <= HORIZONTE_MAXIMO:
+        raise SimulacionInvalida(f'el horizonte debe estar entre 1 y {HORIZONTE_MAXIMO} días')
+    if not 1 <= parametros['corridas'] <= settings.FLOTA_SIMULACION_CORRIDAS_MAXIMAS:
+        raise SimulacionInvalida(f'las corridas deben estar entre 1 y {settings.FLOTA_SIMULACION_CORRIDAS_MAXIMAS}')
+    return parametros
+
+
+# ==================== ESCENARIO ====================
+def _capacidad(hoy, horizonte):
+    """Horas de taller por día del horizonte (0 los días no hábiles)"""
+    diaria = Proveedor.objects.filter(activo=True).aggregate(total=Sum('capacidad_horas_diarias'))['total'] or 0
+    habiles = set(dias_habiles(hoy, horizonte))
+    return [diaria if hoy + datetime.timedelta(days=n) in habiles else 0 for n in range(horizonte)]
+
+
+def _flota(alias):
+    """Vehículos activos por (centro, estado)"""
+    return list(Vehiculo.objects.using(alias).filter(activo=True).order_by().values_list(
+        'centro_operacion_id', 'estado'
+    ).annotate(total=Count('id')))
+
+
+def _en_taller(alias):
+    """(centro, horas) de cada vehículo en mantenimiento, con las horas de su trabajo en proceso"""
+    horas = dict(Mantenimiento.objects.using(alias).filter(
+        estado='en_proceso', vehiculo__activo=True, vehiculo__estado='mantenimiento',
+    ).order_by().values_list('vehiculo_id', 'tiempo_estimado_horas'))
+    return [
+        (centro_id, horas.get(vehiculo_id) or HORAS_POR_DEFECTO)
+        for vehiculo_id, centro_id in Vehiculo.objects.using(alias).filter(
+            activo=True, estado='mantenimiento',
+        ).order_by().values_list('id', 'centro_operacion_id')
+    ]
+
+
+def _programados(alias, hoy, horizonte):
+    """(centro, fecha, horas) de los programados de vehículos operativos dentro del horizonte"""
+    return list(Mantenimiento.objects.using(alias).filter(
+        estado='programado', vehiculo__activo=True, vehiculo__estado='operativo',
+        fecha_programada__lt=hoy + datetime.timedelta(days=horizonte),
+    ).order_by().values_list('vehiculo__centro_operacion_id', 'fecha_programada', 'tiempo_estimado_horas'))
+
+
+def _correctivos(alias, desde):
+    """(centro, horas) de los correctivos programados desde ``desde``, vigentes y archivados"""
+    return list(MantenimientoHistorial.objects.using(alias).filter(
+        tipo='correctivo', fecha_programada__gte=desde,
+    ).exclude(estado='cancelado').order_by().values_list('vehiculo__centro_operacion_id', 'tiempo_estimado_horas'))
+
+
+def _agrupar(trabajos):
+    """[(centro, cantidad, horas)] a partir de pares (centro, horas)"""
+    return [(centro, cantidad, horas) for (centro, horas), cantidad in sorted(Counter(trabajos).items())]
+
+
+def preparar_escenario(horizonte=90, con_preventivo=True, semilla=None):
+    """
+    Lee de la base todo lo que usan las corridas y lo deja en un dict
+    serializable (se envía a los procesos del pool).
+    """
+    if not 1 <= horizonte <= HORIZONTE_MAXIMO:
+        raise SimulacionInvalida(f'el horizonte debe estar entre 1 y {HORIZONTE_MAXIMO} días')
+    hoy = timezone.localdate()
+    dispersion = settings.FLOTA_SIMULACION_DISPERSION_USO
+    uso = km_diarios()
+    # Distancia máxima que puede recorrer un vehículo en el horizonte en la corrida de más uso
+    alcance = uso * (1 + 3 * dispersion) * horizonte
+
+    centros = list(CentroOperacional.objects.order_by('nombre').values_list('id', 'nombre'))
+    indice = {centro_id: n for n, (centro_id, _) in enumerate(centros)}
+    totales, fuera, operativos = [0] * len(centros), [0] * len(centros), [0] * len(centros)
+    for parcial in reunir_shards(_flota):
+        for centro_id, estado, total in parcial:
+            n = indice[centro_id]
+            totales[n] += total
+            if estado == 'fuera_servicio':
+                fuera[n] += total
+            elif estado == 'operativo':
+                operativos[n] += total
+
+    en_taller = [(indice[c], max(horas, 1)) for parcial in reunir_shards(_en_taller) for c, horas in parcial]
+    programados = [[] for _ in range(horizonte)]
+    for c, fecha, horas in (fila for parcial in reunir_shards(lambda alias: _programados(alias, hoy, horizonte)) for fila in parcial):
+        programados[max((fecha - hoy).days, 0)].append((indice[c], max(horas or HORAS_POR_DEFECTO, 1)))
+
+    # Preventivos: por (centro, horas), la distancia en km de cada vencimiento dentro del alcance
+    tipos = tipos_preventivos()
+    distancias = defaultdict(list)
+    vencimientos = defaultdict(list)
+    for alias in aliases_consulta():
+        primero = {}
+        for vehiculo_id, estado, km, centro_id, _, tipo, proximo_km in proximos_servicios(alias, tipos):
+            n = indice[centro_id]
+            # Con un trabajo abierto, el siguiente servicio es una frecuencia después de ese
+            distancia = max(proximo_km - km, 0) if proximo_km is not None else tipo.frecuencia_km
+            if estado == 'operativo' and proximo_km is not None and distancia < primero.get(vehiculo_id, (n, alcance))[1]:
+                primero[vehiculo_id] = (n, distancia)
+            while distancia <= alcance:
+                distancias[(n, max(tipo.tiempo_estimado_horas, 1))].append(distancia)
+                distancia += tipo.frecuencia_km
+        for n, distancia in primero.values():
+            vencimientos[n].append(distancia)
+
+    # Correctivos: fallas por vehículo y día de cada centro en el último año
+    correctivos = [fila for parcial in reunir_shards(
+        lambda alias: _correctivos(alias, hoy - datetime.timedelta(days=DIAS_HISTORIAL))
+    ) for fila in parcial if fila[0] in indice]
+    por_centro = Counter(indice[c] for c, _ in correctivos)
+    tasa_flota = (
+        len(correctivos) / (sum(totales) * DIAS_HISTORIAL)
+        if len(correctivos) >= MINIMO_CORRECTIVOS and sum(totales) else settings.FLOTA_SIMULACION_TASA_CORRECTIVA
+    )
+    tasas = [
+        por_centro[n] / (totales[n] * DIAS_HISTORIAL) if por_centro[n] >= MINIMO_CORRECTIVOS and totales[n] else tasa_flota
+        for n in range(len(centros))
+    ]
+    horas_correctivas = [horas for _, horas in correctivos if horas and horas > 0]
+    if len(horas_correctivas) > MUESTRA_HORAS:
+        horas_correctivas = random.Random(semilla).sample(horas_correctivas, MUESTRA_HORAS)
+    if not horas_correctivas:
+        promedio = TipoMantenimiento.objects.filter(es_preventivo=False, activo=True).aggregate(
+            promedio=Avg('tiempo_estimado_horas')
+        )['promedio']
+        horas_correctivas = [max(round(promedio or HORAS_POR_DEFECTO), 1)]
+
+    return {
+        'desde': hoy.isoformat(),
+        'dias': horizonte,
+        'centros': centros,
+        'capacidad': _capacidad(hoy, horizonte),
+        'totales': totales,
+        'fuera': fuera,
+        'operativos': operativos,
+        'en_taller': _agrupar(en_taller),
+        'programados': [_agrupar(dia) for dia in programados],
+        'preventivos': [(n, horas, array('q', sorted(lista))) for (n, horas), lista in sorted(distancias.items())],
+        'vencimientos': [array('q', sorted(vencimientos[n])) for n in range(len(centros))],
+        'tasas': tasas,
+        'horas_correctivas': horas_correctivas,
+        'km_diarios': uso,
+        'dispersion': dispersion,
+        'con_preventivo': con_preventivo,
+        'factor_vencidos': settings.FLOTA_SIMULACION_FACTOR_VENCIDOS,
+    }
+
+
+# ==================== CORRIDAS ====================
+def _poisson(rng, media):
+    if media <= 0:
+        return 0
+    if media >= MEDIA_POISSON_NORMAL:
+        return max(0, round(rng.gauss(media, math.sqrt(media))))
+    # Knuth: multiplicar uniformes hasta bajar de e^-media
+    limite, cantidad, producto = math.exp(-media), 0, rng.random()
+    while producto > limite:
+        cantidad += 1
+        producto *= rng.random()
+    return cantidad
+
+
+class _Talleres:
+    """Horas libres por día compartidas por todos los centros, atendidas por orden de llegada"""
+
+    def __init__(self, capacidad, centros):
+        self.libres = list(capacidad)
+        self.dias = len(capacidad)
+        self.primero = 0
+        # Variación diaria de detenidos por centro (suma acumulada = detenidos)
+        self.cambios = [[0] * (self.dias + 1) for _ in range(centros)]
+
+    def atender(self, dia, centro, cantidad, horas, desde_solicitud):
+        """
+        ``cantidad`` trabajos de ``horas`` pedidos el ``dia``. Los preventivos
+        (desde_solicitud=False) detienen el vehículo al empezar; los correctivos
+        desde que se piden. Lo que no termina en el horizonte queda detenido.
+        """
+        cambios = self.cambios[centro]
+        if desde_solicitud:
+            cambios[dia] += cantidad
+        total, hechas = cantidad * horas, 0
+        # Los pedidos llegan en orden de día: las horas libres anteriores ya no se usan
+        self.primero = n = max(dia, self.primero)
+        while hechas < total and n < self.dias:
+            tomadas = min(self.libres[n], total - hechas)
+            if tomadas:
+                antes, hechas = hechas, hechas + tomadas
+                self.libres[n] -= tomadas
+                if not desde_solicitud:
+                    # Trabajos que empiezan este día: los que tienen su inicio (k × horas) en [antes, hechas)
+                    cambios[n] += -(-hechas // horas) + (antes // -horas)
+                cambios[n + 1] -= hechas // horas - antes // horas
+            n += 1
+        while self.primero < self.dias and not self.libres[self.primero]:
+            self.primero += 1
+
+
+def _corrida(escenario, rng):
+    """Detenidos por centro y día de una corrida, más la fila de la flota completa al final"""
+    dias, cantidad_centros = escenario['dias'], len(escenario['centros'])
+    dispersion = escenario['dispersion']
+    uso = escenario['km_diarios'] * min(max(rng.gauss(1, dispersion), 1 - 3 * dispersion, 0.1), 1 + 3 * dispersion)
+    talleres = _Talleres(escenario['capacidad'], cantidad_centros)
+    preventivos = escenario['preventivos'] if escenario['con_preventivo'] else ()
+    atendidos = [0] * len(preventivos)
+    vencidos_extra = 0 if escenario['con_preventivo'] else escenario['factor_vencidos'] - 1
+    horas_correctivas = escenario['horas_correctivas']
+
+    for centro, cantidad, horas in escenario['en_taller']:
+        talleres.atender(0, centro, cantidad, horas, True)
+    for dia in range(dias):
+        for centro, cantidad, horas in escenario['programados'][dia]:
+            talleres.atender(dia, centro, cantidad, horas, False)
+        recorrido = dia * uso
+        for n, (centro, horas, distancias) in enumerate(preventivos):
+            vencen = bisect.bisect_right(distancias, recorrido, atendidos[n])
+            if vencen > atendidos[n]:
+                talleres.atender(dia, centro, vencen - atendidos[n], horas, False)
+                atendidos[n] = vencen
+        for centro in range(cantidad_centros):
+            tasa = escenario['tasas'][centro]
+            media = tasa * escenario['operativos'][centro]
+            if vencidos_extra:
+                media += tasa * vencidos_extra * bisect.bisect_right(escenario['vencimientos'][centro], recorrido)
+            fallas = _poisson(rng, media)
+            if fallas:
+                for horas, cantidad in Counter(rng.choices(horas_correctivas, k=fallas)).items():
+                    talleres.atender(dia, centro, cantidad, horas, True)
+
+    filas, flota = [], [0] * dias
+    for centro in range(cantidad_centros):
+        total, detenidos = escenario['totales'][centro], escenario['fuera'][centro]
+        cambios = talleres.cambios[centro]
+        for dia in range(dias):
+            detenidos += cambios[dia]
+            valor = min(detenidos, total)
+            filas.append(valor)
+            flota[dia] += valor
+    filas.extend(flota)
+    return filas
+
+
+def simular_corridas(escenario, semilla, corridas):
+    """
+    Ejecuta ``corridas`` trayectorias (en el pool de procesos). Retorna un
+    array plano de detenidos indexado por [corrida][centro][día], con la
+    flota completa como último centro.
+    """
+    rng = random.Random(semilla)
+    salida = array('i')
+    for _ in range(corridas):
+        salida.extend(_corrida(escenario, rng))
+    return salida
+
+
+# ==================== POOL DE PROCESOS ====================
+_pools = {}
+_pool_lock = threading.Lock()
+
+
+def obtener_pool(procesos):
+    with _pool_lock:
+        if procesos not in _pools:
+            _pools[procesos] = ProcessPoolExecutor(
+                max_workers=procesos,
+                # Igual que el pool de reportes: spawn y django.setup en cada proceso
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=django.setup,
+            )
+        return _pools[procesos]
+
+
+def _lotes(corridas, procesos, semilla):
+    """(semilla, corridas) por lote: unos pocos por proceso para repartir la carga"""
+    cantidad = min(corridas, procesos * 4 if procesos > 1 else 1)
+    base, resto = divmod(corridas, cantidad)
+    return [(semilla * 1000003 + n, base + (n < resto)) for n in range(cantidad)]
+
+
+# ==================== RESULTADO ====================
+def _percentil(ordenados, p):
+    """Percentil por rango más cercano"""
+    return ordenados[min(len(ordenados) - 1, max(0, math.ceil(p / 100 * len(ordenados)) - 1))]
+
+
+def _resumen_fila(detenidos, fila, filas, dias, total):
+    """Percentiles de la disponibilidad (%) y detenidos promedio por día de una fila"""
+    resultado = {f'p{p}': [] for p in PERCENTILES}
+    resultado['detenidos_promedio'] = []
+    for dia in range(dias):
+        valores = sorted(detenidos[fila * dias + dia::filas * dias])
+        # Más detenidos es menos disponibilidad: el p5 de la disponibilidad es el p95 de los detenidos
+        for p in PERCENTILES:
+            disponibles = total - _percentil(valores, 100 - p) if total else 0
+            resultado[f'p{p}'].append(round(100 * disponibles / total, 1) if total else 0.0)
+        resultado['detenidos_promedio'].append(round(sum(valores) / len(valores), 2))
+    return resultado
+
+
+def simular(horizonte=90, corridas=None, centros=None, con_preventivo=True, semilla=None, procesos=None):
+    """
+    Disponibilidad proyectada por centro y para la flota: percentiles diarios
+    sobre ``corridas`` trayectorias. ``centros`` limita los centros informados
+    (la simulación siempre incluye toda la flota: comparten los talleres).
+    """
+    corridas = corridas or settings.FLOTA_SIMULACION_CORRIDAS
+    if not 1 <= corridas <= settings.FLOTA_SIMULACION_CORRIDAS_MAXIMAS:
+        raise SimulacionInvalida(f'las corridas deben estar entre 1 y {settings.FLOTA_SIMULACION_CORRIDAS_MAXIMAS}')
+    procesos = max(procesos or settings.FLOTA_SIMULACION_PROCESOS, 1)
+    semilla = random.randrange(2 ** 32) if semilla is None else semilla
+    inicio = time.perf_counter()
+
+    escenario = preparar_escenario(horizonte, con_preventivo, semilla)
+    lotes = _lotes(corridas, procesos, semilla)
+    if len(lotes) == 1:
+        partes = [simular_corridas(escenario, *lotes[0])]
+    else:
+        pool = obtener_pool(procesos)
+        partes = list(pool.map(simular_corridas, [escenario] * len(lotes), *zip(*lotes)))
+    detenidos = array('i')
+    for parte in partes:
+        detenidos.extend(parte)
+
+    dias, filas = escenario['dias'], len(escenario['centros']) + 1
+    desde = datetime.date.fromisoformat(escenario['desde'])
+    informados = set(centros) if centros else None
+    return {
+        'desde': escenario['desde'],
+        'fechas': [(desde + datetime.timedelta(days=n)).isoformat() for n in range(dias)],
+        'corridas': corridas,
+        'semilla': semilla,
+        'con_preventivo': con_preventivo,
+        'percentiles': list(PERCENTILES),
+        'centros': [
+            {'id': centro_id, 'nombre': nombre, 'vehiculos': escenario['totales'][fila],
+             **_resumen_fila(detenidos, fila, filas, dias, escenario['totales'][fila])}
+            for fila, (centro_id, nombre) in enumerate(escenario['centros'])
+            if informados is None or centro_id in informados
+        ],
+        'flota': {
+            'vehiculos': sum(escenario['totales']),
+            **_resumen_fila(detenidos, filas - 1, filas, dias, sum(escenario['totales'])),
+        },
+        'segundos': round(time.perf_counter() - inicio, 2),
+    }
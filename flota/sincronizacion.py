@@ -0,0 +1,271 @@
+"""
+Sincronización incremental para las tablets de taller y los teléfonos de los
+conductores: copia offline de los vehículos y los mantenimientos abiertos de
+un centro.
+
+``GET /api/sincronizacion/?centro=<id>&cursor=<cursor>&limite=500``. Sin
+cursor se recibe la copia completa; con el cursor de la respuesta anterior,
+solo lo que cambió desde entonces. Cada página trae:
+
+- ``vehiculos`` y ``mantenimientos``: filas compactas (``campos`` una vez y
+  ``filas`` como listas), que el cliente aplica como upserts;
+- ``bajas``: ids a borrar de la copia local. Son los vehículos y
+  mantenimientos eliminados o que salieron del alcance (vehículo marcado para
+  eliminar o trasladado a otro centro, mantenimiento completado o
+  cancelado). La baja de un vehículo incluye sus mantenimientos. En cada
+  página las bajas se aplican antes que los upserts;
+- ``cursor`` y ``completo``: con ``completo`` falso se pide de inmediato la
+  página siguiente; con verdadero la copia quedó al día y el cursor se
+  guarda para la próxima sincronización.
+
+Cada ciclo cubre los cambios con ``desde < fecha_modificacion <= hasta``, con
+``hasta`` fijado en la primera página, ``FLOTA_SINCRONIZACION_MARGEN``
+segundos antes del momento de la consulta: ``fecha_modificacion`` se asigna
+antes de que la transacción se confirme, y el margen evita dejar atrás una
+fila que aún no era visible. Dentro del ciclo se pagina por
+(fecha_modificacion, id), con los índices ``vehiculo_sync_idx`` y
+``mantenimiento_modif_idx``: cada página lee un rango del índice, no la tabla
+(la copia completa inicial sí recorre los mantenimientos del centro).
+Las bajas salen del registro de cambios (``cambios.py``, índice por fecha); un
+cursor anterior a su retención queda vencido (410) y el cliente parte de
+nuevo sin cursor.
+
+Las respuestas van comprimidas con gzip cuando el cliente lo acepta.
+"""
+import base64
+import binascii
+import datetime
+import json
+from decimal import Decimal
+from django.conf import settings
+from django.db.models import Q
+from django.http import HttpResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from .cambios import CursorVencido, fecha_purgada
+from .exportaciones import comprimir_gzip
+from .models import Mantenimiento, RegistroCambio, Vehiculo
+from .shards import alias_de_centro
+
+
+ESTADOS_ABIERTOS = ('programado', 'en_proceso')
+
+CAMPOS_VEHICULO = (
+    'id', 'patente', 'marca', 'modelo', 'año', 'tipo_capacidad', 'estado', 'kilometraje_actual',
+)
+CAMPOS_MANTENIMIENTO = (
+    'id', 'vehiculo_id', 'tipo_mantenimiento_id', 'tipo_mantenimiento__nombre', 'proveedor_id', 'proveedor__nombre',
+    'tipo', 'estado', 'prioridad', 'fecha_programada', 'kilometraje_programado', 'costo_estimado',
+    'tiempo_estimado_horas', 'descripcion',
+)
+
+# Filas leídas por fila enviada, como máximo, al recorrer los mantenimientos modificados de todos los centros
+ESCANEO_MAXIMO = 10
+
+# Sin compresión bajo este tamaño: gzip no ahorra nada en una página casi vacía
+MINIMO_GZIP = 1024
+
+
+class CursorInvalido(ValueError):
+    pass
+
+
+# ==================== CURSOR ====================
+def codificar_cursor(estado):
+    """Estado del ciclo como texto opaco y corto (JSON en base64 url-safe)"""
+    texto = json.dumps(estado, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(texto).decode('ascii').rstrip('=')
+
+
+def leer_cursor(texto, centro_id):
+    """
+    Estado {'c': centro, 'd': desde, 'h': hasta, 'e': etapa, 'p': posición};
+    sin cursor, el de una copia completa. Levanta CursorInvalido.
+    """
+    if not texto:
+        return {'c': centro_id, 'd': None, 'h': None, 'e': 0, 'p': None}
+    try:
+        estado = json.loads(base64.urlsafe_b64decode(texto + '=' * (-len(texto) % 4)))
+        if set(estado) != {'c', 'd', 'h', 'e', 'p'} or not 0 <= estado['e'] <= len(ETAPAS):
+            raise ValueError(texto)
+    except (ValueError, TypeError, binascii.Error):
+        raise CursorInvalido(texto)
+    if estado['c'] != centro_id:
+        raise CursorInvalido('el cursor es de otro centro')
+    return estado
+
+
+def _fecha(texto):
+    return parse_datetime(texto) if texto else None
+
+
+def _despues_de(consulta, posicion):
+    """Filas posteriores a (fecha_modificacion, id) en el orden de la paginación"""
+    if posicion is None:
+        return consulta
+    fecha, ultimo_id = _fecha(posicion[0]), posicion[1]
+    return consulta.filter(Q(fecha_modificacion__gt=fecha) | Q(fecha_modificacion=fecha, id__gt=ultimo_id))
+
+
+# ==================== ETAPAS ====================
+# Cada etapa agrega a la página hasta ``limite`` filas y retorna (cantidad
+# agregada, posición de la última leída, si terminó)
+
+def _bajas(alias, centro_id, desde, hasta, posicion, limite, pagina):
+    if desde is None:
+        # La copia completa no tiene nada que borrar
+        return 0, None, True
+    registros = RegistroCambio.objects.filter(
+        fecha__gt=desde, fecha__lte=hasta, modelo__in=('vehiculo', 'mantenimiento'),
+    ).filter(
+        Q(operacion='baja', centro_id=centro_id)
+        # Traslados: el registro trae el centro nuevo; a los demás centros les llega como baja
+        | (Q(modelo='vehiculo', operacion='modificacion', datos__has_key='centro_operacion_id') & ~Q(centro_id=centro_id))
+    )
+    if posicion is not None:
+        registros = registros.filter(id__gt=posicion)
+    filas = list(registros.order_by('id').values_list('id', 'modelo', 'objeto_id')[:limite])
+    for _, modelo, objeto_id in filas:
+        pagina['bajas'][f'{modelo}s'].add(objeto_id)
+    return len(filas), filas[-1][0] if filas else posicion, len(filas) < limite
+
+
+def _mantenimientos_abiertos(alias, vehiculo_ids):
+    return list(Mantenimiento.objects.using(alias).filter(
+        vehiculo_id__in=vehiculo_ids, estado__in=ESTADOS_ABIERTOS,
+    ).order_by('id').values_list(*CAMPOS_MANTENIMIENTO))
+
+
+def _vehiculos(alias, centro_id, desde, hasta, posicion, limite, pagina):
+    vehiculos = Vehiculo.objects.using(alias).filter(centro_operacion_id=centro_id, fecha_modificacion__lte=hasta)
+    if desde is None:
+        vehiculos = vehiculos.filter(activo=True)
+    else:
+        vehiculos = vehiculos.filter(fecha_modificacion__gt=desde)
+    filas = list(_despues_de(vehiculos, posicion).order_by('fecha_modificacion', 'id').values_list(
+        'fecha_modificacion', 'activo', *CAMPOS_VEHICULO
+    )[:limite])
+    vigentes = []
+    for _, activo, *valores in filas:
+        if activo:
+            pagina['vehiculos'].append(valores)
+            vigentes.append(valores[0])
+        else:
+            pagina['bajas']['vehiculos'].add(valores[0])
+    if desde is not None and vigentes:
+        # Un vehículo recién trasladado al centro trae mantenimientos abiertos que no cambiaron
+        pagina['mantenimientos'].extend(_mantenimientos_abiertos(alias, vigentes))
+    return len(filas), [filas[-1][0].isoformat(), filas[-1][2]] if filas else posicion, len(filas) < limite
+
+
+def _agregar_mantenimiento(pagina, valores):
+    if valores[CAMPOS_MANTENIMIENTO.index('estado')] in ESTADOS_ABIERTOS:
+        pagina['mantenimientos'].append(valores)
+    else:
+        # Cerrado: sale de la copia de trabajo
+        pagina['bajas']['mantenimientos'].add(valores[0])
+
+
+def _mantenimientos(alias, centro_id, desde, hasta, posicion, limite, pagina):
+    if desde is None:
+        # Copia completa: los abiertos de los vehículos del centro
+        filas = list(_despues_de(Mantenimiento.objects.using(alias).filter(
+            vehiculo__centro_operacion_id=centro_id, vehiculo__activo=True, estado__in=ESTADOS_ABIERTOS,
+            fecha_modificacion__lte=hasta,
+        ), posicion).order_by('fecha_modificacion', 'id').values_list('fecha_modificacion', *CAMPOS_MANTENIMIENTO)[:limite])
+        for _, *valores in filas:
+            _agregar_mantenimiento(pagina, valores)
+        return len(filas), [filas[-1][0].isoformat(), filas[-1][1]] if filas else posicion, len(filas) < limite
+
+    # Incremental: rango de mantenimiento_modif_idx, sin join; el centro se filtra
+    # con los ids de sus vehículos (vehiculo_activo_idx) y la lectura se corta a
+    # ESCANEO_MAXIMO filas por fila de la página
+    vehiculos = set(Vehiculo.objects.using(alias).filter(activo=True, centro_operacion_id=centro_id).values_list(
+        'id', flat=True
+    ))
+    rango = Mantenimiento.objects.using(alias).filter(fecha_modificacion__gt=desde, fecha_modificacion__lte=hasta)
+    agregadas = leidas = 0
+    while agregadas < limite and leidas < limite * ESCANEO_MAXIMO:
+        pendientes = limite - agregadas
+        filas = list(_despues_de(rango, posicion).order_by('fecha_modificacion', 'id').values_list(
+            'fecha_modificacion', *CAMPOS_MANTENIMIENTO
+        )[:pendientes])
+        for _, *valores in filas:
+            if valores[1] in vehiculos:
+                _agregar_mantenimiento(pagina, valores)
+                agregadas += 1
+        if filas:
+            posicion = [filas[-1][0].isoformat(), filas[-1][1]]
+        leidas += len(filas)
+        if len(filas) < pendientes:
+            return agregadas, posicion, True
+    return agregadas, posicion, False
+
+
+ETAPAS = (_bajas, _vehiculos, _mantenimientos)
+
+
+# ==================== PÁGINA ====================
+def sincronizar(centro_id, cursor=None, limite=None):
+    """
+    Página de la sincronización de un centro. Retorna {'cursor', 'completo',
+    'vehiculos', 'mantenimientos', 'bajas'}; levanta CursorInvalido o
+    CursorVencido (si la retención del registro ya borró bajas posteriores).
+    """
+    maximo = settings.FLOTA_SINCRONIZACION_PAGINA_MAXIMA
+    limite = min(max(int(limite or settings.FLOTA_SINCRONIZACION_PAGINA), 1), maximo)
+    estado = leer_cursor(cursor, centro_id)
+    desde = _fecha(estado['d'])
+    purgado = fecha_purgada()
+    if desde is not None and purgado is not None and desde < purgado:
+        raise CursorVencido(cursor)
+    if estado['h'] is None:
+        hasta = timezone.now() - datetime.timedelta(seconds=settings.FLOTA_SINCRONIZACION_MARGEN)
+        if desde is not None:
+            hasta = max(hasta, desde)
+        estado['h'] = hasta.isoformat()
+    hasta = _fecha(estado['h'])
+
+    alias = alias_de_centro(centro_id)
+    pagina = {'vehiculos': [], 'mantenimientos': [], 'bajas': {'vehiculos': set(), 'mantenimientos': set()}}
+    restantes = limite
+    while estado['e'] < len(ETAPAS) and restantes:
+        agregadas, estado['p'], terminada = ETAPAS[estado['e']](
+            alias, centro_id, desde, hasta, estado['p'], restantes, pagina
+        )
+        if not terminada:
+            break
+        estado['e'], estado['p'] = estado['e'] + 1, None
+        restantes -= agregadas
+
+    completo = estado['e'] == len(ETAPAS)
+    if completo:
+        # El próximo ciclo parte donde terminó este
+        estado = {'c': centro_id, 'd': estado['h'], 'h': None, 'e': 0, 'p': None}
+    return {
+        'cursor': codificar_cursor(estado),
+        'completo': completo,
+        'vehiculos': {'campos': CAMPOS_VEHICULO, 'filas': pagina['vehiculos']},
+        'mantenimientos': {'campos': CAMPOS_MANTENIMIENTO, 'filas': pagina['mantenimientos']},
+        'bajas': {nombre: sorted(ids) for nombre, ids in pagina['bajas'].items()},
+    }
+
+
+def _json(valor):
+    if isinstance(valor, (datetime.date, datetime.datetime)):
+        return valor.isoformat()
+    if isinstance(valor, Decimal):
+        return int(valor) if valor == valor.to_integral_value() else float(valor)
+    raise TypeError(type(valor))
+
+
+def respuesta(request, datos):
+    """JSON sin espacios, con gzip si el cliente lo acepta"""
+    contenido = json.dumps(datos, separators=(',', ':'), ensure_ascii=False, default=_json).encode('utf-8')
+    response = HttpResponse(content_type='application/json')
+    if 'gzip' in request.headers.get('Accept-Encoding', '') and len(contenido) >= MINIMO_GZIP:
+        contenido = b''.join(comprimir_gzip([contenido]))
+        response['Content-Encoding'] = 'gzip'
+    response.content = contenido
+    response['Vary'] = 'Accept-Encoding'
+    return response
@@ -0,0 +1,109 @@
+"""
+Perfil de producción para SQLite.
+
+- PRAGMAs (synchronous, cache, mmap, busy_timeout) aplicados a cada
+  conexión nueva mediante la señal ``connection_created``. El modo WAL se
+  guarda en el archivo, así que lo activa una sola vez la migración
+  ``0003_sqlite_wal`` (o ``mantener_bd --wal``) y no cada conexión.
+- ``atomic_inmediato``: transacciones ``BEGIN IMMEDIATE`` para las vistas de
+  escritura. Con el ``BEGIN`` diferido por defecto, una transacción que lee y
+  luego escribe (validar el form y guardar) puede fallar con "database is
+  locked" al intentar pasar de lectura a escritura; IMMEDIATE toma el lock de
+  escritura al inicio y deja que ``busy_timeout`` haga esperar a los demás.
+
+Django 4.2 no soporta ``init_command`` ni ``transaction_mode`` en SQLite
+(disponibles desde 5.1), por eso se implementa aquí.
+"""
+from contextlib import ExitStack
+from functools import wraps
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, transaction
+from . import shards
+
+
+PRAGMAS_POR_DEFECTO = {
+    'synchronous': 'NORMAL',
+    'cache_size': -20000,          # KiB (negativo) = ~20 MB por conexión
+    'mmap_size': 268435456,        # 256 MB
+    'busy_timeout': 5000,          # ms
+    'temp_store': 'MEMORY',
+}
+
+
+def pragmas_configurados():
+    return getattr(settings, 'FLOTA_SQLITE_PRAGMAS', PRAGMAS_POR_DEFECTO)
+
+
+def configurar_conexion_sqlite(sender, connection, **kwargs):
+    """Handler de connection_created: aplica los PRAGMAs a la conexión"""
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        for nombre, valor in pragmas_configurados().items():
+            cursor.execute(f'PRAGMA {nombre} = {valor}')
+        if shards.es_shard(connection.alias):
+            # Usuarios y demás tablas globales no existen en el shard: tampoco se revisan
+            # las FK al cerrar cada migración (el schema editor lo hace con todas las apps)
+            cursor.execute('PRAGMA foreign_keys = OFF')
+            connection.check_constraints = _sin_revisar_fks
+
+
+def _sin_revisar_fks(table_names=None):
+    pass
+
+
+class AtomicInmediato(transaction.Atomic):
+    """transaction.Atomic que abre la transacción externa con BEGIN IMMEDIATE en SQLite"""
+    
+    def __enter__(self):
+        conexion = transaction.get_connection(self.using)
+        if conexion.vendor != 'sqlite' or conexion.in_atomic_block:
+            return super().__enter__()
+        
+        def begin_immediate():
+            conexion.cursor().execute('BEGIN IMMEDIATE')
+        
+        conexion._start_transaction_under_autocommit = begin_immediate
+        try:
+            return super().__enter__()
+        finally:
+            del conexion._start_transaction_under_autocommit
+
+
+def atomic_inmediato(using=None):
+    """Como transaction.atomic(); usable como context manager o decorador"""
+    if callable(using):
+        return AtomicInmediato(DEFAULT_DB_ALIAS, True, False)(using)
+    return AtomicInmediato(using or DEFAULT_DB_ALIAS, True, False)
+
+
+def _aliases_de_escritura(request, kwargs):
+    """Bases que toca un POST con sharding: default, el shard del pk de la URL y los del formulario"""
+    aliases = {DEFAULT_DB_ALIAS}
+    for pk in (kwargs.get('pk'), request.POST.get('vehiculo')):
+        if pk is not None and str(pk).isdigit():
+            aliases.add(shards.alias_probable_de_pk(int(pk)))
+    centro = request.POST.get('centro_operacion', '')
+    if centro.isdigit():
+        aliases.add(shards.alias_de_centro(int(centro)))
+    # Orden estable: dos POST nunca esperan cada uno el lock que tiene el otro
+    return [alias for alias in shards.aliases_datos() if alias in aliases]
+
+
+def escritura_inmediata(view_func):
+    """Decorador para vistas: los POST corren dentro de una transacción IMMEDIATE"""
+    
+    @wraps(view_func)
+    def _wrapped_view(request, *args, **kwargs):
+        if request.method != 'POST':
+            return view_func(request, *args, **kwargs)
+        if not shards.sharding_activo():
+            with atomic_inmediato():
+                return view_func(request, *args, **kwargs)
+        # Con sharding las escrituras van al shard del centro: lock en cada base que se toca
+        with ExitStack() as transacciones:
+            for alias in _aliases_de_escritura(request, kwargs):
+                transacciones.enter_context(atomic_inmediato(alias))
+            return view_func(request, *args, **kwargs)
+    
+    return _wrapped_view
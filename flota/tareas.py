@@ -0,0 +1,141 @@
+"""
+Tareas ejecutadas por la cola de trabajos (flota/trabajos.py).
+
+Se registran al cargar la app (FlotaConfig.ready) para que tanto las vistas
+que encolan como el comando ``trabajador`` las conozcan.
+"""
+from pathlib import Path
+from django.conf import settings
+from django.core.mail import EmailMessage
+from django.urls import reverse
+from django.utils import timezone
+from .models import Mantenimiento
+from .reportes.escritores import FORMATOS, escribir_pdf
+from .reportes.motor import clave_reporte, generar_en_archivo
+from .reportes.planes import PLANES
+from . import archivo, cambios, disponibilidad, eliminacion, notificaciones, simulacion
+from .shards import buscar_por_pk
+from .trabajos import tarea
+from .versiones import version_actual
+
+
+def _clave_actual(tipo, formato):
+    return clave_reporte(tipo, formato, version_actual()[0], timezone.localdate())
+
+
+# ==================== REPORTES ====================
+@tarea('renderizar_reporte', max_intentos=3)
+def renderizar_reporte(tipo, formato):
+    """Genera un reporte en la caché; la descarga posterior lo sirve desde disco"""
+    archivo = generar_en_archivo(tipo, formato, _clave_actual(tipo, formato))
+    return {
+        'archivo': Path(archivo).name,
+        'descarga': reverse('flota:reporte_descargar', args=[tipo]) + f'?formato={formato}',
+    }
+
+
+@tarea('reconstruir_cache_reportes', max_intentos=2)
+def reconstruir_cache_reportes(version=None):
+    """Regenera todos los reportes; se omite si los datos ya cambiaron desde ``version``"""
+    if version is not None and version_actual()[0] != version:
+        return {'omitido': 'versión de datos superada'}
+
+    generados = 0
+    for tipo in PLANES:
+        for formato in FORMATOS:
+            generar_en_archivo(tipo, formato, _clave_actual(tipo, formato))
+            generados += 1
+    return {'generados': generados}
+
+
+# ==================== EMAIL ====================
+@tarea('enviar_email')
+def enviar_email(asunto, cuerpo, destinatarios):
+    enviados = EmailMessage(asunto, cuerpo, to=destinatarios).send()
+    return {'enviados': enviados}
+
+
+@tarea('archivar_reporte_mantenimiento')
+def archivar_reporte_mantenimiento(mantenimiento_id):
+    """Genera y archiva el PDF del mantenimiento completado (se adjunta al próximo resumen)"""
+    mantenimiento = buscar_por_pk(
+        Mantenimiento.objects.select_related('vehiculo', 'tipo_mantenimiento', 'proveedor'), mantenimiento_id
+    )
+    if mantenimiento is None or mantenimiento.estado != 'completado':
+        return {'omitido': 'mantenimiento inexistente o no completado'}
+
+    numero = mantenimiento.numero_reporte()
+    filas = [
+        ('Número de Reporte', numero),
+        ('Vehículo', f'{mantenimiento.vehiculo.patente} - {mantenimiento.vehiculo.marca} {mantenimiento.vehiculo.modelo}'),
+        ('Tipo de Mantenimiento', mantenimiento.tipo_mantenimiento.nombre),
+        ('Tipo', mantenimiento.get_tipo_display()),
+        ('Proveedor', mantenimiento.proveedor.nombre),
+        ('Fecha Programada', mantenimiento.fecha_programada),
+        ('Fecha de Realización', mantenimiento.fecha_realizacion),
+        ('Kilometraje', mantenimiento.kilometraje_programado),
+        ('Costo Estimado', mantenimiento.costo_estimado),
+        ('Costo Real', mantenimiento.costo_real),
+        ('Descripción', mantenimiento.descripcion),
+    ]
+    contenido = b''.join(escribir_pdf(f'Reporte de Mantenimiento {numero}', ('Campo', 'Valor'), filas))
+
+    # Archivo permanente (la caché de reportes se purga)
+    directorio = Path(settings.FLOTA_REPORTES_ARCHIVO_DIR) / 'mantenimientos'
+    directorio.mkdir(parents=True, exist_ok=True)
+    (directorio / f'{numero}.pdf').write_bytes(contenido)
+    return {'numero': numero, 'archivo': f'mantenimientos/{numero}.pdf'}
+
+
+@tarea('archivar_reportes_mantenimiento')
+def archivar_reportes_mantenimiento(mantenimiento_ids):
+    """Un solo trabajo para los PDF de un cierre en bloque (flota/flujo.py)"""
+    archivados = [archivar_reporte_mantenimiento(pk) for pk in mantenimiento_ids]
+    return {'archivados': sum(1 for resultado in archivados if 'numero' in resultado)}
+
+
+# ==================== NOTIFICACIONES ====================
+@tarea('enviar_resumenes')
+def enviar_resumenes():
+    """Resúmenes de eventos por destinatario (ver flota/notificaciones.py)"""
+    return notificaciones.enviar_resumenes()
+
+
+# ==================== DISPONIBILIDAD ====================
+@tarea('tomar_snapshot_disponibilidad', max_intentos=3)
+def tomar_snapshot_disponibilidad():
+    """Snapshot diario de la flota; deja programado el del día siguiente"""
+    resultado = disponibilidad.tomar_snapshot()
+    disponibilidad.programar_snapshot()
+    return resultado
+
+
+@tarea('simular_disponibilidad', max_intentos=1)
+def simular_disponibilidad(**parametros):
+    """Simulación Monte Carlo de la disponibilidad; el resultado trae los percentiles por centro y día"""
+    return simulacion.simular(**parametros)
+
+
+# ==================== ARCHIVO ====================
+@tarea('archivar_mantenimientos', max_intentos=3)
+def archivar_mantenimientos():
+    """Archivado nocturno de los mantenimientos cerrados; deja programado el del día siguiente"""
+    resultado = archivo.archivar_mantenimientos()
+    archivo.programar_archivo()
+    return {**resultado, 'limite': resultado['limite'].isoformat()}
+
+
+# ==================== REGISTRO DE CAMBIOS ====================
+@tarea('mantener_registro_cambios', max_intentos=3)
+def mantener_registro_cambios():
+    """Compactación y retención nocturnas del registro de cambios; deja programada la del día siguiente"""
+    resultado = cambios.mantener_registro()
+    cambios.programar_mantencion()
+    return resultado
+
+
+# ==================== ELIMINACIÓN ====================
+@tarea('purgar_vehiculo', max_intentos=5)
+def purgar_vehiculo(vehiculo_id):
+    """Borra por lotes el historial de un vehículo marcado para eliminar y luego el vehículo"""
+    return eliminacion.purgar_vehiculo(vehiculo_id)
@@ -0,0 +1,77 @@
+"""Datos de prueba compartidos por los tests de flota"""
+from datetime import date, timedelta
+from django.contrib.auth.models import User
+from django.test import TestCase, TransactionTestCase
+from flota import trabajos
+from flota.models import CentroOperacional, Mantenimiento, Proveedor, TipoMantenimiento, Vehiculo
+
+
+ESTADOS_VEHICULO = ['operativo', 'mantenimiento', 'fuera_servicio']
+ESTADOS_MANTENIMIENTO = ['programado', 'en_proceso', 'completado']
+
+
+def crear_flota(cantidad_vehiculos=6):
+    """
+    Tres centros, dos tipos de mantenimiento, un proveedor y ``cantidad_vehiculos``
+    vehículos repartidos por centro y estado, cada uno con un mantenimiento.
+    """
+    centros = [
+        CentroOperacional.objects.create(
+            nombre=nombre, direccion='Av. Principal 100', ciudad=nombre, telefono='221234567',
+            responsable='Jefe de centro', capacidad_maxima=5,
+        )
+        for nombre in ('Santiago', 'Osorno', 'Coquimbo')
+    ]
+    usuario = User.objects.create_superuser('admin', 'admin@acme.cl', 'clave')
+    aceite = TipoMantenimiento.objects.create(
+        nombre='Cambio aceite', descripcion='Aceite y filtros', frecuencia_km=10000,
+        costo_estimado=100000, tiempo_estimado_horas=4,
+    )
+    frenos = TipoMantenimiento.objects.create(
+        nombre='Frenos', descripcion='Pastillas y discos', frecuencia_km=30000,
+        costo_estimado=300000, tiempo_estimado_horas=8,
+    )
+    proveedor = Proveedor.objects.create(
+        nombre='Taller Central', rut='76123456-9', direccion='Calle Taller 1', telefono='221111111',
+        email='taller@acme.cl', contacto_principal='Encargado', especialidad='Mecánica general',
+    )
+    vehiculos = [
+        Vehiculo.objects.create(
+            patente=f'AB-{1000 + i}', marca='Volvo', modelo='FH', año=2020,
+            tipo_capacidad='GC' if i % 2 else 'MC', estado=ESTADOS_VEHICULO[i % 3],
+            kilometraje_actual=9600 + i * 1000, centro_operacion=centros[i % 3],
+        )
+        for i in range(cantidad_vehiculos)
+    ]
+    mantenimientos = []
+    for i, vehiculo in enumerate(vehiculos):
+        completado = i % 3 == 2
+        mantenimientos.append(Mantenimiento.objects.create(
+            vehiculo=vehiculo, tipo_mantenimiento=aceite, proveedor=proveedor,
+            fecha_programada=date.today() + timedelta(days=i), kilometraje_programado=vehiculo.kilometraje_actual,
+            costo_estimado=100000, descripcion='Mantenimiento de prueba', usuario_programacion=usuario,
+            estado=ESTADOS_MANTENIMIENTO[i % 3], costo_real=120000 if completado else None,
+            fecha_realizacion=date.today() if completado else None,
+        ))
+    return {
+        'centros': centros, 'usuario': usuario, 'aceite': aceite, 'frenos': frenos,
+        'proveedor': proveedor, 'vehiculos': vehiculos, 'mantenimientos': mantenimientos,
+    }
+
+
+class FlotaTestCase(TestCase):
+    """TestCase con la flota de ejemplo y el usuario administrador logueado"""
+    
+    def setUp(self):
+        trabajos._claves_confirmadas.clear()
+        self.flota = crear_flota()
+        self.client.force_login(self.flota['usuario'])
+
+
+class FlotaTransactionTestCase(TransactionTestCase):
+    """Para vistas async y código que consulta desde otros hilos o procesos (ven solo datos confirmados)"""
+    
+    def setUp(self):
+        trabajos._claves_confirmadas.clear()
+        self.flota = crear_flota()
+        self.client.force_login(self.flota['usuario'])
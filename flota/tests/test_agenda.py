@@ -0,0 +1,120 @@
+"""Agenda de talleres: cupos por capacidad diaria del proveedor"""
+import random
+from datetime import timedelta
+from io import StringIO
+from django.core.management import call_command
+from django.test import SimpleTestCase
+from django.utils import timezone
+from flota.agenda import Agenda, Taller, dias_habiles, validar_cupo
+from flota.models import Mantenimiento
+from .base import FlotaTestCase
+
+
+def proximo_habil(fecha):
+    while fecha.weekday() > 4:
+        fecha += timedelta(days=1)
+    return fecha
+
+
+def primer_cupo_lineal(libres, capacidad, desde, horas):
+    """El mismo criterio de Taller.cabe, recorriendo día por día"""
+    dias = max(1, -(-horas // capacidad))
+    for indice in range(desde, len(libres) - dias + 1):
+        if libres[indice] and sum(libres[indice:indice + dias]) >= horas:
+            return indice
+    return None
+
+
+class TallerTests(SimpleTestCase):
+    
+    def test_ocupar_y_primer_cupo(self):
+        taller = Taller(1, 8, 10)
+        taller.ocupar(0, 20)
+        
+        self.assertEqual(taller.libres[:4], [0, 0, 4, 8])
+        self.assertEqual(taller.primer_cupo(0, 4), 2)
+        self.assertEqual(taller.primer_cupo(0, 6), 3)
+        self.assertEqual(taller.primer_cupo(0, 12), 2)  # 4 + 8 en dos días
+        self.assertEqual(taller.primer_cupo(0, 13), 3)
+        self.assertIsNone(Taller(1, 0, 5).primer_cupo(0, 1))
+    
+    def test_primer_cupo_igual_al_recorrido_lineal(self):
+        azar = random.Random(40)
+        for _ in range(200):
+            capacidad, dias = azar.randint(1, 10), azar.randint(1, 40)
+            taller = Taller(1, capacidad, dias)
+            for _ in range(azar.randint(0, dias)):
+                taller.ocupar(azar.randrange(dias), azar.randint(1, 2 * capacidad))
+            desde, horas = azar.randrange(dias), azar.randint(1, 3 * capacidad)
+            self.assertEqual(
+                taller.primer_cupo(desde, horas), primer_cupo_lineal(taller.libres, capacidad, desde, horas),
+                (capacidad, taller.libres, desde, horas),
+            )
+
+
+class AgendaTests(FlotaTestCase):
+    
+    def setUp(self):
+        super().setUp()
+        self.proveedor = self.flota['proveedor']
+        self.fecha = proximo_habil(timezone.localdate() + timedelta(days=10))
+    
+    def _programar(self, cantidad, fecha, **campos):
+        return [
+            Mantenimiento.objects.create(
+                vehiculo=self.flota['vehiculos'][i % 6], tipo_mantenimiento=self.flota['aceite'], proveedor=self.proveedor,
+                fecha_programada=fecha, kilometraje_programado=1, costo_estimado=1, descripcion='Agenda',
+                usuario_programacion=self.flota['usuario'], tiempo_estimado_horas=4, **campos,
+            )
+            for i in range(cantidad)
+        ]
+    
+    def _datos_formulario(self, **cambios):
+        datos = {
+            'vehiculo': self.flota['vehiculos'][0].pk, 'tipo_mantenimiento': self.flota['aceite'].pk, 'tipo': 'preventivo',
+            'prioridad': 'media', 'fecha_programada': self.fecha.isoformat(), 'kilometraje_programado': 999999,
+            'proveedor': self.proveedor.pk, 'costo_estimado': 1000, 'tiempo_estimado_horas': 4, 'descripcion': 'Agenda',
+        }
+        datos.update(cambios)
+        return datos
+    
+    def test_formulario_rechaza_dia_lleno_salvo_critico(self):
+        self._programar(2, self.fecha)
+        self.assertFalse(Agenda().cabe(self.proveedor.pk, self.fecha, 1))
+        self.assertIn('Primera fecha disponible', validar_cupo(self.proveedor.pk, self.fecha, 4))
+        
+        respuesta = self.client.post('/dashboard/mantenimientos/crear/', self._datos_formulario())
+        self.assertContains(respuesta, 'Primera fecha disponible')
+        
+        respuesta = self.client.post('/dashboard/mantenimientos/crear/', self._datos_formulario(prioridad='critica'))
+        self.assertEqual(respuesta.status_code, 302)
+        
+        sabado = self.fecha + timedelta(days=(5 - self.fecha.weekday()) % 7)
+        respuesta = self.client.post('/dashboard/mantenimientos/crear/', self._datos_formulario(fecha_programada=sabado.isoformat()))
+        self.assertContains(respuesta, 'no es día hábil')
+    
+    def test_api_agenda_y_propuesta(self):
+        self._programar(3, self.fecha)
+        
+        datos = self.client.get('/dashboard/api/agenda/', {'desde': self.fecha, 'hasta': self.fecha + timedelta(days=6)}).json()
+        self.assertEqual(datos['dias'][0], self.fecha.isoformat())
+        self.assertEqual(datos['proveedores'][0]['ocupadas'][:2], [8, 4])  # el tercero se desborda al día siguiente
+        
+        propuesta = self.client.get('/dashboard/api/agenda/proponer/', {'horas': 8, 'desde': self.fecha}).json()
+        # Los dos primeros días hábiles tienen horas ocupadas: 8 horas libres recién el tercero
+        self.assertEqual(propuesta['opciones'][0]['fecha'], dias_habiles(self.fecha, 7)[2].isoformat())
+        self.assertEqual(self.client.get('/dashboard/api/agenda/?desde=x').status_code, 400)
+        self.assertEqual(self.client.get('/dashboard/api/agenda/proponer/?horas=0').status_code, 400)
+    
+    def test_comando_reprograma_solo_con_aplicar(self):
+        fecha = proximo_habil(timezone.localdate() + timedelta(days=30))
+        self._programar(9, fecha)
+        self._programar(1, fecha, prioridad='critica')
+        
+        call_command('agendar_mantenimientos', stdout=StringIO())
+        self.assertEqual(Mantenimiento.objects.filter(fecha_programada=fecha).count(), 10)
+        
+        call_command('agendar_mantenimientos', '--aplicar', stdout=StringIO())
+        en_la_fecha = Mantenimiento.objects.filter(fecha_programada=fecha)
+        self.assertEqual(en_la_fecha.count(), 2)
+        self.assertTrue(en_la_fecha.filter(prioridad='critica').exists())
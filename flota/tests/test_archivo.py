@@ -0,0 +1,104 @@
+"""Archivo de mantenimientos cerrados: tabla caliente chica y lectura unificada"""
+from datetime import date, timedelta
+from io import StringIO
+from django.core.management import call_command
+from flota import costos, cubo
+from flota.archivo import archivar_mantenimientos
+from flota.exportaciones import EXPORTACIONES
+from flota.models import (
+    Mantenimiento, MantenimientoArchivado, MantenimientoHistorial, ResumenCostoMensual, Trabajo,
+)
+from flota.planificacion import calcular_plan
+from flota.trabajos import TAREAS
+from .base import FlotaTestCase
+
+
+def resumen():
+    return sorted(ResumenCostoMensual.objects.values_list('mes', 'vehiculo_id', 'centro_id', 'cantidad', 'costo_real'))
+
+
+class ArchivoTests(FlotaTestCase):
+    
+    def setUp(self):
+        super().setUp()
+        self.mantenimientos = self.flota['mantenimientos']
+        viejo = date.today() - timedelta(days=400)
+        # Completados (2 y 5) y cancelado (0) viejos se archivan; el 1 sigue en proceso
+        for mantenimiento in (self.mantenimientos[2], self.mantenimientos[5]):
+            mantenimiento.fecha_realizacion = mantenimiento.fecha_programada = viejo
+            mantenimiento.save()
+        self.mantenimientos[0].estado = 'cancelado'
+        self.mantenimientos[0].fecha_programada = viejo
+        self.mantenimientos[0].save()
+        self.mantenimientos[1].fecha_programada = viejo
+        self.mantenimientos[1].save()
+    
+    def assertDerivadosConsistentes(self, antes):
+        diferencias = cubo.verificar_cubo()
+        self.assertEqual((diferencias['faltantes'], diferencias['sobrantes'], diferencias['distintas']), ([], [], []))
+        self.assertEqual(resumen(), antes)
+        costos.reconstruir_resumen()
+        self.assertEqual(resumen(), antes)
+    
+    def test_archiva_por_lotes_sin_tocar_derivados(self):
+        antes = resumen()
+        
+        self.assertEqual(archivar_mantenimientos(simular=True)['archivados'], 3)
+        self.assertEqual(Mantenimiento.objects.count(), 6)
+        self.assertEqual(archivar_mantenimientos(lote=2)['archivados'], 3)
+        
+        self.assertEqual(Mantenimiento.objects.count(), 3)
+        self.assertEqual(MantenimientoArchivado.objects.count(), 3)
+        self.assertEqual(MantenimientoHistorial.objects.count(), 6)
+        self.assertEqual(MantenimientoHistorial.objects.filter(archivado=True).count(), 3)
+        self.assertEqual(archivar_mantenimientos()['archivados'], 0)
+        self.assertDerivadosConsistentes(antes)
+    
+    def test_vistas_leen_el_historial(self):
+        archivar_mantenimientos()
+        archivado = self.mantenimientos[2]
+        
+        self.assertContains(self.client.get(f'/dashboard/mantenimientos/{archivado.pk}/'), 'Archivado')
+        self.assertEqual(self.client.get(f'/dashboard/mantenimientos/{archivado.pk}/reporte/').status_code, 200)
+        respuesta = self.client.get('/dashboard/mantenimientos/')
+        self.assertEqual((len(respuesta.context['mantenimientos']), respuesta.context['total']), (3, 6))
+        self.assertEqual(len(self.client.get('/dashboard/mantenimientos/?archivo=1').context['mantenimientos']), 6)
+        self.assertEqual(len(self.client.get('/dashboard/mantenimientos/?estado=completado').context['mantenimientos']), 2)
+        respuesta = self.client.get(f'/dashboard/vehiculos/{self.flota["vehiculos"][2].pk}/')
+        self.assertEqual(len(respuesta.context['mantenimientos']), 1)
+        self.assertEqual(EXPORTACIONES['mantenimientos'].modelo.objects.count(), 6)
+    
+    def test_ids_nuevos_y_baja_de_vehiculo(self):
+        archivar_mantenimientos()
+        antes = resumen()
+        
+        nuevo = Mantenimiento.objects.create(
+            vehiculo=self.flota['vehiculos'][5], tipo_mantenimiento=self.flota['aceite'], proveedor=self.flota['proveedor'],
+            fecha_programada=date.today(), kilometraje_programado=1, costo_estimado=1, descripcion='Nuevo',
+            usuario_programacion=self.flota['usuario'],
+        )
+        # Los ids archivados no se reutilizan
+        self.assertGreater(nuevo.pk, max(mantenimiento.pk for mantenimiento in self.mantenimientos))
+        nuevo.delete()
+        
+        vehiculo_id = self.flota['vehiculos'][5].pk
+        self.flota['vehiculos'][5].delete()
+        self.assertEqual(MantenimientoArchivado.objects.count(), 2)
+        self.assertDerivadosConsistentes([fila for fila in antes if fila[1] != vehiculo_id])
+    
+    def test_comando_y_tarea(self):
+        salida = StringIO()
+        call_command('archivar_mantenimientos', '--simular', stdout=salida)
+        self.assertIn('Se archivarían 3', salida.getvalue())
+        
+        call_command('archivar_mantenimientos', '--programar', stdout=StringIO())
+        
+        self.assertEqual(MantenimientoArchivado.objects.count(), 3)
+        self.assertIn('archivar_mantenimientos', TAREAS)
+        self.assertTrue(Trabajo.objects.filter(tipo='archivar_mantenimientos').exists())
+    
+    def test_plan_preventivo_considera_archivados(self):
+        antes = calcular_plan(horizonte=30)
+        archivar_mantenimientos()
+        
+        self.assertEqual(len(calcular_plan(horizonte=30)['trabajos']), len(antes['trabajos']))
@@ -0,0 +1,42 @@
+import asyncio
+from unittest import mock
+from django.test import SimpleTestCase
+from django.urls import reverse
+from flota.asincrono import en_paralelo, reunir
+from .base import FlotaTransactionTestCase
+
+
+class EnParaleloTests(SimpleTestCase):
+    
+    def test_reunir_conserva_el_orden(self):
+        self.assertEqual(asyncio.run(reunir(lambda: 1, lambda: 2, lambda: 3)), [1, 2, 3])
+    
+    def test_limpia_conexiones_antes_y_despues(self):
+        with mock.patch('flota.asincrono.close_old_connections') as limpiar:
+            self.assertEqual(asyncio.run(en_paralelo(max, 2, 5)), 5)
+        self.assertEqual(limpiar.call_count, 2)
+    
+    def test_limpia_conexiones_aunque_falle(self):
+        def fallar():
+            raise ValueError('consulta inválida')
+        
+        with mock.patch('flota.asincrono.close_old_connections') as limpiar:
+            with self.assertRaises(ValueError):
+                asyncio.run(en_paralelo(fallar))
+        self.assertEqual(limpiar.call_count, 2)
+
+
+class VistasAsyncTests(FlotaTransactionTestCase):
+    
+    def test_vistas_de_lectura(self):
+        for nombre in ('flota:dashboard', 'flota:estadisticas', 'flota:alertas', 'flota:api_alertas_count', 'flota:api_kpis'):
+            self.assertEqual(self.client.get(reverse(nombre)).status_code, 200, nombre)
+    
+    def test_api_kpis(self):
+        respuesta = self.client.get(reverse('flota:api_kpis'))
+        self.assertEqual(respuesta.json()['total'], 6)
+        self.assertEqual(self.client.get(reverse('flota:api_kpis'), HTTP_IF_NONE_MATCH=respuesta['ETag']).status_code, 304)
+    
+    def test_requieren_login(self):
+        self.client.logout()
+        self.assertEqual(self.client.get(reverse('flota:dashboard')).status_code, 302)
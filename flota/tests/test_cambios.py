@@ -0,0 +1,152 @@
+"""Registro de cambios (CDC): captura, rollbacks, API, compactación y retención"""
+from datetime import timedelta
+from io import StringIO
+from django.core.management import call_command
+from django.db import transaction
+from django.utils import timezone
+from flota import cambios
+from flota.eliminacion import purgar_vehiculo, solicitar_eliminacion
+from flota.flujo import aplicar_operacion
+from flota.models import Mantenimiento, RegistroCambio, Trabajo
+from flota.planificacion import generar_plan
+from flota.transiciones import transicionar_vehiculos
+from .base import FlotaTestCase
+
+
+def registrados(**filtros):
+    return list(RegistroCambio.objects.filter(**filtros).order_by('id').values_list('modelo', 'objeto_id', 'operacion'))
+
+
+class CapturaTests(FlotaTestCase):
+    
+    def test_altas_y_modificaciones(self):
+        vehiculo = self.flota['vehiculos'][0]
+        self.assertEqual(RegistroCambio.objects.filter(modelo='vehiculo', operacion='alta').count(), 6)
+        alta = RegistroCambio.objects.get(modelo='mantenimiento', objeto_id=self.flota['mantenimientos'][0].pk)
+        self.assertEqual((alta.centro_id, alta.datos['costo_estimado']), (vehiculo.centro_operacion_id, 100000))
+        inicio = cambios.cursor_actual()
+        
+        vehiculo.kilometraje_actual += 10
+        vehiculo.save()
+        vehiculo.save()  # sin cambios: no registra
+        
+        registro = RegistroCambio.objects.get(id__gt=inicio)
+        self.assertEqual((registro.operacion, set(registro.datos)), ('modificacion', {'kilometraje_actual', 'fecha_modificacion'}))
+    
+    def test_rollback_no_deja_filas(self):
+        proveedor = self.flota['proveedor']
+        inicio = cambios.cursor_actual()
+        
+        try:
+            with transaction.atomic():
+                proveedor.telefono = '999'
+                proveedor.save()
+                raise RuntimeError
+        except RuntimeError:
+            pass
+        
+        self.assertFalse(RegistroCambio.objects.filter(id__gt=inicio).exists())
+    
+    def test_rollback_de_savepoint_conserva_el_resto(self):
+        proveedor, centro = self.flota['proveedor'], self.flota['centros'][0]
+        inicio = cambios.cursor_actual()
+        
+        with self.captureOnCommitCallbacks(execute=True), transaction.atomic():
+            centro.responsable = 'Otro'
+            centro.save()
+            try:
+                with transaction.atomic():
+                    proveedor.telefono = '999'
+                    proveedor.save()
+                    raise RuntimeError
+            except RuntimeError:
+                pass
+            proveedor.telefono = '111'
+            proveedor.save()
+        
+        self.assertEqual(registrados(id__gt=inicio), [
+            ('centro', centro.pk, 'modificacion'), ('proveedor', proveedor.pk, 'modificacion'),
+        ])
+        self.assertEqual(RegistroCambio.objects.get(id__gt=inicio, modelo='proveedor').datos['telefono'], '111')
+    
+    def test_operaciones_en_bloque_y_bajas(self):
+        mantenimientos, vehiculos = self.flota['mantenimientos'], self.flota['vehiculos']
+        
+        inicio = cambios.cursor_actual()
+        aplicar_operacion('completar', [{'id': mantenimientos[0].pk}])
+        registro = RegistroCambio.objects.get(id__gt=inicio)
+        self.assertEqual(registro.datos['estado'], 'completado')
+        self.assertIn('fecha_realizacion', registro.datos)
+        
+        inicio = cambios.cursor_actual()
+        transicionar_vehiculos([vehiculos[3].pk], estado='mantenimiento')
+        registro = RegistroCambio.objects.get(id__gt=inicio, modelo='vehiculo')
+        self.assertEqual(registro.datos['estado'], 'mantenimiento')
+        self.assertNotIn('centro_operacion_id', registro.datos)
+        
+        inicio = cambios.cursor_actual()
+        creados = generar_plan(self.flota['usuario'], horizonte=90)
+        self.assertEqual(RegistroCambio.objects.filter(id__gt=inicio, modelo='mantenimiento', operacion='alta').count(), creados['creados'])
+        
+        inicio = cambios.cursor_actual()
+        vehiculo = vehiculos[4]
+        cantidad = Mantenimiento.objects.filter(vehiculo=vehiculo).count()
+        solicitar_eliminacion(vehiculo)
+        purgar_vehiculo(vehiculo.pk)
+        self.assertEqual(len(registrados(id__gt=inicio, modelo='mantenimiento', operacion='baja')), cantidad)
+        self.assertEqual(registrados(id__gt=inicio, modelo='vehiculo'), [
+            ('vehiculo', vehiculo.pk, 'modificacion'), ('vehiculo', vehiculo.pk, 'baja'),
+        ])
+        
+        inicio = cambios.cursor_actual()
+        mantenimiento = mantenimientos[1]
+        pk = mantenimiento.pk
+        mantenimiento.delete()
+        self.assertEqual(registrados(id__gt=inicio), [('mantenimiento', pk, 'baja')])
+
+
+class ApiCambiosTests(FlotaTestCase):
+    
+    def setUp(self):
+        super().setUp()
+        self.vehiculo = self.flota['vehiculos'][1]
+        for km in (1, 2, 3):
+            self.vehiculo.kilometraje_actual += km
+            self.vehiculo.save()
+    
+    def test_paginas_por_cursor(self):
+        total = RegistroCambio.objects.count()
+        
+        datos = self.client.get('/dashboard/api/cambios/?limite=5').json()
+        vistos = datos['cambios']
+        while datos['hay_mas']:
+            datos = self.client.get(f"/dashboard/api/cambios/?limite=5&desde={datos['cursor']}").json()
+            vistos += datos['cambios']
+        
+        self.assertEqual(len(vistos), total)
+        self.assertEqual([cambio['id'] for cambio in vistos], sorted(cambio['id'] for cambio in vistos))
+        self.assertEqual(len(self.client.get('/dashboard/api/cambios/?modelo=vehiculo&limite=100000').json()['cambios']), 9)
+        self.assertEqual(self.client.get('/dashboard/api/cambios/?desde=x').status_code, 400)
+        self.assertEqual(self.client.get('/dashboard/vehiculos/exportar/')['X-Cambios-Cursor'], str(cambios.cursor_actual()))
+    
+    def test_compactacion_y_retencion(self):
+        RegistroCambio.objects.update(fecha=timezone.now() - timedelta(days=10))
+        
+        self.assertGreater(cambios.mantener_registro(compactar_dias=7, retencion_dias=90)['compactados'], 0)
+        
+        # El vehículo queda en una sola alta con el kilometraje final
+        fila = RegistroCambio.objects.get(modelo='vehiculo', objeto_id=self.vehiculo.pk)
+        self.assertEqual((fila.operacion, fila.datos['kilometraje_actual']), ('alta', self.vehiculo.kilometraje_actual))
+        
+        corte = cambios.cursor_actual()
+        RegistroCambio.objects.update(fecha=timezone.now() - timedelta(days=100))
+        self.vehiculo.kilometraje_actual += 5
+        self.vehiculo.save()
+        call_command('mantener_cambios', stdout=StringIO())
+        
+        self.assertEqual(RegistroCambio.objects.count(), 1)
+        self.assertEqual(cambios.cursor_purgado(), corte)
+        self.assertEqual(self.client.get('/dashboard/api/cambios/?desde=0').status_code, 410)
+        self.assertEqual(len(self.client.get(f'/dashboard/api/cambios/?desde={corte}').json()['cambios']), 1)
+        call_command('mantener_cambios', '--programar', stdout=StringIO())
+        self.assertTrue(Trabajo.objects.filter(tipo='mantener_registro_cambios').exists())
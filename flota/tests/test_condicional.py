@@ -0,0 +1,46 @@
+from django.urls import reverse
+from .base import FlotaTestCase, FlotaTransactionTestCase
+
+
+class GetCondicionalTests(FlotaTestCase):
+    
+    def _urls(self):
+        vehiculo = self.flota['vehiculos'][0]
+        return [
+            reverse('flota:vehiculo_detalle', kwargs={'pk': vehiculo.pk}),
+            reverse('flota:mantenimiento_detalle', kwargs={'pk': self.flota['mantenimientos'][0].pk}),
+            reverse('flota:mantenimiento_reporte', kwargs={'pk': self.flota['mantenimientos'][2].pk}),
+        ]
+    
+    def test_etag_coincidente_retorna_304(self):
+        for url in self._urls():
+            respuesta = self.client.get(url)
+            self.assertEqual(respuesta.status_code, 200, url)
+            self.assertIn('Last-Modified', respuesta)
+            repetida = self.client.get(url, HTTP_IF_NONE_MATCH=respuesta['ETag'])
+            self.assertEqual(repetida.status_code, 304, url)
+    
+    def test_cambio_de_datos_invalida_el_etag(self):
+        etags = {url: self.client.get(url)['ETag'] for url in self._urls()}
+        vehiculo = self.flota['vehiculos'][0]
+        vehiculo.kilometraje_actual += 1
+        vehiculo.save()
+        for url, etag in etags.items():
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200, url)
+    
+    def test_reporte_de_mantenimiento_no_completado_redirige(self):
+        url = reverse('flota:mantenimiento_reporte', kwargs={'pk': self.flota['mantenimientos'][0].pk})
+        self.assertEqual(self.client.get(url).status_code, 302)
+
+
+class GetCondicionalAsyncTests(FlotaTransactionTestCase):
+    
+    def test_api_alertas_count(self):
+        url = reverse('flota:api_alertas_count')
+        respuesta = self.client.get(url)
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=respuesta['ETag']).status_code, 304)
+        vehiculo = self.flota['vehiculos'][0]
+        vehiculo.estado = 'fuera_servicio'
+        vehiculo.save()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=respuesta['ETag']).status_code, 200)
@@ -0,0 +1,94 @@
+"""Resumen de costos: la actualización incremental por signals debe igualar a la reconstrucción completa"""
+from datetime import date, timedelta
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from flota import costos
+from flota.models import Mantenimiento, ResumenCostoMensual
+from .base import FlotaTestCase
+
+
+def foto_resumen():
+    campos = ('mes', 'vehiculo_id', 'centro_id', 'proveedor_id', 'tipo_mantenimiento_id', *costos.MEDIDAS)
+    return sorted(
+        tuple(int(valor) if campo in ('costo_estimado', 'costo_real') else valor for campo, valor in zip(campos, fila))
+        for fila in ResumenCostoMensual.objects.values_list(*campos)
+    )
+
+
+class ResumenCostosTests(FlotaTestCase):
+    
+    def assertIgualAReconstruido(self):
+        incremental = foto_resumen()
+        costos.reconstruir_resumen()
+        self.assertEqual(incremental, foto_resumen())
+    
+    def _completar(self, mantenimiento, costo_real, fecha=None):
+        mantenimiento.estado = 'completado'
+        mantenimiento.costo_real = costo_real
+        mantenimiento.fecha_realizacion = fecha or date.today()
+        mantenimiento.save()
+    
+    def test_tramos_en_los_bordes(self):
+        # Estimado 100000: ahorro, 0-10 justo en el borde, 10-25, 25-50 en el borde, más de 50
+        for mantenimiento, real in zip(self.flota['mantenimientos'], (90000, 110000, 125000, 150000, 150001)):
+            self._completar(mantenimiento, real)
+        self.assertIgualAReconstruido()
+        
+        totales = costos.analisis_costos('centro')['totales']
+        self.assertEqual(totales['cantidad'], 6)
+        self.assertEqual(sum(totales['distribucion'].values()), 6)
+    
+    def test_completado_sin_costo_real(self):
+        self._completar(self.flota['mantenimientos'][0], None)
+        self.assertIgualAReconstruido()
+    
+    def test_ediciones_mueven_el_aporte(self):
+        mantenimiento = self.flota['mantenimientos'][2]
+        mantenimiento.costo_real = 50000
+        mantenimiento.save()
+        self.assertIgualAReconstruido()
+        
+        mantenimiento.fecha_realizacion = date.today() - timedelta(days=70)
+        mantenimiento.save()
+        self.assertIgualAReconstruido()
+        
+        mantenimiento.tipo_mantenimiento = self.flota['frenos']
+        mantenimiento.vehiculo = self.flota['vehiculos'][0]
+        mantenimiento.save()
+        self.assertIgualAReconstruido()
+    
+    def test_descompletar_y_eliminar(self):
+        completado, otro = self.flota['mantenimientos'][2], self.flota['mantenimientos'][5]
+        completado.estado = 'cancelado'
+        completado.save()
+        self.assertIgualAReconstruido()
+        
+        otro.delete()
+        self.assertIgualAReconstruido()
+        self.assertFalse(ResumenCostoMensual.objects.exists())
+    
+    def test_cambio_de_centro_del_vehiculo(self):
+        vehiculo = self.flota['vehiculos'][2]
+        vehiculo.centro_operacion = self.flota['centros'][0]
+        vehiculo.save()
+        self.assertIgualAReconstruido()
+    
+    def test_edicion_es_un_solo_update(self):
+        mantenimiento = Mantenimiento.objects.get(pk=self.flota['mantenimientos'][2].pk)
+        mantenimiento.costo_real = 130000
+        
+        with CaptureQueriesContext(connection) as consultas:
+            mantenimiento.save()
+        
+        al_resumen = [consulta['sql'] for consulta in consultas.captured_queries if 'flota_resumencostomensual' in consulta['sql']]
+        self.assertEqual(len(al_resumen), 1)
+        self.assertTrue(al_resumen[0].startswith('UPDATE'))
+        self.assertIgualAReconstruido()
+    
+    def test_api_costos(self):
+        respuesta = self.client.get('/dashboard/api/costos/?por=proveedor')
+        
+        self.assertEqual(respuesta.status_code, 200)
+        grupo = respuesta.json()['grupos'][0]
+        self.assertEqual((grupo['nombre'], grupo['cantidad'], grupo['costo_real']), ('Taller Central', 2, 240000))
+        self.assertEqual(grupo['desviacion_porcentaje'], 20.0)
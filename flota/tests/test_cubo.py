@@ -0,0 +1,102 @@
+"""Cubo OLAP: los deltas de los signals deben igualar al cubo reconstruido desde las tablas"""
+from datetime import date, timedelta
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from flota import cubo
+from flota.models import CeldaCubo, Mantenimiento, Vehiculo
+from .base import FlotaTestCase
+
+
+def foto_cubo():
+    return sorted(CeldaCubo.objects.filter(cantidad__gt=0).values_list(*cubo.CAMPOS_CLAVE, *cubo.MEDIDAS), key=str)
+
+
+class CuboTests(FlotaTestCase):
+    
+    def assertIgualAReconstruido(self):
+        diferencias = cubo.verificar_cubo()
+        self.assertEqual((diferencias['faltantes'], diferencias['sobrantes'], diferencias['distintas']), ([], [], []))
+        incremental = foto_cubo()
+        cubo.reconstruir_cubo()
+        self.assertEqual(incremental, foto_cubo())
+    
+    def _consultas_al_cubo(self, funcion):
+        with CaptureQueriesContext(connection) as consultas:
+            funcion()
+        return [consulta['sql'] for consulta in consultas.captured_queries if 'flota_celdacubo' in consulta['sql']]
+    
+    def test_cambios_de_mantenimientos(self):
+        mantenimiento = self.flota['mantenimientos'][0]
+        mantenimiento.estado = 'completado'
+        mantenimiento.costo_real = 95000
+        mantenimiento.fecha_realizacion = date.today() - timedelta(days=40)
+        mantenimiento.save()
+        self.assertIgualAReconstruido()
+        
+        mantenimiento.vehiculo = self.flota['vehiculos'][1]
+        mantenimiento.tipo_mantenimiento = self.flota['frenos']
+        mantenimiento.tiempo_estimado_horas = 6
+        mantenimiento.save()
+        self.assertIgualAReconstruido()
+        
+        self.flota['mantenimientos'][4].delete()
+        Mantenimiento.objects.create(
+            vehiculo=self.flota['vehiculos'][2], tipo_mantenimiento=self.flota['frenos'], proveedor=self.flota['proveedor'],
+            fecha_programada=date.today(),
+            kilometraje_programado=20000, costo_estimado=300000, descripcion='Nuevo', usuario_programacion=self.flota['usuario'],
+        )
+        self.assertIgualAReconstruido()
+    
+    def test_cambios_de_vehiculos(self):
+        vehiculos = self.flota['vehiculos']
+        vehiculos[0].estado = 'mantenimiento'
+        vehiculos[0].save()
+        vehiculos[1].centro_operacion = self.flota['centros'][2]
+        vehiculos[1].tipo_capacidad = 'MC'
+        vehiculos[1].save()
+        vehiculos[2].activo = False
+        vehiculos[2].save()
+        vehiculos[3].delete()
+        Vehiculo.objects.create(
+            patente='ZZ-9999', marca='Scania', modelo='R', año=2022, tipo_capacidad='GC', estado='operativo',
+            kilometraje_actual=100, centro_operacion=self.flota['centros'][0],
+        )
+        self.assertIgualAReconstruido()
+    
+    def test_primer_cambio_del_mes_toma_la_foto_del_stock(self):
+        CeldaCubo.objects.filter(hecho='vehiculo').delete()
+        vehiculo = self.flota['vehiculos'][0]
+        vehiculo.estado = 'fuera_servicio'
+        vehiculo.save()
+        
+        self.assertEqual(
+            CeldaCubo.objects.filter(hecho='vehiculo', mes=cubo.mes_actual()).count(),
+            len(cubo.celdas_vehiculos(Vehiculo.objects.all(), cubo.mes_actual())),
+        )
+        self.assertIgualAReconstruido()
+    
+    def test_cambio_de_estado_son_updates_condicionales(self):
+        # Un segundo vehículo para que la celda de destino ya exista
+        Vehiculo.objects.create(
+            patente='ZZ-9999', marca='Scania', modelo='R', año=2022, tipo_capacidad='MC', estado='mantenimiento',
+            kilometraje_actual=100, centro_operacion=self.flota['centros'][0],
+        )
+        vehiculo = Vehiculo.objects.get(pk=self.flota['vehiculos'][0].pk)
+        vehiculo.estado = 'mantenimiento'
+        
+        sql = self._consultas_al_cubo(vehiculo.save)
+        
+        self.assertFalse([linea for linea in sql if 'COUNT' in linea or linea.startswith('SELECT')])
+        self.assertEqual([linea.split()[0] for linea in sql], ['UPDATE', 'DELETE', 'UPDATE'])
+        self.assertIgualAReconstruido()
+    
+    def test_editar_mantenimiento_no_consulta_el_vehiculo(self):
+        mantenimiento = Mantenimiento.objects.get(pk=self.flota['mantenimientos'][1].pk)
+        mantenimiento.estado = 'programado'
+        mantenimiento.costo_estimado = 80000
+        
+        with CaptureQueriesContext(connection) as consultas:
+            mantenimiento.save()
+        
+        self.assertFalse([consulta for consulta in consultas.captured_queries if 'FROM "flota_vehiculo"' in consulta['sql']])
+        self.assertIgualAReconstruido()
@@ -0,0 +1,104 @@
+"""Historial de disponibilidad: transiciones, snapshots diarios y horas por período"""
+from datetime import timedelta
+from io import StringIO
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from flota import disponibilidad, series
+from flota.disponibilidad import inicio_dia
+from flota.models import SnapshotDisponibilidad, Trabajo, TransicionEstado
+from .base import FlotaTestCase
+
+
+class TransicionesTests(FlotaTestCase):
+    
+    def setUp(self):
+        super().setUp()
+        TransicionEstado.objects.all().delete()
+        self.vehiculo = self.flota['vehiculos'][0]
+    
+    def test_solo_cambios_de_estado_centro_o_capacidad(self):
+        self.vehiculo.kilometraje_actual += 5
+        self.vehiculo.save()
+        self.assertFalse(TransicionEstado.objects.exists())
+        
+        self.vehiculo.estado = 'mantenimiento'
+        self.vehiculo.save()
+        transicion = TransicionEstado.objects.get()
+        self.assertEqual(
+            (transicion.estado_anterior, transicion.estado_nuevo, transicion.centro_id),
+            ('operativo', 'mantenimiento', self.flota['centros'][0].pk),
+        )
+    
+    def test_cambio_de_centro_y_baja(self):
+        self.vehiculo.centro_operacion = self.flota['centros'][1]
+        self.vehiculo.save()
+        self.assertEqual(
+            sorted(TransicionEstado.objects.values_list('centro_id', 'estado_anterior', 'estado_nuevo')),
+            [(self.flota['centros'][0].pk, 'operativo', ''), (self.flota['centros'][1].pk, '', 'operativo')],
+        )
+        
+        pk = self.vehiculo.pk
+        self.vehiculo.delete()
+        self.assertTrue(TransicionEstado.objects.filter(vehiculo_id=pk, estado_anterior='operativo', estado_nuevo='').exists())
+        self.assertTrue(Trabajo.objects.filter(tipo='tomar_snapshot_disponibilidad').exists())
+    
+    def test_snapshot_de_manana_se_encola_una_vez_por_proceso(self):
+        self.vehiculo.estado = 'mantenimiento'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.vehiculo.save()
+        self.vehiculo.estado = 'operativo'
+        
+        with CaptureQueriesContext(connection) as consultas:
+            self.vehiculo.save()
+        
+        self.assertEqual(TransicionEstado.objects.count(), 2)
+        self.assertFalse([consulta for consulta in consultas.captured_queries if 'snapshot_disponibilidad' in consulta['sql']])
+        self.assertEqual(Trabajo.objects.filter(tipo='tomar_snapshot_disponibilidad').count(), 1)
+
+
+class SnapshotsTests(FlotaTestCase):
+    
+    def test_snapshot_del_stock_del_cubo(self):
+        call_command('snapshot_disponibilidad', stdout=StringIO())
+        call_command('snapshot_disponibilidad', stdout=StringIO())
+        
+        filas = SnapshotDisponibilidad.objects.filter(fecha=timezone.localdate())
+        self.assertEqual(sum(fila.cantidad for fila in filas), 6)
+        self.assertEqual(sum(fila.cantidad for fila in filas if fila.estado == 'operativo'), 2)
+        self.assertEqual(Trabajo.objects.filter(tipo='tomar_snapshot_disponibilidad').count(), 1)
+    
+    def test_horas_desde_el_snapshot_y_las_transiciones(self):
+        SnapshotDisponibilidad.objects.all().delete()
+        TransicionEstado.objects.all().delete()
+        d0 = timezone.localdate() - timedelta(days=3)
+        d1, d2, d3 = (d0 + timedelta(days=dias) for dias in (1, 2, 3))
+        # Centro 99: 4 vehículos (2 operativos) al mediodía de d0
+        for estado in ('operativo', 'mantenimiento'):
+            SnapshotDisponibilidad.objects.create(
+                fecha=d0, tomado=inicio_dia(d0) + timedelta(hours=12), centro_id=99, tipo_capacidad='GC',
+                estado=estado, cantidad=2,
+            )
+        # d1 06:00 uno vuelve a operativo; d2 00:00 alta de uno fuera de servicio
+        TransicionEstado.objects.create(
+            vehiculo_id=1, centro_id=99, tipo_capacidad='GC', estado_anterior='mantenimiento', estado_nuevo='operativo',
+            fecha=inicio_dia(d1) + timedelta(hours=6),
+        )
+        TransicionEstado.objects.create(
+            vehiculo_id=2, centro_id=99, tipo_capacidad='GC', estado_anterior='', estado_nuevo='fuera_servicio',
+            fecha=inicio_dia(d2),
+        )
+        
+        horas, cubiertas = disponibilidad.horas_por_periodo([d0, d1, d2, d3])
+        
+        self.assertEqual(cubiertas, [12, 24, 24])
+        self.assertEqual(horas[0][99], {'disponibles': 24, 'totales': 48})
+        self.assertEqual(horas[1][99], {'disponibles': 2 * 6 + 3 * 18, 'totales': 96})
+        self.assertEqual(horas[2][99], {'disponibles': 72, 'totales': 120})
+        
+        cache.clear()
+        serie = series.serie('disponibilidad', 'dia', d0 - timedelta(days=2), d2)
+        self.assertEqual(serie['columnas']['flota'][-1], 60.0)
+        self.assertEqual(serie['columnas']['vehiculos'][-1], 5)
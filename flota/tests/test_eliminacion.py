@@ -0,0 +1,94 @@
+"""Eliminación de vehículos: baja inmediata y purga por lotes en segundo plano"""
+from datetime import date, timedelta
+from io import StringIO
+from django.core.management import call_command
+from flota import costos, cubo
+from flota.archivo import archivar_mantenimientos
+from flota.eliminacion import purgar_vehiculo
+from flota.indicadores import kpis_flota
+from flota.models import (
+    Mantenimiento, MantenimientoArchivado, MantenimientoHistorial, ResumenCostoMensual, Trabajo, TransicionEstado, Vehiculo,
+)
+from flota.trabajos import procesar_pendientes
+from .base import FlotaTestCase
+
+
+def resumen():
+    return sorted(ResumenCostoMensual.objects.values_list('mes', 'vehiculo_id', 'centro_id', 'cantidad', 'costo_real'))
+
+
+class EliminacionTests(FlotaTestCase):
+    
+    def assertDerivadosConsistentes(self):
+        diferencias = cubo.verificar_cubo()
+        self.assertEqual((diferencias['faltantes'], diferencias['sobrantes'], diferencias['distintas']), ([], [], []))
+        antes = resumen()
+        costos.reconstruir_resumen()
+        self.assertEqual(resumen(), antes)
+    
+    def _historial(self, vehiculo, cantidad):
+        for i in range(cantidad):
+            fecha = date.today() - timedelta(days=30 * i + 400)
+            Mantenimiento.objects.create(
+                vehiculo=vehiculo, tipo_mantenimiento=self.flota['aceite'], proveedor=self.flota['proveedor'],
+                fecha_programada=fecha, fecha_realizacion=fecha, estado='completado', costo_real=500 + i,
+                kilometraje_programado=1, costo_estimado=1000, descripcion='Historial', usuario_programacion=self.flota['usuario'],
+            )
+    
+    def test_baja_inmediata_y_purga_por_lotes(self):
+        vehiculo = self.flota['vehiculos'][2]
+        self._historial(vehiculo, 7)
+        archivar_mantenimientos()
+        self._historial(vehiculo, 3)
+        self.assertTrue(MantenimientoArchivado.objects.filter(vehiculo=vehiculo).exists())
+        total = Mantenimiento.objects.filter(vehiculo=vehiculo).count() + MantenimientoArchivado.objects.filter(vehiculo=vehiculo).count()
+        vehiculos_antes = kpis_flota()['total']
+        
+        self.assertEqual(self.client.get(f'/dashboard/vehiculos/{vehiculo.pk}/eliminar/').status_code, 200)
+        self.assertEqual(self.client.post(f'/dashboard/vehiculos/{vehiculo.pk}/eliminar/').status_code, 302)
+        
+        vehiculo.refresh_from_db()
+        self.assertFalse(vehiculo.activo)
+        self.assertEqual(kpis_flota()['total'], vehiculos_antes - 1)
+        self.assertEqual(TransicionEstado.objects.filter(vehiculo_id=vehiculo.pk, estado_nuevo='').count(), 1)
+        self.assertDerivadosConsistentes()
+        # Las lecturas del dashboard ya no lo muestran
+        self.assertEqual(self.client.get(f'/dashboard/vehiculos/{vehiculo.pk}/').status_code, 404)
+        self.assertNotIn(vehiculo, list(self.client.get('/dashboard/vehiculos/').context['vehiculos']))
+        mantenimientos = self.client.get('/dashboard/mantenimientos/').context['mantenimientos']
+        self.assertTrue(all(mantenimiento.vehiculo_id != vehiculo.pk for mantenimiento in mantenimientos))
+        
+        trabajo = Trabajo.objects.get(tipo='purgar_vehiculo')
+        with self.settings(FLOTA_ELIMINACION_LOTE=3):
+            procesar_pendientes()
+        
+        trabajo.refresh_from_db()
+        self.assertEqual(trabajo.estado, 'completado', trabajo.error)
+        self.assertEqual((trabajo.resultado['borrados'], trabajo.resultado['eliminado']), (total, True))
+        self.assertFalse(Vehiculo.objects.filter(pk=vehiculo.pk).exists())
+        self.assertFalse(MantenimientoHistorial.objects.filter(vehiculo_id=vehiculo.pk).exists())
+        self.assertFalse(ResumenCostoMensual.objects.filter(vehiculo_id=vehiculo.pk).exists())
+        self.assertDerivadosConsistentes()
+        # Reintento idempotente
+        self.assertEqual(purgar_vehiculo(vehiculo.pk)['omitido'], 'no existe')
+    
+    def test_admin_formularios_y_comando(self):
+        vehiculos = self.flota['vehiculos']
+        
+        respuesta = self.client.post('/admin/flota/vehiculo/', {
+            'action': 'delete_selected', '_selected_action': [vehiculos[0].pk, vehiculos[1].pk], 'post': 'yes',
+        })
+        
+        self.assertEqual(respuesta.status_code, 302)
+        self.assertEqual(Vehiculo.objects.filter(activo=False).count(), 2)
+        # Patente reservada mientras se purga
+        self.assertContains(self.client.post('/dashboard/vehiculos/crear/', {'patente': vehiculos[0].patente}), 'se está eliminando')
+        opciones = self.client.get('/dashboard/mantenimientos/crear/').context['form'].fields['vehiculo'].choices
+        self.assertNotIn(vehiculos[0].pk, [opcion.value for opcion, _ in opciones if opcion])
+        
+        salida = StringIO()
+        call_command('purgar_vehiculos', '--lote', '1', stdout=salida)
+        
+        self.assertIn('2 vehículo(s)', salida.getvalue())
+        self.assertEqual(Vehiculo.objects.count(), 4)
+        self.assertDerivadosConsistentes()
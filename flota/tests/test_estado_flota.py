@@ -0,0 +1,164 @@
+"""Estado de la flota en memoria: igual a las consultas, refresco fuera del lock"""
+import threading
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+from django.core.management import call_command
+from django.test import override_settings
+from django.utils import timezone
+from flota import cambios, estado_flota
+from flota.eliminacion import purgar_vehiculo, solicitar_eliminacion
+from flota.estado_flota import consultar_estado, descartar_estado
+from flota.indicadores import contar_alertas_flota, kpis_flota
+from flota.models import Vehiculo
+from flota.transiciones import transicionar_vehiculos
+from .base import FlotaTestCase, FlotaTransactionTestCase
+
+
+def kpis_y_alertas(en_memoria):
+    with override_settings(FLOTA_ESTADO_MEMORIA=en_memoria):
+        return kpis_flota(), contar_alertas_flota()
+
+
+@override_settings(FLOTA_ESTADO_MEMORIA_REFRESCO=0)
+class EstadoFlotaTests(FlotaTestCase):
+    
+    def setUp(self):
+        super().setUp()
+        descartar_estado()
+        self.addCleanup(descartar_estado)
+        self.vehiculos, self.centros = self.flota['vehiculos'], self.flota['centros']
+    
+    def assertIgualALasConsultas(self):
+        self.assertEqual(kpis_y_alertas(True), kpis_y_alertas(False))
+        
+        def revisar_columnas(estado):
+            self.assertEqual(sorted(estado.posiciones.values()), list(range(len(estado))))
+            for vehiculo_id, posicion in estado.posiciones.items():
+                self.assertEqual(estado.ids[posicion], vehiculo_id)
+        
+        consultar_estado(revisar_columnas)
+    
+    def test_cambios_se_aplican_desde_el_registro(self):
+        self.assertIgualALasConsultas()
+        v, c = self.vehiculos, self.centros
+        
+        v[0].kilometraje_actual = 19900
+        v[0].save()
+        v[1].estado, v[1].kilometraje_actual = 'operativo', 29700
+        v[1].save()
+        transicionar_vehiculos([v[2].pk, v[3].pk], centro_id=c[1].pk)
+        transicionar_vehiculos([v[4].pk], estado='fuera_servicio')
+        Vehiculo.objects.create(
+            patente='NN-0001', marca='Volvo', modelo='FM', año=2022, tipo_capacidad='GC', estado='operativo',
+            kilometraje_actual=8100, centro_operacion=c[2],
+        )
+        solicitar_eliminacion(Vehiculo.objects.get(pk=v[5].pk))
+        
+        self.assertIgualALasConsultas()
+        self.assertEqual(consultar_estado(len), 6)
+        purgar_vehiculo(v[5].pk)
+        self.assertIgualALasConsultas()
+    
+    def test_reactivado_se_lee_de_la_base(self):
+        vehiculo = self.vehiculos[0]
+        Vehiculo.objects.filter(pk=vehiculo.pk).update(activo=False)
+        cambios.registrar_cambios([(Vehiculo, vehiculo.pk, 'modificacion', {'activo': False}, vehiculo.centro_operacion_id)])
+        self.assertEqual(consultar_estado(len), 5)
+        
+        vehiculo = Vehiculo.objects.get(pk=vehiculo.pk)
+        vehiculo.activo = True
+        vehiculo.save()
+        
+        self.assertEqual(consultar_estado(len), 6)
+        self.assertIgualALasConsultas()
+    
+    def test_retencion_por_delante_del_cursor_recarga(self):
+        consultar_estado(len)
+        cambios.purgar(timezone.now() + timedelta(seconds=1))
+        self.vehiculos[3].kilometraje_actual = 1
+        self.vehiculos[3].save()
+        
+        self.assertIgualALasConsultas()
+    
+    def test_refresco_a_lo_mas_cada_intervalo(self):
+        inicial = consultar_estado(lambda estado: estado)
+        self.vehiculos[0].estado = 'fuera_servicio'
+        
+        with override_settings(FLOTA_ESTADO_MEMORIA_REFRESCO=60):
+            self.vehiculos[0].save()
+            self.assertIs(consultar_estado(lambda estado: estado), inicial)
+        
+        refrescado = consultar_estado(lambda estado: estado)
+        # El estado publicado no se modifica: el refresco publica una copia
+        self.assertIsNot(refrescado, inicial)
+        self.assertEqual(inicial.estados[inicial.posiciones[self.vehiculos[0].pk]], estado_flota.OPERATIVO)
+        self.assertNotEqual(refrescado.estados[refrescado.posiciones[self.vehiculos[0].pk]], estado_flota.OPERATIVO)
+    
+    def test_consultas_no_esperan_al_refresco(self):
+        inicial = consultar_estado(lambda estado: estado)
+        self.vehiculos[0].kilometraje_actual += 1
+        self.vehiculos[0].save()
+        leidos = []
+        refrescar = estado_flota.EstadoFlota.refrescar
+        
+        def refrescar_con_lectura(estado):
+            # Otro hilo consulta mientras este refresca: recibe el estado anterior sin esperar
+            lector = threading.Thread(target=lambda: leidos.append(consultar_estado(lambda actual: actual)))
+            lector.start()
+            lector.join(timeout=5)
+            return refrescar(estado)
+        
+        with mock.patch.object(estado_flota.EstadoFlota, 'refrescar', refrescar_con_lectura):
+            refrescado = consultar_estado(lambda estado: estado)
+        
+        self.assertEqual(leidos, [inicial])
+        self.assertIsNot(refrescado, inicial)
+
+
+@override_settings(FLOTA_ESTADO_MEMORIA=True, FLOTA_ESTADO_MEMORIA_REFRESCO=0)
+class VistasConEstadoTests(FlotaTransactionTestCase):
+    # Las vistas async consultan desde otros hilos: los datos deben estar confirmados
+    
+    def setUp(self):
+        super().setUp()
+        descartar_estado()
+        self.addCleanup(descartar_estado)
+        vehiculos = self.flota['vehiculos']
+        # Dos operativos en alerta: uno urgente y uno próximo
+        vehiculos[0].kilometraje_actual = 19700
+        vehiculos[0].save()
+        vehiculos[3].kilometraje_actual = 38500
+        vehiculos[3].save()
+    
+    def _alertas(self):
+        respuesta = self.client.get('/dashboard/alertas/')
+        return sorted(
+            (alerta['vehiculo'].pk, alerta.get('km_restantes'), alerta['nivel'])
+            for alerta in respuesta.context['vehiculos_alerta']
+        )
+    
+    def test_alertas_y_estadisticas_salen_del_estado(self):
+        with override_settings(FLOTA_ESTADO_MEMORIA=False):
+            alertas = self._alertas()
+            estadisticas = self.client.get('/dashboard/estadisticas/').context['centros_data']
+        consultar_estado(len)
+        
+        # Con el estado en memoria no se agrupa ni se filtra la tabla de vehículos
+        with mock.patch('flota.indicadores.conteos_por_centro', side_effect=AssertionError), \
+                mock.patch('flota.indicadores.vehiculos_alerta_km', side_effect=AssertionError):
+            self.assertEqual(self._alertas(), alertas)
+            self.assertEqual(self.client.get('/dashboard/estadisticas/').context['centros_data'], estadisticas)
+            self.assertEqual(self.client.get('/dashboard/api/alertas-count/').json()['count'], 2)
+        self.assertIn((self.flota['vehiculos'][0].pk, 300, 'critico'), alertas)
+    
+    def test_benchmark_compara_con_las_consultas(self):
+        salida = StringIO()
+        
+        call_command('benchmark_estado_flota', '--vehiculos', '300', '--centros', '4', '--repeticiones', '1', stdout=salida)
+        
+        self.assertIn('indicadores.conteos_por_centro', salida.getvalue())
+        self.assertNotIn('no coinciden', salida.getvalue())
+        # Los vehículos sintéticos se revierten
+        self.assertEqual(Vehiculo.objects.count(), 6)
+        self.assertEqual(Vehiculo.objects.filter(activo=True).count(), 6)
@@ -0,0 +1,96 @@
+"""Exportaciones CSV/JSON en streaming, con gzip y cursor incremental"""
+import csv
+import gzip
+import io
+import json
+from datetime import timedelta
+from unittest import mock
+from django.test import RequestFactory, override_settings
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from flota import exportaciones, replica
+from flota.models import Mantenimiento, Vehiculo
+from .base import FlotaTestCase
+
+
+def contenido(respuesta):
+    return b''.join(respuesta.streaming_content)
+
+
+class ExportacionesTests(FlotaTestCase):
+    
+    def test_csv_de_vehiculos_con_filtros_de_la_lista(self):
+        respuesta = self.client.get('/dashboard/vehiculos/exportar/?estado=operativo')
+        
+        self.assertTrue(respuesta.streaming)
+        self.assertIn('attachment; filename="vehiculos_', respuesta['Content-Disposition'])
+        filas = list(csv.reader(io.StringIO(contenido(respuesta).decode())))
+        self.assertEqual(filas[0][:3], ['id', 'patente', 'marca'])
+        patentes = sorted(fila[1] for fila in filas[1:])
+        self.assertEqual(patentes, sorted(Vehiculo.objects.filter(estado='operativo').values_list('patente', flat=True)))
+    
+    def test_json_comprimido_si_el_cliente_acepta_gzip(self):
+        respuesta = self.client.get('/dashboard/mantenimientos/exportar/?formato=json', HTTP_ACCEPT_ENCODING='gzip, deflate')
+        
+        self.assertEqual(respuesta['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', respuesta['Vary'])
+        datos = json.loads(gzip.decompress(contenido(respuesta)))
+        self.assertEqual(datos['modelo'], 'mantenimientos')
+        self.assertEqual(datos['cursor'], respuesta['X-Export-Cursor'])
+        self.assertEqual(len(datos['datos']), Mantenimiento.objects.count())
+        # El usuario se resuelve en memoria (auth_user no está en los shards)
+        self.assertEqual(datos['datos'][0]['usuario'], 'admin')
+        self.assertEqual(datos['datos'][-1]['costo_real'], 120000)
+    
+    def test_descarga_gz_explicita(self):
+        respuesta = self.client.get('/dashboard/mantenimientos/exportar/?gzip=1&estado=completado')
+        
+        self.assertEqual(respuesta['Content-Type'], 'application/gzip')
+        self.assertTrue(respuesta['Content-Disposition'].endswith('.csv.gz"'))
+        lineas = gzip.decompress(contenido(respuesta)).decode().splitlines()
+        self.assertEqual(len(lineas) - 1, Mantenimiento.objects.filter(estado='completado').count())
+    
+    @override_settings(FLOTA_EXPORTACION_MARGEN=0)
+    def test_since_trae_solo_lo_modificado_despues_del_cursor(self):
+        primera = self.client.get('/dashboard/mantenimientos/exportar/', {'formato': 'json'})
+        contenido(primera)
+        mantenimiento = self.flota['mantenimientos'][1]
+        mantenimiento.costo_estimado = 5
+        mantenimiento.save()
+        
+        segunda = self.client.get(
+            '/dashboard/mantenimientos/exportar/', {'formato': 'json', 'since': primera['X-Export-Cursor']}
+        )
+        
+        datos = json.loads(contenido(segunda))['datos']
+        self.assertEqual([(fila['id'], fila['costo_estimado']) for fila in datos], [(mantenimiento.pk, 5)])
+    
+    def test_fila_confirmada_tarde_con_fecha_anterior_al_cursor(self):
+        Mantenimiento.objects.update(fecha_modificacion=timezone.now() - timedelta(hours=1))
+        primera = self.client.get('/dashboard/mantenimientos/exportar/', {'formato': 'json'})
+        self.assertEqual(len(json.loads(contenido(primera))['datos']), 6)
+        cursor = parse_datetime(primera['X-Export-Cursor'])
+        # Guardada antes del corte, pero su transacción se confirmó después de la lectura
+        tardio = self.flota['mantenimientos'][2]
+        Mantenimiento.objects.filter(pk=tardio.pk).update(costo_estimado=7, fecha_modificacion=cursor - timedelta(seconds=1))
+        
+        segunda = self.client.get(
+            '/dashboard/mantenimientos/exportar/', {'formato': 'json', 'since': primera['X-Export-Cursor']}
+        )
+        
+        datos = json.loads(contenido(segunda))['datos']
+        self.assertEqual([(fila['id'], fila['costo_estimado']) for fila in datos], [(tardio.pk, 7)])
+    
+    @mock.patch('flota.exportaciones.alias_replica', return_value='replica')
+    @mock.patch('flota.replica.alias_replica', return_value='replica')
+    def test_solo_la_exportacion_completa_lee_de_la_replica(self, *mocks):
+        @replica.lectura_replica
+        def vista(request):
+            return exportaciones.bases_exportacion(None), exportaciones.bases_exportacion(timezone.now())
+        
+        self.assertEqual(vista(RequestFactory().get('/')), (['replica'], ['default']))
+    
+    def test_since_invalido(self):
+        respuesta = self.client.get('/dashboard/mantenimientos/exportar/?since=nope')
+        
+        self.assertEqual(respuesta.status_code, 400)
@@ -0,0 +1,141 @@
+"""Operaciones masivas del taller: iniciar, completar y cancelar en bloque"""
+import json
+from datetime import date, timedelta
+from unittest import mock
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from flota import costos, cubo
+from flota.flujo import OperacionInvalida, aplicar_operacion
+from flota.models import Mantenimiento, ResumenCostoMensual, Trabajo, Vehiculo
+from flota.sqlite import atomic_inmediato
+from .base import FlotaTestCase
+
+
+URL = '/dashboard/api/mantenimientos/operacion/'
+
+
+def resumen():
+    return sorted(ResumenCostoMensual.objects.values_list('mes', 'vehiculo_id', 'centro_id', 'cantidad', 'costo_real'))
+
+
+class FlujoTests(FlotaTestCase):
+    
+    def setUp(self):
+        super().setUp()
+        self.mantenimientos, self.vehiculos = self.flota['mantenimientos'], self.flota['vehiculos']
+    
+    def assertDerivadosConsistentes(self):
+        diferencias = cubo.verificar_cubo()
+        self.assertEqual((diferencias['faltantes'], diferencias['sobrantes'], diferencias['distintas']), ([], [], []))
+        antes = resumen()
+        costos.reconstruir_resumen()
+        self.assertEqual(antes, resumen())
+    
+    def test_iniciar_rechaza_por_estado(self):
+        m = self.mantenimientos
+        
+        resultado = aplicar_operacion('iniciar', [{'id': x.pk} for x in (m[0], m[3], m[1], m[2])] + [{'id': 999999}])
+        
+        self.assertEqual(resultado['procesados'], 2)
+        self.assertEqual(sorted(resultado['rechazados']['estado_no_permitido']), [m[1].pk, m[2].pk])
+        self.assertEqual(resultado['rechazados']['no_encontrado'], [999999])
+        self.assertEqual(Vehiculo.objects.get(pk=self.vehiculos[0].pk).estado, 'mantenimiento')
+        self.assertDerivadosConsistentes()
+    
+    def test_completar_con_valores_por_fila(self):
+        m = self.mantenimientos
+        ayer = date.today() - timedelta(days=1)
+        
+        resultado = aplicar_operacion('completar', [
+            {'id': m[0].pk, 'fecha_realizacion': ayer, 'costo_real': 150000}, {'id': m[1].pk}, {'id': m[4].pk},
+        ])
+        
+        self.assertEqual(resultado['procesados'], 3)
+        self.assertEqual(len(set(resultado['numeros_reporte'])), 3)
+        completado = Mantenimiento.objects.get(pk=m[0].pk)
+        self.assertEqual((completado.estado, completado.fecha_realizacion, completado.costo_real), ('completado', ayer, 150000))
+        self.assertEqual(Mantenimiento.objects.get(pk=m[1].pk).fecha_realizacion, date.today())
+        self.assertEqual(
+            set(Vehiculo.objects.filter(pk__in=[self.vehiculos[i].pk for i in (0, 1, 4)]).values_list('estado', flat=True)), {'operativo'},
+        )
+        self.assertTrue(Trabajo.objects.filter(tipo='archivar_reportes_mantenimiento').exists())
+        self.assertDerivadosConsistentes()
+    
+    def test_cancelar_devuelve_el_vehiculo(self):
+        aplicar_operacion('iniciar', [{'id': self.mantenimientos[3].pk}])
+        
+        aplicar_operacion('cancelar', [{'id': self.mantenimientos[3].pk}])
+        
+        self.assertEqual(Mantenimiento.objects.get(pk=self.mantenimientos[3].pk).estado, 'cancelado')
+        self.assertEqual(Vehiculo.objects.get(pk=self.vehiculos[3].pk).estado, 'operativo')
+        self.assertDerivadosConsistentes()
+    
+    def test_validacion(self):
+        with self.assertRaises(OperacionInvalida):
+            aplicar_operacion('x', [])
+        with self.assertRaises(OperacionInvalida):
+            aplicar_operacion('cancelar', [])
+    
+    def _completar_lote(self, cantidad):
+        descripcion = f'Lote de {cantidad}'
+        Mantenimiento.objects.bulk_create([
+            Mantenimiento(
+                vehiculo=self.vehiculos[i % 6], tipo_mantenimiento=self.flota['aceite'], proveedor=self.flota['proveedor'],
+                fecha_programada=date.today(), kilometraje_programado=1, costo_estimado=1000, descripcion=descripcion,
+                usuario_programacion=self.flota['usuario'],
+            )
+            for i in range(cantidad)
+        ])
+        cubo.reconstruir_cubo()
+        ids = list(Mantenimiento.objects.filter(descripcion=descripcion).values_list('pk', flat=True))
+        aplicar_operacion('iniciar', [{'id': pk} for pk in ids])
+        with CaptureQueriesContext(connection) as consultas:
+            resultado = aplicar_operacion('completar', [{'id': pk, 'costo_real': pk} for pk in ids])
+        self.assertEqual(resultado['procesados'], cantidad)
+        return len(consultas.captured_queries)
+    
+    def test_consultas_por_lote_y_no_por_fila(self):
+        # Costos distintos por fila: igual un solo UPDATE por lote
+        self.assertLess(self._completar_lote(300), 150)
+        self.assertDerivadosConsistentes()
+
+
+class OperacionesVistasTests(FlotaTestCase):
+    
+    def _api(self, datos):
+        return self.client.post(URL, json.dumps(datos), content_type='application/json')
+    
+    def test_api(self):
+        m = self.flota['mantenimientos']
+        
+        respuesta = self._api({'operacion': 'completar', 'mantenimientos': [{'id': m[0].pk, 'costo_real': 1000}]})
+        self.assertEqual(respuesta.json()['procesados'], 1, respuesta.content)
+        
+        respuesta = self._api({'operacion': 'completar', 'mantenimientos': [{'id': m[3].pk, 'fecha_realizacion': '2099-01-01'}]})
+        self.assertEqual(respuesta.status_code, 400)
+        self.assertEqual(self._api({'operacion': 'x', 'mantenimientos': []}).status_code, 400)
+    
+    def test_escrituras_en_transaccion_inmediata(self):
+        m = self.flota['mantenimientos']
+        with mock.patch('flota.sqlite.atomic_inmediato', wraps=atomic_inmediato) as inmediato:
+            self._api({'operacion': 'iniciar', 'mantenimientos': [{'id': m[0].pk}]})
+            self.client.post('/dashboard/mantenimientos/operaciones/', {'operacion': 'iniciar', 'seleccion': [m[3].pk]})
+            self.client.get('/dashboard/mantenimientos/operaciones/')
+        
+        self.assertEqual(inmediato.call_count, 2)
+        self.assertEqual(Mantenimiento.objects.filter(pk__in=[m[0].pk, m[3].pk], estado='en_proceso').count(), 2)
+    
+    def test_formulario_del_taller(self):
+        m = self.flota['mantenimientos']
+        self.assertContains(self.client.get('/dashboard/mantenimientos/operaciones/?hasta=2099-01-01'), f'costo_real_{m[3].pk}')
+        
+        respuesta = self.client.post('/dashboard/mantenimientos/operaciones/', {'operacion': 'iniciar', 'seleccion': [m[3].pk]}, follow=True)
+        self.assertContains(respuesta, '1 mantenimiento(s)')
+        self.assertEqual(Mantenimiento.objects.get(pk=m[3].pk).estado, 'en_proceso')
+        
+        respuesta = self.client.post('/dashboard/mantenimientos/operaciones/', {
+            'operacion': 'completar', 'seleccion': [m[3].pk], f'costo_real_{m[3].pk}': '-5',
+        }, follow=True)
+        self.assertContains(respuesta, 'costo_real')
+        self.assertEqual(Mantenimiento.objects.get(pk=m[3].pk).estado, 'en_proceso')
+        self.assertContains(self.client.get('/dashboard/mantenimientos/'), 'Operaciones del Taller')
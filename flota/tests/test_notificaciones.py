@@ -0,0 +1,105 @@
+"""Eventos de notificación y su envío agrupado en resúmenes"""
+from django.core import mail
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from flota import notificaciones
+from flota.models import EventoNotificacion, Trabajo
+from flota.trabajos import procesar_pendientes
+from .base import FlotaTestCase
+
+
+class NotificacionesTests(FlotaTestCase):
+    
+    def _eventos(self, tipo):
+        return EventoNotificacion.objects.filter(tipo=tipo)
+    
+    def test_completar_mantenimiento_registra_evento_por_destinatario(self):
+        mantenimiento = self.flota['mantenimientos'][0]
+        respuesta = self.client.post(
+            f'/dashboard/mantenimientos/{mantenimiento.pk}/completar/',
+            {'estado': 'completado', 'fecha_realizacion': '2026-10-19', 'costo_real': 1000},
+        )
+        
+        self.assertEqual(respuesta.status_code, 302)
+        eventos = self._eventos('mantenimiento_completado').filter(referencia=f'mantenimiento:{mantenimiento.pk}')
+        self.assertEqual(eventos.count(), len(notificaciones.destinatarios('mantenimiento_completado')))
+        self.assertIn('AB-1000', eventos.first().titulo)
+        self.assertEqual(Trabajo.objects.filter(tipo='enviar_resumenes').count(), 1)
+    
+    def test_prioridad_critica_notifica_solo_al_subir(self):
+        mantenimiento = self.flota['mantenimientos'][0]
+        mantenimiento.prioridad = 'critica'
+        mantenimiento.save()
+        mantenimiento.descripcion = 'Sin cambio de prioridad'
+        mantenimiento.save()
+        
+        self.assertEqual(self._eventos('prioridad_critica').count(), len(notificaciones.destinatarios('prioridad_critica')))
+    
+    def test_alerta_km_solo_cuando_sube_el_nivel(self):
+        vehiculo = self.flota['vehiculos'][3]
+        for kilometraje in (18500, 18600, 19700, 19800):
+            vehiculo.kilometraje_actual = kilometraje
+            vehiculo.save()
+        
+        titulos = set(self._eventos('alerta_km').filter(referencia=f'vehiculo:{vehiculo.pk}').values_list('titulo', flat=True))
+        self.assertEqual(len(titulos), 2)
+        self.assertTrue(any('URGENTE' in titulo for titulo in titulos))
+    
+    def test_guardado_sin_evento_no_carga_vehiculo_ni_consulta_la_cola(self):
+        mantenimiento = self.flota['mantenimientos'][0]
+        mantenimiento.refresh_from_db()
+        mantenimiento.descripcion = 'Solo cambia la descripción'
+        
+        with CaptureQueriesContext(connection) as consultas:
+            mantenimiento.save()
+        
+        sql = [consulta['sql'] for consulta in consultas.captured_queries]
+        self.assertFalse([linea for linea in sql if 'FROM "flota_vehiculo"' in linea])
+        self.assertFalse([linea for linea in sql if 'flota_trabajo' in linea])
+    
+    def test_resumen_programado_una_vez_por_ventana(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            notificaciones.registrar_evento('alerta_km', 'Primero')
+        
+        with CaptureQueriesContext(connection) as consultas:
+            notificaciones.registrar_evento('alerta_km', 'Segundo')
+        
+        self.assertFalse([consulta for consulta in consultas.captured_queries if 'flota_trabajo' in consulta['sql']])
+        self.assertEqual(Trabajo.objects.filter(tipo='enviar_resumenes').count(), 1)
+    
+    def test_enviar_resumenes_un_correo_por_destinatario(self):
+        notificaciones.registrar_evento('mantenimiento_completado', 'MT-1', referencia='mantenimiento:1')
+        notificaciones.registrar_evento('prioridad_critica', 'MT-2', referencia='mantenimiento:2')
+        notificaciones.registrar_evento('alerta_km', 'AB-1', referencia='vehiculo:1')
+        notificaciones.registrar_evento('alerta_km', 'AB-1 urgente', referencia='vehiculo:1')
+        destinatarios = set(EventoNotificacion.objects.values_list('destinatario', flat=True))
+        
+        resultado = notificaciones.enviar_resumenes()
+        
+        self.assertEqual(resultado['resumenes'], len(destinatarios))
+        self.assertEqual(len(mail.outbox), len(destinatarios))
+        self.assertFalse(EventoNotificacion.objects.filter(fecha_envio__isnull=True).exists())
+        flota = next(correo for correo in mail.outbox if 'jefe.flota' in correo.to[0])
+        # Los cambios de alerta del mismo vehículo se reducen al último
+        self.assertIn('AB-1 urgente', flota.body)
+        self.assertNotIn('AB-1\n', flota.body)
+    
+    @override_settings(FLOTA_NOTIFICACIONES_MAXIMO=2)
+    def test_sobre_el_maximo_sigue_en_otra_pasada(self):
+        for numero in range(3):
+            notificaciones.registrar_evento('alerta_km', f'AB-{numero}', referencia=f'vehiculo:{numero}')
+        total = EventoNotificacion.objects.count()
+        continuaciones = Trabajo.objects.filter(clave_idempotencia__startswith='enviar_resumenes:continuacion:')
+        
+        notificaciones.enviar_resumenes()
+        self.assertEqual(continuaciones.count(), 1)
+        # Otra pasada que leyó el mismo lote (p. ej. un reintento) no encola una segunda continuación
+        EventoNotificacion.objects.update(fecha_envio=None)
+        notificaciones.enviar_resumenes()
+        self.assertEqual(continuaciones.count(), 1)
+        
+        procesar_pendientes()
+        
+        self.assertFalse(EventoNotificacion.objects.filter(fecha_envio__isnull=True).exists())
+        self.assertEqual(continuaciones.count(), total // 2)
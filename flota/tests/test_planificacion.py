@@ -0,0 +1,76 @@
+"""Plan preventivo: vencimientos por kilometraje y altas sin duplicar trabajos abiertos"""
+from concurrent.futures import ThreadPoolExecutor
+from io import StringIO
+from django.core.management import call_command
+from django.db import connections
+from flota import cubo
+from flota.models import Mantenimiento
+from flota.planificacion import calcular_plan, crear_trabajos
+from .base import FlotaTestCase, FlotaTransactionTestCase
+
+
+def del_plan():
+    return Mantenimiento.objects.filter(descripcion__contains='plan preventivo')
+
+
+class PlanPreventivoTests(FlotaTestCase):
+    
+    def test_comando_programa_y_no_repite(self):
+        salida = StringIO()
+        call_command('plan_preventivo', '--horizonte', '90', '--simular', stdout=salida)
+        self.assertIn('4 mantenimientos', salida.getvalue())
+        self.assertFalse(del_plan().exists())
+        
+        call_command('plan_preventivo', '--horizonte', '90', stdout=StringIO())
+        call_command('plan_preventivo', '--horizonte', '90', stdout=StringIO())
+        
+        self.assertEqual(del_plan().count(), 4)
+        mantenimiento = del_plan().first()
+        self.assertEqual(
+            (mantenimiento.tipo_mantenimiento, mantenimiento.estado, mantenimiento.kilometraje_programado),
+            (self.flota['frenos'], 'programado', 30000),
+        )
+        # Ocho horas cada uno: un día de taller por trabajo
+        self.assertEqual(len(set(del_plan().values_list('fecha_programada', flat=True))), 4)
+        diferencias = cubo.verificar_cubo()
+        self.assertEqual((diferencias['faltantes'], diferencias['sobrantes'], diferencias['distintas']), ([], [], []))
+    
+    def test_plan_desactualizado_omite_pares_con_trabajo_abierto(self):
+        plan = calcular_plan(horizonte=90)
+        vehiculo = self.flota['vehiculos'][0]
+        Mantenimiento.objects.create(
+            vehiculo=vehiculo, tipo_mantenimiento=self.flota['frenos'], proveedor=self.flota['proveedor'],
+            fecha_programada=plan['trabajos'][0]['fecha'], kilometraje_programado=30000, costo_estimado=300000,
+            descripcion='Programado a mano', usuario_programacion=self.flota['usuario'],
+        )
+        
+        self.assertEqual(crear_trabajos(plan['trabajos'], self.flota['usuario']), 3)
+        self.assertFalse(del_plan().filter(vehiculo=vehiculo).exists())
+    
+    def test_vista(self):
+        self.assertContains(self.client.get('/dashboard/mantenimientos/plan-preventivo/?horizonte=90'), 'Programar 4 Mantenimientos')
+        
+        respuesta = self.client.post('/dashboard/mantenimientos/plan-preventivo/', {'horizonte': 90, 'proveedor': '', 'centro': ''})
+        
+        self.assertEqual(respuesta.status_code, 302)
+        self.assertEqual(del_plan().count(), 4)
+        self.assertContains(self.client.get('/dashboard/mantenimientos/plan-preventivo/?horizonte=x'), 'Parámetros inválidos')
+
+
+class PlanesSimultaneosTests(FlotaTransactionTestCase):
+    
+    def test_dos_planes_calculados_a_la_vez_no_duplican(self):
+        planes = [calcular_plan(horizonte=90) for _ in range(2)]
+        
+        def crear(plan):
+            try:
+                return crear_trabajos(plan['trabajos'], self.flota['usuario'])
+            finally:
+                connections.close_all()
+        
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            creados = list(pool.map(crear, planes))
+        
+        self.assertEqual(sorted(creados), [0, 4])
+        pares = list(del_plan().values_list('vehiculo_id', 'tipo_mantenimiento_id'))
+        self.assertEqual(len(pares), len(set(pares)))
@@ -0,0 +1,131 @@
+"""Rebalanceo: mínimo de traslados entre centros contra la fuerza bruta y aplicación de la propuesta revisada"""
+import itertools
+import random
+from collections import Counter
+from django.test import SimpleTestCase
+from flota.models import DemandaCentro, Vehiculo
+from flota.rebalanceo import optimizar, proponer_rebalanceo
+from .base import FlotaTestCase
+
+
+def objetivo(centros, conteos, demandas, traslados):
+    """(exceso de capacidad, operativos faltantes, traslados) tras aplicar ``traslados``: se minimiza en ese orden"""
+    vehiculos, operativos = Counter(), Counter()
+    for centro_id, estado, tipo, total in conteos:
+        vehiculos[centro_id] += total
+        if estado == 'operativo':
+            operativos[(centro_id, tipo)] += total
+    for origen, destino, tipo, cantidad in traslados:
+        vehiculos[origen] -= cantidad
+        vehiculos[destino] += cantidad
+        operativos[(origen, tipo)] -= cantidad
+        operativos[(destino, tipo)] += cantidad
+        assert operativos[(origen, tipo)] >= 0, traslados
+    faltantes = sum(max(demanda - operativos[clave], 0) for clave, demanda in demandas.items() if centros[clave[0]][1])
+    exceso = sum(max(vehiculos[centro_id] - (capacidad if activo else 0), 0) for centro_id, (capacidad, activo) in centros.items())
+    return exceso, faltantes, sum(cantidad for *_, cantidad in traslados)
+
+
+class OptimizarTests(SimpleTestCase):
+    
+    def test_cubre_la_demanda_y_descarga_el_exceso(self):
+        centros = {1: (10, True), 2: (10, True), 3: (3, True)}
+        conteos = [(1, 'operativo', 'GC', 8), (2, 'operativo', 'GC', 1), (3, 'operativo', 'MC', 5), (3, 'fuera_servicio', 'GC', 1)]
+        demandas = {(1, 'GC'): 4, (2, 'GC'): 3}
+        
+        self.assertEqual(objetivo(centros, conteos, demandas, optimizar(centros, conteos, demandas)), (0, 0, 5))
+    
+    def test_igual_a_la_fuerza_bruta(self):
+        azar = random.Random(4)
+        for _ in range(150):
+            centros = {centro_id: (azar.randint(0, 5), azar.random() > 0.15) for centro_id in (1, 2, 3)}
+            conteos = [(centro_id, estado, 'GC', azar.randint(0, 3)) for centro_id in centros for estado in ('operativo', 'mantenimiento')]
+            demandas = {(centro_id, 'GC'): azar.randint(0, 4) for centro_id in centros if azar.random() > 0.3}
+            operativos = {centro_id: total for centro_id, estado, _, total in conteos if estado == 'operativo'}
+            pares = [(origen, destino) for origen in centros for destino in centros if origen != destino]
+            
+            mejor = None
+            for cantidades in itertools.product(range(4), repeat=len(pares)):
+                if any(sum(n for (origen, _), n in zip(pares, cantidades) if origen == c) > operativos[c] for c in centros):
+                    continue
+                valor = objetivo(centros, conteos, demandas, [(o, d, 'GC', n) for (o, d), n in zip(pares, cantidades) if n])
+                mejor = valor if mejor is None or valor < mejor else mejor
+            
+            traslados = optimizar(centros, conteos, demandas)
+            self.assertEqual(objetivo(centros, conteos, demandas, traslados), mejor, (centros, conteos, demandas, traslados))
+    
+    def test_escala(self):
+        azar = random.Random(1)
+        centros = {centro_id: (azar.randint(50, 150), True) for centro_id in range(1, 501)}
+        conteos = [
+            (centro_id, estado, tipo, azar.randint(0, 60))
+            for centro_id in centros for tipo in ('GC', 'MC') for estado in ('operativo', 'mantenimiento', 'fuera_servicio')
+        ]
+        demandas = {(centro_id, tipo): azar.randint(0, 70) for centro_id in centros for tipo in ('GC', 'MC')}
+        
+        traslados = optimizar(centros, conteos, demandas)
+        
+        antes, despues = objetivo(centros, conteos, demandas, []), objetivo(centros, conteos, demandas, traslados)
+        self.assertLess(despues[:2], antes[:2])
+
+
+class RebalanceoTests(FlotaTestCase):
+    
+    def setUp(self):
+        super().setUp()
+        self.centros = self.flota['centros']
+        # Santiago con 3 GC operativos y Osorno sin ninguno, pero necesita 2
+        self.nuevos = [
+            Vehiculo.objects.create(
+                patente=f'RB-{i}', marca='Volvo', modelo='FH', año=2020, tipo_capacidad='GC', estado='operativo',
+                kilometraje_actual=100, centro_operacion=self.centros[0],
+            )
+            for i in range(2)
+        ]
+        DemandaCentro.objects.create(centro=self.centros[1], tipo_capacidad='GC', operativos=2)
+    
+    def _en_osorno(self):
+        return set(Vehiculo.objects.filter(centro_operacion=self.centros[1], estado='operativo').values_list('patente', flat=True))
+    
+    def test_propuesta(self):
+        propuesta = self.client.get('/dashboard/api/rebalanceo/').json()
+        
+        self.assertEqual((propuesta['resumen']['faltantes'], propuesta['resumen']['faltantes_despues']), (2, 0))
+        self.assertEqual(
+            [(t['origen'], t['destino'], t['tipo_capacidad'], t['cantidad']) for t in propuesta['transferencias']],
+            [(self.centros[0].pk, self.centros[1].pk, 'GC', 2)],
+        )
+        # Primero los que no tienen un mantenimiento abierto
+        self.assertEqual({v['patente'] for v in propuesta['transferencias'][0]['vehiculos']}, {'RB-0', 'RB-1'})
+        self.assertContains(self.client.get('/dashboard/vehiculos/rebalanceo/'), f'value="{propuesta["huella"]}"')
+    
+    def test_aplica_la_propuesta_revisada(self):
+        huella = self.client.get('/dashboard/vehiculos/rebalanceo/').context['propuesta']['huella']
+        
+        self.assertEqual(self.client.post('/dashboard/vehiculos/rebalanceo/', {'huella': huella}).status_code, 302)
+        
+        self.assertEqual(self._en_osorno(), {'RB-0', 'RB-1'})
+        self.assertEqual(proponer_rebalanceo()['transferencias'], [])
+    
+    def test_rechaza_si_la_flota_cambio(self):
+        huella = self.client.get('/dashboard/vehiculos/rebalanceo/').context['propuesta']['huella']
+        self.nuevos[0].estado = 'mantenimiento'
+        self.nuevos[0].save()
+        
+        respuesta = self.client.post('/dashboard/vehiculos/rebalanceo/', {'huella': huella}, follow=True)
+        
+        self.assertContains(respuesta, 'La flota cambió')
+        self.assertEqual(self._en_osorno(), set())
+        self.assertEqual(self.client.post('/dashboard/vehiculos/rebalanceo/').status_code, 302)
+        self.assertEqual(self._en_osorno(), set())
+        
+        self.client.post('/dashboard/vehiculos/rebalanceo/', {'huella': respuesta.context['propuesta']['huella']})
+        self.assertEqual(self._en_osorno(), {'RB-1', 'AB-1003'})
+    
+    def test_solo_staff(self):
+        self.flota['usuario'].is_staff = self.flota['usuario'].is_superuser = False
+        self.flota['usuario'].save()
+        
+        self.assertEqual(self.client.get('/dashboard/api/rebalanceo/').status_code, 302)
+        self.assertEqual(self.client.post('/dashboard/vehiculos/rebalanceo/').status_code, 302)
+        self.assertEqual(self._en_osorno(), set())
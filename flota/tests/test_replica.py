@@ -0,0 +1,54 @@
+from unittest import mock
+from django.test import RequestFactory, SimpleTestCase
+from django.urls import reverse
+from flota import replica
+from flota.models import Vehiculo
+from .base import FlotaTestCase
+
+
+def _con_replica(test):
+    """Simula un alias 'replica' configurado (el router solo decide, no consulta)"""
+    test = mock.patch('flota.replica.alias_replica', return_value='replica')(test)
+    return mock.patch('flota.routers.alias_replica', return_value='replica')(test)
+
+
+class LecturaReplicaTests(SimpleTestCase):
+    
+    @_con_replica
+    def test_solo_las_lecturas_de_la_vista_van_a_la_replica(self, *mocks):
+        @replica.lectura_replica
+        def vista(request):
+            return Vehiculo.objects.all().db
+        
+        factory = RequestFactory()
+        self.assertEqual(vista(factory.get('/')), 'replica')
+        self.assertEqual(vista(factory.post('/')), 'default')
+        self.assertEqual(Vehiculo.objects.all().db, 'default')
+    
+    def test_sin_replica_todo_va_al_primario(self):
+        @replica.lectura_replica
+        def vista(request):
+            return Vehiculo.objects.all().db
+        
+        self.assertEqual(vista(RequestFactory().get('/')), 'default')
+
+
+class FijarPrimarioTests(FlotaTestCase):
+    
+    @_con_replica
+    def test_sesion_que_escribio_lee_del_primario(self, *mocks):
+        vehiculo = self.flota['vehiculos'][0]
+        self.client.post(
+            reverse('flota:vehiculo_actualizar_km', kwargs={'pk': vehiculo.pk}),
+            {'kilometraje_actual': vehiculo.kilometraje_actual + 50},
+        )
+        self.assertIn(replica.CLAVE_SESION_PIN, self.client.session)
+        
+        request = RequestFactory().get('/')
+        request.session = self.client.session
+        middleware = replica.ReplicaMiddleware(lambda request: None)
+        middleware.process_request(request)
+        try:
+            self.assertTrue(replica._fijado_primario.get())
+        finally:
+            middleware.process_response(request, None)
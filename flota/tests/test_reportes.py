@@ -0,0 +1,132 @@
+import csv
+import io
+import re
+import tempfile
+import zipfile
+from pathlib import Path
+from xml.dom import minidom
+from django.http import FileResponse
+from django.test import SimpleTestCase, override_settings
+from django.urls import reverse
+from flota.models import Trabajo
+from flota.reportes.escritores import escribir_csv, escribir_pdf, escribir_xlsx
+from flota.trabajos import procesar_pendientes
+from .base import FlotaTestCase
+
+TIPOS = ('vehiculos', 'mantenimientos', 'costos', 'rendimiento', 'alertas')
+
+
+def verificar_pdf(test, datos):
+    """Cabecera, trailer y tabla xref con offsets que apuntan a cada objeto"""
+    test.assertTrue(datos.startswith(b'%PDF'))
+    test.assertTrue(datos.rstrip().endswith(b'%%EOF'))
+    inicio_xref = int(re.search(rb'startxref\n(\d+)', datos).group(1))
+    test.assertTrue(datos[inicio_xref:].startswith(b'xref'))
+    for entrada in re.finditer(rb'(\d{10}) 00000 n', datos[inicio_xref:]):
+        desplazamiento = int(entrada.group(1))
+        test.assertRegex(datos[desplazamiento:desplazamiento + 20], rb'^\d+ 0 obj')
+
+
+def verificar_xlsx(test, datos):
+    libro = zipfile.ZipFile(io.BytesIO(datos))
+    test.assertIsNone(libro.testzip())
+    for nombre in libro.namelist():
+        if nombre.endswith(('.xml', '.rels')):
+            minidom.parseString(libro.read(nombre))
+
+
+class EscritoresTests(SimpleTestCase):
+    columnas = ('Patente', 'Kilometraje', 'Estado', 'Costo')
+    filas = [('AB-1000', 9600, 'operativo', 3.5), ('AB-1001', 10600, 'mantención & "taller"', None)]
+    
+    def test_csv(self):
+        datos = b''.join(escribir_csv('Vehículos', self.columnas, iter(self.filas))).decode('utf-8-sig')
+        filas = list(csv.reader(io.StringIO(datos), delimiter=';'))
+        self.assertEqual(filas[0], list(self.columnas))
+        self.assertEqual(filas[2][2], 'mantención & "taller"')
+    
+    def test_xlsx_valido(self):
+        verificar_xlsx(self, b''.join(escribir_xlsx('Vehículos', self.columnas, iter(self.filas))))
+    
+    def test_pdf_valido_con_varias_paginas(self):
+        filas = ((f'AB-{i}', i, 'operativo', 1.5) for i in range(500))
+        datos = b''.join(escribir_pdf('Vehículos', self.columnas, filas))
+        verificar_pdf(self, datos)
+        self.assertGreater(datos.count(b'/Type /Page '), 1)
+
+
+class DescargaReportesTests(FlotaTestCase):
+    
+    def setUp(self):
+        super().setUp()
+        directorio = tempfile.TemporaryDirectory()
+        self.addCleanup(directorio.cleanup)
+        configuracion = override_settings(FLOTA_REPORTES_CACHE_DIR=Path(directorio.name))
+        configuracion.enable()
+        self.addCleanup(configuracion.disable)
+    
+    def _descargar(self, tipo, formato):
+        respuesta = self.client.get(reverse('flota:reporte_descargar', args=[tipo]), {'formato': formato})
+        self.assertEqual(respuesta.status_code, 200, (tipo, formato))
+        return respuesta, b''.join(respuesta.streaming_content)
+    
+    def test_todos_los_tipos_y_formatos(self):
+        for tipo in TIPOS:
+            _, datos = self._descargar(tipo, 'csv')
+            self.assertGreater(len(datos.decode('utf-8-sig').splitlines()), 1, tipo)
+            verificar_xlsx(self, self._descargar(tipo, 'xlsx')[1])
+            verificar_pdf(self, self._descargar(tipo, 'pdf')[1])
+    
+    def test_csv_de_vehiculos(self):
+        _, datos = self._descargar('vehiculos', 'csv')
+        filas = list(csv.reader(io.StringIO(datos.decode('utf-8-sig')), delimiter=';'))
+        patentes = {fila[0] for fila in filas[1:]}
+        self.assertTrue({vehiculo.patente for vehiculo in self.flota['vehiculos']} <= patentes)
+    
+    def test_cache_hasta_que_cambian_los_datos(self):
+        primera, datos = self._descargar('vehiculos', 'xlsx')
+        self.assertNotIsInstance(primera, FileResponse)
+        segunda, repetidos = self._descargar('vehiculos', 'xlsx')
+        self.assertIsInstance(segunda, FileResponse)
+        self.assertEqual(datos, repetidos)
+        
+        vehiculo = self.flota['vehiculos'][0]
+        vehiculo.kilometraje_actual += 5
+        vehiculo.save()
+        tercera, _ = self._descargar('vehiculos', 'xlsx')
+        self.assertNotIsInstance(tercera, FileResponse)
+    
+    def test_tipo_desconocido(self):
+        self.assertEqual(self.client.get(reverse('flota:reporte_descargar', args=['x'])).status_code, 404)
+    
+    def test_etag_vigente_responde_304(self):
+        primera, _ = self._descargar('vehiculos', 'csv')
+        url = reverse('flota:reporte_descargar', args=['vehiculos'])
+        respuesta = self.client.get(url, {'formato': 'csv'}, HTTP_IF_NONE_MATCH=primera['ETag'])
+        self.assertEqual(respuesta.status_code, 304)
+        
+        vehiculo = self.flota['vehiculos'][0]
+        vehiculo.kilometraje_actual += 5
+        vehiculo.save()
+        respuesta = self.client.get(url, {'formato': 'csv'}, HTTP_IF_NONE_MATCH=primera['ETag'])
+        self.assertEqual(respuesta.status_code, 200)
+    
+    def test_alertas_sin_vehiculos_inactivos(self):
+        en_proceso = next(m for m in self.flota['mantenimientos'] if m.estado == 'en_proceso')
+        en_proceso.vehiculo.activo = False
+        en_proceso.vehiculo.save()
+        _, datos = self._descargar('alertas', 'csv')
+        filas = list(csv.reader(io.StringIO(datos.decode('utf-8-sig')), delimiter=';'))
+        self.assertNotIn(en_proceso.vehiculo.patente, {fila[1] for fila in filas[1:]})
+    
+    @override_settings(FLOTA_REPORTES_UMBRAL_TRABAJO=1)
+    def test_reporte_grande_se_encola_sin_bloquear(self):
+        url = reverse('flota:reporte_descargar', args=['vehiculos'])
+        for _ in range(2):
+            self.assertEqual(self.client.get(url, {'formato': 'xlsx'}).status_code, 202)
+        self.assertEqual(Trabajo.objects.filter(tipo='renderizar_reporte').count(), 1)
+        
+        procesar_pendientes()
+        respuesta, datos = self._descargar('vehiculos', 'xlsx')
+        self.assertIsInstance(respuesta, FileResponse)
+        verificar_xlsx(self, datos)
@@ -0,0 +1,53 @@
+"""Series de tiempo para los gráficos de tendencia"""
+from datetime import date, timedelta
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from flota import series
+from flota.models import Mantenimiento
+from .base import FlotaTestCase
+
+
+class SeriesTests(FlotaTestCase):
+    
+    def test_columnas_alineadas_con_los_periodos(self):
+        for nombre in ('mantenimientos', 'costos', 'disponibilidad'):
+            for granularidad in ('dia', 'semana', 'mes'):
+                respuesta = self.client.get(
+                    f'/dashboard/api/series/{nombre}/', {'granularidad': granularidad, 'desde': '2026-01-01', 'hasta': '2026-12-31'},
+                )
+                self.assertEqual(respuesta.status_code, 200, respuesta.content)
+                datos = respuesta.json()
+                for valores in datos['columnas'].values():
+                    self.assertEqual(len(valores), len(datos['periodos']))
+    
+    def test_totales_de_mantenimientos_y_costos(self):
+        desde, hasta = date.today(), date.today() + timedelta(days=10)
+        datos = series.serie('mantenimientos', 'dia', desde, hasta)
+        self.assertEqual(sum(datos['columnas']['total']), Mantenimiento.objects.filter(fecha_programada__range=(desde, hasta)).count())
+        
+        mes_pasado = date.today() - timedelta(days=30)
+        self.assertEqual(sum(series.serie('costos', 'semana', mes_pasado, date.today())['columnas']['real']), 240000)
+        self.assertEqual(sum(series.serie('costos', 'mes', mes_pasado, date.today())['columnas']['real']), 240000)
+    
+    def test_periodos_cacheados_no_consultan_las_tablas(self):
+        desde, hasta = date.today(), date.today() + timedelta(days=10)
+        series.serie('mantenimientos', 'dia', desde, hasta)
+        
+        with CaptureQueriesContext(connection) as consultas:
+            series.serie('mantenimientos', 'dia', desde, hasta)
+        
+        self.assertFalse([consulta for consulta in consultas.captured_queries if 'flota_mantenimiento' in consulta['sql']])
+    
+    def test_parametros_invalidos(self):
+        for url in (
+            '/dashboard/api/series/x/',
+            '/dashboard/api/series/costos/?granularidad=dia&desde=2000-01-01',
+            '/dashboard/api/series/costos/?desde=2000-13-01',
+            '/dashboard/api/series/costos/?desde=abc',
+        ):
+            self.assertEqual(self.client.get(url).status_code, 400, url)
+    
+    def test_etag(self):
+        etag = self.client.get('/dashboard/api/series/costos/')['ETag']
+        
+        self.assertEqual(self.client.get('/dashboard/api/series/costos/', HTTP_IF_NONE_MATCH=etag).status_code, 304)
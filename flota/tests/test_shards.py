@@ -0,0 +1,181 @@
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+from itertools import cycle
+from unittest import skipUnless
+from django.core.management import call_command
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.test import TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from flota import cambios, costos, cubo, shards
+from flota.forms import MantenimientoForm
+from flota.models import CeldaCubo, CentroOperacional, Mantenimiento, RegistroCambio, ResumenCostoMensual, TransicionEstado, Vehiculo
+from flota.sqlite import atomic_inmediato
+from .base import crear_flota
+
+
+def _en_hilo(funcion, *args):
+    try:
+        return funcion(*args)
+    finally:
+        connections.close_all()
+
+
+class ReservarIdsTests(TransactionTestCase):
+    databases = '__all__'
+    
+    def test_reservas_concurrentes_no_se_repiten(self):
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            ids = list(pool.map(lambda _: _en_hilo(shards.reservar_ids, Vehiculo, 'default'), range(200)))
+        self.assertEqual(len(set(ids)), 200)
+        self.assertEqual(sorted(ids), list(range(1, 201)))
+    
+    def test_el_contador_parte_del_maximo_existente(self):
+        centro = crear_flota()['centros'][0]
+        alias = shards.alias_de_centro(centro.pk)
+        ultimo = Vehiculo.objects.using(alias).order_by('-pk').values_list('pk', flat=True).first()
+        self.assertEqual(shards.reservar_ids(Vehiculo, alias, 10), ultimo + 1)
+        self.assertEqual(shards.siguiente_id(Vehiculo, alias), ultimo + 11)
+
+
+@skipUnless(shards.sharding_activo(), 'Requiere shards configurados (ACME_SHARDS=1,2,3)')
+class ShardsTests(TransactionTestCase):
+    databases = '__all__'
+    # Los centros del test tienen ids 1, 2 y 3 y se reparten entre los shards configurados
+    reset_sequences = True
+    
+    def setUp(self):
+        mapa = dict(zip((1, 2, 3), cycle(shards.aliases_shards())))
+        ajuste = override_settings(FLOTA_SHARDS=mapa)
+        ajuste.enable()
+        self.addCleanup(ajuste.disable)
+        call_command('preparar_shards', verbosity=0)
+        self.flota = crear_flota()
+        self.client.force_login(self.flota['usuario'])
+    
+    def _datos_vehiculo(self, patente, centro):
+        return {
+            'patente': patente, 'marca': 'Volvo', 'modelo': 'FM', 'año': 2022, 'tipo_capacidad': 'GC',
+            'centro_operacion': centro.pk, 'kilometraje_actual': 5, 'estado': 'operativo',
+        }
+    
+    def test_cada_vehiculo_vive_en_el_shard_de_su_centro(self):
+        self.assertEqual({vehiculo._state.db for vehiculo in self.flota['vehiculos']}, set(shards.aliases_shards()))
+        for vehiculo in self.flota['vehiculos']:
+            alias = shards.alias_de_centro(vehiculo.centro_operacion_id)
+            self.assertEqual(vehiculo._state.db, alias)
+            self.assertEqual(shards.alias_probable_de_pk(vehiculo.pk), alias)
+        for alias in shards.aliases_shards():
+            self.assertEqual(CentroOperacional.objects.using(alias).count(), 3)
+    
+    def test_reservas_concurrentes_en_un_shard(self):
+        alias = shards.alias_de_centro(self.flota['centros'][1].pk)
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            ids = list(pool.map(lambda _: _en_hilo(shards.siguiente_id, Mantenimiento, alias), range(100)))
+        self.assertEqual(len(set(ids)), 100)
+        self.assertTrue(all(shards.alias_probable_de_pk(pk) == alias for pk in ids))
+    
+    def test_creaciones_concurrentes_en_un_shard(self):
+        centro = self.flota['centros'][1]
+        alias = shards.alias_de_centro(centro.pk)
+        
+        def crear(numero):
+            # Como escritura_inmediata en un POST que crea un vehículo del centro
+            with atomic_inmediato(DEFAULT_DB_ALIAS), atomic_inmediato(alias):
+                return Vehiculo.objects.create(
+                    patente=f'CC-{numero:04d}', marca='Volvo', modelo='FM', año=2022,
+                    tipo_capacidad='MC', centro_operacion_id=centro.pk,
+                ).pk
+        
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            ids = list(pool.map(lambda numero: _en_hilo(crear, numero), range(40)))
+        self.assertEqual(len(set(ids)), 40)
+        self.assertTrue(all(shards.alias_probable_de_pk(pk) == alias for pk in ids))
+        self.assertEqual(Vehiculo.objects.using(alias).filter(patente__startswith='CC-').count(), 40)
+    
+    def test_cambio_de_centro_mueve_el_historial(self):
+        origen, destino = self.flota['centros'][1], self.flota['centros'][2]
+        alias_origen, alias_destino = shards.alias_de_centro(origen.pk), shards.alias_de_centro(destino.pk)
+        if alias_origen == alias_destino:
+            self.skipTest('Requiere al menos dos shards')
+        respuesta = self.client.post(reverse('flota:vehiculo_crear'), self._datos_vehiculo('ZZ-9999', origen))
+        self.assertEqual(respuesta.status_code, 302)
+        vehiculo = Vehiculo.objects.using(alias_origen).get(patente='ZZ-9999')
+        Mantenimiento.objects.create(
+            vehiculo=vehiculo, tipo_mantenimiento=self.flota['aceite'], proveedor=self.flota['proveedor'],
+            fecha_programada=self.flota['mantenimientos'][0].fecha_programada, kilometraje_programado=10,
+            costo_estimado=1000, descripcion='Revisión', usuario_programacion=self.flota['usuario'],
+        )
+        
+        respuesta = self.client.post(
+            reverse('flota:vehiculo_editar', kwargs={'pk': vehiculo.pk}), self._datos_vehiculo('ZZ-9999', destino),
+        )
+        self.assertEqual(respuesta.status_code, 302)
+        self.assertFalse(Vehiculo.objects.using(alias_origen).filter(pk=vehiculo.pk).exists())
+        self.assertTrue(Vehiculo.objects.using(alias_destino).filter(pk=vehiculo.pk).exists())
+        self.assertEqual(Mantenimiento.objects.using(alias_destino).filter(vehiculo_id=vehiculo.pk).count(), 1)
+        self.assertEqual(self.client.get(reverse('flota:vehiculo_detalle', kwargs={'pk': vehiculo.pk})).status_code, 200)
+    
+    def test_preparar_shards_mueve_sin_dar_de_baja(self):
+        centro = self.flota['centros'][0]
+        alias = shards.alias_de_centro(centro.pk)
+        ids = list(Vehiculo.objects.using(alias).filter(centro_operacion=centro).values_list('pk', flat=True))
+        # Los vehículos del centro vuelven a default, como antes de activar el sharding
+        with transaction.atomic(using=alias), transaction.atomic(using=DEFAULT_DB_ALIAS):
+            shards.mover_vehiculos(ids, alias, DEFAULT_DB_ALIAS)
+        costos.reconstruir_resumen()
+        cubo.reconstruir_cubo()
+        
+        def foto():
+            return (
+                sorted(ResumenCostoMensual.objects.values_list(*costos.CAMPOS_CLAVE, 'cantidad', 'costo_real'), key=str),
+                sorted(CeldaCubo.objects.filter(cantidad__gt=0).values_list(*cubo.CAMPOS_CLAVE, 'cantidad'), key=str),
+                RegistroCambio.objects.count(), TransicionEstado.objects.count(),
+            )
+        
+        antes = foto()
+        call_command('preparar_shards', verbosity=0)
+        
+        self.assertEqual(sorted(Vehiculo.objects.using(alias).filter(centro_operacion=centro).values_list('pk', flat=True)), sorted(ids))
+        self.assertFalse(Vehiculo.objects.using(DEFAULT_DB_ALIAS).exists())
+        self.assertEqual(foto(), antes)
+        diferencias = cubo.verificar_cubo()
+        self.assertEqual((diferencias['faltantes'], diferencias['sobrantes'], diferencias['distintas']), ([], [], []))
+    
+    def test_el_formulario_consulta_los_shards_solo_al_listar(self):
+        with ExitStack() as pila:
+            consultas = [pila.enter_context(CaptureQueriesContext(connections[alias])) for alias in shards.aliases_datos()]
+            formulario = MantenimientoForm()
+        
+        self.assertEqual([len(captura) for captura in consultas], [0] * len(consultas))
+        self.assertEqual(len(list(formulario.fields['vehiculo'].choices)), 7)
+    
+    def test_vistas_que_cruzan_shards(self):
+        for nombre in ('flota:dashboard', 'flota:estadisticas', 'flota:alertas', 'flota:vehiculos', 'flota:mantenimientos'):
+            self.assertEqual(self.client.get(reverse(nombre)).status_code, 200, nombre)
+        self.assertEqual(self.client.get(reverse('flota:api_kpis')).json()['total'], 6)
+        self.assertEqual(len(self.client.get(reverse('flota:vehiculos')).context['vehiculos']), 6)
+    
+    def test_registro_de_cambios_descarta_lo_revertido_en_el_shard(self):
+        vehiculo = self.flota['vehiculos'][0]
+        alias, marca = vehiculo._state.db, vehiculo.marca
+        inicio = cambios.cursor_actual()
+        
+        def revertir():
+            try:
+                with transaction.atomic(using=alias):
+                    vehiculo.marca = 'Scania'
+                    vehiculo.save()
+                    raise RuntimeError
+            except RuntimeError:
+                vehiculo.marca = marca
+        
+        revertir()
+        with transaction.atomic(using=alias):
+            vehiculo.kilometraje_actual += 1
+            vehiculo.save()
+            revertir()
+            self.assertFalse(RegistroCambio.objects.filter(id__gt=inicio).exists())
+        
+        registro = RegistroCambio.objects.get(id__gt=inicio)
+        self.assertEqual((registro.objeto_id, set(registro.datos)), (vehiculo.pk, {'kilometraje_actual', 'fecha_modificacion'}))
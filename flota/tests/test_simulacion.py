@@ -0,0 +1,88 @@
+"""Simulador Monte Carlo de disponibilidad por centro y día"""
+import time
+from django.test import SimpleTestCase, override_settings
+from flota.models import Proveedor, Vehiculo
+from flota.simulacion import SimulacionInvalida, _Talleres, simular
+from flota.trabajos import procesar_pendientes
+from .base import FlotaTestCase
+
+
+class TalleresTests(SimpleTestCase):
+    
+    def test_atencion_por_capacidad_diaria(self):
+        talleres = _Talleres([8, 8, 0, 8, 8], 1)
+        talleres.atender(0, 0, 3, 4, False)  # dos el día 0 y uno el día 1
+        talleres.atender(0, 0, 1, 10, True)  # detenido desde la solicitud, termina el día 3
+        
+        detenidos, acumulado = [], 0
+        for dia in range(5):
+            acumulado += talleres.cambios[0][dia]
+            detenidos.append(acumulado)
+        
+        self.assertEqual(detenidos, [3, 2, 1, 1, 0])
+
+
+class SimulacionTests(FlotaTestCase):
+    
+    def test_percentiles_por_centro_y_dia(self):
+        resultado = simular(30, 200, semilla=7, procesos=1)
+        
+        self.assertEqual(len(resultado['fechas']), 30)
+        self.assertEqual([centro['nombre'] for centro in resultado['centros']], ['Coquimbo', 'Osorno', 'Santiago'])
+        for fila in resultado['centros'] + [resultado['flota']]:
+            for dia in range(30):
+                self.assertLessEqual(fila['p5'][dia], fila['p50'][dia])
+                self.assertLessEqual(fila['p50'][dia], fila['p95'][dia])
+        # En Coquimbo todos están fuera de servicio
+        self.assertEqual(resultado['centros'][0]['p95'], [0.0] * 30)
+        self.assertEqual(resultado['flota']['vehiculos'], 6)
+    
+    def test_semilla_reproducible_y_opciones(self):
+        resultado = simular(30, 200, semilla=7, procesos=1)
+        self.assertEqual(simular(30, 200, semilla=7, procesos=1)['flota'], resultado['flota'])
+        
+        self.assertFalse(simular(30, 200, semilla=7, procesos=1, con_preventivo=False)['con_preventivo'])
+        solo = simular(10, 20, centros=[self.flota['centros'][0].pk], semilla=1, procesos=1)
+        self.assertEqual([centro['nombre'] for centro in solo['centros']], ['Santiago'])
+        with self.assertRaises(SimulacionInvalida):
+            simular(0, 10)
+    
+    def test_procesos_en_paralelo_reproducibles(self):
+        resultado = simular(20, 64, semilla=3, procesos=2)
+        
+        self.assertEqual(resultado['corridas'], 64)
+        self.assertEqual(simular(20, 64, semilla=3, procesos=2)['flota'], resultado['flota'])
+    
+    def test_api_encola_y_el_trabajador_simula(self):
+        url = '/dashboard/api/simulacion/'
+        respuesta = self.client.post(url, {'horizonte': 14, 'corridas': 50, 'semilla': 1, 'procesos': 9})
+        self.assertEqual(respuesta.status_code, 202, respuesta.content)
+        # La misma simulación pendiente no se encola dos veces
+        self.assertEqual(self.client.post(url, {'horizonte': 14, 'corridas': 50, 'semilla': 1}).json()['id'], respuesta.json()['id'])
+        self.assertEqual(self.client.post(url, {'horizonte': 'x'}).status_code, 400)
+        self.assertEqual(self.client.post(url, {'corridas': 10 ** 9}).status_code, 400)
+        self.assertEqual(self.client.get(url).status_code, 405)
+        
+        with override_settings(FLOTA_SIMULACION_PROCESOS=1):
+            procesar_pendientes()
+        
+        trabajo = self.client.get(f"/dashboard/api/trabajos/{respuesta.json()['id']}/").json()
+        self.assertEqual(trabajo['estado'], 'completado', trabajo)
+        self.assertEqual(len(trabajo['resultado']['flota']['p50']), 14)
+    
+    def test_escala(self):
+        centros = self.flota['centros']
+        Vehiculo.objects.bulk_create([
+            Vehiculo(
+                patente=f'SX-{i:05d}', marca='Volvo', modelo='FH', año=2020, tipo_capacidad='GC', estado='operativo',
+                kilometraje_actual=(i * 37) % 60000, centro_operacion=centros[i % 3],
+            )
+            for i in range(10000)
+        ])
+        Proveedor.objects.update(capacidad_horas_diarias=400)
+        inicio = time.perf_counter()
+        
+        resultado = simular(90, 1000, semilla=5)
+        
+        self.assertEqual(resultado['flota']['vehiculos'], 10006)
+        self.assertLess(time.perf_counter() - inicio, 60)
@@ -0,0 +1,219 @@
+"""Sincronización incremental de tablets y teléfonos por centro"""
+import gzip
+import json
+import time
+from datetime import date, timedelta
+from django.test import override_settings
+from django.utils import timezone
+from flota import cambios
+from flota.eliminacion import solicitar_eliminacion
+from flota.flujo import aplicar_operacion
+from flota.models import Mantenimiento, Vehiculo
+from flota.sincronizacion import CAMPOS_MANTENIMIENTO
+from flota.transiciones import transicionar_vehiculos
+from .base import FlotaTestCase
+
+
+URL = '/dashboard/api/sincronizacion/'
+
+
+class CopiaLocal:
+    """Lo que guarda el cliente: vehículos y mantenimientos por id"""
+    
+    def __init__(self):
+        self.vehiculos, self.mantenimientos, self.bajas = {}, {}, set()
+    
+    def aplicar(self, pagina):
+        for vehiculo_id in pagina['bajas']['vehiculos']:
+            self.bajas.add(vehiculo_id)
+            self.vehiculos.pop(vehiculo_id, None)
+            for mantenimiento_id in [pk for pk, fila in self.mantenimientos.items() if fila['vehiculo_id'] == vehiculo_id]:
+                del self.mantenimientos[mantenimiento_id]
+        for mantenimiento_id in pagina['bajas']['mantenimientos']:
+            self.mantenimientos.pop(mantenimiento_id, None)
+        for fila in pagina['vehiculos']['filas']:
+            self.vehiculos[fila[0]] = dict(zip(pagina['vehiculos']['campos'], fila))
+        for fila in pagina['mantenimientos']['filas']:
+            self.mantenimientos[fila[0]] = dict(zip(pagina['mantenimientos']['campos'], fila))
+
+
+@override_settings(FLOTA_SINCRONIZACION_MARGEN=0)
+class SincronizacionTests(FlotaTestCase):
+    
+    def setUp(self):
+        super().setUp()
+        self.c0, self.c1 = self.flota['centros'][0].pk, self.flota['centros'][1].pk
+        self.vehiculos, self.mantenimientos = self.flota['vehiculos'], self.flota['mantenimientos']
+        # Lo creado en el setUp queda antes del primer corte
+        time.sleep(0.01)
+    
+    def _sincronizar(self, centro, copia, cursor=None, limite=2, entre_paginas=None):
+        """Pide páginas hasta completar el ciclo; retorna (cursor, páginas)"""
+        paginas = 0
+        while True:
+            parametros = {'centro': centro, 'limite': limite, **({'cursor': cursor} if cursor else {})}
+            respuesta = self.client.get(URL, parametros)
+            self.assertEqual(respuesta.status_code, 200, respuesta.content)
+            pagina = json.loads(respuesta.content)
+            self.assertLessEqual(len(pagina['vehiculos']['filas']) + len(pagina['bajas']['vehiculos']), limite)
+            copia.aplicar(pagina)
+            paginas += 1
+            cursor = pagina['cursor']
+            if pagina['completo']:
+                return cursor, paginas
+            if entre_paginas:
+                entre_paginas()
+                entre_paginas = None
+    
+    def assertIgualAlServidor(self, centro, copia):
+        vehiculos = set(Vehiculo.objects.filter(centro_operacion_id=centro, activo=True).values_list('id', flat=True))
+        abiertos = Mantenimiento.objects.filter(vehiculo_id__in=vehiculos, estado__in=('programado', 'en_proceso'))
+        self.assertEqual(set(copia.vehiculos), vehiculos)
+        self.assertEqual(set(copia.mantenimientos), set(abiertos.values_list('id', flat=True)))
+        for pk, fila in copia.vehiculos.items():
+            self.assertEqual(fila['kilometraje_actual'], Vehiculo.objects.get(pk=pk).kilometraje_actual)
+        for pk, fila in copia.mantenimientos.items():
+            self.assertEqual(fila['estado'], Mantenimiento.objects.get(pk=pk).estado)
+    
+    def _mantenimiento(self, vehiculo):
+        return Mantenimiento.objects.create(
+            vehiculo=vehiculo, tipo_mantenimiento=self.flota['aceite'], proveedor=self.flota['proveedor'],
+            fecha_programada=date.today(), kilometraje_programado=1, costo_estimado=1, descripcion='Sincronización',
+            usuario_programacion=self.flota['usuario'],
+        )
+    
+    def test_copia_completa_y_cambios(self):
+        copia, otra = CopiaLocal(), CopiaLocal()
+        cursor, paginas = self._sincronizar(self.c0, copia, limite=1)
+        cursor_otra, _ = self._sincronizar(self.c1, otra)
+        self.assertGreaterEqual(paginas, 4)
+        self.assertEqual(set(copia.vehiculos), {self.vehiculos[0].pk, self.vehiculos[3].pk})
+        self.assertIgualAlServidor(self.c0, copia)
+        
+        self.vehiculos[0].kilometraje_actual += 50
+        self.vehiculos[0].save()
+        aplicar_operacion('completar', [{'id': self.mantenimientos[0].pk}])
+        transicionar_vehiculos([self.vehiculos[1].pk], centro_id=self.c0)
+        nuevo = Vehiculo.objects.create(
+            patente='ZZ-0001', marca='Volvo', modelo='FM', año=2021, tipo_capacidad='MC', centro_operacion_id=self.c0,
+        )
+        del_nuevo = self._mantenimiento(nuevo)
+        borrado = self._mantenimiento(self.vehiculos[0])
+        borrado_id = borrado.pk
+        borrado.delete()
+        time.sleep(0.01)
+        
+        self._sincronizar(self.c0, copia, cursor)
+        self._sincronizar(self.c1, otra, cursor_otra)
+        
+        self.assertIgualAlServidor(self.c0, copia)
+        self.assertIgualAlServidor(self.c1, otra)
+        # El trasladado llega con su mantenimiento abierto, que no cambió
+        self.assertIn(self.mantenimientos[1].pk, copia.mantenimientos)
+        self.assertIn(del_nuevo.pk, copia.mantenimientos)
+        self.assertNotIn(borrado_id, copia.mantenimientos)
+        self.assertIn(self.vehiculos[1].pk, otra.bajas)
+    
+    def test_traslado_entre_paginas_llega_como_baja(self):
+        copia = CopiaLocal()
+        cursor, _ = self._sincronizar(self.c0, copia)
+        trasladado = self.vehiculos[3]
+        for _ in range(3):
+            self.vehiculos[0].kilometraje_actual += 1
+            self.vehiculos[0].save()
+        time.sleep(0.01)
+        
+        def trasladar():
+            transicionar_vehiculos([trasladado.pk], centro_id=self.c1)
+        
+        # El traslado ocurre mientras el cliente pagina: el ciclo en curso no lo ve
+        cursor, paginas = self._sincronizar(self.c0, copia, cursor, limite=1, entre_paginas=trasladar)
+        self.assertGreater(paginas, 1)
+        self.assertIn(trasladado.pk, copia.vehiculos)
+        time.sleep(0.01)
+        
+        # y el siguiente lo entrega como baja, con sus mantenimientos
+        self._sincronizar(self.c0, copia, cursor, limite=1)
+        
+        self.assertIn(trasladado.pk, copia.bajas)
+        self.assertFalse([fila for fila in copia.mantenimientos.values() if fila['vehiculo_id'] == trasladado.pk])
+        self.assertIgualAlServidor(self.c0, copia)
+    
+    def test_ida_y_vuelta_en_el_mismo_ciclo(self):
+        copia = CopiaLocal()
+        cursor, _ = self._sincronizar(self.c0, copia)
+        vehiculo = self.vehiculos[3]
+        transicionar_vehiculos([vehiculo.pk], centro_id=self.c1)
+        transicionar_vehiculos([vehiculo.pk], centro_id=self.c0)
+        nuevo = Vehiculo.objects.create(
+            patente='ZZ-0002', marca='Volvo', modelo='FM', año=2021, tipo_capacidad='MC', centro_operacion_id=self.c0,
+        )
+        time.sleep(0.01)
+        cursor, _ = self._sincronizar(self.c0, copia, cursor, limite=1)
+        self.assertIn(nuevo.pk, copia.vehiculos)
+        
+        solicitar_eliminacion(Vehiculo.objects.get(pk=nuevo.pk))
+        time.sleep(0.01)
+        self._sincronizar(self.c0, copia, cursor, limite=1)
+        
+        # Las bajas de cada página se aplican antes que los upserts
+        self.assertIn(vehiculo.pk, copia.vehiculos)
+        self.assertNotIn(nuevo.pk, copia.vehiculos)
+        self.assertIgualAlServidor(self.c0, copia)
+    
+    def test_cambios_de_otro_centro_no_alargan_la_pagina(self):
+        copia = CopiaLocal()
+        cursor, _ = self._sincronizar(self.c0, copia)
+        for _ in range(25):
+            self._mantenimiento(self.vehiculos[4])
+        self.vehiculos[0].kilometraje_actual += 1
+        self.vehiculos[0].save()
+        time.sleep(0.01)
+        
+        cursor, paginas = self._sincronizar(self.c0, copia, cursor, limite=1)
+        
+        self.assertGreaterEqual(paginas, 3)
+        self.assertIgualAlServidor(self.c0, copia)
+        pagina = self.client.get(URL, {'centro': self.c0, 'cursor': cursor}).json()
+        self.assertTrue(pagina['completo'])
+        self.assertEqual((pagina['vehiculos']['filas'], pagina['bajas']), ([], {'vehiculos': [], 'mantenimientos': []}))
+    
+    def test_gzip_en_paginas_grandes(self):
+        respuesta = self.client.get(URL, {'centro': self.c0, 'limite': 100}, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertFalse(respuesta.has_header('Content-Encoding'))
+        for i in range(15):
+            Vehiculo.objects.create(
+                patente=f'GZ-{i:04d}', marca='Volvo', modelo='FM', año=2021, tipo_capacidad='MC', centro_operacion_id=self.c0,
+            )
+        time.sleep(0.01)
+        
+        respuesta = self.client.get(URL, {'centro': self.c0, 'limite': 100}, HTTP_ACCEPT_ENCODING='gzip')
+        
+        self.assertEqual(respuesta['Content-Encoding'], 'gzip')
+        self.assertEqual(len(json.loads(gzip.decompress(respuesta.content))['vehiculos']['filas']), 17)
+    
+    def test_errores_y_cursor_vencido(self):
+        cursor, _ = self._sincronizar(self.c0, CopiaLocal())
+        self.assertEqual(self.client.get(URL).status_code, 400)
+        self.assertEqual(self.client.get(URL, {'centro': 999}).status_code, 404)
+        self.assertEqual(self.client.get(URL, {'centro': self.c0, 'cursor': 'basura'}).status_code, 400)
+        self.assertEqual(self.client.get(URL, {'centro': self.c1, 'cursor': cursor}).status_code, 400)
+        self.assertEqual(self.client.get(URL, {'centro': self.c0, 'limite': 'x'}).status_code, 400)
+        
+        cambios.purgar(timezone.now() + timedelta(seconds=1))
+        
+        self.assertEqual(self.client.get(URL, {'centro': self.c0, 'cursor': cursor}).status_code, 410)
+        self.assertEqual(self.client.get(URL, {'centro': self.c0}).status_code, 200)
+    
+    def test_paginas_leen_rangos_de_indice(self):
+        desde = timezone.now() - timedelta(days=1)
+        plan = Vehiculo.objects.filter(centro_operacion_id=self.c0, fecha_modificacion__gt=desde).order_by(
+            'fecha_modificacion', 'id'
+        ).explain()
+        self.assertIn('vehiculo_sync_idx', plan)
+        
+        plan = Mantenimiento.objects.filter(fecha_modificacion__gt=desde, fecha_modificacion__lte=timezone.now()).order_by(
+            'fecha_modificacion', 'id'
+        ).values_list('fecha_modificacion', *CAMPOS_MANTENIMIENTO)[:10].explain()
+        self.assertIn('mantenimiento_modif_idx', plan)
+        self.assertNotIn('TEMP B-TREE', plan)
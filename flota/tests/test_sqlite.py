@@ -0,0 +1,79 @@
+import importlib
+from io import StringIO
+from unittest import mock
+from django.core.management import call_command
+from django.db import connection
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from flota.sqlite import _aliases_de_escritura, escritura_inmediata, pragmas_configurados
+from .base import FlotaTestCase
+
+migracion_wal = importlib.import_module('flota.migrations.0003_sqlite_wal')
+
+
+class PragmasTests(SimpleTestCase):
+    
+    def test_journal_mode_no_se_aplica_por_conexion(self):
+        # Cambiarlo en cada conexión reescribe la cabecera del archivo
+        self.assertNotIn('journal_mode', pragmas_configurados())
+    
+    def test_migracion_activa_wal_solo_en_sqlite(self):
+        editor = mock.Mock()
+        editor.connection.vendor = 'sqlite'
+        migracion_wal.activar_wal(None, editor)
+        editor.execute.assert_called_once_with('PRAGMA journal_mode = WAL')
+        
+        editor = mock.Mock()
+        editor.connection.vendor = 'postgresql'
+        migracion_wal.activar_wal(None, editor)
+        editor.execute.assert_not_called()
+
+
+class EscrituraInmediataTests(TransactionTestCase):
+    
+    def test_post_corre_dentro_de_una_transaccion(self):
+        @escritura_inmediata
+        def vista(request):
+            return HttpResponse(str(connection.in_atomic_block))
+        
+        factory = RequestFactory()
+        self.assertEqual(vista(factory.post('/')).content, b'True')
+        self.assertEqual(vista(factory.get('/')).content, b'False')
+    
+    @override_settings(FLOTA_SHARDS={1: 'centro_1', 2: 'centro_2'})
+    def test_con_shards_bloquea_las_bases_del_request(self):
+        factory = RequestFactory()
+        request = factory.post('/', {'centro_operacion': '2'})
+        self.assertEqual(_aliases_de_escritura(request, {}), ['default', 'centro_2'])
+        # El pk de la URL apunta al shard donde se creó el registro
+        request = factory.post('/', {'centro_operacion': '1'})
+        self.assertEqual(_aliases_de_escritura(request, {'pk': 2 * 10 ** 12 + 5}), ['default', 'centro_1', 'centro_2'])
+        self.assertEqual(_aliases_de_escritura(factory.post('/', {}), {}), ['default'])
+
+
+class PerfilSqliteTests(FlotaTestCase):
+    
+    def test_pragmas_de_conexion(self):
+        with connection.cursor() as cursor:
+            self.assertEqual(cursor.execute('PRAGMA busy_timeout').fetchone()[0], 5000)
+            self.assertEqual(cursor.execute('PRAGMA synchronous').fetchone()[0], 1)
+    
+    def test_vista_de_escritura(self):
+        vehiculo = self.flota['vehiculos'][0]
+        url = reverse('flota:vehiculo_actualizar_km', kwargs={'pk': vehiculo.pk})
+        respuesta = self.client.post(url, {'kilometraje_actual': vehiculo.kilometraje_actual + 50})
+        self.assertEqual(respuesta.status_code, 302)
+        vehiculo.refresh_from_db()
+        self.assertEqual(vehiculo.kilometraje_actual, 9650)
+        # Un kilometraje menor se rechaza sin escribir
+        self.assertEqual(self.client.post(url, {'kilometraje_actual': 1}).status_code, 200)
+
+
+class MantenerBdTests(TransactionTestCase):
+    
+    def test_mantenimiento_completo(self):
+        salida = StringIO()
+        call_command('mantener_bd', '--analyze', '--forzar-vacuum', '--wal', stdout=salida)
+        self.assertIn('VACUUM', salida.getvalue())
+        self.assertIn('journal_mode', salida.getvalue())
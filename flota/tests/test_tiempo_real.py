@@ -0,0 +1,117 @@
+import asyncio
+from asgiref.sync import sync_to_async
+from django.test import SimpleTestCase, override_settings
+from flota.tiempo_real import CancelarAlDesconectar, Difusor, calcular_delta, flujo_eventos, obtener_difusor
+from flota.versiones import version_actual
+from .base import FlotaTransactionTestCase
+
+
+class CalcularDeltaTests(SimpleTestCase):
+    
+    def test_solo_claves_y_centros_que_cambiaron(self):
+        anterior = {'total': 5, 'alertas': 1, 'centros': [{'nombre': 'Osorno', 'total': 2}, {'nombre': 'Coquimbo', 'total': 1}]}
+        actual = {'total': 5, 'alertas': 2, 'centros': [{'nombre': 'Osorno', 'total': 3}]}
+        self.assertEqual(calcular_delta(anterior, actual), {
+            'alertas': 2,
+            'centros': {'Osorno': {'nombre': 'Osorno', 'total': 3}, 'Coquimbo': None},
+        })
+
+
+@override_settings(FLOTA_SSE_INTERVALO=0.05, FLOTA_SSE_LATIDO=5, FLOTA_SSE_DURACION_MAXIMA=30)
+class DifusorTests(FlotaTransactionTestCase):
+    
+    def test_delta_tras_guardar_un_vehiculo(self):
+        vehiculo = self.flota['vehiculos'][0]
+        
+        async def escenario():
+            flujo = flujo_eventos(None)
+            self.assertEqual(await flujo.__anext__(), b'retry: 3000\n\n')
+            self.assertTrue((await flujo.__anext__()).startswith(b'id: '))
+            vehiculo.estado = 'fuera_servicio'
+            await sync_to_async(vehiculo.save)()
+            evento = await asyncio.wait_for(flujo.__anext__(), 5)
+            await flujo.aclose()
+            return evento
+        
+        self.assertIn(b'event: kpis', asyncio.run(escenario()))
+    
+    def test_ultimo_suscriptor_detiene_la_consulta(self):
+        async def escenario():
+            difusor = Difusor(intervalo=0.05)
+            await difusor.suscribir()
+            await difusor.suscribir()
+            tarea = difusor._tarea
+            difusor.desuscribir()
+            self.assertFalse(tarea.done())
+            difusor.desuscribir()
+            await asyncio.sleep(0)
+            return difusor, tarea
+        
+        difusor, tarea = asyncio.run(escenario())
+        self.assertTrue(tarea.cancelled())
+        self.assertIsNone(difusor._tarea)
+    
+    def test_cancelar_el_stream_desuscribe(self):
+        async def escenario():
+            async def consumir():
+                async for _ in flujo_eventos(None):
+                    pass
+            
+            consumo = asyncio.ensure_future(consumir())
+            difusor = obtener_difusor()
+            while difusor.version is None:
+                await asyncio.sleep(0.01)
+            await asyncio.sleep(0.05)
+            self.assertEqual(difusor.suscriptores, 1)
+            consumo.cancel()
+            await asyncio.gather(consumo, return_exceptions=True)
+            return difusor
+        
+        difusor = asyncio.run(escenario())
+        self.assertEqual(difusor.suscriptores, 0)
+        self.assertIsNone(difusor._tarea)
+
+
+class CanalSinAsgiTests(FlotaTransactionTestCase):
+    
+    def test_solo_version_y_alertas_o_304(self):
+        respuesta = self.client.get('/dashboard/api/eventos/')
+        
+        numero, _ = version_actual()
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertIn(f'id: {numero}\nevent: version\n'.encode(), respuesta.content)
+        self.assertIn(b'"alertas":', respuesta.content)
+        self.assertNotIn(b'operativos', respuesta.content)
+        self.assertEqual(self.client.get('/dashboard/api/eventos/', HTTP_LAST_EVENT_ID=str(numero)).status_code, 304)
+        self.assertEqual(self.client.get('/dashboard/api/eventos/', {'ultimo': numero - 1}).status_code, 200)
+    
+    def test_canal_solo_en_dashboard_y_alertas(self):
+        for url, abre in (('/dashboard/', True), ('/dashboard/alertas/', True), ('/dashboard/vehiculos/', False)):
+            self.assertContains(self.client.get(url), f'if ({str(abre).lower()} && window.EventSource)', msg_prefix=url)
+
+
+class CancelarAlDesconectarTests(SimpleTestCase):
+    
+    def test_desconexion_cancela_la_respuesta(self):
+        cancelada = []
+        
+        async def aplicacion(scope, receive, send):
+            await receive()
+            try:
+                await asyncio.sleep(30)
+            except asyncio.CancelledError:
+                cancelada.append(True)
+                raise
+        
+        async def escenario():
+            mensajes = [{'type': 'http.request', 'body': b'', 'more_body': False}, {'type': 'http.disconnect'}]
+            
+            async def receive():
+                await asyncio.sleep(0.01)
+                return mensajes.pop(0)
+            
+            middleware = CancelarAlDesconectar(aplicacion, rutas={'/dashboard/api/eventos/'})
+            await asyncio.wait_for(middleware({'type': 'http', 'path': '/dashboard/api/eventos/'}, receive, None), 5)
+        
+        asyncio.run(escenario())
+        self.assertEqual(cancelada, [True])
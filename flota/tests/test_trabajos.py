@@ -0,0 +1,129 @@
+from datetime import timedelta
+from unittest import mock
+from django.core import mail
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from flota import trabajos
+from flota.models import Trabajo
+
+llamadas = []
+
+
+@trabajos.tarea('prueba_falla_dos_veces', max_intentos=3)
+def falla_dos_veces(valor):
+    llamadas.append(valor)
+    if len(llamadas) < 3:
+        raise RuntimeError('falla transitoria')
+    return {'valor': valor}
+
+
+@trabajos.tarea('prueba_siempre_falla', max_intentos=2)
+def siempre_falla():
+    raise RuntimeError('falla permanente')
+
+
+@trabajos.tarea('prueba_con_progreso')
+def con_progreso(pasos):
+    for paso in range(pasos):
+        trabajos.informar_progreso({'paso': paso + 1})
+    # Lo que ve /api/trabajos/<id>/ mientras la tarea corre
+    return Trabajo.objects.filter(estado='en_proceso').values_list('resultado', flat=True).get()
+
+
+def _vencer_arriendo(trabajo):
+    Trabajo.objects.filter(pk=trabajo.pk).update(bloqueado_hasta=timezone.now() - timedelta(seconds=1))
+
+
+@override_settings(EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend')
+class ColaTrabajosTests(TestCase):
+    
+    def setUp(self):
+        llamadas.clear()
+    
+    def _email(self, **kwargs):
+        return trabajos.encolar('enviar_email', {'asunto': 'Aviso', 'cuerpo': 'Texto', 'destinatarios': ['jefe@acme.cl']}, **kwargs)
+    
+    def test_tarea_desconocida(self):
+        with self.assertRaises(trabajos.TareaDesconocida):
+            trabajos.encolar('no_existe')
+    
+    def test_clave_idempotente(self):
+        self.assertEqual(self._email(clave='aviso-1').pk, self._email(clave='aviso-1').pk)
+        self.assertEqual(Trabajo.objects.count(), 1)
+    
+    def test_prioridad_y_ejecucion(self):
+        baja = trabajos.encolar('prueba_falla_dos_veces', {'valor': 1}, prioridad=trabajos.PRIORIDAD_BAJA)
+        alta = self._email(prioridad=trabajos.PRIORIDAD_ALTA)
+        trabajo = trabajos.tomar_trabajo('trabajador-1')
+        self.assertEqual(trabajo.pk, alta.pk)
+        trabajo = trabajos.ejecutar(trabajo)
+        self.assertEqual(trabajo.estado, 'completado')
+        self.assertEqual(trabajo.resultado, {'enviados': 1})
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(trabajos.tomar_trabajo('trabajador-1').pk, baja.pk)
+    
+    def test_reintentos_con_espera_hasta_completar(self):
+        pendiente = trabajos.encolar('prueba_falla_dos_veces', {'valor': 7})
+        for intento in (1, 2):
+            with self.assertLogs('flota.trabajos', 'WARNING'):
+                trabajo = trabajos.ejecutar(trabajos.tomar_trabajo('trabajador-1'))
+            self.assertEqual((trabajo.estado, trabajo.intentos), ('pendiente', intento))
+            self.assertIn('falla transitoria', trabajo.error)
+            self.assertGreater(trabajo.disponible_desde, timezone.now())
+            # Aún en espera: nadie lo toma hasta que se cumpla el backoff
+            self.assertIsNone(trabajos.tomar_trabajo('trabajador-1'))
+            Trabajo.objects.filter(pk=pendiente.pk).update(disponible_desde=timezone.now())
+        trabajo = trabajos.ejecutar(trabajos.tomar_trabajo('trabajador-1'))
+        self.assertEqual((trabajo.estado, trabajo.resultado, trabajo.error), ('completado', {'valor': 7}, ''))
+    
+    def test_falla_definitiva_al_agotar_intentos(self):
+        pendiente = trabajos.encolar('prueba_siempre_falla')
+        with self.assertLogs('flota.trabajos', 'WARNING'):
+            trabajos.ejecutar(trabajos.tomar_trabajo('trabajador-1'))
+        Trabajo.objects.filter(pk=pendiente.pk).update(disponible_desde=timezone.now())
+        with self.assertLogs('flota.trabajos', 'ERROR'):
+            trabajo = trabajos.ejecutar(trabajos.tomar_trabajo('trabajador-1'))
+        self.assertEqual((trabajo.estado, trabajo.intentos), ('fallido', 2))
+        self.assertIsNone(trabajos.tomar_trabajo('trabajador-1'))
+    
+    def test_arriendo_vencido_se_retoma(self):
+        pendiente = self._email()
+        self.assertEqual(trabajos.tomar_trabajo('trabajador-1').pk, pendiente.pk)
+        self.assertIsNone(trabajos.tomar_trabajo('trabajador-2'))
+        _vencer_arriendo(pendiente)
+        retomado = trabajos.tomar_trabajo('trabajador-2')
+        self.assertEqual((retomado.pk, retomado.trabajador), (pendiente.pk, 'trabajador-2'))
+    
+    def test_resultado_de_arriendo_perdido_se_descarta(self):
+        pendiente = trabajos.encolar('prueba_falla_dos_veces', {'valor': 3})
+        llamadas.extend([1, 2])
+        original = trabajos.tomar_trabajo('trabajador-1')
+        _vencer_arriendo(pendiente)
+        retomado = trabajos.tomar_trabajo('trabajador-2')
+        
+        with self.assertLogs('flota.trabajos', 'WARNING') as registro:
+            trabajo = trabajos.ejecutar(original)
+        self.assertIn('arriendo venció', registro.output[0])
+        self.assertEqual((trabajo.estado, trabajo.trabajador), ('en_proceso', 'trabajador-2'))
+        self.assertIsNone(Trabajo.objects.get(pk=pendiente.pk).resultado)
+        # El dueño actual del arriendo sí guarda su resultado
+        self.assertEqual(trabajos.ejecutar(retomado).estado, 'completado')
+    
+    def test_progreso_renueva_el_arriendo(self):
+        trabajos.encolar('prueba_con_progreso', {'pasos': 3})
+        trabajo = trabajos.tomar_trabajo('trabajador-1')
+        arriendo_inicial = trabajo.bloqueado_hasta
+        with mock.patch('flota.trabajos.Trabajo.objects.filter', wraps=Trabajo.objects.filter) as filtrar:
+            trabajo = trabajos.ejecutar(trabajo)
+        renovaciones = [llamada for llamada in filtrar.call_args_list if 'bloqueado_hasta' in llamada.kwargs]
+        # Cada renovación exige el arriendo anterior; el guardado final, el último renovado
+        self.assertEqual(renovaciones[0].kwargs['bloqueado_hasta'], arriendo_inicial)
+        self.assertGreater(renovaciones[-1].kwargs['bloqueado_hasta'], arriendo_inicial)
+        self.assertEqual((trabajo.estado, trabajo.resultado), ('completado', {'paso': 3}))
+    
+    def test_procesar_pendientes(self):
+        for numero in range(3):
+            self._email(clave=f'aviso-{numero}')
+        self.assertEqual(trabajos.procesar_pendientes('trabajador-1'), 3)
+        self.assertEqual(len(mail.outbox), 3)
+        self.assertEqual(trabajos.estado_trabajo(Trabajo.objects.first())['estado'], 'completado')
@@ -0,0 +1,116 @@
+"""Transiciones masivas de vehículos: reglas, derivados y API"""
+import json
+from unittest import mock
+from flota import cubo
+from flota.models import ResumenCostoMensual, TransicionEstado, Vehiculo
+from flota.sqlite import atomic_inmediato
+from flota.transiciones import TransicionInvalida, transicionar_vehiculos
+from flota.versiones import version_actual
+from .base import FlotaTestCase
+
+
+URL = '/dashboard/api/vehiculos/transicion/'
+
+
+class TransicionesTests(FlotaTestCase):
+    
+    def setUp(self):
+        super().setUp()
+        self.vehiculos = self.flota['vehiculos']
+        self.ids = [vehiculo.pk for vehiculo in self.vehiculos]
+    
+    def assertCuboConsistente(self):
+        diferencias = cubo.verificar_cubo()
+        self.assertEqual((diferencias['faltantes'], diferencias['sobrantes'], diferencias['distintas']), ([], [], []))
+    
+    def test_rechazos_por_regla(self):
+        resultado = transicionar_vehiculos(self.ids + [999999], estado='operativo')
+        
+        self.assertEqual((resultado['actualizados'], resultado['sin_cambio']), (0, 2))
+        # Con un mantenimiento en proceso no se puede volver a operar
+        self.assertEqual(sorted(resultado['rechazados']['trabajo_en_proceso']), [self.ids[1], self.ids[4]])
+        # Fuera de servicio vuelve pasando por el taller
+        self.assertEqual(sorted(resultado['rechazados']['transicion_no_permitida']), [self.ids[2], self.ids[5]])
+        self.assertEqual(resultado['rechazados']['no_encontrado'], [999999])
+        self.assertEqual(Vehiculo.objects.filter(estado='operativo').count(), 2)
+    
+    def test_transicion_permitida_mantiene_derivados(self):
+        transiciones, version = TransicionEstado.objects.count(), version_actual()[0]
+        
+        resultado = transicionar_vehiculos(self.ids, estado='mantenimiento')
+        
+        self.assertEqual(resultado['actualizados'], 4)
+        self.assertEqual(Vehiculo.objects.filter(estado='mantenimiento').count(), 6)
+        self.assertEqual(TransicionEstado.objects.count(), transiciones + 4)
+        self.assertGreater(version_actual()[0], version)
+        self.assertCuboConsistente()
+    
+    def test_cambio_de_centro(self):
+        destino = self.flota['centros'][0]
+        
+        resultado = transicionar_vehiculos([self.ids[2], self.ids[5]], centro_id=destino.pk)
+        
+        self.assertEqual(resultado['actualizados'], 2)
+        self.assertEqual(
+            set(ResumenCostoMensual.objects.filter(vehiculo_id=self.ids[2]).values_list('centro_id', flat=True)), {destino.pk},
+        )
+        self.assertEqual(TransicionEstado.objects.filter(vehiculo_id=self.ids[2], estado_nuevo='').count(), 1)
+        self.assertCuboConsistente()
+    
+    def test_parametros_invalidos(self):
+        with self.assertRaises(TransicionInvalida):
+            transicionar_vehiculos([self.ids[0]], estado='x')
+        with self.assertRaises(TransicionInvalida):
+            transicionar_vehiculos([self.ids[0]])
+
+
+class ApiTransicionTests(FlotaTestCase):
+    
+    def test_form_con_vehiculos_repetidos(self):
+        vehiculos = self.flota['vehiculos']
+        
+        respuesta = self.client.post(URL, {'vehiculos': [vehiculos[0].pk, vehiculos[3].pk], 'estado': 'fuera_servicio'})
+        
+        self.assertEqual(respuesta.json()['actualizados'], 2, respuesta.content)
+        self.assertEqual(Vehiculo.objects.get(pk=vehiculos[0].pk).estado, 'fuera_servicio')
+    
+    def test_form_separado_por_comas_y_json(self):
+        vehiculos, centros = self.flota['vehiculos'], self.flota['centros']
+        
+        respuesta = self.client.post(URL, {'vehiculos': f'{vehiculos[0].pk},{vehiculos[3].pk}', 'estado': 'mantenimiento'})
+        self.assertEqual(respuesta.json()['actualizados'], 2)
+        
+        respuesta = self.client.post(
+            URL, json.dumps({'centro_origen': centros[1].pk, 'centro': centros[0].pk}), content_type='application/json',
+        )
+        self.assertEqual(respuesta.json()['actualizados'], 2, respuesta.content)
+    
+    def test_errores(self):
+        self.assertEqual(self.client.post(URL, {'vehiculos': '1', 'estado': 'zz'}).status_code, 400)
+        self.assertEqual(self.client.post(URL, 'no es json', content_type='application/json').status_code, 400)
+        self.assertEqual(self.client.get(URL).status_code, 405)
+    
+    def test_solo_staff_y_en_transaccion_inmediata(self):
+        vehiculos = self.flota['vehiculos']
+        with mock.patch('flota.sqlite.atomic_inmediato', wraps=atomic_inmediato) as inmediato:
+            self.assertEqual(self.client.post(URL, {'vehiculos': vehiculos[0].pk, 'estado': 'mantenimiento'}).status_code, 200)
+        inmediato.assert_called_once_with()
+        
+        self.flota['usuario'].is_staff = self.flota['usuario'].is_superuser = False
+        self.flota['usuario'].save()
+        self.assertEqual(self.client.post(URL, {'vehiculos': vehiculos[3].pk, 'estado': 'mantenimiento'}).status_code, 302)
+        self.assertEqual(Vehiculo.objects.get(pk=vehiculos[3].pk).estado, 'operativo')
+    
+    def test_acciones_del_admin(self):
+        vehiculos, centros = self.flota['vehiculos'], self.flota['centros']
+        
+        respuesta = self.client.post('/admin/flota/vehiculo/', {
+            'action': 'marcar_mantenimiento', '_selected_action': [vehiculos[0].pk, vehiculos[3].pk], 'centro': '',
+        }, follow=True)
+        self.assertContains(respuesta, '2 vehículo(s) actualizados')
+        
+        respuesta = self.client.post('/admin/flota/vehiculo/', {
+            'action': 'mover_a_centro', '_selected_action': [vehiculos[0].pk], 'centro': centros[2].pk,
+        }, follow=True)
+        self.assertContains(respuesta, '1 vehículo(s) actualizados')
+        self.assertEqual(Vehiculo.objects.get(pk=vehiculos[0].pk).centro_operacion, centros[2])
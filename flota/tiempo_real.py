@@ -0,0 +1,245 @@
+"""
+Canal de eventos en tiempo real (Server-Sent Events) para KPIs y alertas.
+
+Un único ``Difusor`` por proceso observa el contador de versión de datos
+(ver ``versiones.py``). Solo cuando la versión cambia recalcula los KPIs una
+vez y despierta a todos los clientes conectados con el delta. Los clientes
+inactivos quedan esperando un ``asyncio.Event``, por lo que miles de conexiones
+abiertas no consumen CPU.
+
+El ``id`` de cada evento es el número de versión; al reconectar, el navegador
+envía ``Last-Event-ID`` y se le reenvían los deltas pendientes desde el
+historial reciente, o un snapshot completo si quedó demasiado atrás.
+
+Django 4.2 no escucha ``http.disconnect`` mientras transmite una respuesta:
+``CancelarAlDesconectar`` (ver ``asgi.py``) cancela el stream en cuanto el
+cliente se va, y el último suscriptor en salir detiene la consulta periódica.
+"""
+import asyncio
+import json
+from collections import deque
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from .indicadores import kpis_flota
+from .versiones import version_actual
+
+
+def _config(nombre, defecto):
+    return getattr(settings, nombre, defecto)
+
+
+def calcular_delta(anterior, actual):
+    """Claves de KPIs que cambiaron; los centros se comparan por nombre"""
+    delta = {}
+    for clave, valor in actual.items():
+        if clave == 'centros':
+            continue
+        if anterior.get(clave) != valor:
+            delta[clave] = valor
+    
+    centros_previos = {c['nombre']: c for c in anterior.get('centros', [])}
+    centros_actuales = {c['nombre']: c for c in actual.get('centros', [])}
+    centros_delta = {
+        nombre: centro for nombre, centro in centros_actuales.items()
+        if centros_previos.get(nombre) != centro
+    }
+    for nombre in centros_previos.keys() - centros_actuales.keys():
+        centros_delta[nombre] = None
+    if centros_delta:
+        delta['centros'] = centros_delta
+    return delta
+
+
+def formatear_evento(evento, id_evento=None, datos=None, retry=None):
+    """Serializa un evento en el formato text/event-stream"""
+    lineas = []
+    if retry is not None:
+        lineas.append(f'retry: {retry}')
+    if id_evento is not None:
+        lineas.append(f'id: {id_evento}')
+    lineas.append(f'event: {evento}')
+    lineas.append('data: ' + json.dumps(datos, separators=(',', ':')))
+    return ('\n'.join(lineas) + '\n\n').encode()
+
+
+def eventos_delta(numero, delta):
+    """Evento de KPIs y, si cambió el conteo, el evento dedicado de alertas"""
+    eventos = [formatear_evento('kpis', numero, delta)]
+    if 'alertas' in delta:
+        eventos.append(formatear_evento('alertas', numero, {'count': delta['alertas']}))
+    return eventos
+
+
+class Difusor:
+    """Fuente única de cambios que reparte los eventos a los suscriptores del proceso"""
+    
+    def __init__(self, intervalo=None, historial=None):
+        self.intervalo = intervalo or _config('FLOTA_SSE_INTERVALO', 2)
+        self.version = None
+        self.kpis = None
+        self.historial = deque(maxlen=historial or _config('FLOTA_SSE_HISTORIAL', 100))
+        # Versión desde la cual el historial está completo
+        self.historial_desde = None
+        self.suscriptores = 0
+        self._nuevo_evento = asyncio.Event()
+        self._tarea = None
+    
+    async def _refrescar(self):
+        """Consulta la versión y, si cambió, recalcula KPIs y publica el delta"""
+        numero, _ = await sync_to_async(version_actual)()
+        if numero == self.version:
+            return
+        kpis = await sync_to_async(kpis_flota)()
+        if self.kpis is None:
+            self.historial_desde = numero
+        else:
+            delta = calcular_delta(self.kpis, kpis)
+            if delta:
+                if len(self.historial) == self.historial.maxlen:
+                    self.historial_desde = self.historial[0][0]
+                self.historial.append((numero, delta))
+        self.version = numero
+        self.kpis = kpis
+        # Despertar a todos los que esperan y preparar el próximo evento
+        evento, self._nuevo_evento = self._nuevo_evento, asyncio.Event()
+        evento.set()
+    
+    async def _observar(self):
+        try:
+            while self.suscriptores > 0:
+                await asyncio.sleep(self.intervalo)
+                await self._refrescar()
+        finally:
+            # Una tarea cancelada no debe borrar a la que la reemplazó
+            if self._tarea is asyncio.current_task():
+                self._tarea = None
+    
+    async def suscribir(self):
+        """Registra un suscriptor y garantiza que haya un estado inicial"""
+        self.suscriptores += 1
+        try:
+            if self.kpis is None:
+                await self._refrescar()
+        except BaseException:
+            # Cliente desconectado (CancelledError) o error de BD antes del primer evento
+            self.desuscribir()
+            raise
+        if self._tarea is None:
+            self._tarea = asyncio.ensure_future(self._observar())
+    
+    def desuscribir(self):
+        self.suscriptores -= 1
+        if self.suscriptores <= 0 and self._tarea is not None:
+            # Sin clientes no hay a quién avisar: no seguir consultando la base
+            self._tarea.cancel()
+            self._tarea = None
+    
+    def pendientes_desde(self, ultima_version):
+        """Deltas posteriores a ultima_version, o None si ya no están en el historial"""
+        if ultima_version == self.version:
+            return []
+        if ultima_version is None or not self.historial_desde <= ultima_version <= self.version:
+            return None
+        return [(numero, delta) for numero, delta in self.historial if numero > ultima_version]
+    
+    async def esperar_cambio(self, timeout):
+        """Espera el próximo evento; retorna False si se cumplió el timeout"""
+        evento = self._nuevo_evento
+        try:
+            await asyncio.wait_for(evento.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+
+_difusores = {}
+
+
+def obtener_difusor():
+    """Un difusor por event loop (los objetos asyncio no se comparten entre loops)"""
+    loop = asyncio.get_running_loop()
+    difusor = _difusores.get(loop)
+    if difusor is None:
+        difusor = _difusores[loop] = Difusor()
+    return difusor
+
+
+async def flujo_eventos(ultima_version=None):
+    """Generador async con los eventos text/event-stream de una conexión"""
+    difusor = obtener_difusor()
+    await difusor.suscribir()
+    latido = _config('FLOTA_SSE_LATIDO', 25)
+    duracion_maxima = _config('FLOTA_SSE_DURACION_MAXIMA', 300)
+    loop = asyncio.get_running_loop()
+    fin = loop.time() + duracion_maxima
+    
+    # finally también corre con CancelledError (desconexión) y GeneratorExit (aclose)
+    try:
+        yield b'retry: 3000\n\n'
+        pendientes = difusor.pendientes_desde(ultima_version)
+        if pendientes is None:
+            yield formatear_evento('snapshot', difusor.version, difusor.kpis)
+        else:
+            for numero, delta in pendientes:
+                for evento in eventos_delta(numero, delta):
+                    yield evento
+        enviada = difusor.version
+        
+        # La conexión se cierra periódicamente; el navegador reconecta con Last-Event-ID
+        while loop.time() < fin:
+            hubo_cambio = await difusor.esperar_cambio(min(latido, max(fin - loop.time(), 0)))
+            if not hubo_cambio:
+                yield b': ping\n\n'
+                continue
+            pendientes = difusor.pendientes_desde(enviada)
+            if pendientes is None:
+                yield formatear_evento('snapshot', difusor.version, difusor.kpis)
+            else:
+                for numero, delta in pendientes:
+                    for evento in eventos_delta(numero, delta):
+                        yield evento
+            enviada = difusor.version
+    finally:
+        difusor.desuscribir()
+
+
+class CancelarAlDesconectar:
+    """
+    Middleware ASGI: cancela la respuesta de las rutas de streaming cuando el
+    cliente se desconecta, en vez de esperar al próximo envío (Django 5.0 lo
+    hace por sí mismo; 4.2 solo lo nota al cerrar la conexión el navegador).
+    """
+    
+    def __init__(self, app, rutas=None):
+        self.app = app
+        self.rutas = rutas
+    
+    def _es_stream(self, scope):
+        if self.rutas is None:
+            from django.urls import reverse
+            self.rutas = {reverse('flota:eventos')}
+        return scope['type'] == 'http' and scope['path'] in self.rutas
+    
+    async def __call__(self, scope, receive, send):
+        if not self._es_stream(scope):
+            return await self.app(scope, receive, send)
+        
+        mensajes = asyncio.Queue()
+        respuesta = asyncio.ensure_future(self.app(scope, mensajes.get, send))
+        
+        async def escuchar():
+            while True:
+                mensaje = await receive()
+                await mensajes.put(mensaje)
+                if mensaje['type'] == 'http.disconnect':
+                    respuesta.cancel()
+                    return
+        
+        escucha = asyncio.ensure_future(escuchar())
+        try:
+            await respuesta
+        except asyncio.CancelledError:
+            if not escucha.done():
+                raise
+        finally:
+            escucha.cancel()
@@ -0,0 +1,241 @@
+"""
+Cola local de trabajos en segundo plano, guardada en la base de datos.
+
+Sin broker externo: los trabajos son filas de ``Trabajo`` y el comando
+``manage.py trabajador`` las ejecuta en uno o más procesos. Cada trabajo se toma
+con un UPDATE condicional (sólo uno de los procesos lo logra) y queda
+arrendado hasta ``bloqueado_hasta``; si el proceso muere, otro lo retoma al
+vencer el arriendo.
+
+Uso:
+    @tarea('enviar_email')
+    def enviar_email(asunto, cuerpo, destinatarios): ...
+
+    encolar('enviar_email', {'asunto': ..., ...}, clave='aviso-123')
+
+Una tarea larga puede llamar a ``informar_progreso({...})`` entre lotes: el
+avance queda en el resultado del trabajo y el arriendo se renueva.
+"""
+import logging
+import os
+import random
+import socket
+import threading
+import traceback
+from datetime import timedelta
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.utils import timezone
+from .models import Trabajo
+
+
+logger = logging.getLogger(__name__)
+
+PRIORIDAD_ALTA = 0
+PRIORIDAD_NORMAL = 5
+PRIORIDAD_BAJA = 9
+
+TAREAS = {}
+
+# Trabajo que ejecuta cada hilo del trabajador (para informar_progreso)
+_en_curso = threading.local()
+
+
+class TareaDesconocida(Exception):
+    pass
+
+
+def tarea(nombre, max_intentos=5):
+    """Registra una función como tarea ejecutable por el trabajador"""
+    def registrar(funcion):
+        TAREAS[nombre] = (funcion, max_intentos)
+        return funcion
+    return registrar
+
+
+def encolar(tipo, parametros=None, prioridad=PRIORIDAD_NORMAL, clave=None, retraso=0):
+    """
+    Agrega un trabajo a la cola y lo retorna. Con ``clave`` la operación es
+    idempotente: si ya existe un trabajo con esa clave se retorna ése.
+    """
+    if tipo not in TAREAS:
+        raise TareaDesconocida(tipo)
+
+    if clave:
+        existente = Trabajo.objects.filter(clave_idempotencia=clave).first()
+        if existente is not None:
+            return existente
+
+    try:
+        with transaction.atomic():
+            return Trabajo.objects.create(
+                tipo=tipo,
+                parametros=parametros or {},
+                prioridad=prioridad,
+                clave_idempotencia=clave or None,
+                max_intentos=TAREAS[tipo][1],
+                disponible_desde=timezone.now() + timedelta(seconds=retraso),
+            )
+    except IntegrityError:
+        # Otro proceso encoló la misma clave entremedio
+        return Trabajo.objects.get(clave_idempotencia=clave)
+
+
+# Claves que este proceso ya encoló en una transacción confirmada (ver encolar_una_vez)
+_claves_confirmadas = set()
+
+
+def encolar_una_vez(tipo, parametros=None, prioridad=PRIORIDAD_NORMAL, clave=None, retraso=0):
+    """
+    Como ``encolar`` con clave, pero sin consultar la cola si este proceso ya
+    encoló esa clave y la transacción se confirmó. Para los trabajos que se
+    programan en cada guardado (un resumen por ventana, un snapshot por día).
+    Retorna None cuando no consultó.
+    """
+    if clave in _claves_confirmadas:
+        return None
+    trabajo = encolar(tipo, parametros, prioridad, clave, retraso)
+    if len(_claves_confirmadas) > 1000:
+        _claves_confirmadas.clear()
+    transaction.on_commit(lambda: _claves_confirmadas.add(clave))
+    return trabajo
+
+
+def espera_reintento(intentos):
+    """Backoff exponencial con jitter: base * 2^(intentos-1), con tope"""
+    base = getattr(settings, 'FLOTA_TRABAJOS_BACKOFF_BASE', 10)
+    tope = getattr(settings, 'FLOTA_TRABAJOS_BACKOFF_MAXIMO', 3600)
+    espera = min(base * 2 ** (intentos - 1), tope)
+    return espera * random.uniform(0.8, 1.2)
+
+
+def nombre_trabajador():
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+def tomar_trabajo(trabajador):
+    """Arrienda el siguiente trabajo disponible, o retorna None si no hay"""
+    arriendo = getattr(settings, 'FLOTA_TRABAJOS_ARRIENDO', 600)
+
+    while True:
+        ahora = timezone.now()
+        disponibles = Trabajo.objects.filter(
+            Q(estado='pendiente', disponible_desde__lte=ahora)
+            # Arriendos vencidos: el proceso que los tomó murió
+            | Q(estado='en_proceso', bloqueado_hasta__lt=ahora)
+        )
+        candidato = disponibles.order_by('prioridad', 'disponible_desde', 'id').values_list(
+            'id', 'estado', 'bloqueado_hasta'
+        ).first()
+        if candidato is None:
+            return None
+
+        pk, estado, bloqueado_hasta = candidato
+        # Sólo uno de los procesos que compiten por la fila logra actualizarla
+        tomado = Trabajo.objects.filter(pk=pk, estado=estado, bloqueado_hasta=bloqueado_hasta).update(
+            estado='en_proceso',
+            trabajador=trabajador,
+            bloqueado_hasta=ahora + timedelta(seconds=arriendo),
+            fecha_inicio=ahora,
+        )
+        if tomado:
+            return Trabajo.objects.get(pk=pk)
+
+
+def ejecutar(trabajo):
+    """
+    Ejecuta el trabajo y registra el resultado o programa el reintento.
+    
+    El resultado se guarda solo si el arriendo sigue siendo de este proceso: si
+    venció durante la ejecución y otro proceso retomó el trabajo, se descarta
+    (el trabajo queda con el estado que dejó el otro proceso).
+    """
+    funcion, _ = TAREAS.get(trabajo.tipo, (None, 0))
+    trabajo.intentos += 1
+
+    try:
+        if funcion is None:
+            raise TareaDesconocida(trabajo.tipo)
+        _en_curso.trabajo = trabajo
+        try:
+            resultado = funcion(**trabajo.parametros)
+        finally:
+            _en_curso.trabajo = None
+    except Exception as error:
+        trabajo.error = ''.join(traceback.format_exception_only(type(error), error)).strip()
+        if trabajo.intentos >= trabajo.max_intentos or isinstance(error, TareaDesconocida):
+            trabajo.estado = 'fallido'
+            trabajo.fecha_fin = timezone.now()
+            logger.exception('Trabajo %s falló definitivamente', trabajo)
+        else:
+            trabajo.estado = 'pendiente'
+            trabajo.disponible_desde = timezone.now() + timedelta(seconds=espera_reintento(trabajo.intentos))
+            logger.warning('Trabajo %s falló (intento %s), reintento programado', trabajo, trabajo.intentos)
+    else:
+        trabajo.estado = 'completado'
+        trabajo.resultado = resultado
+        trabajo.error = ''
+        trabajo.fecha_fin = timezone.now()
+
+    # informar_progreso pudo renovar el arriendo: vale el último que se registró
+    arriendo, trabajo.bloqueado_hasta = trabajo.bloqueado_hasta, None
+    campos = ('estado', 'intentos', 'resultado', 'error', 'bloqueado_hasta', 'disponible_desde', 'fecha_fin')
+    guardado = Trabajo.objects.filter(
+        pk=trabajo.pk, estado='en_proceso', trabajador=trabajo.trabajador, bloqueado_hasta=arriendo,
+    ).update(**{campo: getattr(trabajo, campo) for campo in campos})
+    if not guardado:
+        logger.warning('Trabajo %s: el arriendo venció durante la ejecución, resultado descartado', trabajo)
+        trabajo.refresh_from_db()
+    return trabajo
+
+
+def informar_progreso(progreso):
+    """
+    Desde una tarea larga: guarda ``progreso`` como resultado parcial del
+    trabajo en curso (visible en /api/trabajos/<id>/) y renueva su arriendo.
+    Fuera del trabajador (p. ej. desde un comando) no hace nada.
+    """
+    trabajo = getattr(_en_curso, 'trabajo', None)
+    if trabajo is None:
+        return
+    arriendo = getattr(settings, 'FLOTA_TRABAJOS_ARRIENDO', 600)
+    renovado_hasta = timezone.now() + timedelta(seconds=arriendo)
+    # Sólo mientras el arriendo siga siendo de este proceso
+    renovado = Trabajo.objects.filter(
+        pk=trabajo.pk, trabajador=trabajo.trabajador, estado='en_proceso', bloqueado_hasta=trabajo.bloqueado_hasta,
+    ).update(resultado=progreso, bloqueado_hasta=renovado_hasta)
+    if renovado:
+        trabajo.resultado = progreso
+        trabajo.bloqueado_hasta = renovado_hasta
+
+
+def procesar_pendientes(trabajador=None, limite=None):
+    """Ejecuta trabajos disponibles hasta vaciar la cola (o hasta ``limite``); retorna cuántos"""
+    trabajador = trabajador or nombre_trabajador()
+    procesados = 0
+    while limite is None or procesados < limite:
+        trabajo = tomar_trabajo(trabajador)
+        if trabajo is None:
+            break
+        ejecutar(trabajo)
+        procesados += 1
+    return procesados
+
+
+def estado_trabajo(trabajo):
+    """Representación JSON del trabajo para los endpoints de estado"""
+    return {
+        'id': trabajo.pk,
+        'tipo': trabajo.tipo,
+        'estado': trabajo.estado,
+        'prioridad': trabajo.prioridad,
+        'intentos': trabajo.intentos,
+        'max_intentos': trabajo.max_intentos,
+        'resultado': trabajo.resultado,
+        'error': trabajo.error,
+        'disponible_desde': trabajo.disponible_desde.isoformat(),
+        'fecha_creacion': trabajo.fecha_creacion.isoformat(),
+        'fecha_inicio': trabajo.fecha_inicio.isoformat() if trabajo.fecha_inicio else None,
+        'fecha_fin': trabajo.fecha_fin.isoformat() if trabajo.fecha_fin else None,
+    }
@@ -0,0 +1,201 @@
+"""
+Transiciones masivas de vehículos: cambio de estado o de centro en bloque.
+
+Cerrar un centro o devolver un lote del taller no pasa por el formulario de
+cada vehículo: ``transicionar_vehiculos`` valida por conjuntos (una consulta
+por lote para los datos actuales y otra para los trabajos en proceso), aplica
+un UPDATE por lote dentro de una sola transacción por base y mantiene a mano
+lo que en la edición individual hacen los signals:
+
+- historial de estados (``TransicionEstado``) en un solo bulk_create;
+- stock del cubo, recontando una vez cada celda afectada, y aportes de los
+  mantenimientos al cambiar de centro;
+- centro del resumen de costos;
+- registro de cambios (``cambios.py``);
+- alertas de kilometraje que suben de nivel;
+- versión de datos (ETags y cachés de series), una vez por base.
+
+Con sharding, un cambio a un centro de otro shard mueve las filas de base
+(``shards.mover_vehiculos``).
+"""
+from collections import defaultdict
+from django.utils import timezone
+from .cambios import diferencias, registrar_cambios
+from .indicadores import INTERVALO_MANTENIMIENTO_KM, nivel_alerta_km
+from .models import CentroOperacional, Mantenimiento, MantenimientoHistorial, ResumenCostoMensual, Vehiculo
+from .shards import alias_de_centro, aliases_datos, mover_vehiculos, sharding_activo
+from .sqlite import atomic_inmediato
+from .versiones import incrementar_version
+from . import cubo, disponibilidad, notificaciones
+
+
+ESTADOS = dict(Vehiculo.ESTADO_CHOICES)
+
+# Un vehículo fuera de servicio vuelve a operar pasando por el taller
+TRANSICIONES_PERMITIDAS = {
+    'operativo': {'mantenimiento', 'fuera_servicio'},
+    'mantenimiento': {'operativo', 'fuera_servicio'},
+    'fuera_servicio': {'mantenimiento'},
+}
+
+MOTIVOS_RECHAZO = {
+    'no_encontrado': 'No existe',
+    'transicion_no_permitida': 'Transición de estado no permitida',
+    'trabajo_en_proceso': 'Tiene un mantenimiento en proceso',
+}
+
+TAMANO_LOTE = 1000
+
+
+class TransicionInvalida(ValueError):
+    pass
+
+
+def transicion_permitida(anterior, nuevo):
+    return anterior == nuevo or nuevo in TRANSICIONES_PERMITIDAS.get(anterior, ())
+
+
+def _validar_parametros(estado, centro_id):
+    if estado is None and centro_id is None:
+        raise TransicionInvalida('indique el estado o el centro de destino')
+    if estado is not None and estado not in ESTADOS:
+        raise TransicionInvalida(f'estado desconocido: {estado}')
+    if centro_id is not None and not CentroOperacional.objects.filter(pk=centro_id, activo=True).exists():
+        raise TransicionInvalida(f'centro inexistente o inactivo: {centro_id}')
+
+
+def _clasificar(alias, lote, estado, centro_id, resultado):
+    """
+    Ids del lote presentes en la base y filas (id, patente, km, anterior, nuevo) que
+    cambian; registra en ``resultado`` las omitidas y rechazadas.
+    """
+    encontrados, candidatas = set(), []
+    for pk, patente, km, centro_actual, tipo_capacidad, estado_actual in Vehiculo.objects.using(alias).filter(
+        pk__in=lote, activo=True
+    ).order_by().values_list('id', 'patente', 'kilometraje_actual', 'centro_operacion_id', 'tipo_capacidad', 'estado'):
+        encontrados.add(pk)
+        anterior = (centro_actual, tipo_capacidad, estado_actual)
+        nuevo = (centro_actual if centro_id is None else centro_id, tipo_capacidad, estado or estado_actual)
+        if anterior == nuevo:
+            resultado['sin_cambio'] += 1
+        elif not transicion_permitida(estado_actual, nuevo[2]):
+            resultado['rechazados']['transicion_no_permitida'].append(pk)
+        else:
+            candidatas.append((pk, patente, km, anterior, nuevo))
+
+    if estado == 'operativo':
+        en_proceso = set(Mantenimiento.objects.using(alias).filter(
+            vehiculo_id__in=[pk for pk, *_, anterior, _ in candidatas if anterior[2] != 'operativo'],
+            estado='en_proceso',
+        ).values_list('vehiculo_id', flat=True).distinct())
+        resultado['rechazados']['trabajo_en_proceso'].extend(pk for pk, *_ in candidatas if pk in en_proceso)
+        candidatas = [fila for fila in candidatas if fila[0] not in en_proceso]
+    return encontrados, candidatas
+
+
+def _aplicar_lote(alias, filas, estado, centro_id, ahora):
+    """UPDATE (o movimiento de shard) de un lote ya validado, con el cubo y los costos"""
+    ids = [pk for pk, *_ in filas]
+    cambios = {'fecha_modificacion': ahora}
+    if estado is not None:
+        cambios['estado'] = estado
+    if centro_id is not None:
+        cambios['centro_operacion_id'] = centro_id
+        cambian_centro = [pk for pk, *_, anterior, nuevo in filas if anterior[0] != nuevo[0]]
+        # Antes del UPDATE: las celdas se agrupan con el centro actual de cada vehículo
+        cubo.mover_aportes_a_centro(
+            MantenimientoHistorial.objects.using(alias).filter(vehiculo_id__in=cambian_centro), centro_id
+        )
+        ResumenCostoMensual.objects.filter(vehiculo_id__in=cambian_centro).update(centro_id=centro_id)
+
+    destino = alias_de_centro(centro_id) if centro_id is not None and sharding_activo() else alias
+    if destino != alias:
+        with atomic_inmediato(destino):
+            mover_vehiculos(ids, alias, destino, **cambios)
+    else:
+        Vehiculo.objects.using(alias).filter(pk__in=ids).update(**cambios)
+    registrar_cambios((
+        (Vehiculo, pk, 'modificacion', diferencias(
+            {'centro_operacion_id': anterior[0], 'estado': anterior[2]},
+            {'centro_operacion_id': nuevo[0], 'estado': nuevo[2], 'fecha_modificacion': ahora},
+        ), nuevo[0])
+        for pk, *_, anterior, nuevo in filas
+    ), using=alias)
+    return destino
+
+
+def _notificar_alertas(filas):
+    """Misma regla que notificar_alerta_vehiculo: solo cuando el nivel sube"""
+    eventos = []
+    for pk, patente, km, anterior, nuevo in filas:
+        nivel = nivel_alerta_km(km, nuevo[2])
+        if nivel > nivel_alerta_km(km, anterior[2]):
+            eventos.append({
+                'titulo': f'{patente}: {"URGENTE" if nivel == 2 else "próximo mantenimiento"} '
+                          f'(faltan {INTERVALO_MANTENIMIENTO_KM - km % INTERVALO_MANTENIMIENTO_KM:,} km)',
+                'detalle': f'Kilometraje actual {km:,} km',
+                'referencia': f'vehiculo:{pk}',
+            })
+    notificaciones.registrar_eventos('alerta_km', eventos)
+
+
+def transicionar_vehiculos(vehiculo_ids, estado=None, centro_id=None, using=None):
+    """
+    Lleva los vehículos al ``estado`` y/o ``centro_id`` indicados. Los que no
+    existen (o están marcados para eliminar), ya están así o no admiten la transición se omiten y se informan.
+    Con ``using`` solo se buscan en esa base (p. ej. dentro de su transacción).
+    Retorna {'actualizados', 'sin_cambio', 'rechazados': {motivo: [ids]}}.
+    """
+    _validar_parametros(estado, centro_id)
+    pendientes = sorted({int(pk) for pk in vehiculo_ids})
+    ahora = timezone.now()
+    resultado = {'actualizados': 0, 'sin_cambio': 0, 'rechazados': defaultdict(list)}
+    cambios_historial, celdas_stock, actualizados = [], set(), []
+
+    cubo.asegurar_stock_mes()
+    for alias in [using] if using else aliases_datos():
+        if not pendientes:
+            break
+        encontrados, bases = set(), set()
+        # Una transacción por base: lectura, validación y escritura ven los mismos datos
+        with atomic_inmediato(alias):
+            for inicio in range(0, len(pendientes), TAMANO_LOTE):
+                lote = pendientes[inicio:inicio + TAMANO_LOTE]
+                leidos, filas = _clasificar(alias, lote, estado, centro_id, resultado)
+                encontrados |= leidos
+                if not filas:
+                    continue
+                bases.update({alias, _aplicar_lote(alias, filas, estado, centro_id, ahora)})
+                cambios_historial.extend((pk, anterior, nuevo) for pk, *_, anterior, nuevo in filas)
+                for *_, anterior, nuevo in filas:
+                    celdas_stock.update((anterior, nuevo))
+                actualizados.extend(filas)
+        for base in bases:
+            incrementar_version(using=base)
+        pendientes = [pk for pk in pendientes if pk not in encontrados]
+
+    resultado['rechazados']['no_encontrado'].extend(pendientes)
+    disponibilidad.registrar_transiciones(cambios_historial, fecha=ahora)
+    for dimensiones in celdas_stock:
+        cubo.recalcular_stock(*dimensiones)
+    _notificar_alertas(actualizados)
+    resultado['actualizados'] = len(actualizados)
+    resultado['rechazados'] = {motivo: ids for motivo, ids in resultado['rechazados'].items() if ids}
+    return resultado
+
+
+def vehiculos_de_centro(centro_id, estado=None):
+    """Ids de los vehículos de un centro (p. ej. para cerrarlo), opcionalmente solo los de un estado"""
+    vehiculos = Vehiculo.objects.using(alias_de_centro(centro_id)).filter(centro_operacion_id=centro_id, activo=True)
+    if estado:
+        vehiculos = vehiculos.filter(estado=estado)
+    return list(vehiculos.values_list('id', flat=True))
+
+
+def describir_resultado(resultado):
+    """Mensaje corto para el admin y las vistas"""
+    partes = [f"{resultado['actualizados']} vehículo(s) actualizados"]
+    if resultado['sin_cambio']:
+        partes.append(f"{resultado['sin_cambio']} sin cambio")
+    partes.extend(f'{len(ids)} rechazados: {MOTIVOS_RECHAZO[motivo].lower()}' for motivo, ids in resultado['rechazados'].items())
+    return '; '.join(partes)
@@ -11,6 +11,8 @@ urlpatterns = [
     
     # Vehículos
     path('vehiculos/', views.gestion_vehiculos_view, name='vehiculos'),
+    path('vehiculos/exportar/', views.vehiculos_exportar_view, name='vehiculos_exportar'),
+    path('vehiculos/rebalanceo/', views.rebalanceo_view, name='rebalanceo'),
     path('vehiculos/crear/', views.vehiculo_crear_view, name='vehiculo_crear'),
     path('vehiculos/<int:pk>/', views.vehiculo_detalle_view, name='vehiculo_detalle'),
     path('vehiculos/<int:pk>/editar/', views.vehiculo_editar_view, name='vehiculo_editar'),
@@ -19,7 +21,10 @@ urlpatterns = [
     
     # Mantenimientos
     path('mantenimientos/', views.mantenimientos_view, name='mantenimientos'),
+    path('mantenimientos/exportar/', views.mantenimientos_exportar_view, name='mantenimientos_exportar'),
     path('mantenimientos/crear/', views.mantenimiento_crear_view, name='mantenimiento_crear'),
+    path('mantenimientos/plan-preventivo/', views.plan_preventivo_view, name='plan_preventivo'),
+    path('mantenimientos/operaciones/', views.mantenimientos_operaciones_view, name='mantenimientos_operaciones'),
     path('mantenimientos/<int:pk>/', views.mantenimiento_detalle_view, name='mantenimiento_detalle'),
     path('mantenimientos/<int:pk>/completar/', views.mantenimiento_completar_view, name='mantenimiento_completar'),
     path('mantenimientos/<int:pk>/reporte/', views.mantenimiento_reporte_view, name='mantenimiento_reporte'),  # ← AGREGAR ESTA
@@ -27,9 +32,26 @@ urlpatterns = [
     
     # API
     path('api/alertas-count/', views.api_alertas_count, name='api_alertas_count'),
+    path('api/kpis/', views.api_kpis, name='api_kpis'),
+    path('api/vehiculos/transicion/', views.api_vehiculos_transicion, name='api_vehiculos_transicion'),
+    path('api/mantenimientos/operacion/', views.api_mantenimientos_operacion, name='api_mantenimientos_operacion'),
+    path('api/eventos/', views.eventos_stream_view, name='eventos'),
+    path('api/costos/', views.api_costos, name='api_costos'),
+    path('api/cubo/', views.api_cubo, name='api_cubo'),
+    path('api/series/<str:nombre>/', views.api_series, name='api_series'),
+    path('api/agenda/', views.api_agenda, name='api_agenda'),
+    path('api/agenda/proponer/', views.api_agenda_proponer, name='api_agenda_proponer'),
+    path('api/trabajos/', views.api_trabajos, name='api_trabajos'),
+    path('api/trabajos/<int:pk>/', views.api_trabajo_estado, name='api_trabajo_estado'),
+    path('api/cambios/', views.api_cambios, name='api_cambios'),
+    path('api/sincronizacion/', views.api_sincronizacion, name='api_sincronizacion'),
+    path('api/simulacion/', views.api_simulacion, name='api_simulacion'),
+    path('api/rebalanceo/', views.api_rebalanceo, name='api_rebalanceo'),
 
     # Otras secciones
     path('reportes/', views.reportes_view, name='reportes'),
+    path('reportes/<str:tipo>/descargar/', views.reporte_descargar_view, name='reporte_descargar'),
+    path('reportes/<str:tipo>/encolar/', views.reporte_encolar_view, name='reporte_encolar'),
     path('alertas/', views.alertas_view, name='alertas'),
     path('cambiar-usuario/', views.cambiar_usuario_view, name='cambiar_usuario'),
 ]
\ No newline at end of file
@@ -0,0 +1,41 @@
+from django.db import DEFAULT_DB_ALIAS, IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+from .models import VersionDatos
+from . import shards
+
+
+VERSION_GLOBAL = 'global'
+
+
+def _version_en(alias, clave):
+    fila = VersionDatos.objects.using(alias).filter(clave=clave).values_list(
+        'numero', 'fecha_modificacion'
+    ).first()
+    return fila or (0, None)
+
+
+def version_actual(clave=VERSION_GLOBAL):
+    """Retorna (numero, fecha_modificacion) de la versión indicada"""
+    if not shards.sharding_activo():
+        return _version_en(None, clave)
+    
+    # Cada shard lleva su propio contador; la suma de contadores crecientes también crece
+    versiones = [_version_en(alias, clave) for alias in shards.aliases_datos()]
+    fechas = [fecha for _, fecha in versiones if fecha is not None]
+    return sum(numero for numero, _ in versiones), max(fechas) if fechas else None
+
+
+def incrementar_version(clave=VERSION_GLOBAL, using=DEFAULT_DB_ALIAS):
+    """Incrementa la versión con un UPDATE atómico (sin leer la fila)"""
+    actualizadas = VersionDatos.objects.using(using).filter(clave=clave).update(
+        numero=F('numero') + 1,
+        fecha_modificacion=timezone.now()
+    )
+    if not actualizadas:
+        try:
+            with transaction.atomic(using=using):
+                VersionDatos.objects.using(using).create(clave=clave, numero=1)
+        except IntegrityError:
+            # Otro proceso la creó entremedio
+            incrementar_version(clave, using)
@@ -1,137 +1,111 @@
 # flota/views.py
-from django.http import JsonResponse
-from django.shortcuts import render, redirect, get_object_or_404
-from django.contrib.auth.decorators import login_required
+from django.conf import settings
+from django.http import JsonResponse, HttpResponse, StreamingHttpResponse
+from django.core.handlers.asgi import ASGIRequest
+from asgiref.sync import sync_to_async
+from django.shortcuts import render, redirect
+from django.contrib.auth.decorators import login_required, user_passes_test
 from django.contrib.auth import logout
 from django.contrib import messages
+from django.views.decorators.http import condition, require_POST
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+import asyncio
+import hashlib
 import json
-from .models import Vehiculo, CentroOperacional, Mantenimiento, TipoMantenimiento, Proveedor
-from .forms import VehiculoForm, ActualizarKilometrajeForm, MantenimientoForm, CompletarMantenimientoForm
+from .models import Vehiculo, CentroOperacional, Mantenimiento, MantenimientoHistorial, TipoMantenimiento, Proveedor, Trabajo
+from .forms import VehiculoForm, ActualizarKilometrajeForm, MantenimientoForm, CompletarMantenimientoForm, OperacionMantenimientosForm
+from . import condicional
+from .agenda import calendario_talleres, opciones_cupo
+from .archivo import consultar_mantenimientos, incluir_archivo
+from .asincrono import en_paralelo, render_async
+from .cambios import CursorVencido, cursor_actual, leer_cambios
+from .costos import analisis_costos, leer_mes, panel_costos
+from .cubo import consultar_cubo
+from .series import serie as serie_temporal
+from .simulacion import SimulacionInvalida, leer_parametros as parametros_simulacion
+from .sincronizacion import sincronizar, respuesta as respuesta_sincronizacion
+from .decorators import login_required_async
+from .eliminacion import solicitar_eliminacion
+from .exportaciones import respuesta_exportacion, CursorInvalido
+from .filtros import filtrar_vehiculos, filtrar_mantenimientos
+from .flujo import aplicar_operacion, describir_resultado as describir_operacion
+from .indicadores import kpis_flota_async, km_restantes_alerta, vehiculos_proximos_km, contar_alertas_flota
+from .planificacion import calcular_plan, generar_plan, resumen_plan
+from .rebalanceo import aplicar_rebalanceo, proponer_rebalanceo
+from .replica import lectura_replica
+from .reportes import respuesta_reporte, encolar_reporte, FORMATOS, PLANES
+from .shards import obtener_o_404, buscar_por_pk, listar_shards, contar_en_shards, reunir_shards_async
+from .sqlite import escritura_inmediata
+from .tiempo_real import flujo_eventos, formatear_evento
+from .trabajos import encolar, estado_trabajo, PRIORIDAD_ALTA, PRIORIDAD_BAJA
+from .transiciones import transicionar_vehiculos, vehiculos_de_centro
+from .versiones import version_actual
 
 
 
 # ==================== DASHBOARD ====================
-@login_required
-def dashboard_view(request):
+@login_required_async
+@lectura_replica
+async def dashboard_view(request):
     """Centro de Control Operativo - Vista Principal"""
     
-    # Obtener datos REALES de la base de datos
-    vehiculos = Vehiculo.objects.all()
-    centros = CentroOperacional.objects.all()
-    
-    # Estadísticas generales
-    total = vehiculos.count()
-    operativos = vehiculos.filter(estado='operativo').count()
-    mantenimiento = vehiculos.filter(estado='mantenimiento').count()
-    fuera_servicio = vehiculos.filter(estado='fuera_servicio').count()
-    
-    # Estadísticas por centro
-    centros_data = []
-    for centro in centros:
-        vehiculos_centro = centro.vehiculos.all()
-        operativos_centro = vehiculos_centro.filter(estado='operativo').count()
-        mantenimiento_centro = vehiculos_centro.filter(estado='mantenimiento').count()
-        fuera_servicio_centro = vehiculos_centro.filter(estado='fuera_servicio').count()
-        total_centro = vehiculos_centro.count()
-        
-        centros_data.append({
-            'nombre': centro.nombre,
-            'operativos': operativos_centro,
-            'mantenimiento': mantenimiento_centro,
-            'fuera_servicio': fuera_servicio_centro,
-            'total': total_centro,
-            'disponibilidad': round((operativos_centro / total_centro) * 100, 1) if total_centro > 0 else 0
-        })
-    
-    # Vehículos por tipo
-    gc_total = vehiculos.filter(tipo_capacidad='GC').count()
-    mc_total = vehiculos.filter(tipo_capacidad='MC').count()
+    # Conteos por centro/estado/tipo y alertas: consultas agrupadas en paralelo
+    kpis = await kpis_flota_async()
+    centros_data = kpis['centros']
     
     context = {
         'usuario': request.user,
-        'total_vehiculos': total,
-        'vehiculos_operativos': operativos,
-        'vehiculos_mantenimiento': mantenimiento,
-        'vehiculos_fuera_servicio': fuera_servicio,
+        'total_vehiculos': kpis['total'],
+        'vehiculos_operativos': kpis['operativos'],
+        'vehiculos_mantenimiento': kpis['mantenimiento'],
+        'vehiculos_fuera_servicio': kpis['fuera_servicio'],
         'centros_data': centros_data,
-        'gc_total': gc_total,
-        'mc_total': mc_total,
+        'gc_total': kpis['gc'],
+        'mc_total': kpis['mc'],
         'page_title': 'Centro de Control Operativo',
         'centros_data_json': json.dumps(centros_data),
     }
     
-    return render(request, 'flota/dashboard.html', context)
-# AGREGAR después de dashboard_view en flota/views.py
+    return await render_async(request, 'flota/dashboard.html', context)
 
-@login_required
-def estadisticas_view(request):
+
+@login_required_async
+@lectura_replica
+async def estadisticas_view(request):
     """Vista de Estadísticas y Gráficos"""
     
-    # Obtener datos para gráficos
-    vehiculos = Vehiculo.objects.all()
-    centros = CentroOperacional.objects.all()
-    
-    # Estadísticas generales
-    total = vehiculos.count()
-    operativos = vehiculos.filter(estado='operativo').count()
-    mantenimiento = vehiculos.filter(estado='mantenimiento').count()
-    fuera_servicio = vehiculos.filter(estado='fuera_servicio').count()
-    
-    # Por tipo
-    gc_total = vehiculos.filter(tipo_capacidad='GC').count()
-    mc_total = vehiculos.filter(tipo_capacidad='MC').count()
-    
-    # Por centro
-    centros_data = []
-    for centro in centros:
-        vehiculos_centro = centro.vehiculos.all()
-        operativos_centro = vehiculos_centro.filter(estado='operativo').count()
-        mantenimiento_centro = vehiculos_centro.filter(estado='mantenimiento').count()
-        fuera_servicio_centro = vehiculos_centro.filter(estado='fuera_servicio').count()
-        total_centro = vehiculos_centro.count()
-        
-        centros_data.append({
-            'nombre': centro.nombre,
-            'operativos': operativos_centro,
-            'mantenimiento': mantenimiento_centro,
-            'fuera_servicio': fuera_servicio_centro,
-            'total': total_centro,
-            'disponibilidad': round((operativos_centro / total_centro) * 100, 1) if total_centro > 0 else 0
-        })
-    
-    import json
+    kpis, costos = await asyncio.gather(kpis_flota_async(), en_paralelo(panel_costos))
+    centros_data = kpis['centros']
     
     context = {
-        'total_vehiculos': total,
-        'vehiculos_operativos': operativos,
-        'vehiculos_mantenimiento': mantenimiento,
-        'vehiculos_fuera_servicio': fuera_servicio,
-        'gc_total': gc_total,
-        'mc_total': mc_total,
+        'total_vehiculos': kpis['total'],
+        'vehiculos_operativos': kpis['operativos'],
+        'vehiculos_mantenimiento': kpis['mantenimiento'],
+        'vehiculos_fuera_servicio': kpis['fuera_servicio'],
+        'gc_total': kpis['gc'],
+        'mc_total': kpis['mc'],
         'centros_data': centros_data,
         'centros_data_json': json.dumps(centros_data),
+        'costos': costos,
+        'costos_tablas': [('Por Centro', costos['por_centro']), ('Top 10 Proveedores', costos['por_proveedor'])],
+        'costos_json': json.dumps(costos),
         'page_title': 'Estadísticas',
     }
     
-    return render(request, 'flota/estadisticas.html', context)
+    return await render_async(request, 'flota/estadisticas.html', context)
 
 # ==================== GESTIÓN DE VEHÍCULOS ====================
 @login_required
 def gestion_vehiculos_view(request):
     """Gestión de Vehículos - Lista completa"""
-    vehiculos = Vehiculo.objects.select_related('centro_operacion').all().order_by('patente')
+    vehiculos = Vehiculo.objects.select_related('centro_operacion').filter(activo=True).order_by('patente')
     
     # Filtros
-    centro_filter = request.GET.get('centro', '')
-    tipo_filter = request.GET.get('tipo', '')
-    estado_filter = request.GET.get('estado', '')
+    vehiculos = filtrar_vehiculos(vehiculos, request.GET)
     
-    if centro_filter:
-        vehiculos = vehiculos.filter(centro_operacion__nombre=centro_filter)
-    if tipo_filter:
-        vehiculos = vehiculos.filter(tipo_capacidad=tipo_filter)
-    if estado_filter:
-        vehiculos = vehiculos.filter(estado=estado_filter)
+    # Con sharding se concatenan los resultados de cada centro
+    vehiculos = listar_shards(lambda alias: vehiculos.using(alias), clave=lambda v: v.patente)
     
     context = {
         'vehiculos': vehiculos,
@@ -143,14 +117,25 @@ def gestion_vehiculos_view(request):
 
 
 @login_required
+@lectura_replica
+def vehiculos_exportar_view(request):
+    """Exportación de vehículos (CSV/JSON en streaming, mismos filtros que el listado)"""
+    try:
+        return respuesta_exportacion(request, 'vehiculos')
+    except CursorInvalido:
+        return JsonResponse({'error': 'Parámetro since inválido (use fecha ISO 8601)'}, status=400)
+
+
+@login_required
+@condition(etag_func=condicional.vehiculo_detalle_etag, last_modified_func=condicional.vehiculo_detalle_last_modified)
 def vehiculo_detalle_view(request, pk):
     """Ver detalle completo de un vehículo"""
-    vehiculo = get_object_or_404(Vehiculo, pk=pk)
+    vehiculo = obtener_o_404(Vehiculo.objects.filter(activo=True), pk)
     
-    # Mantenimientos del vehículo
-    mantenimientos = vehiculo.mantenimientos.select_related(
-        'tipo_mantenimiento', 'proveedor'
-    ).order_by('-fecha_programada')[:10]
+    # Mantenimientos del vehículo (también los archivados)
+    mantenimientos = MantenimientoHistorial.objects.using(vehiculo._state.db).filter(
+        vehiculo_id=vehiculo.pk
+    ).select_related('tipo_mantenimiento', 'proveedor').order_by('-fecha_programada')[:10]
     
     context = {
         'vehiculo': vehiculo,
@@ -162,6 +147,7 @@ def vehiculo_detalle_view(request, pk):
 
 
 @login_required
+@escritura_inmediata
 def vehiculo_crear_view(request):
     """Crear nuevo vehículo"""
     if request.method == 'POST':
@@ -184,9 +170,10 @@ def vehiculo_crear_view(request):
 
 
 @login_required
+@escritura_inmediata
 def vehiculo_editar_view(request, pk):
     """Editar vehículo existente"""
-    vehiculo = get_object_or_404(Vehiculo, pk=pk)
+    vehiculo = obtener_o_404(Vehiculo.objects.filter(activo=True), pk)
     
     if request.method == 'POST':
         form = VehiculoForm(request.POST, request.FILES, instance=vehiculo)
@@ -209,14 +196,16 @@ def vehiculo_editar_view(request, pk):
 
 
 @login_required
+@escritura_inmediata
 def vehiculo_eliminar_view(request, pk):
-    """Eliminar vehículo"""
-    vehiculo = get_object_or_404(Vehiculo, pk=pk)
+    """Eliminar vehículo: baja inmediata y purga del historial en segundo plano"""
+    vehiculo = obtener_o_404(Vehiculo.objects.filter(activo=True), pk)
     
     if request.method == 'POST':
-        patente = vehiculo.patente
-        vehiculo.delete()
-        messages.success(request, f'✅ Vehículo {patente} eliminado exitosamente.')
+        trabajo = solicitar_eliminacion(vehiculo)
+        messages.success(
+            request, f'✅ Vehículo {vehiculo.patente} eliminado. Su historial se borra en segundo plano (trabajo #{trabajo.pk}).'
+        )
         return redirect('flota:vehiculos')
     
     context = {
@@ -228,9 +217,10 @@ def vehiculo_eliminar_view(request, pk):
 
 
 @login_required
+@escritura_inmediata
 def vehiculo_actualizar_km_view(request, pk):
     """Actualizar kilometraje rápido"""
-    vehiculo = get_object_or_404(Vehiculo, pk=pk)
+    vehiculo = obtener_o_404(Vehiculo.objects.filter(activo=True), pk)
     
     if request.method == 'POST':
         form = ActualizarKilometrajeForm(request.POST, instance=vehiculo)
@@ -250,35 +240,67 @@ def vehiculo_actualizar_km_view(request, pk):
     return render(request, 'flota/vehiculo_actualizar_km.html', context)
 
 
+@login_required
+@user_passes_test(lambda usuario: usuario.is_staff)
+@require_POST
+@escritura_inmediata
+def api_vehiculos_transicion(request):
+    """
+    Cambio de estado y/o centro en bloque. Cuerpo JSON o form:
+    {"vehiculos": [ids] | "centro_origen": id, "estado_origen": "...", "estado": "...", "centro": id}
+    En un form ``vehiculos`` puede repetirse o venir separado por comas.
+    """
+    try:
+        if request.content_type == 'application/json':
+            datos = json.loads(request.body)
+        else:
+            datos = request.POST.dict()
+            # vehiculos=1&vehiculos=2 (o vehiculos=1,2): dict() se quedaría sólo con el último
+            datos['vehiculos'] = [pk for valor in request.POST.getlist('vehiculos') for pk in valor.split(',')]
+        if datos.get('centro_origen'):
+            vehiculos = vehiculos_de_centro(int(datos['centro_origen']), datos.get('estado_origen'))
+        else:
+            vehiculos = datos.get('vehiculos') or []
+            if isinstance(vehiculos, str):
+                vehiculos = vehiculos.split(',')
+            vehiculos = [pk for pk in vehiculos if str(pk).strip()]
+        resultado = transicionar_vehiculos(
+            vehiculos,
+            estado=datos.get('estado') or None,
+            centro_id=int(datos['centro']) if datos.get('centro') else None,
+        )
+    except (ValueError, TypeError) as error:  # incluye TransicionInvalida y JSON inválido
+        return JsonResponse({'error': f'Parámetro inválido: {error}'}, status=400)
+    
+    return JsonResponse(resultado)
+
+
 # ==================== MANTENIMIENTOS ====================
 # ==================== MANTENIMIENTOS ====================
 @login_required
 def mantenimientos_view(request):
     """Sistema de Mantenimientos - Lista completa"""
-    mantenimientos = Mantenimiento.objects.select_related(
+    # Trabajo vigente; con ?archivo=1 o un estado cerrado, el historial completo
+    mantenimientos = consultar_mantenimientos(request.GET).filter(vehiculo__activo=True).select_related(
         'vehiculo', 'tipo_mantenimiento', 'proveedor'
-    ).all().order_by('-fecha_programada')
+    ).order_by('-fecha_programada')
     
     # Filtros
-    estado_filter = request.GET.get('estado', '')
-    tipo_filter = request.GET.get('tipo', '')
-    prioridad_filter = request.GET.get('prioridad', '')
+    mantenimientos = filtrar_mantenimientos(mantenimientos, request.GET)
     
-    if estado_filter:
-        mantenimientos = mantenimientos.filter(estado=estado_filter)
-    if tipo_filter:
-        mantenimientos = mantenimientos.filter(tipo=tipo_filter)
-    if prioridad_filter:
-        mantenimientos = mantenimientos.filter(prioridad=prioridad_filter)
+    mantenimientos = listar_shards(
+        lambda alias: mantenimientos.using(alias), clave=lambda m: m.fecha_programada, reverse=True
+    )
     
     # Estadísticas
-    total = Mantenimiento.objects.count()
-    programados = Mantenimiento.objects.filter(estado='programado').count()
-    en_proceso = Mantenimiento.objects.filter(estado='en_proceso').count()
-    completados = Mantenimiento.objects.filter(estado='completado').count()
+    total = contar_en_shards(MantenimientoHistorial.objects.filter(vehiculo__activo=True))
+    programados = contar_en_shards(Mantenimiento.objects.filter(vehiculo__activo=True, estado='programado'))
+    en_proceso = contar_en_shards(Mantenimiento.objects.filter(vehiculo__activo=True, estado='en_proceso'))
+    completados = contar_en_shards(MantenimientoHistorial.objects.filter(vehiculo__activo=True, estado='completado'))
     
     context = {
         'mantenimientos': mantenimientos,
+        'incluye_archivo': incluir_archivo(request.GET),
         'total': total,
         'programados': programados,
         'en_proceso': en_proceso,
@@ -290,6 +312,17 @@ def mantenimientos_view(request):
 
 
 @login_required
+@lectura_replica
+def mantenimientos_exportar_view(request):
+    """Exportación del historial de mantenimientos (CSV/JSON en streaming)"""
+    try:
+        return respuesta_exportacion(request, 'mantenimientos')
+    except CursorInvalido:
+        return JsonResponse({'error': 'Parámetro since inválido (use fecha ISO 8601)'}, status=400)
+
+
+@login_required
+@escritura_inmediata
 def mantenimiento_crear_view(request):
     """Programar nuevo mantenimiento"""
     if request.method == 'POST':
@@ -304,12 +337,10 @@ def mantenimiento_crear_view(request):
         vehiculo_id = request.GET.get('vehiculo')
         initial = {}
         if vehiculo_id:
-            try:
-                vehiculo = Vehiculo.objects.get(pk=vehiculo_id)
+            vehiculo = buscar_por_pk(Vehiculo.objects.filter(activo=True), vehiculo_id)
+            if vehiculo is not None:
                 initial['vehiculo'] = vehiculo
                 initial['kilometraje_programado'] = vehiculo.kilometraje_actual
-            except Vehiculo.DoesNotExist:
-                pass
         
         form = MantenimientoForm(initial=initial)
     
@@ -324,9 +355,99 @@ def mantenimiento_crear_view(request):
 
 
 @login_required
+@user_passes_test(lambda usuario: usuario.is_staff)
+@escritura_inmediata
+def plan_preventivo_view(request):
+    """Plan preventivo de toda la flota: vista previa con GET, programación con POST"""
+    parametros = request.POST if request.method == 'POST' else request.GET
+    try:
+        opciones = {
+            'horizonte': int(parametros.get('horizonte') or 30),
+            'proveedor_id': int(parametros['proveedor']) if parametros.get('proveedor') else None,
+            'respetar_capacidad': parametros.get('ignorar_capacidad') != '1',
+            'centro': int(parametros['centro']) if parametros.get('centro') else None,
+        }
+        if request.method == 'POST':
+            resumen = generar_plan(request.user, **opciones)
+            messages.success(
+                request,
+                f"✅ Plan preventivo: {resumen['creados']} mantenimientos programados "
+                f"({resumen['con_trabajo_abierto']} ya tenían un trabajo abierto, {resumen['sin_cupo']} sin cupo en la agenda).",
+            )
+            return redirect('flota:mantenimientos')
+        plan = calcular_plan(**opciones) if 'horizonte' in request.GET else None
+    except ValueError as error:  # incluye PlanInvalido
+        messages.error(request, f'Parámetros inválidos: {error}')
+        plan, opciones = None, {'horizonte': 30, 'respetar_capacidad': True}
+    
+    muestra = []
+    if plan:
+        muestra = sorted(plan['trabajos'], key=lambda trabajo: (trabajo['fecha'], trabajo['vehiculo_id']))[:50]
+        patentes = {}
+        for alias in {trabajo['alias'] for trabajo in muestra}:
+            patentes.update(Vehiculo.objects.using(alias).filter(
+                pk__in=[trabajo['vehiculo_id'] for trabajo in muestra if trabajo['alias'] == alias]
+            ).values_list('id', 'patente'))
+        proveedores = dict(Proveedor.objects.values_list('id', 'nombre'))
+        muestra = [
+            {**trabajo, 'patente': patentes.get(trabajo['vehiculo_id']), 'proveedor': proveedores.get(trabajo['proveedor_id'])}
+            for trabajo in muestra
+        ]
+    
+    context = {
+        'opciones': opciones,
+        'resumen': resumen_plan(plan) if plan else None,
+        'muestra': muestra,
+        'proveedores': Proveedor.objects.filter(activo=True).order_by('nombre'),
+        'centros': CentroOperacional.objects.order_by('nombre'),
+    }
+    
+    return render(request, 'flota/plan_preventivo.html', context)
+
+
+@login_required
+@user_passes_test(lambda usuario: usuario.is_staff)
+@escritura_inmediata
+def rebalanceo_view(request):
+    """
+    Traslados entre centros para cubrir la demanda sin exceder la capacidad:
+    propuesta con GET, aplicación con POST de la huella de la propuesta
+    revisada (si la flota cambió desde entonces no se traslada nada).
+    """
+    if request.method == 'POST':
+        propuesta = proponer_rebalanceo()
+        if request.POST.get('huella') != propuesta['huella']:
+            messages.warning(request, 'La flota cambió desde que se calculó la propuesta. Revise los traslados actualizados.')
+            return redirect('flota:rebalanceo')
+        resultado = aplicar_rebalanceo(propuesta)
+        messages.success(
+            request,
+            f"✅ Rebalanceo: {resultado['trasladados']} vehículos trasladados ({resultado['rechazados']} omitidos).",
+        )
+        return redirect('flota:rebalanceo')
+    
+    propuesta = proponer_rebalanceo()
+    # Con cientos de centros se muestran solo los que tienen faltantes, exceso o traslados
+    centros = [
+        centro for centro in propuesta['centros']
+        if centro['exceso'] or centro['vehiculos'] != centro['vehiculos_despues']
+        or any(tipo['faltan'] for tipo in centro['tipos'].values())
+    ]
+    
+    context = {
+        'propuesta': propuesta,
+        'centros': centros,
+        'page_title': 'Rebalanceo de Flota',
+    }
+    
+    return render(request, 'flota/rebalanceo.html', context)
+
+
+@login_required
+@condition(etag_func=condicional.mantenimiento_detalle_etag, last_modified_func=condicional.mantenimiento_detalle_last_modified)
 def mantenimiento_detalle_view(request, pk):
     """Ver detalle de un mantenimiento"""
-    mantenimiento = get_object_or_404(Mantenimiento, pk=pk)
+    mantenimiento = obtener_o_404(MantenimientoHistorial, pk)
     
     context = {
         'mantenimiento': mantenimiento,
@@ -337,9 +458,10 @@ def mantenimiento_detalle_view(request, pk):
 
 
 @login_required
+@escritura_inmediata
 def mantenimiento_completar_view(request, pk):
     """Completar un mantenimiento"""
-    mantenimiento = get_object_or_404(Mantenimiento, pk=pk)
+    mantenimiento = obtener_o_404(Mantenimiento, pk)
     
     if request.method == 'POST':
         form = CompletarMantenimientoForm(request.POST, instance=mantenimiento)
@@ -349,18 +471,27 @@ def mantenimiento_completar_view(request, pk):
             # Generar número de reporte automático
             numero_reporte = f"MT-2025-{mantenimiento.pk:04d}"
             
-            # Mensaje de éxito con simulación de reporte
+            # El PDF se genera fuera del request (manage.py trabajador) y se adjunta al
+            # próximo resumen de notificaciones (ver flota/notificaciones.py)
+            trabajo = encolar(
+                'archivar_reporte_mantenimiento', {'mantenimiento_id': mantenimiento.pk},
+                prioridad=PRIORIDAD_ALTA, clave=f'reporte_mantenimiento:{mantenimiento.pk}',
+            )
+            encolar(
+                'reconstruir_cache_reportes', {'version': version_actual()[0]},
+                prioridad=PRIORIDAD_BAJA, clave=f'reconstruir_cache_reportes:{version_actual()[0]}',
+            )
+            
             mensaje_html = f"""
             <strong>✅ Mantenimiento completado exitosamente</strong><br><br>
             <div style='background: #f0f9ff; padding: 15px; border-left: 4px solid #3b82f6; margin-top: 10px;'>
-                <strong>📊 Reporte Automático Generado</strong><br>
+                <strong>📊 Reporte Automático en Preparación</strong><br>
                 <hr style='margin: 8px 0; border-color: #bfdbfe;'>
                 <strong>Número:</strong> {numero_reporte}<br>
-                <strong>📧 Enviado a:</strong> Jefe de Mantenimiento, Gerente de Operaciones<br>
-                <strong>📎 Formatos:</strong> PDF, Excel (.xlsx)<br>
-                <strong>💾 Ubicación:</strong> Sistema DocuTrans → Mantenimientos 2025<br>
+                <strong>📧 Se enviará a:</strong> Jefe de Mantenimiento, Gerente de Operaciones (resumen periódico)<br>
+                <strong>📎 Formato:</strong> PDF<br>
                 <small style='color: #64748b; margin-top: 8px; display: block;'>
-                    <em>En el sistema real, este reporte se enviaría automáticamente por email y se almacenaría en el servidor.</em>
+                    <em>Generación y envío en segundo plano (trabajo #{trabajo.pk}).</em>
                 </small>
             </div>
             """
@@ -378,10 +509,72 @@ def mantenimiento_completar_view(request, pk):
     
     return render(request, 'flota/mantenimiento_completar.html', context)
 
+
+@login_required
+@escritura_inmediata
+def mantenimientos_operaciones_view(request):
+    """Tablet del taller: iniciar, completar o cancelar varios mantenimientos de una vez"""
+    if request.method == 'POST':
+        form = OperacionMantenimientosForm(OperacionMantenimientosForm.datos_tablet(request.POST))
+        if form.is_valid():
+            operacion = form.cleaned_data['operacion']
+            resultado = aplicar_operacion(operacion, form.cleaned_data['mantenimientos'])
+            nivel = messages.warning if resultado['rechazados'] else messages.success
+            nivel(request, f'✅ {describir_operacion(operacion, resultado)}.')
+        else:
+            for error in form.non_field_errors() + form.errors.get('operacion', []):
+                messages.error(request, error)
+        return redirect(f"{request.path}?{request.GET.urlencode()}")
+    
+    hasta = parse_date(request.GET.get('hasta') or '') or timezone.localdate()
+    abiertos = Mantenimiento.objects.select_related('vehiculo', 'tipo_mantenimiento', 'proveedor').filter(
+        vehiculo__activo=True, estado__in=['programado', 'en_proceso'], fecha_programada__lte=hasta,
+    )
+    if request.GET.get('proveedor'):
+        abiertos = abiertos.filter(proveedor_id=request.GET['proveedor'])
+    mantenimientos = listar_shards(
+        lambda alias: abiertos.using(alias).order_by('fecha_programada', 'id')[:200], clave=lambda m: (m.fecha_programada, m.pk),
+    )[:200]
+    
+    context = {
+        'mantenimientos': mantenimientos,
+        'proveedores': Proveedor.objects.filter(activo=True).order_by('nombre'),
+        'filtros': request.GET,
+        'hasta': hasta,
+        'hoy': timezone.localdate(),
+        'page_title': 'Operaciones del Taller',
+    }
+    
+    return render(request, 'flota/mantenimientos_operaciones.html', context)
+
+
 @login_required
+@require_POST
+@escritura_inmediata
+def api_mantenimientos_operacion(request):
+    """
+    Operación en bloque: {"operacion": "completar", "mantenimientos": [{"id": 1,
+    "fecha_realizacion": "2025-06-01", "costo_real": 120000}, ...]} (JSON o form de tablet)
+    """
+    try:
+        datos = json.loads(request.body) if request.content_type == 'application/json' else OperacionMantenimientosForm.datos_tablet(request.POST)
+    except ValueError:
+        return JsonResponse({'error': 'JSON inválido'}, status=400)
+    
+    form = OperacionMantenimientosForm(datos)
+    if not form.is_valid():
+        detalle = {campo: list(mensajes) for campo, mensajes in form.errors.items()}
+        return JsonResponse({'error': 'Datos inválidos', 'detalle': detalle}, status=400)
+    
+    resultado = aplicar_operacion(form.cleaned_data['operacion'], form.cleaned_data['mantenimientos'])
+    return JsonResponse(resultado)
+
+
+@login_required
+@condition(etag_func=condicional.mantenimiento_reporte_etag, last_modified_func=condicional.mantenimiento_reporte_last_modified)
 def mantenimiento_reporte_view(request, pk):
     """Ver detalle del reporte de un mantenimiento completado"""
-    mantenimiento = get_object_or_404(Mantenimiento, pk=pk)
+    mantenimiento = obtener_o_404(MantenimientoHistorial, pk)
     
     if mantenimiento.estado != 'completado':
         messages.warning(request, 'Este mantenimiento aún no está completado. No hay reporte disponible.')
@@ -405,9 +598,10 @@ def mantenimiento_reporte_view(request, pk):
 
 
 @login_required
+@escritura_inmediata
 def mantenimiento_eliminar_view(request, pk):
     """Eliminar mantenimiento"""
-    mantenimiento = get_object_or_404(Mantenimiento, pk=pk)
+    mantenimiento = obtener_o_404(Mantenimiento, pk)
     
     if request.method == 'POST':
         vehiculo = mantenimiento.vehiculo.patente
@@ -426,6 +620,7 @@ def mantenimiento_eliminar_view(request, pk):
 # ==================== REPORTES ====================
 # ==================== REPORTES ====================
 @login_required
+@lectura_replica
 def reportes_view(request):
     """Sistema de Reportes"""
     
@@ -477,12 +672,14 @@ def reportes_view(request):
         messages.success(
             request,
             f'✅ Reporte "{info.get("titulo", "")}" generado exitosamente. '
-            f'En la versión completa se enviaría automáticamente.'
+            f'Descárguelo en el formato requerido.'
         )
         
         context = {
             'reporte_generado': True,
             'info_reporte': info,
+            'tipo_reporte': tipo_reporte,
+            'formatos_descarga': list(FORMATOS),
             'page_title': 'Reportes',
         }
         
@@ -494,38 +691,65 @@ def reportes_view(request):
     }
     
     return render(request, 'flota/reportes.html', context)
-# ==================== ALERTAS ====================
+
+
 @login_required
-def alertas_view(request):
+@lectura_replica
+def reporte_descargar_view(request, tipo):
+    """Descarga del reporte en CSV, XLSX o PDF (streaming o desde caché)"""
+    return respuesta_reporte(request, tipo, request.GET.get('formato', 'xlsx'))
+
+
+@login_required
+@require_POST
+def reporte_encolar_view(request, tipo):
+    """Encola la generación de un reporte; la descarga queda lista al completar el trabajo"""
+    formato = request.POST.get('formato', 'xlsx')
+    if tipo not in PLANES or formato not in FORMATOS:
+        return JsonResponse({'error': 'Reporte no encontrado'}, status=404)
+    return JsonResponse(estado_trabajo(encolar_reporte(tipo, formato)), status=202)
+
+
+# ==================== ALERTAS ====================
+@login_required_async
+@lectura_replica
+async def alertas_view(request):
     """Centro de Alertas Mejorado"""
     
+    # Con el estado en memoria solo se leen las filas de los vehículos en alerta
+    ids = await en_paralelo(km_restantes_alerta) if settings.FLOTA_ESTADO_MEMORIA else None
+    
+    # Ambas consultas son independientes: se ejecutan en paralelo
+    parciales = await reunir_shards_async(lambda alias: (
+        vehiculos_proximos_km(alias, ids),
+        list(Mantenimiento.objects.using(alias).filter(vehiculo__activo=True, estado='en_proceso').select_related(
+            'vehiculo', 'vehiculo__centro_operacion'
+        )),
+    ))
+    vehiculos_proximos = [v for proximos, _ in parciales for v in proximos]
+    mantenimientos_en_proceso = [m for _, en_proceso in parciales for m in en_proceso]
+    
     # Vehículos que necesitan mantenimiento pronto
     vehiculos_alerta = []
-    for vehiculo in Vehiculo.objects.filter(estado='operativo'):
+    for vehiculo in vehiculos_proximos:
         km_restantes = vehiculo.km_hasta_mantenimiento()
-        if km_restantes <= 2000:
-            nivel = 'critico' if km_restantes <= 500 else 'alta' if km_restantes <= 1000 else 'media'
-            vehiculos_alerta.append({
-                'vehiculo': vehiculo,
-                'km_restantes': km_restantes,
-                'nivel': nivel,
-                'tipo': 'mantenimiento',
-                'mensaje': f'Mantenimiento próximo en {km_restantes} km'
-            })
+        nivel = 'critico' if km_restantes <= 500 else 'alta' if km_restantes <= 1000 else 'media'
+        vehiculos_alerta.append({
+            'vehiculo': vehiculo,
+            'km_restantes': km_restantes,
+            'nivel': nivel,
+            'tipo': 'mantenimiento',
+            'mensaje': f'Mantenimiento próximo en {km_restantes} km'
+        })
     
     # Vehículos en mantenimiento hace mucho tiempo
-    mantenimientos_activos = Mantenimiento.objects.filter(
-        estado__in=['programado', 'en_proceso']
-    ).select_related('vehiculo')
-    
-    for mant in mantenimientos_activos:
-        if mant.estado == 'en_proceso':
-            vehiculos_alerta.append({
-                'vehiculo': mant.vehiculo,
-                'nivel': 'media',
-                'tipo': 'en_proceso',
-                'mensaje': f'Mantenimiento en proceso desde {mant.fecha_programada}'
-            })
+    for mant in mantenimientos_en_proceso:
+        vehiculos_alerta.append({
+            'vehiculo': mant.vehiculo,
+            'nivel': 'media',
+            'tipo': 'en_proceso',
+            'mensaje': f'Mantenimiento en proceso desde {mant.fecha_programada}'
+        })
     
     # Filtros
     nivel_filter = request.GET.get('nivel', '')
@@ -546,23 +770,246 @@ def alertas_view(request):
         'page_title': 'Alertas',
     }
     
-    return render(request, 'flota/alertas.html', context)
+    return await render_async(request, 'flota/alertas.html', context)
 
 
 # ==================== API ====================
-@login_required
-def api_alertas_count(request):
+@login_required_async
+@condicional.condition_async(etag_func=condicional.api_version_etag, last_modified_func=condicional.api_version_last_modified)
+async def api_alertas_count(request):
     """API para contar alertas activas"""
-    count = 0
-    
-    # Contar vehículos que necesitan mantenimiento
-    for vehiculo in Vehiculo.objects.filter(estado='operativo'):
-        if vehiculo.km_hasta_mantenimiento() <= 2000:
-            count += 1
+    # Vehículos que necesitan mantenimiento, contados en SQL
+    count = await en_paralelo(contar_alertas_flota)
     
     return JsonResponse({'count': count})
 
 
+@login_required_async
+@lectura_replica
+@condicional.condition_async(etag_func=condicional.api_version_etag, last_modified_func=condicional.api_version_last_modified)
+async def api_kpis(request):
+    """API con los KPIs de la flota (totales, por tipo y por centro)"""
+    kpis = await kpis_flota_async()
+    
+    return JsonResponse(kpis)
+
+
+@login_required_async
+async def eventos_stream_view(request):
+    """Canal SSE con deltas de KPIs y conteo de alertas (requiere ASGI)"""
+    try:
+        ultima_version = int(request.headers.get('Last-Event-ID') or request.GET.get('ultimo', ''))
+    except ValueError:
+        ultima_version = None
+    
+    if not isinstance(request, ASGIRequest):
+        # Bajo WSGI no se puede mantener la conexión abierta sin bloquear un worker: se envía
+        # solo la versión y el conteo de alertas (304 si la versión no cambió) y el navegador
+        # vuelve a consultar tras `retry`; el dashboard pide los KPIs a api_kpis al ver otra versión
+        numero, _ = await sync_to_async(version_actual)()
+        if numero == ultima_version:
+            return HttpResponse(status=304)
+        alertas = await en_paralelo(contar_alertas_flota)
+        cuerpo = formatear_evento('version', numero, {'version': numero, 'alertas': alertas}, retry=15000)
+        return HttpResponse(cuerpo, content_type='text/event-stream')
+    
+    response = StreamingHttpResponse(flujo_eventos(ultima_version), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+@login_required
+@lectura_replica
+@condition(etag_func=condicional.api_version_etag, last_modified_func=condicional.api_version_last_modified)
+def api_costos(request):
+    """Costo estimado vs. real agrupado por ?por=centro|vehiculo|proveedor|tipo_mantenimiento|mes"""
+    try:
+        desde = leer_mes(request.GET.get('desde'))
+        hasta = leer_mes(request.GET.get('hasta'))
+        centro = int(request.GET['centro']) if request.GET.get('centro') else None
+        limite = int(request.GET['limite']) if request.GET.get('limite') else None
+        datos = analisis_costos(request.GET.get('por', 'centro'), desde, hasta, centro=centro, limite=limite)
+    except ValueError as error:  # incluye ParametroInvalido
+        return JsonResponse({'error': f'Parámetro inválido: {error}'}, status=400)
+    
+    return JsonResponse(datos)
+
+
+@login_required
+@lectura_replica
+@condition(etag_func=condicional.api_version_etag, last_modified_func=condicional.api_version_last_modified)
+def api_cubo(request):
+    """
+    Consulta del cubo de indicadores. Ejemplo:
+    ?hecho=mantenimiento&por=proveedor,tipo,periodo&granularidad=trimestre&tipo_capacidad=GC
+    """
+    por = [dimension for dimension in request.GET.get('por', '').split(',') if dimension]
+    filtros = {
+        dimension: request.GET[dimension].split(',')
+        for dimension in ('centro', 'tipo_capacidad', 'estado', 'tipo_mantenimiento', 'proveedor', 'tipo')
+        if request.GET.get(dimension)
+    }
+    try:
+        datos = consultar_cubo(
+            hecho=request.GET.get('hecho', 'mantenimiento'),
+            por=por,
+            filtros=filtros,
+            granularidad=request.GET.get('granularidad', 'mes'),
+            desde=leer_mes(request.GET.get('desde')),
+            hasta=leer_mes(request.GET.get('hasta')),
+        )
+    except ValueError as error:  # incluye ConsultaInvalida
+        return JsonResponse({'error': f'Consulta inválida: {error}'}, status=400)
+    
+    return JsonResponse(datos)
+
+
+def _fecha_parametro(request, nombre):
+    """Fecha ISO de un parámetro GET; None si no viene, ValueError si no es válida"""
+    texto = request.GET.get(nombre)
+    if not texto:
+        return None
+    fecha = parse_date(texto)
+    if fecha is None:
+        raise ValueError(f'{nombre}={texto}')
+    return fecha
+
+
+@login_required
+@lectura_replica
+@condition(etag_func=condicional.api_version_etag, last_modified_func=condicional.api_version_last_modified)
+def api_series(request, nombre):
+    """Serie de tiempo columnar (mantenimientos, costos, disponibilidad) por ?granularidad=dia|semana|mes"""
+    try:
+        datos = serie_temporal(
+            nombre,
+            granularidad=request.GET.get('granularidad', 'semana'),
+            desde=_fecha_parametro(request, 'desde'),
+            hasta=_fecha_parametro(request, 'hasta'),
+        )
+    except ValueError as error:  # incluye SerieInvalida
+        return JsonResponse({'error': f'Consulta inválida: {error}'}, status=400)
+    
+    return JsonResponse(datos)
+
+
+# ==================== AGENDA DE TALLERES ====================
+@login_required
+@lectura_replica
+def api_agenda(request):
+    """Calendario de capacidad: ?desde=&hasta=&proveedor=1,2 (horas ocupadas y libres por día hábil)"""
+    try:
+        proveedores = [int(pk) for pk in request.GET['proveedor'].split(',')] if request.GET.get('proveedor') else None
+        datos = calendario_talleres(_fecha_parametro(request, 'desde'), _fecha_parametro(request, 'hasta'), proveedores)
+    except ValueError as error:  # incluye AgendaInvalida
+        return JsonResponse({'error': f'Parámetro inválido: {error}'}, status=400)
+    
+    return JsonResponse(datos)
+
+
+@login_required
+@lectura_replica
+def api_agenda_proponer(request):
+    """Fechas con cupo para un trabajo: ?horas=8&desde=2025-06-01&proveedor=3"""
+    try:
+        horas = int(request.GET.get('horas', 4))
+        proveedor = int(request.GET['proveedor']) if request.GET.get('proveedor') else None
+        datos = opciones_cupo(horas, _fecha_parametro(request, 'desde'), proveedor)
+    except ValueError as error:
+        return JsonResponse({'error': f'Parámetro inválido: {error}'}, status=400)
+    
+    return JsonResponse(datos)
+
+
+@login_required
+def api_trabajo_estado(request, pk):
+    """Estado de un trabajo en segundo plano"""
+    trabajo = Trabajo.objects.filter(pk=pk).first()
+    if trabajo is None:
+        return JsonResponse({'error': 'Trabajo no encontrado'}, status=404)
+    return JsonResponse(estado_trabajo(trabajo))
+
+
+@login_required
+@lectura_replica
+def api_cambios(request):
+    """Registro de cambios por cursor: ?desde=<cursor>&limite=500&modelo=vehiculo,mantenimiento"""
+    modelos = [modelo for modelo in request.GET.get('modelo', '').split(',') if modelo]
+    try:
+        datos = leer_cambios(request.GET.get('desde'), request.GET.get('limite'), modelos)
+    except CursorVencido:
+        return JsonResponse({
+            'error': 'El cursor es anterior a la retención del registro; resincronice con una exportación completa',
+            'cursor_actual': str(cursor_actual()),
+        }, status=410)
+    except ValueError as error:
+        return JsonResponse({'error': f'Parámetro inválido: {error}'}, status=400)
+    
+    return JsonResponse(datos)
+
+
+@login_required
+def api_sincronizacion(request):
+    """Sincronización incremental de un centro: ?centro=<id>&cursor=<cursor>&limite=500"""
+    try:
+        centro_id = int(request.GET.get('centro', ''))
+    except ValueError:
+        return JsonResponse({'error': 'Indique el centro con ?centro=<id>'}, status=400)
+    if not CentroOperacional.objects.filter(pk=centro_id).exists():
+        return JsonResponse({'error': 'Centro no encontrado'}, status=404)
+    
+    try:
+        datos = sincronizar(centro_id, request.GET.get('cursor'), request.GET.get('limite'))
+    except CursorVencido:
+        return JsonResponse({
+            'error': 'El cursor es anterior a la retención del registro; sincronice de nuevo sin cursor',
+        }, status=410)
+    except ValueError as error:
+        return JsonResponse({'error': f'Parámetro inválido: {error}'}, status=400)
+    
+    return respuesta_sincronizacion(request, datos)
+
+
+@login_required
+@require_POST
+def api_simulacion(request):
+    """Encola una simulación de disponibilidad (horizonte, corridas, centro, preventivo, semilla)"""
+    try:
+        parametros = parametros_simulacion(request.POST)
+    except SimulacionInvalida as error:
+        return JsonResponse({'error': f'Parámetro inválido: {error}'}, status=400)
+    
+    # Mismos parámetros y misma versión de datos: un solo trabajo
+    version = version_actual()[0]
+    huella = hashlib.sha1(json.dumps(parametros, sort_keys=True).encode()).hexdigest()[:16]
+    trabajo = encolar(
+        'simular_disponibilidad', parametros, prioridad=PRIORIDAD_BAJA,
+        clave=f'simular_disponibilidad:{huella}:v{version}:{timezone.localdate()}',
+    )
+    return JsonResponse(estado_trabajo(trabajo), status=202)
+
+
+@login_required
+@user_passes_test(lambda usuario: usuario.is_staff)
+@lectura_replica
+def api_rebalanceo(request):
+    """Traslados propuestos entre centros y el estado de cada centro antes y después"""
+    return JsonResponse(proponer_rebalanceo())
+
+
+@login_required
+def api_trabajos(request):
+    """Últimos trabajos, filtrables por ?estado= y ?tipo="""
+    trabajos = Trabajo.objects.all()
+    if request.GET.get('estado'):
+        trabajos = trabajos.filter(estado=request.GET['estado'])
+    if request.GET.get('tipo'):
+        trabajos = trabajos.filter(tipo=request.GET['tipo'])
+    
+    return JsonResponse({'trabajos': [estado_trabajo(trabajo) for trabajo in trabajos[:50]]})
+
+
 # ==================== USUARIOS ====================
 @login_required
 def cambiar_usuario_view(request):